@@ -0,0 +1,95 @@
+"""Recall@k versus latency of the IVF-PQ index against exact search.
+
+Runs on the chunk embeddings of the local vector index configured through
+`Context` (ingest with `VECTOR_STORE_BACKEND=local medical-agent-ingest ...`
+first). Queries are either real clinician questions embedded with the
+configured model (`--queries-file`, one per line) or a sample of the stored
+chunk embeddings.
+
+Usage:
+    python benchmarks/ann_recall.py --k 5 --nprobe 1 4 16 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from medical_agent.context import Context
+from medical_agent.vector_index import LocalVectorIndex
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled chunk embeddings to query with.")
+    parser.add_argument("--queries-file", help="Text file with one clinician query per line.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the IVF-PQ index before measuring.")
+    args = parser.parse_args()
+
+    context = Context()
+    index = LocalVectorIndex(context.local_index_path, dtype=context.local_index_dtype)
+    if not len(index):
+        raise SystemExit(f"Local index at {context.local_index_path} is empty; ingest some PDFs first.")
+
+    if args.rebuild or index.ann is None:
+        started = time.perf_counter()
+        index.build_ann(nlist=context.ann_nlist, m=context.ann_pq_m)
+        print(f"Built IVF-PQ (nlist={index.ann.nlist}, m={index.ann.m}) in {time.perf_counter() - started:.1f}s")
+
+    if args.queries_file:
+        from medical_agent.embeddings import build_embeddings
+
+        with open(args.queries_file) as fh:
+            texts = [line.strip() for line in fh if line.strip()]
+        queries = np.asarray(build_embeddings(context).embed_documents(texts), dtype=np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        rows = index.live_rows()
+        queries = index.vectors(rng.choice(rows, size=min(args.queries, len(rows)), replace=False))
+
+    exact_ids, exact_times = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, args.k)
+        exact_times.append(time.perf_counter() - started)
+        exact_ids.append({hit.id for hit in hits})
+
+    report = {
+        "vectors": len(index),
+        "dimensions": index.dimensions,
+        "dtype": index.dtype,
+        "k": args.k,
+        "queries": len(queries),
+        "exact": {"p50_ms": percentile_ms(exact_times, 50), "p95_ms": percentile_ms(exact_times, 95)},
+        "ann": [],
+    }
+    for nprobe in args.nprobe:
+        recalls, times = [], []
+        for query, truth in zip(queries, exact_ids):
+            started = time.perf_counter()
+            hits = index.search(query, args.k, nprobe=nprobe, rerank_factor=context.ann_rerank_factor)
+            times.append(time.perf_counter() - started)
+            recalls.append(len(truth & {hit.id for hit in hits}) / max(1, len(truth)))
+        report["ann"].append(
+            {
+                "nprobe": nprobe,
+                f"recall@{args.k}": float(np.mean(recalls)),
+                "p50_ms": percentile_ms(times, 50),
+                "p95_ms": percentile_ms(times, 95),
+            }
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Checkpoint write time and storage per turn: SQLite delta checkpointer versus the default.
+
+`langgraph dev` checkpoints into LangGraph's in-memory saver and pickles it
+to `.langgraph_api/`; this benchmark measures that (the pickled size of the
+saver after each turn) against `medical_agent.checkpointer.SQLiteCheckpointer`
+(the database file size). Both savers checkpoint the same consultation: a
+graph over `MedicalState` whose nodes write what the real ones do (the
+normalized input and memory record, patient snapshot documents, procedure
+guideline documents and an answer message) without calling any model or
+database. Procedure documents are windows of the procedure PDF and repeat
+across turns, as they do when a consultation keeps asking about the same
+condition.
+
+Usage:
+    python benchmarks/checkpoint.py --turns 20 --threads 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from medical_agent.checkpointer import SQLiteCheckpointer
+from medical_agent.memory import compact_messages, fold_turn
+from medical_agent.schemas import RequiredInfo, UserInputInfo
+from medical_agent.state import InputState, MedicalState
+
+ROOT = Path(__file__).resolve().parent.parent
+QUESTIONS = [
+    ("Alice Souza", ["febre", "tosse"], "pneumonia"),
+    ("Alice Souza", ["falta de ar"], "asma"),
+    ("Alice Souza", ["dor no peito"], ""),
+    ("Bruno Ribeiro", ["retenção urinária"], ""),
+]
+
+
+def procedure_windows(chars: int = 1200) -> List[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(ROOT / "db" / "medic-procedures" / "BasicProcedure.pdf")
+    text = " ".join(" ".join((page.extract_text() or "").split()) for page in reader.pages[:20])
+    return [text[i : i + chars] for i in range(0, len(text), chars)]
+
+
+def build_graph(windows: List[str], checkpointer):
+    def normalize(state: MedicalState) -> Dict[str, Any]:
+        turn = len([m for m in state["messages"] if m.type == "human"])
+        patient, symptoms, disease = QUESTIONS[turn % len(QUESTIONS)]
+        info = UserInputInfo(
+            patient_name=patient, symptoms=symptoms, disease_name=disease, condition="",
+            original_input=state["messages"][-1].content, summary=state["messages"][-1].content,
+        )
+        return {
+            "user_input_info": info,
+            "memory": fold_turn(state.get("memory"), info, 8),
+            "messages": compact_messages(state["messages"], 2000),
+            "required_info": RequiredInfo(patient=True, procedure_guidelines=True, disease_infos=True),
+        }
+
+    def gather_patient_info(state: MedicalState) -> Dict[str, Any]:
+        name = state["user_input_info"]["patient_name"]
+        history = [f"2024-0{i + 1}-10: consultation {i}. Reported {', '.join(state['user_input_info']['symptoms'])}." for i in range(8)]
+        text = f"Patient: {name}\n" + "\n".join(f"- {item}" for item in history)
+        return {
+            "patient_info": [Document(page_content=text, metadata={"source": "patient_queries", "patient_name": name})],
+            "patient_health_history": history,
+            "branch_timings": {"gather_patient_info": 0.01},
+        }
+
+    def gather_procedure_guidelines(state: MedicalState) -> Dict[str, Any]:
+        start = zlib.crc32(state["user_input_info"]["disease_name"].encode()) % len(windows)
+        docs = [Document(page_content=windows[(start + i) % len(windows)], metadata={"source": "BasicProcedure.pdf", "page": start + i}) for i in range(4)]
+        return {"procedure_guidelines": docs, "branch_timings": {"gather_procedure_guidelines": 0.02}}
+
+    def answer(state: MedicalState) -> Dict[str, Any]:
+        return {"messages": [AIMessage(" ".join(doc.page_content[:300] for doc in state["procedure_guidelines"]))]}
+
+    builder = StateGraph(MedicalState, input_schema=InputState)
+    builder.add_node(normalize)
+    builder.add_node(gather_patient_info)
+    builder.add_node(gather_procedure_guidelines)
+    builder.add_node(answer)
+    builder.add_edge(START, "normalize")
+    builder.add_edge("normalize", "gather_patient_info")
+    builder.add_edge("normalize", "gather_procedure_guidelines")
+    builder.add_edge(["gather_patient_info", "gather_procedure_guidelines"], "answer")
+    builder.add_edge("answer", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+class Timed:
+    """Accumulate the time spent in a saver's write methods."""
+
+    def __init__(self, saver):
+        self.seconds = 0.0
+        for name in ("put", "put_writes"):
+            method = getattr(saver, name)
+
+            def timed(*args, _method=method, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    self.seconds += time.perf_counter() - started
+
+            setattr(saver, name, timed)
+
+
+def memory_saver_bytes(saver: InMemorySaver) -> int:
+    # What `langgraph dev` writes to .langgraph_api on each flush; the time to pickle it is the flush cost.
+    return len(pickle.dumps((dict(saver.storage), dict(saver.writes), saver.blobs)))
+
+
+def sqlite_bytes(saver: SQLiteCheckpointer) -> int:
+    # Moving the WAL into the database file is the flush cost.
+    saver._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(saver.path)
+
+
+def run(saver, size, args, windows) -> Dict[str, Any]:
+    graph = build_graph(windows, saver)
+    timer = Timed(saver)
+    write_ms, flush_ms, growth = [], [], []
+    previous = size(saver)
+    for turn in range(args.turns):
+        before = timer.seconds
+        for thread in range(args.threads):
+            patient, symptoms, _ = QUESTIONS[turn % len(QUESTIONS)]
+            graph.invoke(
+                {"messages": [HumanMessage(f"Paciente {patient} com {', '.join(symptoms)}; turno {turn}")]},
+                {"configurable": {"thread_id": f"thread-{thread}"}},
+            )
+        write_ms.append((timer.seconds - before) * 1000.0 / args.threads)
+        started = time.perf_counter()
+        current = size(saver)
+        flush_ms.append((time.perf_counter() - started) * 1000.0 / args.threads)
+        growth.append((current - previous) / args.threads)
+        previous = current
+    result = {
+        "write_ms_per_turn_mean": float(np.mean(write_ms)),
+        "write_ms_per_turn_last": write_ms[-1],
+        "flush_ms_per_turn_mean": float(np.mean(flush_ms)),
+        "bytes_per_turn_mean": float(np.mean(growth)),
+        "bytes_per_turn_last": growth[-1],
+        "total_bytes": previous,
+    }
+    if isinstance(saver, SQLiteCheckpointer):
+        saver.prune()
+        page_size, pages, free = (
+            saver._conn.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in ("page_size", "page_count", "freelist_count")
+        )
+        # Freed pages are reused by later writes; the file itself only shrinks on VACUUM.
+        result["live_bytes_after_prune"] = page_size * (pages - free)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=5, help="Concurrent consultations, run one after another per turn.")
+    parser.add_argument("--keep-per-thread", type=int, default=20)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    windows = procedure_windows()
+    report: Dict[str, Any] = {"turns": args.turns, "threads": args.threads}
+    report["in_memory_pickle"] = run(InMemorySaver(), memory_saver_bytes, args, windows)
+    with tempfile.TemporaryDirectory(prefix="medical-agent-checkpoint-") as directory:
+        saver = SQLiteCheckpointer(Path(directory) / "checkpoints.sqlite3", keep_per_thread=args.keep_per_thread)
+        report["sqlite_delta"] = run(saver, sqlite_bytes, args, windows)
+        saver.close()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Offline end-to-end benchmark of the medical agent.
+
+Replays a corpus of clinician queries through the compiled `graph` (and,
+optionally, the supervisor, PDF and SQL agents on their own) at several
+concurrency levels, with every external dependency replaced by a local
+stand-in:
+
+- Ollama is served by `fake_ollama.py` with configurable time to first token
+  and token rate; chat models and embeddings are pointed at it through
+  `OLLAMA_HOST`.
+- Procedures are ingested from `db/medic-procedures` into a throwaway local
+  vector index (`VECTOR_STORE_BACKEND=local`) under a temporary cache dir.
+- Patient data comes from a MySQL-compatible server loaded with
+  `db/1_schema.sql` and `db/3_data.sql` (`--load-fixture` recreates the
+  database named by `DB_NAME`). The agents only speak MySQL, so the fixture
+  cannot be SQLite; `docker compose up -d mysql` is enough.
+
+The corpus is JSON lines with a `query` and an optional `expected_source`; a
+retrieval hit is a procedure answer citing that source.
+
+Reports latency percentiles, QPS, LLM and embedding calls per request,
+retrieval hit rate and per-span latencies as JSON.
+
+Usage:
+    DB_PASSWORD=root DB_NAME=medical_agent_bench \\
+        python benchmarks/e2e.py --load-fixture --concurrency 1 4 16 --llm-latency-ms 300 --tokens-per-second 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from fake_ollama import FakeOllama
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TERMS = [
+    # Procedures from db/medic-procedures
+    "venepuncture", "intravenous cannulation", "blood pressure", "arterial blood gas", "peak flow",
+    "inhaler technique", "oxygen administration", "nasogastric tube", "urethral catheterization",
+    "suprapubic catheterization", "endotracheal intubation", "lumbar puncture", "pericardial aspiration",
+    "ascitic tap", "knee joint aspiration", "blood cultures", "central vein cannulation", "chest drain",
+    "abdominal paracentesis", "tracheostomy", "pleural fluid", "airway management", "non-invasive ventilation",
+    # Symptoms and conditions
+    "febre", "falta de ar", "dor no peito", "dor de cabeça", "asma", "ascite", "retenção urinária",
+    "derrame pleural", "meningite", "gripe",
+]
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000.0) if samples else 0.0
+
+
+def fixture_patient_names() -> List[str]:
+    data = (ROOT / "db" / "3_data.sql").read_text(encoding="utf-8")
+    return re.findall(r"\(UUID\(\), '([^']+)', '\d{4}-\d{2}-\d{2}', '(?:male|female|other)'\)", data)
+
+
+def load_fixture(context) -> None:
+    """Recreate `context.db_name` from the schema and data scripts."""
+    import mysql.connector
+
+    from medical_agent.sql_parsing import split_statements
+
+    connection = mysql.connector.connect(
+        host=context.db_host, port=context.db_port, user=context.db_user, password=context.db_password
+    )
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{context.db_name}`")
+        cursor.execute(f"CREATE DATABASE `{context.db_name}`")
+        cursor.execute(f"USE `{context.db_name}`")
+        for script in ("1_schema.sql", "3_data.sql"):
+            for statement in split_statements((ROOT / "db" / script).read_text(encoding="utf-8")):
+                cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def ingest_procedures(context) -> Dict[str, Any]:
+    from medical_agent.document_loader.ingest import build_pipeline
+
+    started = time.perf_counter()
+    stats = build_pipeline(context).ingest_directory(str(ROOT / "db" / "medic-procedures"))
+    return {"summary": stats.summary(), "seconds": time.perf_counter() - started}
+
+
+async def run_target(target: str, query: str, context) -> List[str]:
+    """Run one query through `target` and return the procedure sources it cited."""
+    messages = {"messages": [{"role": "user", "content": query}]}
+    if target == "graph":
+        from medical_agent import graph
+
+        state = await graph.ainvoke(messages, context=context)
+        return [source for doc in state.get("procedure_guidelines") or [] for source in doc.metadata.get("sources") or []]
+    if target == "supervisor":
+        from medical_agent.agents.supervisor_agent import supervisor_agent
+
+        state = await supervisor_agent.ainvoke(messages)
+        return [message.text for message in state["messages"] if "Retrieved sources:" in message.text]
+    if target == "pdf":
+        from medical_agent.agents.pdf_agent import aanswer_with_sources
+
+        _, sources = await aanswer_with_sources(query)
+        return sources
+    if target == "sql":
+        from medical_agent.registry import registry
+
+        await registry.get("sql_agent", context).ainvoke(messages)
+        return []
+    raise ValueError(f"Unknown target {target!r}")
+
+
+async def run_level(
+    target: str, corpus: List[Dict[str, Any]], requests: int, concurrency: int, context, server: FakeOllama
+) -> Dict[str, Any]:
+    from medical_agent.tracing import LatencyHistograms, get_tracer
+
+    tracer = get_tracer()
+    tracer.histograms = LatencyHistograms()
+    before = server.stats.snapshot()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+    hits = expected = 0
+
+    async def one(item: Dict[str, Any]) -> None:
+        nonlocal hits, expected
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                sources = await run_target(target, item["query"], context)
+            except Exception as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+                return
+            latencies.append(time.perf_counter() - started)
+        if item.get("expected_source") and target != "sql":
+            expected += 1
+            hits += any(item["expected_source"] in source for source in sources)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(corpus[i % len(corpus)]) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    after = server.stats.snapshot()
+    per_request = max(1, requests)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": {
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+            "mean_ms": float(np.mean(latencies) * 1000.0) if latencies else 0.0,
+            "max_ms": float(np.max(latencies) * 1000.0) if latencies else 0.0,
+        },
+        "llm_calls_per_request": (after["chat_requests"] - before["chat_requests"]) / per_request,
+        "embedding_calls_per_request": (after["embed_requests"] - before["embed_requests"]) / per_request,
+        "llm_tokens_per_request": {
+            "prompt": (after["prompt_tokens"] - before["prompt_tokens"]) / per_request,
+            "completion": (after["completion_tokens"] - before["completion_tokens"]) / per_request,
+        },
+        "retrieval_hit_rate": hits / expected if expected else None,
+        "spans": {
+            name: {"count": stats["count"], "p50_ms": stats["p50"] * 1000.0, "p95_ms": stats["p95"] * 1000.0}
+            for name, stats in tracer.histograms.summary().items()
+        },
+    }
+
+
+def read_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def configure_environment(args: argparse.Namespace, server: FakeOllama, cache_dir: str) -> None:
+    """Point every dependency at the local stand-ins; must run before `medical_agent` is imported."""
+    os.environ["OLLAMA_HOST"] = server.url
+    os.environ["VECTOR_STORE_BACKEND"] = "local"
+    os.environ["CACHE_DIR"] = cache_dir
+    os.environ["LOCAL_INDEX_PATH"] = os.path.join(cache_dir, "procedure_index")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(cache_dir, "lexical_index")
+    os.environ["TRACE_EXPORT_PATH"] = args.trace_export or os.path.join(cache_dir, "traces.jsonl")
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["ANSWER_CACHE_ENABLED"] = str(args.answer_cache).lower()
+
+
+async def run(args: argparse.Namespace, server: FakeOllama) -> Dict[str, Any]:
+    from medical_agent.context import Context
+    from medical_agent.registry import registry
+
+    context = Context()
+    report: Dict[str, Any] = {
+        "llm_latency_ms": args.llm_latency_ms,
+        "tokens_per_second": args.tokens_per_second,
+        "embed_latency_ms": args.embed_latency_ms,
+        "answer_cache": args.answer_cache,
+        "database": f"{context.db_host}:{context.db_port}/{context.db_name}",
+    }
+    if args.load_fixture:
+        load_fixture(context)
+    report["ingestion"] = ingest_procedures(context)
+
+    corpus = read_corpus(args.queries_file)
+    requests = args.requests or len(corpus)
+    report["queries"] = len(corpus)
+    report["warm_up"] = await registry.warm_up(context=context)
+    report["results"] = []
+    for target in args.targets:
+        for item in corpus[: args.warmup]:
+            try:
+                await run_target(target, item["query"], context)
+            except Exception as exc:
+                report.setdefault("warm_up_errors", []).append(f"{target}: {type(exc).__name__}: {exc}")
+        for concurrency in args.concurrency:
+            report["results"].append(await run_level(target, corpus, requests, concurrency, context, server))
+    report["fake_ollama"] = server.stats.snapshot()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", choices=["graph", "supervisor", "pdf", "sql"], default=["graph"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, help="Requests per concurrency level (default: the corpus size).")
+    parser.add_argument("--warmup", type=int, default=1, help="Corpus queries run per target before measuring.")
+    parser.add_argument("--queries-file", default=str(Path(__file__).with_name("queries.jsonl")))
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fake time to first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake generation rate.")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Length of fake free-text answers.")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled.")
+    parser.add_argument("--load-fixture", action="store_true", help="Recreate DB_NAME from db/1_schema.sql and db/3_data.sql.")
+    parser.add_argument("--trace-export", help="Write spans to this JSONL file.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        llm_latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        embed_latency_ms=args.embed_latency_ms,
+        answer_tokens=args.answer_tokens,
+        patient_names=fixture_patient_names(),
+        terms=TERMS,
+    )
+    with server, tempfile.TemporaryDirectory(prefix="medical-agent-e2e-") as cache_dir:
+        configure_environment(args, server, cache_dir)
+        report = asyncio.run(run(args, server))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
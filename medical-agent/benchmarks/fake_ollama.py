@@ -0,0 +1,385 @@
+"""Local stand-in for the Ollama HTTP API used by the end-to-end benchmark.
+
+Serves `/api/chat`, `/api/embed` and `/api/embeddings` (plus `/api/tags` and
+`/api/show`) with configurable time to first token and token rate, so the
+agents can be exercised end to end without a GPU or a real model:
+
+- Chat requests with a `format` schema (structured output) get a JSON object
+  filled from the user message: known patient names and clinical terms are
+  picked up with a simple lexicon.
+- Chat requests offering tools get a tool call (`sql_db_query` with a query for
+  the named patient when it is offered, otherwise one call per tool with the
+  user message); once tool results are in the conversation, a text answer.
+- Embeddings are deterministic hashed bags of words, so texts sharing words
+  are close and retrieval over the local index behaves sensibly.
+- With `prefill_tokens_per_second` set, prompt processing is simulated like
+  Ollama's prompt cache: each model keeps the prompts of its last `kv_slots`
+  requests, and only the part of a new prompt after the longest prefix it
+  shares with one of them costs prefill time.
+
+Run standalone with `python benchmarks/fake_ollama.py --port 11434`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NAMED_PATIENT_RE = re.compile(r"(?i:paciente|patient)\s*:?[ \t]+((?:[A-ZÀ-Ý][\wÀ-ÿ]+[ \t]?){1,3})")
+
+
+@dataclass
+class FakeOllamaStats:
+    chat_requests: int = 0
+    structured_requests: int = 0
+    tool_call_responses: int = 0
+    embed_requests: int = 0
+    embed_inputs: int = 0
+    prompt_tokens: int = 0
+    prompt_cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents."""
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(ch))
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def render_prompt(body: Dict[str, Any]) -> str:
+    """Flatten a chat request the way a chat template would: system message, tools, then the rest."""
+    messages = list(body.get("messages") or [])
+    parts = []
+    if messages and messages[0].get("role") == "system":
+        parts.append(f"<system>{messages.pop(0).get('content') or ''}")
+    if body.get("tools"):
+        parts.append(f"<tools>{json.dumps(body['tools'], sort_keys=True)}")
+    parts += [f"<{message.get('role')}>{message.get('content') or ''}" for message in messages]
+    return "".join(parts)
+
+
+def hashed_embedding(text: str, dimensions: int) -> List[float]:
+    """Signed feature hashing of the folded words of `text`, L2-normalised."""
+    vector = [0.0] * dimensions
+    for word in _WORD_RE.findall(_fold(text)):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimensions
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FakeOllama:
+    """Threaded HTTP server speaking enough of the Ollama API for the agents.
+
+    Args:
+        llm_latency_ms (float): Time to first token of every chat response.
+        tokens_per_second (float): Generation rate after the first token; 0 means instant.
+        embed_latency_ms (float): Latency of every embedding request.
+        dimensions (int): Size of the returned embeddings.
+        answer_tokens (int): Length of free-text answers, in tokens.
+        prefill_tokens_per_second (float): Prompt processing rate of uncached tokens; 0 means instant.
+        kv_slots (int): Prompts whose cache is kept per model, like `OLLAMA_NUM_PARALLEL`.
+        patient_names (Sequence[str]): Names recognised as the patient in structured output.
+        terms (Sequence[str]): Symptoms, diseases and procedures recognised in structured output.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        llm_latency_ms: float = 200.0,
+        tokens_per_second: float = 50.0,
+        embed_latency_ms: float = 5.0,
+        dimensions: int = 384,
+        answer_tokens: int = 120,
+        prefill_tokens_per_second: float = 0.0,
+        kv_slots: int = 4,
+        patient_names: Sequence[str] = (),
+        terms: Sequence[str] = (),
+    ):
+        self.llm_latency_ms = llm_latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.embed_latency_ms = embed_latency_ms
+        self.dimensions = dimensions
+        self.answer_tokens = answer_tokens
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.kv_slots = kv_slots
+        self._kv_cache: Dict[str, List[str]] = {}
+        self.patient_names = {_fold(name): name for name in patient_names}
+        self.terms = {_fold(term): term for term in terms}
+        self.stats = FakeOllamaStats()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler_class_for(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def prefill_seconds(self, body: Dict[str, Any]) -> float:
+        """Simulated prompt processing time, reusing the cached prompt with the longest shared prefix."""
+        if self.prefill_tokens_per_second <= 0:
+            return 0.0
+        prompt = render_prompt(body)
+        with self._lock:
+            slots = self._kv_cache.setdefault(str(body.get("model")), [])
+            best, shared = 0, 0
+            for index, cached in enumerate(slots):
+                length = len(os.path.commonprefix([cached, prompt]))
+                if length > shared:
+                    best, shared = index, length
+            # Like Ollama's multi-user cache: a prompt extending a cached one takes its slot,
+            # one that diverges from it copies the shared prefix into the least recently used slot.
+            if slots and shared == len(slots[best]):
+                slots.pop(best)
+            elif len(slots) >= self.kv_slots:
+                slots.pop(0)
+            slots.append(prompt)
+            cached_tokens = shared // 4
+            self.stats.prompt_cached_tokens += cached_tokens
+        return max(0, _count_tokens(prompt) - cached_tokens) / self.prefill_tokens_per_second
+
+    # Responses
+
+    def chat_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The assistant message for a chat request, as `{"content": ..., "tool_calls": [...]}`."""
+        messages = body.get("messages") or []
+        user_text = next((str(m.get("content") or "") for m in reversed(messages) if m.get("role") == "user"), "")
+        schema = body.get("format")
+        if isinstance(schema, dict):
+            self.count(structured_requests=1)
+            return {"role": "assistant", "content": json.dumps(self.structured(schema, user_text), ensure_ascii=False)}
+        if schema == "json":
+            self.count(structured_requests=1)
+            return {"role": "assistant", "content": json.dumps({"answer": self.answer(user_text)}, ensure_ascii=False)}
+
+        tools = [tool.get("function", tool) for tool in body.get("tools") or []]
+        if tools and not (messages and messages[-1].get("role") == "tool"):
+            self.count(tool_call_responses=1)
+            return {"role": "assistant", "content": "", "tool_calls": self.tool_calls(tools, user_text)}
+        return {"role": "assistant", "content": self.answer(user_text)}
+
+    def structured(self, schema: Dict[str, Any], text: str) -> Dict[str, Any]:
+        folded = _fold(text)
+        patient = next((name for key, name in self.patient_names.items() if key in folded), "")
+        if not patient and (match := _NAMED_PATIENT_RE.search(text)):
+            patient = match.group(1).strip()
+        terms = [term for key, term in self.terms.items() if re.search(rf"\b{re.escape(key)}\b", folded)]
+        known = {
+            "patient_name": patient,
+            "symptoms": terms,
+            "disease_name": "",
+            "condition": "",
+            "original_input": text,
+            "summary": text[:200],
+        }
+        result = {}
+        for name, prop in (schema.get("properties") or {}).items():
+            if name in known:
+                result[name] = known[name]
+            else:
+                result[name] = {"array": [], "boolean": False, "integer": 0, "number": 0, "object": {}}.get(prop.get("type"), "")
+        return result
+
+    def tool_calls(self, tools: List[Dict[str, Any]], text: str) -> List[Dict[str, Any]]:
+        names = [tool.get("name") for tool in tools]
+        if "sql_db_query" in names:
+            patient = self.structured({"properties": {"patient_name": {}}}, text)["patient_name"].replace("'", "''")
+            query = (
+                "SELECT h.title, h.description, h.occurred_at FROM health_history h "
+                "JOIN patients p ON p.id = h.patient_id "
+                f"WHERE p.full_name LIKE '{patient}%' ORDER BY h.occurred_at DESC LIMIT 5"
+            )
+            return [{"function": {"name": "sql_db_query", "arguments": {"query": query}}}]
+        calls = []
+        for tool in tools:
+            required = (tool.get("parameters") or {}).get("required") or list(((tool.get("parameters") or {}).get("properties") or {}))
+            calls.append({"function": {"name": tool["name"], "arguments": {name: text for name in required[:1]}}})
+        return calls
+
+    def answer(self, text: str) -> str:
+        words = _WORD_RE.findall(text) or ["resposta"]
+        return " ".join(words[i % len(words)] for i in range(self.answer_tokens))
+
+
+def _handler_class_for(server: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _json_body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/api/tags":
+                self._send_json({"models": []})
+            elif self.path in ("/", "/api/version"):
+                self._send_json({"version": "0.0.0-fake"})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_HEAD(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self) -> None:
+            body = self._json_body()
+            if self.path == "/api/chat":
+                self._chat(body)
+            elif self.path == "/api/embed":
+                inputs = body.get("input")
+                inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+                self._embed_delay(len(inputs))
+                self._send_json(
+                    {"model": body.get("model"), "embeddings": [hashed_embedding(text, server.dimensions) for text in inputs]}
+                )
+            elif self.path == "/api/embeddings":
+                self._embed_delay(1)
+                self._send_json({"embedding": hashed_embedding(str(body.get("prompt") or ""), server.dimensions)})
+            elif self.path == "/api/show":
+                self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}, "capabilities": ["completion", "tools"]})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def _embed_delay(self, inputs: int) -> None:
+            server.count(embed_requests=1, embed_inputs=inputs)
+            time.sleep(server.embed_latency_ms / 1000.0)
+
+        def _chat(self, body: Dict[str, Any]) -> None:
+            prompt_tokens = sum(_count_tokens(str(m.get("content") or "")) for m in body.get("messages") or [])
+            message = server.chat_response(body)
+            content = message["content"]
+            # Split on whitespace boundaries so concatenated chunks reproduce the content.
+            pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+            completion_tokens = len(pieces) + 10 * len(message.get("tool_calls") or [])
+            server.count(chat_requests=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            interval = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0.0
+            started = time.perf_counter_ns()
+            time.sleep(server.llm_latency_ms / 1000.0 + server.prefill_seconds(body))
+
+            def chunk(message_part: Dict[str, Any], done: bool) -> Dict[str, Any]:
+                payload = {
+                    "model": body.get("model"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": message_part,
+                    "done": done,
+                }
+                if done:
+                    payload.update(
+                        done_reason="stop",
+                        total_duration=time.perf_counter_ns() - started,
+                        prompt_eval_count=prompt_tokens,
+                        eval_count=completion_tokens,
+                    )
+                return payload
+
+            if not body.get("stream", True):
+                time.sleep(interval * completion_tokens)
+                self._send_json(chunk(message, True))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            parts = [chunk({"role": "assistant", "content": piece}, False) for piece in pieces]
+            if message.get("tool_calls"):
+                parts.append(chunk({"role": "assistant", "content": "", "tool_calls": message["tool_calls"]}, False))
+            parts.append(chunk({"role": "assistant", "content": ""}, True))
+            for index, part in enumerate(parts):
+                if index:
+                    time.sleep(interval)
+                data = (json.dumps(part, ensure_ascii=False) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--dimensions", type=int, default=384)
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        args.host,
+        args.port,
+        llm_latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        embed_latency_ms=args.embed_latency_ms,
+        prefill_tokens_per_second=args.prefill_tokens_per_second,
+        dimensions=args.dimensions,
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Time to first token of the PDF agent prompt, before and after the prefix-stable layout.
+
+Ollama reuses the KV cache of a previous request for the longest prefix the
+new prompt shares with it, so only the tokens after that prefix are
+processed again. The PDF agent used to put the user query and the retrieved
+documents ahead of its instructions, which made every prompt differ from
+its first bytes; it now appends them after the static instructions
+(`medical_agent.prompts.append_sections`).
+
+This benchmark sends the clinician queries of the corpus in both layouts,
+each preceded by a normalization request as in the graph, and reports TTFT
+percentiles. By default it runs against `fake_ollama.py` with simulated
+prefill (`--prefill-tokens-per-second`); `--ollama-url` measures a real
+server instead. The retrieved documents are windows of the procedure PDF
+picked per query, so prompts have realistic sizes.
+
+Usage:
+    python benchmarks/ttft.py --prefill-tokens-per-second 400
+    python benchmarks/ttft.py --ollama-url http://localhost:11434 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from fake_ollama import FakeOllama
+
+ROOT = Path(__file__).resolve().parent.parent
+LAYOUTS = ("before", "after")
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000.0) if samples else 0.0
+
+
+def read_queries(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line)["query"] for line in fh if line.strip()]
+
+
+def procedure_windows(chars: int) -> List[str]:
+    """Text of the procedure PDF cut into windows of `chars` characters."""
+    from pypdf import PdfReader
+
+    text = " ".join(
+        page.extract_text() or "" for page in PdfReader(ROOT / "db" / "medic-procedures" / "BasicProcedure.pdf").pages
+    )
+    text = " ".join(text.split())
+    return [text[i : i + chars] for i in range(0, len(text), chars)]
+
+
+def documents_for(query: str, windows: List[str], k: int) -> str:
+    start = zlib.crc32(query.encode()) % len(windows)
+    return "\n\n".join(
+        f"[BasicProcedure.pdf:{(start + i) % len(windows)}] {windows[(start + i) % len(windows)]}" for i in range(k)
+    )
+
+
+def pdf_system_message(layout: str, query: str, docs: str) -> str:
+    from medical_agent.prompts import PDF_AGENT_PROMPT, append_sections
+
+    sections = (("User query", query), ("Retrieved procedure documents (most relevant first)", docs))
+    if layout == "after":
+        return append_sections(PDF_AGENT_PROMPT, *sections)
+    # The previous layout: dynamic content first, instructions last.
+    return append_sections("", *sections).lstrip() + "\n\n" + PDF_AGENT_PROMPT
+
+
+async def first_token_seconds(model, messages: List[Dict[str, str]]) -> float:
+    started, first = time.perf_counter(), None
+    # The stream is drained so the connection goes back to the pool.
+    async for chunk in model.astream(messages):
+        if chunk.content and first is None:
+            first = time.perf_counter() - started
+    return first if first is not None else time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace, server: Optional[FakeOllama]) -> Dict[str, Any]:
+    from medical_agent.context import Context
+    from medical_agent.models import model_registry
+    from medical_agent.prompts import NORMALIZATION_PROMPT
+
+    context = Context()
+    model = model_registry(context).chat_model(context.model)
+    queries = read_queries(args.queries_file)
+    windows = procedure_windows(args.doc_chars)
+
+    report: Dict[str, Any] = {"model": context.model, "queries": len(queries), "repeat": args.repeat, "layouts": {}}
+    for layout in LAYOUTS:
+        before = server.stats.snapshot() if server else None
+        samples = []
+        for _ in range(args.repeat):
+            for query in queries:
+                await first_token_seconds(
+                    model, [{"role": "system", "content": NORMALIZATION_PROMPT}, {"role": "user", "content": query}]
+                )
+                system = pdf_system_message(layout, query, documents_for(query, windows, args.docs))
+                samples.append(
+                    await first_token_seconds(
+                        model, [{"role": "system", "content": system}, {"role": "user", "content": query}]
+                    )
+                )
+        result: Dict[str, Any] = {
+            "ttft_p50_ms": percentile_ms(samples, 50),
+            "ttft_p95_ms": percentile_ms(samples, 95),
+            "ttft_mean_ms": float(np.mean(samples) * 1000.0),
+        }
+        if server:
+            after = server.stats.snapshot()
+            prompt = after["prompt_tokens"] - before["prompt_tokens"]
+            cached = after["prompt_cached_tokens"] - before["prompt_cached_tokens"]
+            result["prompt_tokens"] = prompt
+            result["prompt_cache_ratio"] = cached / prompt if prompt else 0.0
+        report["layouts"][layout] = result
+
+    before, after = report["layouts"]["before"], report["layouts"]["after"]
+    report["ttft_p50_speedup"] = before["ttft_p50_ms"] / after["ttft_p50_ms"] if after["ttft_p50_ms"] else 0.0
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries-file", default=str(Path(__file__).with_name("queries.jsonl")))
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per layout.")
+    parser.add_argument("--docs", type=int, default=4, help="Retrieved documents per prompt.")
+    parser.add_argument("--doc-chars", type=int, default=1200, help="Characters per retrieved document.")
+    parser.add_argument("--ollama-url", help="Measure this Ollama server instead of the fake one.")
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0, help="Fake fixed latency before prefill.")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=400.0, help="Fake prompt processing rate.")
+    parser.add_argument("--kv-slots", type=int, default=4, help="Fake cached prompts per model.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    if args.ollama_url:
+        os.environ["OLLAMA_HOST"] = args.ollama_url
+        report = asyncio.run(run(args, None))
+    else:
+        server = FakeOllama(
+            llm_latency_ms=args.llm_latency_ms,
+            prefill_tokens_per_second=args.prefill_tokens_per_second,
+            kv_slots=args.kv_slots,
+            answer_tokens=8,
+        )
+        with server:
+            os.environ["OLLAMA_HOST"] = server.url
+            report = asyncio.run(run(args, server))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
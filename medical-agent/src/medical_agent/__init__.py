@@ -1,3 +1,18 @@
-from medical_agent.graph import graph
+"""Medical agent: a LangGraph graph answering clinicians' questions from patient
+records and hospital procedures.
 
-__all__ = ["graph"]
\ No newline at end of file
+`graph` is compiled on first access, so importing the package is cheap and does
+not load LangGraph, the models or any backend.
+"""
+
+__all__ = ["graph"]
+
+
+def __getattr__(name: str):
+    if name == "graph":
+        from medical_agent.graph import graph
+
+        # Importing the submodule bound `graph` to the module; point it at the compiled graph as before.
+        globals()["graph"] = graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
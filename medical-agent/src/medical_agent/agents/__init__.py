@@ -1,2 +1,7 @@
-from .pdf_agent import agent as pdf_agent
-from .sql_agent import agent as sql_agent
\ No newline at end of file
+"""Sub-agents of the medical agent.
+
+The agents are built on first use by `medical_agent.registry`, so importing
+this package does not connect to any backend:
+
+    registry.get("sql_agent"), registry.get("pdf_agent"), registry.get("supervisor_agent")
+"""
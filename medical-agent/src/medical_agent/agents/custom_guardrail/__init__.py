@@ -1 +1,4 @@
-from .custom_guardrail import DatabaseWriteOperationGuardrail
\ No newline at end of file
+from .custom_guardrail import DatabaseWriteOperationGuardrail
+from .partition_pruning import PartitionPruningMiddleware
+from .phi_redaction import PHIRedactionMiddleware
+from .rules import GuardrailEngine, GuardrailRule, guardrail_engine
\ No newline at end of file
@@ -1,90 +1,88 @@
-from typing import Any
-
-from langchain.agents.middleware import AgentMiddleware, hook_config
-from langchain.agents.middleware.types import StateT
-from langgraph.runtime import Runtime
-
-from typing import Any
-import re
 import logging
+from typing import Any, Awaitable, Callable, Optional
 
 from langchain.agents.middleware import AgentMiddleware, hook_config
-from langchain.agents.middleware.types import StateT
+from langchain.agents.middleware.types import StateT, ToolCallRequest
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+
+from medical_agent.agents.custom_guardrail.rules import (
+    GuardrailEngine,
+    SeenMessages,
+    guardrail_engine,
+    message_role,
+    message_text,
+)
+from medical_agent.sql_parsing import write_operations, write_statement_prefix
 
 logger = logging.getLogger(__name__)
 
+BLOCKED_MESSAGE = (
+    "Database write operations are not permitted. "
+    "If you need data modified, please rephrase to request a read-only query "
+    "or escalate to a human operator who can perform database changes."
+)
+
 
 class DatabaseWriteOperationGuardrail(AgentMiddleware):
     """
     A guardrail that prevents write operations to the database.
 
     Behavior:
-    - Scans incoming human/user messages for SQL write operation keywords.
-    - Uses word-boundary regex checks to reduce accidental matches.
-    - Returns an assistant message and jumps to "end" when a write intent is detected.
+    - Checks each human/user message once (tracked by message ID), so the cost
+      per turn depends on the new messages, not on the conversation length.
+    - Finds candidate write verbs with the shared rule automaton and only blocks
+      when the text around them is shaped like a write statement ("UPDATE patients
+      SET ...", "delete the exams from ..."), not on prose like "update me on".
+      Returns an assistant message and jumps to "end" in that case.
+    - Parses the SQL of every `sql_db_query` call and refuses to run anything
+      that is not read-only, returning an error to the model instead.
     """
 
-    def __init__(self):
+    def __init__(self, engine: Optional[GuardrailEngine] = None):
         super().__init__()
-        self.write_operations = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "TRUNCATE"]
-        pattern = r"\b(" + "|".join(self.write_operations) + r")\b"
-        self._write_regex = re.compile(pattern, flags=re.IGNORECASE)
+        self.engine = engine or guardrail_engine()
+        self.seen = SeenMessages()
 
     @hook_config(can_jump_to=["end"])
     def before_agent(self, state: StateT) -> dict[str, Any] | None:
-        """Inspect messages and block any that appear to request DB write operations.
-
-        The middleware is defensive about message shapes: it accepts message objects
-        that expose `.type`, `.role`, `.content`, or `.text`. Only messages that are
-        human/user-initiated are inspected.
-        """
-        try:
-            messages = state.get("messages") or []
-        except Exception:
-            logger.debug("State has no messages or is malformed")
-            return None
-
-        for msg in messages:
-            # Determine if this is a human/user message. Accept multiple shapes.
-            msg_type = getattr(msg, "type", None) or getattr(msg, "role", None) or None
-            if msg_type and str(msg_type).lower() not in ("human", "user"):
+        """Block new human messages that ask for a DB write operation."""
+        messages = (state.get("messages") or []) if isinstance(state, dict) else getattr(state, "messages", [])
+        for message in self.seen.unseen(messages):
+            if message_role(message) not in ("human", "user"):
                 continue
-
-            # Extract text content from common attributes
-            content = None
-            for attr in ("content", "text", "message", "body"):
-                content = getattr(msg, attr, None)
-                if content:
-                    break
-
-            if not content:
-                # If msg is a plain dict-like mapping
-                try:
-                    content = msg.get("content") or msg.get("text")
-                except Exception:
-                    content = None
-
-            if not content:
-                continue
-
-            # Run the regex to detect write operation keywords
-            try:
-                if self._write_regex.search(str(content)):
-                    logger.info("Blocked potential DB write operation detected in user message")
-                    return {
-                        "messages": [
-                            {
-                                "role": "assistant",
-                                "content": (
-                                    "Database write operations are not permitted. "
-                                    "If you need data modified, please rephrase to request a read-only query "
-                                    "or escalate to a human operator who can perform database changes."
-                                ),
-                            }
-                        ],
-                        "jump_to": "end",
-                    }
-            except Exception:
-                logger.exception("Error while scanning message content for write operations")
-
-        return None
\ No newline at end of file
+            operation = self.write_intent(message_text(message))
+            if operation:
+                logger.info("Blocked a %s request in a user message", operation)
+                return {
+                    "messages": [{"role": "assistant", "content": BLOCKED_MESSAGE}],
+                    "jump_to": "end",
+                }
+        return None
+
+    def write_intent(self, text: str) -> Optional[str]:
+        """Return the write operation `text` asks for, if any."""
+        for match in self.engine.scan(text, rules=("write_intent",)):
+            operation = write_statement_prefix(text[match.start :])
+            if operation:
+                return operation
+        return None
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        tool_call = request.tool_call
+        if tool_call["name"] != "sql_db_query":
+            return await handler(request)
+        operations = write_operations(str(tool_call["args"].get("query") or ""))
+        if not operations:
+            return await handler(request)
+        logger.warning("Refused to run a generated %s statement", "/".join(operations))
+        return ToolMessage(
+            content=f"Error: only read-only queries are allowed; the query contains {', '.join(operations)}.",
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            status="error",
+        )
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain.agents.middleware.types import ToolCallRequest
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+
+from medical_agent.context import Context
+from medical_agent.database import database_pool
+from medical_agent.schema_catalog import SchemaCatalog
+from medical_agent.sql_parsing import parse_select
+
+logger = logging.getLogger(__name__)
+
+_YEAR = r"(19[5-9]\d|20\d{2})"
+# A bare 4-digit number is as likely a patient ID, dose or room as a year, so a
+# year only counts after a date preposition or inside a date, and never before a unit.
+_YEAR_RE = re.compile(
+    rf"(?:\b(?:em|no ano de|in|de|of|during|durante|entre|between|and|e|to|a|at[eé]|until|ano|year)\s+{_YEAR}"
+    rf"|\b\d{{1,2}}[/.-]\d{{1,2}}[/.-]{_YEAR}|\b{_YEAR}-\d{{2}}(?:-\d{{2}})?)\b"
+    r"(?!\s*(?:mg|mcg|g|kg|ml|l|ui|units?|unidades?|mmhg)\b|\s*%)",
+    re.IGNORECASE,
+)
+_SINCE_RE = re.compile(r"\b(?:desde|since|ap[oó]s|after|a partir de)\s+(?:o ano de\s+)?(19[5-9]\d|20\d{2})\b", re.IGNORECASE)
+_LAST_RE = re.compile(
+    r"\b(?:[uú]ltim[oa]s?|last|past)\s+(\d+)\s+(anos?|years?|m[eê]s(?:es)?|months?|semanas?|weeks?|dias?|days?)\b",
+    re.IGNORECASE,
+)
+_LAST_YEAR_RE = re.compile(r"\b(?:ano passado|last year)\b", re.IGNORECASE)
+_RECENT_RE = re.compile(
+    r"\b(?:recentes?|recentemente|recent|recently|latest|newest|mais novos?|[uú]ltim[oa]s?|atua(?:l|is)|current(?:ly)?)\b",
+    re.IGNORECASE,
+)
+_PARTITION_COLUMN_RE = re.compile(r"^\s*(?:year|to_days|to_seconds|unix_timestamp)\s*\(\s*(\w+)\s*\)\s*$", re.IGNORECASE)
+
+_UNIT_DAYS = {"ano": 365, "year": 365, "mes": 30, "mês": 30, "month": 30, "semana": 7, "week": 7, "dia": 1, "day": 1}
+
+
+@dataclass
+class DateWindow:
+    """Date bounds for partitioned tables; `end` is exclusive and optional."""
+
+    start: date
+    end: Optional[date] = None
+    explicit: bool = False
+    """True when the bounds come from the question rather than the default lookback."""
+
+    def describe(self) -> str:
+        bounds = f"from {self.start.isoformat()}" + (f" to before {self.end.isoformat()}" if self.end else "")
+        return bounds if self.explicit else f"{bounds} (default lookback for recent records)"
+
+
+def date_window_from_text(text: str, today: date, default_lookback_days: int) -> Optional[DateWindow]:
+    """Derive date bounds from a question, or None when it asks for no period.
+
+    Understands explicit years ("em 2023", "between 2022 and 2024"), "since
+    2022", "last 6 months" / "últimos 2 anos" and "last year" / "ano passado".
+    Questions that only ask for recent data ("exames recentes", "latest
+    results") get `default_lookback_days`.
+    """
+    if match := _SINCE_RE.search(text):
+        return DateWindow(date(int(match.group(1)), 1, 1), explicit=True)
+    if match := _LAST_RE.search(text):
+        amount = int(match.group(1))
+        unit = match.group(2).lower().rstrip("s")
+        unit = "mes" if unit.startswith(("mes", "mê")) else unit
+        return DateWindow(today - timedelta(days=amount * _UNIT_DAYS.get(unit, 1)), explicit=True)
+    if _LAST_YEAR_RE.search(text):
+        return DateWindow(date(today.year - 1, 1, 1), date(today.year, 1, 1), explicit=True)
+    years = [int(next(group for group in match.groups() if group)) for match in _YEAR_RE.finditer(text)]
+    if years:
+        return DateWindow(date(min(years), 1, 1), date(max(years) + 1, 1, 1), explicit=True)
+    if _RECENT_RE.search(text):
+        return DateWindow(today - timedelta(days=default_lookback_days))
+    return None
+
+
+@dataclass
+class ExplainSummary:
+    """Partitions read and rows the optimizer expects to examine, from EXPLAIN."""
+
+    partitions: Dict[str, Set[str]]
+    """Partitions read per table, keyed by the lowercased alias EXPLAIN reports the table under."""
+    rows: int
+
+    def partition_count(self, aliases: Iterable[str]) -> int:
+        """Partitions read for the tables referenced as `aliases`."""
+        return sum(len(self.partitions.get(alias.lower(), ())) for alias in set(aliases))
+
+
+@dataclass
+class PruningStats:
+    queries_seen: int = 0
+    queries_rewritten: int = 0
+    fallbacks: int = 0
+    partitions_total: int = 0
+    partitions_read: int = 0
+    rows_before: int = 0
+    rows_after: int = 0
+
+
+class PartitionPruningMiddleware(AgentMiddleware):
+    """
+    Add date bounds to SQL generated for the year-partitioned tables.
+
+    Behavior:
+    - Intercepts `sql_db_query` tool calls and parses the generated SELECT.
+    - For every partitioned table read in FROM or an inner join with no predicate
+      on its partition column, adds a range predicate on that column. Bounds come
+      from the question ("em 2023", "últimos 6 meses"); the default lookback is
+      only used when the question asks for recent data. Questions naming no
+      period, and aggregate queries (COUNT, MIN, GROUP BY, ...), run unchanged.
+    - Runs EXPLAIN on the original and the bounded query, records the rows each
+      is expected to examine, and keeps the bounded one only when the tables it
+      bounded read fewer partitions than they have.
+    - Appends the window that was added to the tool output, so the model knows
+      the rows are limited to it.
+    - When a default-lookback rewrite returns no rows, re-runs the original query,
+      so older partitions and the `old_health_reports` archive are only read when
+      the recent ones have nothing.
+    """
+
+    def __init__(self, catalog: SchemaCatalog, context: Optional[Context] = None, today: Callable[[], date] = date.today):
+        super().__init__()
+        self.catalog = catalog
+        self.context = context or Context()
+        self.today = today
+        self.stats = PruningStats()
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        tool_call = request.tool_call
+        if not self.context.partition_pruning_enabled or tool_call["name"] != "sql_db_query":
+            return await handler(request)
+        query = tool_call["args"].get("query")
+        if not query:
+            return await handler(request)
+
+        self.stats.queries_seen += 1
+        try:
+            rewrite = await self.rewrite(query, self._question(request.state))
+        except Exception:
+            logger.exception("Partition pruning failed; running the query unchanged")
+            rewrite = None
+        if rewrite is None:
+            return await handler(request)
+
+        rewritten, window = rewrite
+        response = await handler(request.override(tool_call={**tool_call, "args": {**tool_call["args"], "query": rewritten}}))
+        if not window.explicit and isinstance(response, ToolMessage) and not str(response.content).strip():
+            self.stats.fallbacks += 1
+            logger.info("No rows within the default lookback; re-running the query over all partitions")
+            return await handler(request)
+        if isinstance(response, ToolMessage):
+            note = f"[Rows limited to dates {window.describe()}; ask for another period to see other records.]"
+            response = response.model_copy(update={"content": f"{response.content}\n\n{note}"})
+        return response
+
+    async def rewrite(self, query: str, question: str) -> Optional[tuple[str, DateWindow]]:
+        """Return the bounded query and its window, or None when it should run unchanged."""
+        parsed = parse_select(query)
+        # A window would silently change what COUNT(*), "first visit" or GROUP BY answers.
+        if parsed is None or parsed.aggregate:
+            return None
+        window = date_window_from_text(question, self.today(), self.context.partition_default_lookback_days)
+        if window is None:
+            return None
+        catalog = await self.catalog.ensure_fresh()
+
+        conditions = []
+        aliases = []
+        partitions = 0
+        for table in parsed.tables:
+            if table.join not in ("from", "inner"):
+                # A WHERE predicate on an outer-joined table would turn it into an inner join.
+                continue
+            info = catalog.tables.get(table.name)
+            column = self._partition_column(info)
+            if column is None:
+                continue
+            alias = table.alias.lower()
+            if {(alias, column.lower()), ("", column.lower())} & parsed.where_columns:
+                continue
+            partitions += len(info.partitions)
+            aliases.append(table.alias)
+            conditions.append(f"`{table.alias}`.`{column}` >= '{window.start.isoformat()}'")
+            if window.end is not None:
+                conditions.append(f"`{table.alias}`.`{column}` < '{window.end.isoformat()}'")
+        if not conditions:
+            return None
+
+        rewritten = parsed.with_conditions(conditions)
+        if self.context.partition_pruning_explain:
+            before, after = await asyncio.gather(self.explain(query), self.explain(rewritten))
+            # Only the bounded tables count: other partitioned tables (outer-joined or
+            # already filtered) read the same partitions either way.
+            read = after.partition_count(aliases)
+            self.stats.partitions_total += partitions
+            self.stats.partitions_read += read
+            self.stats.rows_before += before.rows
+            self.stats.rows_after += after.rows
+            logger.info(
+                "Partition pruning: %d -> %d partitions, estimated rows examined %d -> %d",
+                partitions,
+                read,
+                before.rows,
+                after.rows,
+            )
+            if read >= partitions:
+                return None
+        self.stats.queries_rewritten += 1
+        return rewritten, window
+
+    async def explain(self, query: str) -> ExplainSummary:
+        columns, rows = await database_pool(self.context).fetch_raw(f"EXPLAIN {query}")
+        records = [dict(zip(columns, row)) for row in rows]
+        partitions: Dict[str, Set[str]] = {}
+        for record in records:
+            if record.get("partitions"):
+                partitions.setdefault(str(record.get("table")).lower(), set()).update(str(record["partitions"]).split(","))
+        return ExplainSummary(partitions, sum(int(record.get("rows") or 0) for record in records))
+
+    @staticmethod
+    def _partition_column(info) -> Optional[str]:
+        if info is None or info.partition_method != "RANGE":
+            return None
+        match = _PARTITION_COLUMN_RE.match(info.partition_expression)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _question(state: Any) -> str:
+        messages = state.get("messages", []) if isinstance(state, dict) else getattr(state, "messages", [])
+        for message in reversed(messages):
+            if getattr(message, "type", None) == "human":
+                return str(message.content)
+        return ""
@@ -0,0 +1,73 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+
+from medical_agent.agents.custom_guardrail.rules import GuardrailEngine, guardrail_engine
+from medical_agent.context import Context
+from medical_agent.patient_queries import patient_names
+
+logger = logging.getLogger(__name__)
+
+
+class PHIRedactionMiddleware(AgentMiddleware):
+    """
+    Redact patient names from the prompts of agents that do not need them.
+
+    Behavior:
+    - Loads the registered patient names into the `phi` rule of the shared rule
+      automaton, reloading them at most every `phi_names_refresh_seconds`; the
+      automaton is only recompiled when the names changed.
+    - Before each model call, replaces patient names in the system prompt and in
+      the messages with `[PATIENT]`, in one pass per text.
+    """
+
+    def __init__(self, engine: Optional[GuardrailEngine] = None, context: Optional[Context] = None):
+        super().__init__()
+        self.engine = engine or guardrail_engine()
+        self.context = context or Context()
+        self._loaded_at = float("-inf")
+
+    async def refresh(self) -> None:
+        """Reload the patient names if the refresh interval has passed."""
+        now = time.monotonic()
+        if now - self._loaded_at < self.context.phi_names_refresh_seconds:
+            return
+        # Set before awaiting so concurrent calls do not all reload.
+        self._loaded_at = now
+        self.engine.set_patterns("phi", await patient_names(self.context))
+
+    def redact_request(self, request: ModelRequest) -> ModelRequest:
+        if not self.engine.rules["phi"].patterns:
+            return request
+        messages = []
+        for message in request.messages:
+            if isinstance(message.content, str):
+                redacted = self.engine.redact(message.content, rules=("phi",))
+                if redacted != message.content:
+                    message = message.model_copy(update={"content": redacted})
+            messages.append(message)
+        overrides: dict[str, Any] = {"messages": messages}
+        if request.system_prompt:
+            overrides["system_prompt"] = self.engine.redact(request.system_prompt, rules=("phi",))
+        return request.override(**overrides)
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        # Names can only be loaded asynchronously; synchronous runs use the last loaded set.
+        if not self.context.phi_redaction_enabled:
+            return handler(request)
+        return handler(self.redact_request(request))
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        if not self.context.phi_redaction_enabled:
+            return await handler(request)
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Could not load patient names for PHI redaction")
+        return await handler(self.redact_request(request))
@@ -0,0 +1,253 @@
+"""Guardrail rules compiled into a single Aho-Corasick automaton.
+
+Each rule is a set of literal patterns with an action (block or redact). The
+patterns of every rule are compiled together, so one pass over a text finds
+the matches of all rules, in time linear in the text whatever the number of
+patterns. The middlewares share the engine returned by `guardrail_engine()`.
+
+Matching ignores case and accents ("Joao" matches "João") and, by default,
+only accepts matches on word boundaries.
+"""
+
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(char: str) -> str:
+    folded = unicodedata.normalize("NFKD", char)[0].lower()
+    return folded if len(folded) == 1 else char
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents without changing the length, so offsets map back to `text`."""
+    return "".join(_fold_char(char) for char in text)
+
+
+class AhoCorasick:
+    """Multi-pattern literal matcher.
+
+    Args:
+        patterns (Iterable[str]): Patterns, already folded; indexes into this sequence identify matches.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if pattern:
+                self._add(pattern, index)
+        self._link()
+
+    def _add(self, pattern: str, index: int) -> None:
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = following
+        self._output[state].append(index)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                self._output[following] = self._output[following] + self._output[self._fail[following]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield `(start, end, pattern index)` for every occurrence, overlapping ones included."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1 - len(self.patterns[index]), position + 1, index
+
+
+@dataclass(frozen=True)
+class GuardrailRule:
+    name: str
+    patterns: Tuple[str, ...]
+    action: str = "block"
+    """`block` rules are reported by `scan`; `redact` rules are also replaced by `redact`."""
+    replacement: str = "[REDACTED]"
+    whole_words: bool = True
+
+
+@dataclass
+class RuleMatch:
+    rule: str
+    start: int
+    end: int
+    text: str
+
+
+class GuardrailEngine:
+    """Match the patterns of every rule in one pass over the text.
+
+    Args:
+        rules (Sequence[GuardrailRule]): Rules to compile; names must be unique.
+    """
+
+    def __init__(self, rules: Sequence[GuardrailRule]):
+        self._lock = threading.Lock()
+        self._compile({rule.name: rule for rule in rules})
+
+    def _compile(self, rules: Dict[str, GuardrailRule]) -> None:
+        owners: List[str] = []
+        patterns: List[str] = []
+        for rule in rules.values():
+            for pattern in rule.patterns:
+                folded = fold(pattern.strip())
+                if folded:
+                    owners.append(rule.name)
+                    patterns.append(folded)
+        # Swap both at once so concurrent scans see a consistent pair.
+        self._state = (rules, owners, AhoCorasick(patterns))
+
+    @property
+    def rules(self) -> Dict[str, GuardrailRule]:
+        return self._state[0]
+
+    def set_patterns(self, name: str, patterns: Iterable[str]) -> bool:
+        """Replace the patterns of rule `name` and recompile; returns False if they did not change."""
+        with self._lock:
+            rules = dict(self._state[0])
+            patterns = tuple(sorted(set(patterns)))
+            if rules[name].patterns == patterns:
+                return False
+            rules[name] = replace(rules[name], patterns=patterns)
+            self._compile(rules)
+        logger.info("Recompiled guardrail rules: %d patterns for %s", len(patterns), name)
+        return True
+
+    def scan(self, text: str, rules: Optional[Collection[str]] = None) -> List[RuleMatch]:
+        """Return the matches in `text`, optionally limited to the named rules, in text order."""
+        compiled_rules, owners, automaton = self._state
+        matches = []
+        for start, end, index in automaton.iter_matches(fold(text)):
+            name = owners[index]
+            if rules is not None and name not in rules:
+                continue
+            if compiled_rules[name].whole_words and not _on_word_boundaries(text, start, end):
+                continue
+            matches.append(RuleMatch(name, start, end, text[start:end]))
+        return matches
+
+    def redact(self, text: str, rules: Optional[Collection[str]] = None) -> str:
+        """Replace matches of `redact` rules, preferring the leftmost, then the longest match."""
+        compiled_rules = self._state[0]
+        matches = [
+            match
+            for match in self.scan(text, rules)
+            if compiled_rules[match.rule].action == "redact"
+        ]
+        if not matches:
+            return text
+        matches.sort(key=lambda match: (match.start, -match.end))
+        parts, position = [], 0
+        for match in matches:
+            if match.start < position:
+                continue
+            parts += [text[position : match.start], compiled_rules[match.rule].replacement]
+            position = match.end
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+def _on_word_boundaries(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+WRITE_INTENT_RULE = GuardrailRule(
+    "write_intent",
+    ("insert", "replace", "update", "delete", "drop", "create", "alter", "rename", "truncate", "grant", "revoke"),
+)
+"""Candidate SQL write verbs in prose; `DatabaseWriteOperationGuardrail` confirms the statement shape."""
+
+PHI_RULE = GuardrailRule("phi", (), action="redact", replacement="[PATIENT]")
+"""Patient names, filled from the database by `PHIRedactionMiddleware`."""
+
+DEFAULT_RULES = (WRITE_INTENT_RULE, PHI_RULE)
+
+_engine: Optional[GuardrailEngine] = None
+
+
+def guardrail_engine() -> GuardrailEngine:
+    """Return the engine shared by all guardrail middlewares, compiling the default rules on first use."""
+    global _engine
+    if _engine is None:
+        _engine = GuardrailEngine(DEFAULT_RULES)
+    return _engine
+
+
+def message_role(message: Any) -> str:
+    """Return the lowercase role/type of a message object or dict."""
+    role = getattr(message, "type", None) or getattr(message, "role", None)
+    if role is None and isinstance(message, dict):
+        role = message.get("type") or message.get("role")
+    return str(role or "").lower()
+
+
+def message_text(message: Any) -> str:
+    """Return the text of a message object or dict."""
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+    if isinstance(content, list):
+        content = "".join(part if isinstance(part, str) else str(part.get("text") or "") for part in content)
+    return str(content or "")
+
+
+class SeenMessages:
+    """Bounded record of the messages a middleware has already inspected.
+
+    Messages are keyed by the ID `add_messages` assigns them, so every message
+    is checked once however long the conversation grows. Messages without an
+    ID are always returned.
+
+    Args:
+        max_size (int): Number of IDs remembered; the oldest are forgotten first.
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def unseen(self, messages: Iterable[Any]) -> List[Any]:
+        """Return the messages not seen before and mark them as seen."""
+        fresh = []
+        with self._lock:
+            for message in messages:
+                message_id = message.get("id") if isinstance(message, dict) else getattr(message, "id", None)
+                if message_id is None:
+                    fresh.append(message)
+                    continue
+                if message_id in self._ids:
+                    continue
+                self._ids[message_id] = None
+                fresh.append(message)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+        return fresh
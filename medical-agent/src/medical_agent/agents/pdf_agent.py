@@ -1,21 +1,69 @@
+import asyncio
 import logging
+from contextvars import ContextVar
+from typing import Awaitable, Callable, List, Optional, Tuple
 
 from langchain.agents import create_agent
-from vector_stores import vector_store
-from langchain_ollama import ChatOllama
-from langchain.agents.middleware import dynamic_prompt, ModelRequest
+from langchain_core.documents import Document
+from medical_agent.agents.custom_guardrail import PHIRedactionMiddleware
+from medical_agent.context import Context
+from medical_agent.context_assembly import AssembledContext, assemble_context
+from medical_agent.prompts import PDF_AGENT_PROMPT, append_sections
+from medical_agent.registry import registry
+from medical_agent.retrievers import with_surrounding_chunks
+from medical_agent.streaming import PROCEDURE_SEARCH, astream_agent, emit
+from medical_agent.vector_stores import neighbour_store
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-__model = ChatOllama(model="gpt-oss:20b")
+# Used by the legacy module attributes and by callers that pass no context.
+_default_context = Context()
 
-retriever = vector_store.as_retriever(search_kwargs={"k": 3})
+# Collects the sources cited by the current run so callers can cache them with the answer.
+_retrieved_sources: ContextVar[Optional[List[str]]] = ContextVar("retrieved_sources", default=None)
 
 
-@dynamic_prompt
-def prompt_with_context(request: ModelRequest) -> str:
+def _neighbours_and_assembly(
+    query: str, retrieved_docs: List[Document], vector_store, context: Context
+) -> AssembledContext:
+    logger.info("Retrieved %d document(s) from vector store", len(retrieved_docs))
+    if context.context_neighbour_span > 0:
+        # The steps around each hit, from the reading order precomputed at ingestion.
+        retrieved_docs = with_surrounding_chunks(
+            retrieved_docs, vector_store, neighbour_store(context.cache_dir), context.context_neighbour_span
+        )
+    # Merge neighbouring chunks, drop near-duplicates, rerank and fit the token budget.
+    return assemble_context(query, retrieved_docs, context)
+
+
+def _system_message(query: str, assembled: AssembledContext) -> str:
+    docs_content = "\n".join(
+        f"---\nSource: {passage.source} | Page: {passage.page}\n---\n{passage.text}\n" for passage in assembled.passages
+    )
+
+    # Log the list of cited sources (non-sensitive metadata only)
+    sources = assembled.sources
+    logger.info("Retrieval sources: %s", ", ".join(sources) if sources else "none")
+    sink = _retrieved_sources.get()
+    if sink is not None:
+        sink.extend(sources)
+    # Citations reach a streaming client before the model starts answering.
+    emit("citations", PROCEDURE_SEARCH, sources=sources)
+
+    # Static instructions first so Ollama reuses their KV cache across requests.
+    system_message = append_sections(
+        PDF_AGENT_PROMPT,
+        ("User query", query),
+        ("Retrieved procedure documents (most relevant first)", docs_content),
+    )
+    logger.debug("Built system message (chars): %d", len(system_message))
+    return system_message
+
+
+class ProcedureContextMiddleware(AgentMiddleware):
     """Inject retrieval results and a stronger system prompt into state messages.
 
     This middleware will (1) retrieve the most relevant hospital procedures for the
@@ -23,59 +71,122 @@ def prompt_with_context(request: ModelRequest) -> str:
     (3) include explicit guardrails: require citation of sources, avoid
     autonomous prescribing, and present any recommendation as requiring human
     validation.
+
+    The async path awaits the retriever and runs neighbour loading and context
+    assembly in a worker thread, so the parallel patient/procedure branches do
+    not block each other on the event loop.
+
+    Settings come from the run's context (`context=` of `invoke`/`astream`),
+    or from the context the agent was built with when the run has none.
+
+    Args:
+        context (Optional[Context]): Settings used when the run carries no context.
     """
-    last_query = request.state["messages"][-1].text
-    logger.info("Received user query for PDF retrieval: %s", last_query)
 
-    try:
-        logger.info("Attempting retrieval using retriever.get_relevant_documents")
-        retrieved_docs = retriever.get_relevant_documents(last_query)
-    except Exception:
-        logger.exception("Retriever.get_relevant_documents() failed, falling back to vector_store.similarity_search()")
-        retrieved_docs = vector_store.similarity_search(last_query)
+    def __init__(self, context: Optional[Context] = None):
+        super().__init__()
+        self.context = context or Context()
+
+    def _context(self, request: ModelRequest) -> Context:
+        runtime_context = getattr(request.runtime, "context", None)
+        return runtime_context if isinstance(runtime_context, Context) else self.context
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        query = request.state["messages"][-1].text
+        logger.info("Received user query for PDF retrieval: %s", query)
+        context = self._context(request)
+        # Hybrid BM25 + vector retrieval unless `Context.retriever_mode` says otherwise.
+        # Query embeddings go through the shared cached embedder, so repeated queries skip Ollama,
+        # and rephrasings of a recent query are served from the retrieval cache.
+        retriever = registry.get("procedure_retriever", context)
+        vector_store = registry.get("procedure_vector_store", context)
+        try:
+            retrieved_docs = retriever.invoke(query)
+        except Exception:
+            logger.exception("Retriever.invoke() failed, falling back to vector_store.similarity_search()")
+            retrieved_docs = vector_store.similarity_search(query)
+        assembled = _neighbours_and_assembly(query, retrieved_docs, vector_store, context)
+        return handler(request.override(system_prompt=_system_message(query, assembled)))
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        query = request.state["messages"][-1].text
+        logger.info("Received user query for PDF retrieval: %s", query)
+        context = self._context(request)
+        retriever = registry.get("procedure_retriever", context)
+        vector_store = registry.get("procedure_vector_store", context)
+        try:
+            retrieved_docs = await retriever.ainvoke(query)
+        except Exception:
+            logger.exception("Retriever.ainvoke() failed, falling back to vector_store.asimilarity_search()")
+            retrieved_docs = await vector_store.asimilarity_search(query)
+        assembled = await asyncio.to_thread(_neighbours_and_assembly, query, retrieved_docs, vector_store, context)
+        return await handler(request.override(system_prompt=_system_message(query, assembled)))
+
+
+def build_pdf_agent(context: Context):
+    """Build the PDF agent; called by the component registry on first use."""
+    # Procedure answers do not depend on who the patient is, so names are redacted
+    # from the prompt once it has been built.
+    return create_agent(
+        registry.get("chat_model", context),
+        tools=[],
+        middleware=[ProcedureContextMiddleware(context), PHIRedactionMiddleware(context=context)],
+    )
 
-    logger.info("Retrieved %d document(s) from vector store", len(retrieved_docs))
 
-    def fmt_doc(doc):
-        meta = doc.metadata or {}
-        source = meta.get("source") or meta.get("filename") or meta.get("title") or meta.get("file_name") or meta.get("document_id") or "unknown-source"
-        page = meta.get("page") or meta.get("page_number") or "unknown-page"
-        header = f"---\nSource: {source} | Page: {page}\n---"
-        return f"{header}\n{doc.page_content}\n"
+def __getattr__(name: str):
+    # `vector_store`, `retriever` and `agent` used to be built at import time.
+    if name == "agent":
+        return registry.get("pdf_agent", _default_context)
+    if name == "vector_store":
+        return registry.get("procedure_vector_store", _default_context)
+    if name == "retriever":
+        return registry.get("procedure_retriever", _default_context)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    docs_content = "\n".join(fmt_doc(doc) for doc in retrieved_docs)
 
-    # Log the list of retrieved sources (non-sensitive metadata only)
-    try:
-        sources = [
-            f"{(doc.metadata or {}).get('source') or (doc.metadata or {}).get('filename') or 'unknown-source'}:"
-            f"{(doc.metadata or {}).get('page') or (doc.metadata or {}).get('page_number') or 'unknown-page'}"
-            for doc in retrieved_docs
-        ]
-        logger.info("Retrieval sources: %s", ", ".join(sources) if sources else "none")
-    except Exception:
-        logger.debug("Failed to build sources list for logging")
-
-    system_message = (
-        "You are a clinical assistant specialized in hospital procedures. Follow these steps before answering:\n"
-        "1) Carefully read the user query (shown below).\n"
-        "2) From the retrieved procedure documents provided, identify the most relevant hospital procedure(s) that address the query.\n"
-        "3) For each matching procedure, give a one-line rationale for relevance and cite the source using the document filename and page number.\n"
-        "4) Provide a concise, protocol-aligned recommendation phrased as guidance for a clinician (NOT as a final prescription or order). Always require human validation for any treatment or medication recommendation.\n"
-        "5) If patient-specific structured data is available in the conversation state, call it out and explain how it affected the recommendation.\n"
-        "6) If no relevant procedure is found, explicitly state that and suggest safe next steps (e.g., consult specialist, obtain missing data).\n"
-        "7) Include a short 'Confidence' statement and a 'Sources' section listing the document filenames and page numbers used.\n\n"
-        "IMPORTANT: Do not hallucinate procedures or sources. Use only the text and metadata from the retrieved documents. If uncertain, say so and do not invent treatments.\n\n"
-        "User query:\n" + last_query + "\n\n"
-        "Retrieved procedure documents (most relevant first):\n\n" + docs_content
-    )
+def answer_with_sources(query: str, context: Optional[Context] = None) -> Tuple[str, List[str]]:
+    """Run the PDF agent for `query` and return its answer with the retrieved sources.
 
+    Args:
+        query (str): Condition or procedure name to search for.
+        context (Optional[Context]): Settings of the calling run; the module defaults if omitted.
+
+    Returns:
+        Tuple[str, List[str]]: The agent's answer and the `source:page` citations retrieved for it.
+    """
+    context = context or _default_context
+    sources: List[str] = []
+    token = _retrieved_sources.set(sources)
     try:
-        logger.debug("Built system message (chars): %d", len(system_message))
-    except Exception:
-        logger.debug("Could not compute system_message length")
+        result = registry.get("pdf_agent", context).invoke(
+            {"messages": [{"role": "user", "content": query}]}, context=context
+        )
+    finally:
+        _retrieved_sources.reset(token)
+    return result["messages"][-1].text, list(dict.fromkeys(sources))
 
-    return system_message
 
+async def aanswer_with_sources(query: str, context: Optional[Context] = None) -> Tuple[str, List[str]]:
+    """Async variant of `answer_with_sources`.
 
-agent = create_agent(__model, tools=[], middleware=[prompt_with_context])
\ No newline at end of file
+    The agent is streamed: its citations and answer tokens are forwarded to the
+    caller's LangGraph stream as they are produced (see `medical_agent.streaming`).
+    """
+    context = context or _default_context
+    sources: List[str] = []
+    token = _retrieved_sources.set(sources)
+    try:
+        result = await astream_agent(
+            registry.get("pdf_agent", context),
+            {"messages": [{"role": "user", "content": query}]},
+            PROCEDURE_SEARCH,
+            context=context,
+        )
+    finally:
+        _retrieved_sources.reset(token)
+    return result["messages"][-1].text, list(dict.fromkeys(sources))
\ No newline at end of file
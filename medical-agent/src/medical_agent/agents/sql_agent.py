@@ -1,41 +1,46 @@
 import logging
-import os
 
 from langchain.agents import create_agent
-from langchain_classic import hub
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_community.utilities import SQLDatabase
-from langchain_ollama import ChatOllama
 
-from agents.custom_guardrail import DatabaseWriteOperationGuardrail
+from medical_agent.context import Context
+from medical_agent.prompts import SQL_AGENT_SYSTEM_PROMPT
+from medical_agent.registry import registry
+from medical_agent.schema_catalog import SchemaPromptMiddleware, schema_catalog
+from medical_agent.agents.custom_guardrail import DatabaseWriteOperationGuardrail, PartitionPruningMiddleware
 
-DB_HOST = os.environ.get('DB_HOST', 'localhost')
-DB_USER = os.environ.get('DB_USER', 'root')
-DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
-DB_NAME = os.environ.get('DB_NAME', 'test_db')
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-
-logging.info("Initializing Ollama LLM...")
-llm = ChatOllama(model="gpt-oss:20b")
-logging.info("Ollama LLM initialized.")
-
-logging.info("Setting up database connection...")
-db = SQLDatabase.from_uri(
-    database_uri=f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}",
-)
-logging.info("Database connection established.")
-toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-
-prompt_template = hub.pull("langchain-ai/sql-agent-system-prompt")
-system_message = prompt_template.format(dialect="MySQL", top_k=5)
-
-agent = create_agent(
-    model=llm,
-    tools=toolkit.get_tools(),
-    system_prompt=system_message,
-    middleware=[
-        DatabaseWriteOperationGuardrail()
-    ]
-)
\ No newline at end of file
+system_message = SQL_AGENT_SYSTEM_PROMPT.format(dialect="MySQL", top_k=5)
+
+# Used by the legacy module attributes; agents run from the graph get their context from the caller.
+_default_context = Context()
+
+
+def build_sql_agent(context: Context):
+    """Build the SQL agent; called by the component registry on first use.
+
+    The tools share the async connection pool with the patient lookup fast
+    path; connections are opened on first query.
+    """
+    return create_agent(
+        model=registry.get("sql_model", context),
+        tools=registry.get("sql_tools", context),
+        system_prompt=system_message,
+        middleware=[
+            DatabaseWriteOperationGuardrail(),
+            SchemaPromptMiddleware(schema_catalog(context)),
+            PartitionPruningMiddleware(schema_catalog(context), context),
+        ]
+    )
+
+
+def __getattr__(name: str):
+    # `llm`, `tools` and `agent` used to be built at import time.
+    if name == "agent":
+        return registry.get("sql_agent", _default_context)
+    if name == "llm":
+        return registry.get("sql_model", _default_context)
+    if name == "tools":
+        return registry.get("sql_tools", _default_context)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,92 @@
-from langchain_ollama import ChatOllama
-from agents import pdf_agent, sql_agent
+import logging
+import time
+from typing import Optional
+
+from medical_agent.agents.pdf_agent import aanswer_with_sources
 from langchain.tools import tool
 from langchain.agents import create_agent
+from langgraph.runtime import get_runtime
+
+from medical_agent.cache import CachedAnswer, SemanticAnswerCache, ingestion_generation
+from medical_agent.context import Context
+from medical_agent.embeddings import build_embeddings
+from medical_agent.memory import ConversationWindowMiddleware
+from medical_agent.prompts import SUPERVISOR_PROMPT
+from medical_agent.registry import registry
+from medical_agent.streaming import PATIENT_QUERY, PROCEDURE_SEARCH, astream_agent, emit
+
+logger = logging.getLogger(__name__)
+
+# Used by the legacy module attributes and by callers outside a graph run.
+_default_context = Context()
 
-model = ChatOllama(model="gpt-oss:20b")
+
+def _run_context() -> Context:
+    """The context of the current graph run, or the module defaults outside one."""
+    try:
+        context = get_runtime(Context).context
+    except RuntimeError:
+        context = None
+    return context if isinstance(context, Context) else _default_context
+
+
+def build_answer_cache(context: Context) -> SemanticAnswerCache:
+    """Build the semantic answer cache; called by the component registry on first use."""
+    return SemanticAnswerCache(
+        build_embeddings(context).embed_query,
+        similarity_threshold=context.answer_cache_similarity_threshold,
+        ttl_seconds=context.answer_cache_ttl_seconds,
+        max_entries=context.answer_cache_max_entries,
+        generation=ingestion_generation(context.cache_dir),
+    )
+
+
+def format_cached_answer(cached: CachedAnswer) -> str:
+    """Render a procedure answer followed by the sources it was built from."""
+    if not cached.sources:
+        return cached.answer
+    return f"{cached.answer}\n\nRetrieved sources: {', '.join(cached.sources)}"
+
+
+async def query_patient(query: str, context: Optional[Context] = None) -> str:
+    """Run the SQL agent for `query` and return its final answer, streaming its tokens to the caller."""
+    started = time.perf_counter()
+    context = context or _run_context()
+    result = await astream_agent(
+        registry.get("sql_agent", context), {"messages":[{"role":"user", "content": query}]}, PATIENT_QUERY, context
+    )
+    logger.info("Branch patient_query finished in %.2fs", time.perf_counter() - started)
+    return result["messages"][-1].text
+
+
+async def search_procedures(query: str, context: Optional[Context] = None) -> CachedAnswer:
+    """Answer a procedure question through the semantic cache and the PDF agent.
+
+    A fresh answer is streamed by the PDF agent; a cached one is sent to the
+    caller's stream in one piece.
+    """
+    started = time.perf_counter()
+    context = context or _run_context()
+    if context.answer_cache_enabled:
+        computed = False
+
+        async def compute(query: str):
+            nonlocal computed
+            computed = True
+            return await aanswer_with_sources(query, context)
+
+        cached = await registry.get("answer_cache", context).aget_or_compute(query, compute)
+        if not computed:
+            emit("citations", PROCEDURE_SEARCH, sources=list(cached.sources))
+            emit("token", PROCEDURE_SEARCH, text=cached.answer)
+    else:
+        answer, sources = await aanswer_with_sources(query, context)
+        cached = CachedAnswer(query=query, answer=answer, sources=sources)
+    logger.info("Branch procedure_search finished in %.2fs", time.perf_counter() - started)
+    return cached
 
 @tool
-def patient_query(query: str) -> str:
+async def patient_query(query: str) -> str:
     """Query the medical records database using SQL and return the results as a JSON string.
     
     Use this tool to perform read-only SQL queries on the medical records database.
@@ -14,36 +94,39 @@ def patient_query(query: str) -> str:
 
     Input: Patient name
     """
-    result = sql_agent.invoke(
-        {"messages":[{"role":"user", "content": query}]}
-    )
-    return result["messages"][-1].text
+    return await query_patient(query)
 
 @tool
-def procedure_search(query: str) -> str:
+async def procedure_search(query: str) -> str:
     """Search hospital procedures based on the user's query and return relevant information.
     
     Use this tool to find and summarize hospital procedures that match the user's request.
 
     Input: Condition or procedure name
     """
-    result = pdf_agent.invoke(
-        {"messages":[{"role":"user", "content": query}]}
+    return format_cached_answer(await search_procedures(query))
+
+def build_supervisor_agent(context: Context):
+    """Build the supervisor agent; called by the component registry on first use."""
+    return create_agent(
+        model=registry.get("chat_model", context),
+        tools=[
+            patient_query,
+            procedure_search
+        ],
+        system_prompt=SUPERVISOR_PROMPT,
+        middleware=[
+            ConversationWindowMiddleware(context.supervisor_token_budget, context.conversation_memory_notes),
+        ],
     )
-    return result["messages"][-1].text
 
-SUPERVISOR_PROMPT = (
-    "You are a medical supervisor agent. Your role is to assist healthcare professionals "
-    "by providing accurate information from patient records and hospital procedures. "
-    "Use the provided tools to query patient data and search for hospital procedures as needed. "
-    "Always ensure patient privacy and data security in your responses."
-)
-
-supervisor_agent = create_agent(
-    model=model,
-    tools=[
-        patient_query,
-        procedure_search
-    ],
-    system_prompt=SUPERVISOR_PROMPT
-)
\ No newline at end of file
+
+def __getattr__(name: str):
+    # `model`, `answer_cache` and `supervisor_agent` used to be built at import time.
+    if name == "supervisor_agent":
+        return registry.get("supervisor_agent", _default_context)
+    if name == "answer_cache":
+        return registry.get("answer_cache", _default_context)
+    if name == "model":
+        return registry.get("chat_model", _default_context)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""Micro-batching and single-flight for structured extraction calls.
+
+Under load many graph runs reach `normalize_user_input` at once, each with a
+short input. `MicroBatcher` collects those calls for up to `max_wait_ms` (or
+until `max_batch_size` are waiting) and dispatches them together with
+`abatch`. Ollama has no batch endpoint for chat, so a batch goes out as
+parallel requests over the shared connection pool, filling the server's
+parallel slots (`OLLAMA_NUM_PARALLEL`) in one go instead of trickling in.
+
+Calls with the same input as one already queued or running share its result
+instead of generating again.
+
+Queue depth, batch sizes and coalesced calls are served by `metrics_text`;
+queue wait times are recorded as the `batch wait <name>` span histogram.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import convert_to_messages
+from langchain_core.runnables import Runnable
+
+from medical_agent.tracing import get_tracer, label_value, register_metrics
+from medical_agent.utils import get_message_text
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch size histogram buckets.
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def input_key(input: Any) -> str:
+    """Hash a prompt (a string or a list of messages) by role and text."""
+    digest = hashlib.sha256()
+    for message in convert_to_messages(input if isinstance(input, list) else [input]):
+        digest.update(message.type.encode())
+        digest.update(b"\0")
+        digest.update(get_message_text(message).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Pending:
+    key: str
+    input: Any
+    future: asyncio.Future
+    queued_at: float
+
+
+@dataclass
+class _LoopState:
+    pending: List[_Pending] = field(default_factory=list)
+    in_flight: Dict[str, asyncio.Future] = field(default_factory=dict)
+    timer: Optional[asyncio.TimerHandle] = None
+    tasks: set = field(default_factory=set)
+
+
+@dataclass
+class BatchStats:
+    requests: int = 0
+    """Calls made to the batcher."""
+    coalesced: int = 0
+    """Calls that shared the result of an identical queued or running call."""
+    batches: int = 0
+    batch_sizes: Dict[int, int] = field(default_factory=lambda: {bound: 0 for bound in _SIZE_BUCKETS})
+    """Batches dispatched, by the smallest bucket bound their size fits in."""
+    max_queue_depth: int = 0
+
+    def record_batch(self, size: int) -> None:
+        self.batches += 1
+        bound = next((bound for bound in _SIZE_BUCKETS if size <= bound), None)
+        if bound is not None:
+            self.batch_sizes[bound] += 1
+
+
+class MicroBatcher:
+    """Coalesce concurrent `ainvoke` calls of a runnable into batches.
+
+    Args:
+        runnable (Runnable): The runnable to batch, e.g. a structured-output model.
+        name (str): Name used in logs and as the `batcher` label of the metrics; a later
+            batcher with the same name replaces its metrics.
+        max_batch_size (int): Dispatch as soon as this many distinct inputs are waiting.
+        max_wait_ms (float): Dispatch at the latest this long after the first input of a batch arrived.
+    """
+
+    def __init__(self, runnable: Runnable, name: str, max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        self.runnable = runnable
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = BatchStats()
+        # Futures and timers belong to one event loop.
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        register_metrics(f"batcher:{name}", self.prometheus)
+
+    @property
+    def queue_depth(self) -> int:
+        """Inputs waiting for their batch to be dispatched."""
+        with self._lock:
+            return sum(len(state.pending) for state in self._loops.values())
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = _LoopState()
+            return state
+
+    async def ainvoke(self, input: Any) -> Any:
+        """Return the runnable's output for `input`, computed in a batch."""
+        key = input_key(input)
+        state = self._state()
+        self.stats.requests += 1
+
+        future = state.in_flight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state.in_flight[key] = future
+        state.pending.append(_Pending(key, input, future, time.perf_counter()))
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, len(state.pending))
+        if len(state.pending) >= self.max_batch_size:
+            self._flush(state)
+        elif state.timer is None:
+            state.timer = loop.call_later(self.max_wait, self._flush, state)
+        # Shielded: a cancelled caller must not cancel the result others wait for.
+        return await asyncio.shield(future)
+
+    def _flush(self, state: _LoopState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        while state.pending:
+            batch, state.pending = state.pending[: self.max_batch_size], state.pending[self.max_batch_size :]
+            task = asyncio.get_running_loop().create_task(self._dispatch(state, batch))
+            state.tasks.add(task)
+            task.add_done_callback(state.tasks.discard)
+
+    async def _dispatch(self, state: _LoopState, batch: List[_Pending]) -> None:
+        dispatched_at = time.perf_counter()
+        histograms = get_tracer().histograms
+        for item in batch:
+            histograms.observe(f"batch wait {self.name}", dispatched_at - item.queued_at)
+        self.stats.record_batch(len(batch))
+        logger.debug("Dispatching %d %s calls in one batch", len(batch), self.name)
+        try:
+            results = await self.runnable.abatch(
+                [item.input for item in batch],
+                config={"max_concurrency": len(batch)},
+                return_exceptions=True,
+            )
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for item, result in zip(batch, results):
+            state.in_flight.pop(item.key, None)
+            if item.future.done():
+                continue
+            if isinstance(result, BaseException):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    def prometheus(self) -> str:
+        """Render the batcher's counters in Prometheus text format."""
+        label = f'batcher="{label_value(self.name)}"'
+        stats = self.stats
+        lines = [
+            f"medical_agent_batch_queue_depth{{{label}}} {self.queue_depth}",
+            f"medical_agent_batch_max_queue_depth{{{label}}} {stats.max_queue_depth}",
+            f"medical_agent_batch_requests_total{{{label}}} {stats.requests}",
+            f"medical_agent_batch_coalesced_total{{{label}}} {stats.coalesced}",
+        ]
+        cumulative = 0
+        for bound, count in stats.batch_sizes.items():
+            cumulative += count
+            lines.append(f'medical_agent_batch_size_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'medical_agent_batch_size_bucket{{{label},le="+Inf"}} {stats.batches}')
+        lines.append(f"medical_agent_batch_size_count{{{label}}} {stats.batches}")
+        return "\n".join(lines) + "\n"
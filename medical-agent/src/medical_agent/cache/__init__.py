@@ -0,0 +1,5 @@
+from .generation import IngestionGeneration, ingestion_generation
+from .semantic_cache import CachedAnswer, SemanticAnswerCache
+from .embedding_cache import EmbeddingCache, content_hash
+from .snapshot_cache import PatientSnapshotCache
+from .retrieval_cache import RetrievalCache
@@ -0,0 +1,102 @@
+"""Persistent embedding cache backed by SQLite with an in-process LRU."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """Return the hex digest used to key a text in the embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Store embeddings keyed by `(model name, content hash)`.
+
+    Vectors are kept as float32 blobs in a SQLite database so they survive
+    restarts and can be shared between the ingestion process and the agent
+    server. The most recently used vectors are also kept in memory to avoid a
+    database round-trip on hot queries.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], lru_size: int = 4096):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lru_size = lru_size
+
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, content_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for `hashes`, skipping the ones not cached."""
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for h in hashes:
+                vector = self._lru.get((model, h))
+                if vector is None:
+                    missing.append(h)
+                    continue
+                self._lru.move_to_end((model, h))
+                found[h] = vector
+
+            # SQLite limits the number of bound parameters, so query in slices.
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                    (model, *chunk),
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[h] = vector
+                    self._remember(model, h, vector)
+        return found
+
+    def put_many(self, model: str, vectors: Mapping[str, np.ndarray]) -> None:
+        """Persist `vectors` (keyed by content hash) for `model`."""
+        if not vectors:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in vectors.items()],
+            )
+            self._conn.commit()
+            for h, v in vectors.items():
+                self._remember(model, h, np.asarray(v, dtype=np.float32))
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, model: str, h: str, vector: np.ndarray) -> None:
+        self._lru[(model, h)] = vector
+        self._lru.move_to_end((model, h))
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,61 @@
+"""Cross-process generation counter for the procedure corpus."""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionGeneration:
+    """A monotonic counter bumped whenever the procedure corpus changes.
+
+    The counter lives in a small file so the ingestion process and the agent
+    server agree on it without sharing memory. Readers only re-read the file
+    when its modification time changes, so checking it on every lookup is cheap.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        # Re-entrant: `bump` reads the current value while holding it.
+        self._lock = threading.RLock()
+        self._mtime_ns: int | None = None
+        self._value = 0
+
+    def current(self) -> int:
+        """Return the current generation, re-reading the file only if it changed."""
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+        if mtime_ns != self._mtime_ns:
+            with self._lock:
+                try:
+                    self._value = int(self.path.read_text().strip() or 0)
+                except (OSError, ValueError):
+                    logger.warning("Could not read ingestion generation from %s", self.path)
+                self._mtime_ns = mtime_ns
+        return self._value
+
+    def bump(self) -> int:
+        """Advance the generation and persist it atomically."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            value = self.current() + 1
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(str(value))
+            os.replace(tmp_path, self.path)
+            logger.info("Procedure corpus generation bumped to %d", value)
+            return value
+
+
+GENERATION_FILE = "ingestion_generation"
+
+
+def ingestion_generation(cache_dir: str | os.PathLike[str]) -> IngestionGeneration:
+    """Return the generation counter stored under `cache_dir`."""
+    return IngestionGeneration(Path(cache_dir) / GENERATION_FILE)
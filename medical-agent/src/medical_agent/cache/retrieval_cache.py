@@ -0,0 +1,226 @@
+"""Retrieval result cache keyed on LSH buckets of query embeddings.
+
+Many phrasings of a question land on the same few protocol sections. The
+retrieval layer caches, per query embedding, the IDs and metadata of the top-k
+chunks it returned, so a close rephrasing skips the vector and BM25 searches.
+
+Query embeddings are quantized with random-hyperplane LSH: each of `tables`
+tables hashes the sign of `bits` projections into a bucket. A lookup gathers
+the entries of the query's bucket in every table, plus the buckets reached by
+flipping its `probes` least certain bits (the projections closest to zero),
+and serves the closest candidate whose cosine similarity reaches
+`similarity_threshold`. Entries are dropped when the ingestion generation
+changes, since the corpus they ranked no longer exists.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from medical_agent.cache.generation import IngestionGeneration
+from medical_agent.tracing import label_value
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    buckets: Tuple[int, ...]
+    hits: List[Tuple[str, Dict[str, Any]]]
+
+
+class RetrievalCache:
+    """LRU of top-k `(id, metadata)` lists found through LSH buckets of the query embedding.
+
+    Args:
+        bits (int): Hyperplanes per table; more bits make buckets smaller and stricter.
+        tables (int): Independent hash tables; more tables find more near neighbours.
+        probes (int): Least certain bits flipped, one at a time, to probe neighbouring buckets.
+        similarity_threshold (float): Minimum cosine similarity between two queries for a result to be reused.
+        max_entries (int): Results kept before the least recently used ones are evicted.
+        generation (Optional[IngestionGeneration]): Counter whose change drops every entry.
+        seed (int): Seed of the hyperplanes, so buckets are the same in every process.
+        name (str): Value of the `cache` label of the metrics.
+    """
+
+    def __init__(
+        self,
+        *,
+        bits: int = 12,
+        tables: int = 4,
+        probes: int = 2,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 2048,
+        generation: Optional[IngestionGeneration] = None,
+        seed: int = 0,
+        name: str = "default",
+    ):
+        self.name = name
+        self.bits = bits
+        self.tables = tables
+        self.probes = min(probes, bits)
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.seed = seed
+        self._generation = generation
+        self._seen_generation = generation.current() if generation else 0
+
+        self._lock = threading.Lock()
+        # Drawn on the first vector, once its dimensions are known.
+        self._planes: Optional[np.ndarray] = None
+        self._weights = 1 << np.arange(bits, dtype=np.int64)
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(tables)]
+        self._next_key = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(vector: Sequence[float]) -> np.ndarray:
+        """L2-normalise a query embedding so dot products are cosine similarities."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """Return the cached `(id, metadata)` list of the closest earlier query, if it is close enough."""
+        with self._lock:
+            self._check_generation()
+            key = self._closest(vector)
+            if key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(self._entries[key].hits)
+
+    def generation(self) -> int:
+        """The ingestion generation the cached results belong to; pass it to `store`."""
+        with self._lock:
+            self._check_generation()
+            return self._seen_generation
+
+    def store(
+        self, vector: np.ndarray, hits: Sequence[Tuple[str, Dict[str, Any]]], generation: Optional[int] = None
+    ) -> None:
+        """Cache the `(id, metadata)` list retrieved for `vector`, evicting the least recently used entries.
+
+        Nothing is cached when `generation` (read before retrieving) is no
+        longer current, since the hits ranked a replaced corpus.
+        """
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._seen_generation:
+                return
+            buckets = tuple(int(code) for code in self._codes(vector)[0])
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = _Entry(vector, buckets, list(hits))
+            for table, bucket in zip(self._buckets, buckets):
+                table.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, vector: np.ndarray) -> None:
+        """Drop the entry served for `vector` because its documents could not be loaded.
+
+        The lookup that served it then counts as a stale miss. Nothing is
+        counted when the entry is already gone, e.g. dropped by a generation
+        change in between.
+        """
+        with self._lock:
+            key = self._closest(vector)
+            if key is None:
+                return
+            self._remove(key)
+            self.hits = max(self.hits - 1, 0)
+            self.misses += 1
+            self.stale += 1
+
+    def invalidate(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def prometheus(self) -> str:
+        stats = self.stats()
+        label = f'cache="{label_value(self.name)}"'
+        return "".join(f"medical_agent_retrieval_cache_{name}{{{label}}} {value}\n" for name, value in stats.items())
+
+    def _closest(self, vector: np.ndarray) -> Optional[int]:
+        candidates: Set[int] = set()
+        for table, bucket in zip(self._buckets, self._probe_buckets(vector)):
+            for code in bucket:
+                candidates.update(table.get(code, ()))
+        if not candidates:
+            return None
+        keys = list(candidates)
+        scores = np.stack([self._entries[key].vector for key in keys]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        logger.debug("Closest cached query: similarity=%.3f among %d candidate(s)", float(scores[best]), len(keys))
+        return keys[best]
+
+    def _codes(self, vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self._planes is None or self._planes.shape[-1] != vector.shape[0]:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((self.tables, self.bits, vector.shape[0])).astype(np.float32)
+            self._clear()
+        projections = self._planes @ vector
+        return (projections > 0).astype(np.int64) @ self._weights, projections
+
+    def _probe_buckets(self, vector: np.ndarray) -> List[List[int]]:
+        codes, projections = self._codes(vector)
+        probes = []
+        for code, margins in zip(codes, np.abs(projections)):
+            flips = np.argsort(margins)[: self.probes]
+            probes.append([int(code), *(int(code) ^ (1 << int(bit)) for bit in flips)])
+        return probes
+
+    def _check_generation(self) -> None:
+        if self._generation is None:
+            return
+        current = self._generation.current()
+        if current != self._seen_generation:
+            self._seen_generation = current
+            self._clear()
+            logger.info("Retrieval cache invalidated by ingestion generation %d", current)
+
+    def _clear(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._buckets = [{} for _ in range(self.tables)]
+
+    def _remove(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        for table, bucket in zip(self._buckets, entry.buckets):
+            members = table.get(bucket)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del table[bucket]
@@ -0,0 +1,216 @@
+"""Semantic answer cache keyed on query embeddings."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from medical_agent.cache.generation import IngestionGeneration
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """An answer stored in the semantic cache together with its cited sources."""
+
+    query: str
+    answer: str
+    sources: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+@dataclass
+class _Entry:
+    answer: CachedAnswer
+    vector: np.ndarray
+
+
+class SemanticAnswerCache:
+    """Cache answers for queries that are semantically close to earlier ones.
+
+    Lookups embed the query, compare it against every cached query embedding
+    with a single matrix-vector product and return the best match when its
+    cosine similarity reaches `similarity_threshold`. Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted once
+    `max_entries` is exceeded. The whole cache is dropped whenever the
+    ingestion generation changes.
+    """
+
+    def __init__(
+        self,
+        embed_query: Callable[[str], Sequence[float]],
+        *,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 512,
+        generation: Optional[IngestionGeneration] = None,
+    ):
+        self._embed_query = embed_query
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._generation = generation
+        self._seen_generation = generation.current() if generation else 0
+
+        self._lock = threading.RLock()
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._next_key = 0
+        self._keys: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, query: str) -> np.ndarray:
+        """Embed and L2-normalise a query so dot products are cosine similarities."""
+        vector = np.asarray(self._embed_query(query), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray) -> Optional[CachedAnswer]:
+        """Return the cached answer closest to `vector`, if it is close enough."""
+        with self._lock:
+            self._check_generation()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            matrix = self._similarity_matrix()
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            key = self._keys[best]
+            entry = self._entries[key]
+
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            if self._is_expired(entry.answer):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry.answer.hits += 1
+            self.hits += 1
+            logger.info(
+                "Semantic cache hit (similarity=%.3f) for query matching %r",
+                float(scores[best]),
+                entry.answer.query,
+            )
+            return entry.answer
+
+    def generation(self) -> int:
+        """The ingestion generation the cached answers belong to; pass it to `store`."""
+        with self._lock:
+            self._check_generation()
+            return self._seen_generation
+
+    def store(
+        self, query: str, vector: np.ndarray, answer: str, sources: Sequence[str], generation: Optional[int] = None
+    ) -> CachedAnswer:
+        """Insert an answer, evicting expired and least recently used entries.
+
+        When `generation` (read before the answer was computed) is no longer
+        current, the answer was built from a replaced corpus: it is returned
+        but not cached.
+        """
+        cached = CachedAnswer(query=query, answer=answer, sources=list(sources))
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._seen_generation:
+                logger.info("Not caching an answer computed before the corpus changed")
+                return cached
+            self._entries[self._next_key] = _Entry(answer=cached, vector=vector)
+            self._next_key += 1
+            self._matrix = None
+
+            for key in [k for k, e in self._entries.items() if self._is_expired(e.answer)]:
+                self._remove(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def get_or_compute(
+        self,
+        query: str,
+        compute: Callable[[str], Tuple[str, Sequence[str]]],
+    ) -> CachedAnswer:
+        """Serve `query` from the cache or compute, store and return a fresh answer.
+
+        Args:
+            query (str): The user's question.
+            compute (Callable): Produces `(answer, sources)` on a cache miss.
+        """
+        vector = self.embed(query)
+        generation = self.generation()
+        cached = self.lookup(vector)
+        if cached is not None:
+            return cached
+
+        answer, sources = compute(query)
+        return self.store(query, vector, answer, sources, generation)
+
+    async def aget_or_compute(
+        self,
+        query: str,
+        compute: Callable[[str], Awaitable[Tuple[str, Sequence[str]]]],
+    ) -> CachedAnswer:
+        """Async variant of `get_or_compute`; the query is embedded off the event loop."""
+        vector = await asyncio.to_thread(self.embed, query)
+        # Read before computing: an ingestion can finish while the PDF agent runs.
+        generation = self.generation()
+        cached = self.lookup(vector)
+        if cached is not None:
+            return cached
+
+        answer, sources = await compute(query)
+        return self.store(query, vector, answer, sources, generation)
+
+    def invalidate(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            logger.info("Semantic answer cache invalidated")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _check_generation(self) -> None:
+        if self._generation is None:
+            return
+        current = self._generation.current()
+        if current != self._seen_generation:
+            self._seen_generation = current
+            self.invalidate()
+
+    def _is_expired(self, answer: CachedAnswer) -> bool:
+        return time.monotonic() - answer.created_at > self.ttl_seconds
+
+    def _remove(self, key: int) -> None:
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _similarity_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[k].vector for k in self._keys])
+        return self._matrix
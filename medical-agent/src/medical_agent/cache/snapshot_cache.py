@@ -0,0 +1,144 @@
+"""Per-patient snapshot cache invalidated by change high-water marks.
+
+A consultation asks about the same patient turn after turn, and their records
+rarely change in between. Snapshots are kept per patient id together with a
+watermark: a string summarizing the last `updated_at`/`created_at` and the
+row counts of the patient's tables, read by the same query that resolves the
+patient's name. A cached snapshot is served only while the watermark it was
+read under is unchanged, so an edit, insert or delete in any of the tables
+makes the next lookup read the records again.
+
+The most recently used snapshots are kept in memory. With a spill path,
+snapshots evicted from memory are written to SQLite as compressed JSON and
+read back from there on their next use. The spill file holds patient data;
+keep it on an encrypted volume.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from medical_agent.tracing import label_value
+
+logger = logging.getLogger(__name__)
+
+
+class PatientSnapshotCache:
+    """LRU of JSON-serializable snapshots keyed by patient id and validated by watermark.
+
+    Args:
+        max_entries (int): Snapshots kept in memory.
+        spill_path (Optional[PathLike]): SQLite file receiving the snapshots evicted from memory; None disables it.
+        name (str): Value of the `cache` label of the metrics.
+    """
+
+    def __init__(
+        self, max_entries: int = 256, spill_path: str | os.PathLike[str] | None = None, name: str = "default"
+    ):
+        self.max_entries = max_entries
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, Tuple[str, Dict[str, Any]]] = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        if spill_path is not None:
+            path = Path(spill_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " patient_id TEXT PRIMARY KEY,"
+                " watermark TEXT NOT NULL,"
+                " payload BLOB NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.spilled = 0
+
+    def get(self, patient_id: str, watermark: str) -> Optional[Dict[str, Any]]:
+        """Return the snapshot of `patient_id` if it was stored under `watermark`."""
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT watermark, payload FROM snapshots WHERE patient_id = ?", (patient_id,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(zlib.decompress(row[1])))
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != watermark:
+                self.stale += 1
+                self._entries.pop(patient_id, None)
+                if self._conn is not None:
+                    self._conn.execute("DELETE FROM snapshots WHERE patient_id = ?", (patient_id,))
+                    self._conn.commit()
+                return None
+            self.hits += 1
+            self._remember(patient_id, entry)
+            return entry[1]
+
+    def put(self, patient_id: str, watermark: str, snapshot: Dict[str, Any]) -> None:
+        """Store the snapshot of `patient_id` read under `watermark`."""
+        with self._lock:
+            self._remember(patient_id, (watermark, snapshot))
+
+    def invalidate(self) -> None:
+        """Drop every snapshot, in memory and spilled."""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM snapshots")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "spilled": self.spilled,
+            }
+
+    def prometheus(self) -> str:
+        stats = self.stats()
+        label = f'cache="{label_value(self.name)}"'
+        return "".join(
+            f"medical_agent_patient_snapshot_cache_{name}{{{label}}} {value}\n" for name, value in stats.items()
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, patient_id: str, entry: Tuple[str, Dict[str, Any]]) -> None:
+        self._entries[patient_id] = entry
+        self._entries.move_to_end(patient_id)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False))
+        if evicted and self._conn is not None:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (patient_id, watermark, payload) VALUES (?, ?, ?)",
+                [
+                    (key, watermark, zlib.compress(json.dumps(snapshot, default=str).encode("utf-8")))
+                    for key, (watermark, snapshot) in evicted
+                ],
+            )
+            self._conn.commit()
+            self.spilled += len(evicted)
@@ -0,0 +1,509 @@
+"""Compact SQLite checkpointer for the graph state.
+
+`langgraph dev` keeps checkpoints in memory and pickles all of them to
+`.langgraph_api/` over and over, and `MedicalState` carries lists of documents
+and a growing message list. `SQLiteCheckpointer` stores them compactly:
+
+- deltas: a checkpoint row only holds the channel versions; a channel value
+  is written when its version changes, as LangGraph's Postgres saver does;
+- content addressing: values are serialized with LangGraph's msgpack codec,
+  compressed when large, and stored once per content hash. Lists (messages,
+  retrieved documents) are stored element by element, so a step that appends
+  one message writes one message and the list of hashes, and a document
+  retrieved again in a later turn is not stored again;
+- pruning: a background thread keeps the last `keep_per_thread` checkpoints
+  of each thread and collects the values nothing references any more.
+
+Enable it with `CHECKPOINT_PATH`; the graph is then compiled with it.
+`langgraph dev` and the LangGraph server bring their own persistence and
+ignore it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from medical_agent.context import Context
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16
+# Payloads at least this large are zlib-compressed.
+COMPRESS_MIN_BYTES = 512
+COMPRESSED = "zlib+"
+
+_SCHEMA = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint BLOB NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS channel_values (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    refs BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    ref BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS payloads (
+    hash BLOB PRIMARY KEY,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _split_refs(refs: bytes) -> List[bytes]:
+    return [refs[i : i + HASH_SIZE] for i in range(0, len(refs), HASH_SIZE)]
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """Checkpoint saver storing deltas of content-addressed values in SQLite.
+
+    Args:
+        path (PathLike): SQLite database file.
+        keep_per_thread (int): Checkpoints kept per thread and namespace by `prune`; 0 keeps all.
+        prune_interval_seconds (float): Interval of the background pruning thread; 0 disables it.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        keep_per_thread: int = 20,
+        prune_interval_seconds: float = 0.0,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_per_thread = keep_per_thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._stop = threading.Event()
+        self._pruner: Optional[threading.Thread] = None
+        if prune_interval_seconds > 0 and keep_per_thread > 0:
+            self._pruner = threading.Thread(
+                target=self._prune_periodically, args=(prune_interval_seconds,), name="checkpoint-pruner", daemon=True
+            )
+            self._pruner.start()
+
+    # Payloads
+
+    def _store(self, value: Any, pending: Dict[bytes, Tuple[str, bytes]]) -> bytes:
+        """Serialize `value` into `pending` and return its content hash."""
+        type_, data = self.serde.dumps_typed(value)
+        key = hashlib.blake2b(type_.encode() + b"\0" + data, digest_size=HASH_SIZE).digest()
+        if key not in pending:
+            if len(data) >= COMPRESS_MIN_BYTES:
+                type_, data = COMPRESSED + type_, zlib.compress(data, 1)
+            pending[key] = (type_, data)
+        return key
+
+    def _flush(self, pending: Dict[bytes, Tuple[str, bytes]]) -> None:
+        if pending:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO payloads (hash, type, data) VALUES (?, ?, ?)",
+                [(key, type_, data) for key, (type_, data) in pending.items()],
+            )
+
+    def _load(self, keys: Sequence[bytes]) -> Dict[bytes, Any]:
+        found: Dict[bytes, Any] = {}
+        unique = list(dict.fromkeys(keys))
+        # SQLite limits the number of bound parameters, so query in slices.
+        for start in range(0, len(unique), 500):
+            chunk = unique[start : start + 500]
+            rows = self._conn.execute(
+                f"SELECT hash, type, data FROM payloads WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, type_, data in rows:
+                if type_.startswith(COMPRESSED):
+                    type_, data = type_[len(COMPRESSED) :], zlib.decompress(data)
+                found[key] = self.serde.loads_typed((type_, data))
+        return found
+
+    # Reads
+
+    def _channel_values(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        rows = [
+            row
+            for channel, version in versions.items()
+            for row in self._conn.execute(
+                "SELECT channel, kind, refs FROM channel_values "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            )
+        ]
+        payloads = self._load([key for _, kind, refs in rows if kind != "empty" for key in _split_refs(refs)])
+        values: Dict[str, Any] = {}
+        for channel, kind, refs in rows:
+            if kind == "list":
+                values[channel] = [payloads[key] for key in _split_refs(refs)]
+            elif kind == "value":
+                values[channel] = payloads[refs]
+        return values
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: Tuple[Any, ...]) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_blob, metadata_blob = row
+        checkpoint: Checkpoint = self.serde.loads_typed(("msgpack", zlib.decompress(checkpoint_blob)))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, ref FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        payloads = self._load([ref for _, _, ref in writes])
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._channel_values(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed(("msgpack", metadata_blob)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, payloads[ref]) for task_id, channel, ref in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, checkpoint, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: Dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, metadata "
+            "FROM checkpoints WHERE 1 = 1"
+        )
+        params: List[Any] = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if filter:
+                metadata = self.serde.loads_typed(("msgpack", row[3]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None and limit <= 0:
+                break
+            if limit is not None:
+                limit -= 1
+            # Built under the lock but yielded outside it, so the caller can use the saver while iterating.
+            with self._lock:
+                checkpoint_tuple = self._tuple(thread_id, checkpoint_ns, tuple(row))
+            yield checkpoint_tuple
+
+    # Writes
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        stored = checkpoint.copy()
+        values: Dict[str, Any] = stored.pop("channel_values")  # type: ignore[misc]
+        pending: Dict[bytes, Tuple[str, bytes]] = {}
+        channel_rows = []
+        for channel, version in new_versions.items():
+            if channel not in values:
+                kind, refs = "empty", b""
+            elif type(values[channel]) is list:
+                kind, refs = "list", b"".join(self._store(item, pending) for item in values[channel])
+            else:
+                kind, refs = "value", self._store(values[channel], pending)
+            channel_rows.append((thread_id, checkpoint_ns, channel, str(version), kind, refs))
+        # Both are plain dicts, which the codec always encodes as msgpack; the checkpoint
+        # repeats every channel name and version, so it is always compressed.
+        _, checkpoint_blob = self.serde.dumps_typed(stored)
+        checkpoint_blob = zlib.compress(checkpoint_blob, 1)
+        _, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._flush(pending)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO channel_values (thread_id, checkpoint_ns, channel, version, kind, refs) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                channel_rows,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_blob,
+                    metadata_blob,
+                ),
+            )
+            self._conn.commit()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        pending: Dict[bytes, Tuple[str, bytes]] = {}
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+             self._store(value, pending), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # Special writes (errors, interrupts) replace each other; regular ones are written once.
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self._flush(pending)
+            self._conn.executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, ref, task_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "channel_values", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def get_next_version(self, current: str | None, channel: None = None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        # Zero-padded so versions compare as strings; the random suffix tells forks apart.
+        return f"{current_v + 1:012}.{random.getrandbits(32):08x}"
+
+    # Async variants; SQLite calls are short, so they run in a worker thread.
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: Dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # Pruning
+
+    def prune(self) -> Dict[str, int]:
+        """Keep the last `keep_per_thread` checkpoints of each thread and drop what only older ones used.
+
+        Returns:
+            Dict[str, int]: Numbers of checkpoints, channel values and payloads deleted.
+        """
+        deleted = {"checkpoints": 0, "channel_values": 0, "payloads": 0}
+        if self.keep_per_thread <= 0:
+            return deleted
+        with self._lock:
+            groups = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns FROM checkpoints GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+                (self.keep_per_thread,),
+            ).fetchall()
+            for thread_id, checkpoint_ns in groups:
+                kept = self._conn.execute(
+                    "SELECT checkpoint_id, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?",
+                    (thread_id, checkpoint_ns, self.keep_per_thread),
+                ).fetchall()
+                oldest = kept[-1][0]
+                referenced: Set[Tuple[str, str]] = {
+                    (channel, str(version))
+                    for _, blob in kept
+                    for channel, version in self.serde.loads_typed(("msgpack", zlib.decompress(blob)))["channel_versions"].items()
+                }
+                for table in ("checkpoints", "writes"):
+                    cursor = self._conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, oldest),
+                    )
+                    if table == "checkpoints":
+                        deleted["checkpoints"] += cursor.rowcount
+                stale = [
+                    (thread_id, checkpoint_ns, channel, version)
+                    for channel, version in self._conn.execute(
+                        "SELECT channel, version FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ?",
+                        (thread_id, checkpoint_ns),
+                    )
+                    if (channel, version) not in referenced
+                ]
+                self._conn.executemany(
+                    "DELETE FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    stale,
+                )
+                deleted["channel_values"] += len(stale)
+            deleted["payloads"] = self._collect_payloads()
+            self._conn.commit()
+        if any(deleted.values()):
+            logger.info("Pruned checkpoints: %s", deleted)
+        return deleted
+
+    def _collect_payloads(self) -> int:
+        """Delete the payloads no channel value or pending write refers to."""
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS live (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("DELETE FROM live")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO live (hash) VALUES (?)",
+            (
+                (key,)
+                for (refs,) in self._conn.execute("SELECT refs FROM channel_values WHERE kind != 'empty'").fetchall()
+                for key in _split_refs(refs)
+            ),
+        )
+        self._conn.execute("INSERT OR IGNORE INTO live (hash) SELECT ref FROM writes")
+        cursor = self._conn.execute("DELETE FROM payloads WHERE hash NOT IN (SELECT hash FROM live)")
+        return cursor.rowcount
+
+    def _prune_periodically(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.prune()
+            except Exception:
+                logger.exception("Checkpoint pruning failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._pruner is not None:
+            self._pruner.join()
+        with self._lock:
+            self._conn.close()
+
+
+def build_checkpointer(context: Context) -> Optional[SQLiteCheckpointer]:
+    """The checkpointer configured by `checkpoint_path`, or None to leave persistence to the server."""
+    if not context.checkpoint_path:
+        return None
+    return SQLiteCheckpointer(
+        context.checkpoint_path,
+        keep_per_thread=context.checkpoint_keep_per_thread,
+        prune_interval_seconds=context.checkpoint_prune_interval_seconds,
+    )
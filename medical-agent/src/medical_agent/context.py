@@ -5,13 +5,16 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass, field, fields
 from typing import Annotated
-from langchain_community.utilities import SQLDatabase
 from . import prompts
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, frozen=True)
 class Context:
-    """The context for the agent."""
+    """The context for the agent.
+
+    Frozen so it can key the caches of components built from it; use
+    `dataclasses.replace` to derive different settings.
+    """
 
     system_prompt: str = field(
         default=prompts.SYSTEM_PROMPT,
@@ -52,14 +55,222 @@ class Context:
         },
     )
 
-    #sql_db_connection: SQLDatabase = field(
-   #     default=SQLDatabase.from_uri(
-   #         database_uri=os.environ.get('DATABASE_URI', 'sqlite:///medical_agent.db')
-   #     ),
-   #     metadata={
-   #         "description": "The database connection for the agent to use for SQL operations."
-   #     },
-   # )
+    llm_max_concurrency: int = field(
+        default=0,
+        metadata={
+            "description": "Maximum in-flight generation requests per Ollama model; 0 means unlimited."
+        },
+    )
+
+    llm_concurrency_overrides: str = field(
+        default="",
+        metadata={
+            "description": "Per-model overrides of llm_max_concurrency as comma-separated "
+            "model=limit pairs, e.g. 'gpt-oss:20b=2,llama3.1=8'."
+        },
+    )
+
+    fast_extraction_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether simple inputs are normalized from the symptom, disease, exam and "
+            "patient name dictionaries instead of by the LLM."
+        },
+    )
+
+    fast_extraction_min_coverage: float = field(
+        default=0.8,
+        metadata={
+            "description": "Minimum share of the informative words the dictionaries must explain "
+            "for the fast extractor's result to be used."
+        },
+    )
+
+    normalization_batching_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether concurrent input normalization calls are micro-batched, "
+            "with identical in-flight inputs sharing one result."
+        },
+    )
+
+    normalization_batch_max_size: int = field(
+        default=8,
+        metadata={
+            "description": "Maximum number of normalization calls dispatched together."
+        },
+    )
+
+    normalization_batch_max_wait_ms: float = field(
+        default=5.0,
+        metadata={
+            "description": "How long a normalization call waits for others to join its batch, in milliseconds."
+        },
+    )
+
+    conversation_window_tokens: int = field(
+        default=2000,
+        metadata={
+            "description": "Token budget of the recent turns kept in the graph's messages; older turns are only kept "
+            "in the conversation memory record. 0 keeps every message."
+        },
+    )
+
+    conversation_memory_notes: int = field(
+        default=8,
+        metadata={
+            "description": "Number of one-line notes of earlier turns kept in the conversation memory."
+        },
+    )
+
+    normalization_token_budget: int = field(
+        default=800,
+        metadata={
+            "description": "Token budget of the recent messages sent to the input normalization call."
+        },
+    )
+
+    supervisor_token_budget: int = field(
+        default=3000,
+        metadata={
+            "description": "Token budget of the recent messages sent on each supervisor model call."
+        },
+    )
+
+    ollama_max_connections: int = field(
+        default=32,
+        metadata={
+            "description": "Maximum HTTP connections to Ollama, shared by every chat model client."
+        },
+    )
+
+    ollama_keepalive_expiry_seconds: float = field(
+        default=120.0,
+        metadata={
+            "description": "How long idle HTTP connections to Ollama are kept open for reuse."
+        },
+    )
+
+    ollama_keep_alive: str = field(
+        default="30m",
+        metadata={
+            "description": "How long Ollama keeps a model (and its prompt cache) loaded after a request, "
+            "e.g. '30m', in seconds if unitless, or '-1' to keep it loaded."
+        },
+    )
+
+    ollama_num_ctx: int = field(
+        default=8192,
+        metadata={
+            "description": "Context window requested from Ollama by every chat client. It is pinned because "
+            "a request with a different value reloads the model and drops its prompt cache; 0 uses the model default."
+        },
+    )
+
+    db_host: str = field(
+        default="localhost",
+        metadata={
+            "description": "Host of the hospital MySQL database."
+        },
+    )
+
+    db_port: int = field(
+        default=3306,
+        metadata={
+            "description": "Port of the hospital MySQL database."
+        },
+    )
+
+    db_user: str = field(
+        default="root",
+        metadata={
+            "description": "User the agent connects to the database as."
+        },
+    )
+
+    db_password: str = field(
+        default="",
+        metadata={
+            "description": "Password of the database user."
+        },
+    )
+
+    db_name: str = field(
+        default="test_db",
+        metadata={
+            "description": "Name of the hospital database schema."
+        },
+    )
+
+    db_pool_min_size: int = field(
+        default=1,
+        metadata={
+            "description": "Number of database connections opened when the pool starts."
+        },
+    )
+
+    db_pool_max_size: int = field(
+        default=10,
+        metadata={
+            "description": "Maximum number of database connections in use at once, shared by every query path."
+        },
+    )
+
+    db_query_timeout_seconds: float = field(
+        default=30.0,
+        metadata={
+            "description": "Per-query timeout, enforced by the client and as the session max_execution_time."
+        },
+    )
+
+    db_health_check_interval_seconds: float = field(
+        default=30.0,
+        metadata={
+            "description": "Idle time after which a pooled connection is pinged before it is reused."
+        },
+    )
+
+    db_stream_batch_size: int = field(
+        default=500,
+        metadata={
+            "description": "Rows fetched per round-trip when streaming large scans such as health_history."
+        },
+    )
+
+    schema_catalog_refresh_seconds: float = field(
+        default=300.0,
+        metadata={
+            "description": "How often the schema catalog checks the database for DDL changes, in seconds."
+        },
+    )
+
+    schema_catalog_sample_rows: int = field(
+        default=3,
+        metadata={
+            "description": "Number of sample rows per table kept in the schema catalog."
+        },
+    )
+
+    partition_pruning_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether generated SQL on the year-partitioned tables gets date bounds so MySQL can prune partitions."
+        },
+    )
+
+    partition_default_lookback_days: int = field(
+        default=730,
+        metadata={
+            "description": "Lookback used for partitioned tables when the question asks for recent data without naming dates; older data is only read when it returns nothing."
+        },
+    )
+
+    partition_pruning_explain: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether bounded queries are checked with EXPLAIN and only kept when they read fewer partitions."
+        },
+    )
 
     mongodb_connection_string: str = field(
         default=os.environ.get('MONGODB_URI'),
@@ -83,6 +294,100 @@ class Context:
         },
     )
 
+    vector_store_backend: str = field(
+        default="mongodb",
+        metadata={
+            "description": "Where procedure embeddings are searched: 'mongodb' (Atlas Vector Search) "
+            "or 'local' (in-process memory-mapped index)."
+        },
+    )
+
+    local_index_path: str = field(
+        default=".cache/medical_agent/procedure_index",
+        metadata={
+            "description": "Directory holding the local vector index files."
+        },
+    )
+
+    local_index_dtype: str = field(
+        default="float32",
+        metadata={
+            "description": "Storage type of local index vectors: 'float32', 'float16' or 'int8' (quantized)."
+        },
+    )
+
+    ann_enabled: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether the local backend searches through its IVF-PQ approximate index "
+            "instead of scanning every vector."
+        },
+    )
+
+    ann_nlist: int = field(
+        default=1024,
+        metadata={
+            "description": "Number of IVF inverted lists (coarse clusters) when building the approximate index."
+        },
+    )
+
+    ann_pq_m: int = field(
+        default=64,
+        metadata={
+            "description": "Number of product-quantization sub-spaces (bytes per encoded vector)."
+        },
+    )
+
+    ann_nprobe: int = field(
+        default=16,
+        metadata={
+            "description": "Number of inverted lists scanned per query; higher improves recall at the cost of latency."
+        },
+    )
+
+    ann_rerank_factor: int = field(
+        default=4,
+        metadata={
+            "description": "Approximate candidates fetched per requested result and re-ranked with exact scores."
+        },
+    )
+
+    lexical_index_path: str = field(
+        default=".cache/medical_agent/lexical_index",
+        metadata={
+            "description": "Directory holding the BM25 inverted index built during ingestion."
+        },
+    )
+
+    retriever_mode: str = field(
+        default="hybrid",
+        metadata={
+            "description": "Procedure retrieval strategy: 'vector' (embeddings only) or 'hybrid' "
+            "(BM25 and vector search fused with reciprocal-rank fusion)."
+        },
+    )
+
+    hybrid_vector_weight: float = field(
+        default=1.0,
+        metadata={
+            "description": "Weight of the vector ranking in reciprocal-rank fusion."
+        },
+    )
+
+    hybrid_lexical_weight: float = field(
+        default=1.0,
+        metadata={
+            "description": "Weight of the BM25 ranking in reciprocal-rank fusion."
+        },
+    )
+
+    rrf_k: int = field(
+        default=60,
+        metadata={
+            "description": "Rank offset of reciprocal-rank fusion; larger values flatten the contribution of top ranks."
+        },
+    )
+
     retriever_k: int = field(
         default=5,
         metadata={
@@ -90,6 +395,260 @@ class Context:
         },
     )
 
+    context_token_budget: int = field(
+        default=1200,
+        metadata={
+            "description": "Maximum estimated tokens of retrieved procedure text put into the PDF agent's prompt."
+        },
+    )
+
+    context_dedup_threshold: float = field(
+        default=0.8,
+        metadata={
+            "description": "Word-shingle Jaccard similarity above which a retrieved passage is dropped "
+            "as a near-duplicate of a better ranked one."
+        },
+    )
+
+    cache_dir: str = field(
+        default=".cache/medical_agent",
+        metadata={
+            "description": "Directory for on-disk caches and the shared ingestion generation file."
+        },
+    )
+
+    checkpoint_path: str = field(
+        default="",
+        metadata={
+            "description": "SQLite file the graph checkpoints its state to; empty leaves persistence to the LangGraph server."
+        },
+    )
+
+    checkpoint_keep_per_thread: int = field(
+        default=20,
+        metadata={
+            "description": "Checkpoints kept per conversation thread when old ones are pruned; 0 keeps all."
+        },
+    )
+
+    checkpoint_prune_interval_seconds: float = field(
+        default=300.0,
+        metadata={
+            "description": "Interval of the background pruning of old checkpoints; 0 disables it."
+        },
+    )
+
+    answer_cache_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether procedure answers are served from the semantic answer cache."
+        },
+    )
+
+    answer_cache_similarity_threshold: float = field(
+        default=0.92,
+        metadata={
+            "description": "Minimum cosine similarity between two queries for a cached answer to be reused."
+        },
+    )
+
+    answer_cache_ttl_seconds: float = field(
+        default=3600.0,
+        metadata={
+            "description": "How long a cached procedure answer stays valid, in seconds."
+        },
+    )
+
+    answer_cache_max_entries: int = field(
+        default=512,
+        metadata={
+            "description": "Maximum number of answers kept before least recently used ones are evicted."
+        },
+    )
+
+    retrieval_cache_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether procedure retrieval results are reused for queries with a near-identical embedding."
+        },
+    )
+
+    retrieval_cache_similarity_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "Minimum cosine similarity between two queries for cached retrieval results to be reused."
+        },
+    )
+
+    retrieval_cache_max_entries: int = field(
+        default=2048,
+        metadata={
+            "description": "Maximum number of cached retrieval results before least recently used ones are evicted."
+        },
+    )
+
+    retrieval_cache_lsh_bits: int = field(
+        default=12,
+        metadata={
+            "description": "Random hyperplanes per LSH table bucketing cached query embeddings."
+        },
+    )
+
+    retrieval_cache_lsh_tables: int = field(
+        default=4,
+        metadata={
+            "description": "Number of LSH tables probed to find cached queries close to a new one."
+        },
+    )
+
+    context_neighbour_span: int = field(
+        default=0,
+        metadata={
+            "description": "Chunks before and after each retrieved procedure chunk added to the PDF agent's "
+            "context from the precomputed reading order; 0 adds none."
+        },
+    )
+
+    embedding_cache_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether embeddings are cached on disk keyed by model name and content hash."
+        },
+    )
+
+    embedding_cache_lru_size: int = field(
+        default=4096,
+        metadata={
+            "description": "Number of embeddings kept in the in-process LRU in front of the on-disk cache."
+        },
+    )
+
+    embedding_batch_size: int = field(
+        default=32,
+        metadata={
+            "description": "Maximum number of texts sent to the embedding model in a single call."
+        },
+    )
+
+    embedding_batch_max_wait_ms: float = field(
+        default=5.0,
+        metadata={
+            "description": "How long concurrent query embeddings wait to be coalesced into one batch."
+        },
+    )
+
+    ingestion_chunk_size: int = field(
+        default=200,
+        metadata={
+            "description": "Maximum number of characters per chunk when splitting procedure PDFs."
+        },
+    )
+
+    ingestion_chunk_overlap: int = field(
+        default=20,
+        metadata={
+            "description": "Number of characters shared by consecutive chunks of the same page."
+        },
+    )
+
+    ingestion_workers: int = field(
+        default=os.cpu_count() or 1,
+        metadata={
+            "description": "Number of processes used to extract text from PDF pages during ingestion."
+        },
+    )
+
+    ingestion_queue_size: int = field(
+        default=64,
+        metadata={
+            "description": "Capacity of the queues between ingestion stages; bounds memory and applies backpressure."
+        },
+    )
+
+    patient_history_limit: int = field(
+        default=20,
+        metadata={
+            "description": "Number of most recent health history events returned by the patient lookup fast path."
+        },
+    )
+
+    patient_exam_limit: int = field(
+        default=20,
+        metadata={
+            "description": "Number of most recent exams, with their results, returned by the patient lookup fast path."
+        },
+    )
+
+    patient_snapshot_cache_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether patient snapshots are reused while the patient's records are unchanged."
+        },
+    )
+
+    patient_snapshot_cache_max_entries: int = field(
+        default=256,
+        metadata={
+            "description": "Patient snapshots kept in memory before least recently used ones are evicted."
+        },
+    )
+
+    patient_snapshot_cache_spill: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether snapshots evicted from memory are kept in cache_dir; the file holds patient data."
+        },
+    )
+
+    phi_redaction_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether patient names are redacted from the prompts of agents that do not need them."
+        },
+    )
+
+    phi_names_refresh_seconds: float = field(
+        default=300.0,
+        metadata={
+            "description": "Minimum time between two reloads of the patient names used for PHI redaction."
+        },
+    )
+
+    tracing_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether spans for nodes, tools, LLM calls, retrieval and SQL are exported."
+        },
+    )
+
+    trace_export_path: str = field(
+        default=".cache/medical_agent/traces.jsonl",
+        metadata={
+            "description": "File that finished spans are appended to, one OTLP/JSON export request per line."
+        },
+    )
+
+    metrics_port: int = field(
+        default=0,
+        metadata={
+            "description": "Port serving span latency quantiles in Prometheus format at /metrics; 0 disables it."
+        },
+    )
+
+    llm_cost_per_1k_input_tokens: float = field(
+        default=0.0,
+        metadata={
+            "description": "Cost per thousand prompt tokens, recorded on LLM spans."
+        },
+    )
+
+    llm_cost_per_1k_output_tokens: float = field(
+        default=0.0,
+        metadata={
+            "description": "Cost per thousand completion tokens, recorded on LLM spans."
+        },
+    )
+
     def __post_init__(self) -> None:
         """Fetch env vars for attributes that were not passed as args."""
         for f in fields(self):
@@ -97,4 +656,13 @@ class Context:
                 continue
 
             if getattr(self, f.name) == f.default:
-                setattr(self, f.name, os.environ.get(f.name.upper(), f.default))
+                object.__setattr__(self, f.name, _coerce(os.environ.get(f.name.upper(), f.default), f.default))
+
+
+def _coerce(value, default):
+    """Convert an environment variable string to the type of the field default."""
+    if not isinstance(value, str) or default is None or isinstance(default, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
@@ -0,0 +1,198 @@
+"""Token-budgeted assembly of retrieved chunks into prompt context.
+
+Procedure chunks are small (200 characters with a 20-character overlap), so
+the hits for a query are often neighbours on the same page and repeat each
+other. Before they go into the prompt they pass through four steps:
+
+1. merge: chunks of the same source and page that overlap or touch (by their
+   `start_index`) are stitched into one passage;
+2. dedupe: passages whose word-shingle sets are near-identical to a better
+   ranked passage are dropped;
+3. rerank: passages are ordered by a cheap local score mixing query-term
+   coverage with their retrieval rank;
+4. pack: passages are added in score order until the token budget is used;
+   the first one that does not fit is cut at a word boundary.
+
+Tokens are estimated at four characters each, which is close enough for
+budgeting and costs nothing.
+"""
+
+import logging
+import math
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+from medical_agent.context import Context
+from medical_agent.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+SHINGLE_SIZE = 3
+# Weight of query-term coverage against the retrieval rank in the rerank score.
+COVERAGE_WEIGHT = 0.7
+# A cut passage shorter than this many tokens is not worth its header.
+MIN_PARTIAL_TOKENS = 32
+_CUT_MARKER = " ..."
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def source_label(doc: Document) -> Tuple[str, str]:
+    """Return the `(source, page)` a document is cited by."""
+    meta = doc.metadata or {}
+    source = (
+        meta.get("source")
+        or meta.get("filename")
+        or meta.get("title")
+        or meta.get("file_name")
+        or meta.get("document_id")
+        or "unknown-source"
+    )
+    page = meta.get("page")
+    if page is None:
+        page = meta.get("page_number")
+    return str(source), "unknown-page" if page is None else str(page)
+
+
+@dataclass
+class Passage:
+    """One or more merged chunks with the best retrieval rank among them."""
+
+    source: str
+    page: str
+    text: str
+    rank: int
+    start: Optional[int] = None
+    score: float = 0.0
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass
+class AssembledContext:
+    passages: List[Passage] = field(default_factory=list)
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def sources(self) -> List[str]:
+        """`source:page` citations of the packed passages, best first."""
+        return list(dict.fromkeys(f"{passage.source}:{passage.page}" for passage in self.passages))
+
+
+def merge_adjacent(docs: Sequence[Document]) -> List[Passage]:
+    """Stitch overlapping or touching chunks of the same source and page into passages."""
+    passages: List[Passage] = []
+    groups: Dict[Tuple[str, str], List[Passage]] = {}
+    for rank, doc in enumerate(docs):
+        source, page = source_label(doc)
+        start = (doc.metadata or {}).get("start_index")
+        passage = Passage(source, page, doc.page_content, rank, start if isinstance(start, int) else None)
+        if passage.start is None:
+            passages.append(passage)
+        else:
+            groups.setdefault((source, page), []).append(passage)
+
+    for group in groups.values():
+        group.sort(key=lambda passage: passage.start)
+        current = group[0]
+        for following in group[1:]:
+            gap = following.start - current.end
+            if gap > 1:
+                passages.append(current)
+                current = following
+                continue
+            if gap == 1:
+                # The splitter strips the separator between touching chunks.
+                current.text += " "
+            overlap = current.end - following.start
+            if overlap < len(following.text):
+                current.text += following.text[overlap:]
+            current.rank = min(current.rank, following.rank)
+        passages.append(current)
+
+    passages.sort(key=lambda passage: passage.rank)
+    return passages
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hashed word n-grams of `text`."""
+    words = tokenize(text)
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i : i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(passages: Sequence[Passage], threshold: float) -> List[Passage]:
+    """Keep each passage unless its shingles overlap a better ranked one's by `threshold` (Jaccard) or more."""
+    kept: List[Tuple[Passage, Set[int]]] = []
+    for passage in passages:
+        hashed = shingles(passage.text)
+        duplicate = any(
+            hashed and other and len(hashed & other) / len(hashed | other) >= threshold for _, other in kept
+        )
+        if not duplicate:
+            kept.append((passage, hashed))
+    return [passage for passage, _ in kept]
+
+
+def rerank(query: str, passages: Sequence[Passage]) -> List[Passage]:
+    """Order passages by query-term coverage, blended with their retrieval rank."""
+    terms = set(tokenize(query))
+    for passage in passages:
+        coverage = len(terms.intersection(tokenize(passage.text))) / len(terms) if terms else 0.0
+        passage.score = COVERAGE_WEIGHT * coverage + (1 - COVERAGE_WEIGHT) / (1 + passage.rank)
+    return sorted(passages, key=lambda passage: passage.score, reverse=True)
+
+
+def pack(passages: Sequence[Passage], budget: int) -> List[Passage]:
+    """Take passages in order while they fit in `budget` tokens, cutting the first one that does not."""
+    packed: List[Passage] = []
+    remaining = budget
+    for passage in passages:
+        if passage.tokens <= remaining:
+            packed.append(passage)
+            remaining -= passage.tokens
+            continue
+        if remaining >= MIN_PARTIAL_TOKENS:
+            # Leave room for the marker, so the cut passage still fits.
+            cut = passage.text[: remaining * CHARS_PER_TOKEN - len(_CUT_MARKER)].rsplit(" ", 1)[0]
+            packed.append(Passage(passage.source, passage.page, cut + _CUT_MARKER, passage.rank, passage.start, passage.score))
+        break
+    return packed
+
+
+def assemble_context(query: str, docs: Sequence[Document], context: Optional[Context] = None) -> AssembledContext:
+    """Merge, dedupe, rerank and pack retrieved documents for the prompt.
+
+    Args:
+        query (str): The user's query, used to rerank.
+        docs (Sequence[Document]): Retrieved documents, best first.
+        context (Optional[Context]): Agent context with the token budget and dedup threshold.
+    """
+    context = context or Context()
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    passages = merge_adjacent(docs)
+    passages = drop_near_duplicates(passages, context.context_dedup_threshold)
+    passages = pack(rerank(query, passages), context.context_token_budget)
+    assembled = AssembledContext(passages, tokens_before, sum(passage.tokens for passage in passages))
+    logger.info(
+        "Assembled context: %d chunk(s), ~%d tokens -> %d passage(s), ~%d tokens",
+        len(docs),
+        assembled.tokens_before,
+        len(passages),
+        assembled.tokens_after,
+    )
+    return assembled
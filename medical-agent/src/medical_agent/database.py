@@ -0,0 +1,313 @@
+"""Async, pooled access to the hospital MySQL database.
+
+Every query path (the patient lookup fast path and the SQL agent tools)
+shares one `DatabasePool` per event loop, so concurrent graph runs get their
+own connections instead of serialising on one, and no query blocks the loop.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+from mysql.connector import aio as mysql_aio
+from mysql.connector.errors import DatabaseError, OperationalError
+
+from medical_agent.context import Context
+from medical_agent.tracing import get_tracer, span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PooledConnection:
+    connection: Any
+    last_used: float = field(default_factory=time.monotonic)
+    # Prepared cursors keyed by SQL text. The connector only reuses a server-side
+    # statement when it is executed again with the very same string object, so
+    # the first string seen for each SQL text is kept alongside its cursor.
+    statements: Dict[str, Tuple[str, Any]] = field(default_factory=dict)
+
+    async def close(self) -> None:
+        for _, cursor in self.statements.values():
+            try:
+                await cursor.close()
+            except Exception:
+                pass
+        self.statements.clear()
+        try:
+            await self.connection.close()
+        except Exception:
+            logger.debug("Error while closing a pooled MySQL connection", exc_info=True)
+
+
+@dataclass
+class PoolStats:
+    """Counters of a `DatabasePool`."""
+
+    opened: int = 0
+    closed: int = 0
+    acquired: int = 0
+    waited: int = 0
+    health_check_failures: int = 0
+    timeouts: int = 0
+    statements_prepared: int = 0
+
+
+class DatabasePool:
+    """Bounded pool of async MySQL connections.
+
+    Connections are opened lazily up to `max_size` (the first `min_size` when the
+    pool is opened), pinged before reuse when they sat idle for longer than
+    `health_check_interval`, and discarded instead of returned when a query
+    times out or the connection fails. Each session also gets a server-side
+    `max_execution_time`, so a timed-out SELECT stops running on the server too.
+
+    Args:
+        host, port, user, password, database: Connection settings.
+        min_size (int): Connections opened up front by `open`.
+        max_size (int): Maximum number of connections checked out at once.
+        query_timeout (float): Default per-query timeout, in seconds.
+        health_check_interval (float): Idle time after which a connection is pinged before reuse.
+        stream_batch_size (int): Rows fetched per round-trip by `stream`.
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        database: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        query_timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+        stream_batch_size: int = 500,
+    ):
+        self._connect_args = {"host": host, "port": port, "user": user, "password": password, "database": database}
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.query_timeout = query_timeout
+        self.health_check_interval = health_check_interval
+        self.stream_batch_size = stream_batch_size
+        self.stats = PoolStats()
+        self._idle: Deque[_PooledConnection] = deque()
+        self._slots = asyncio.Semaphore(max_size)
+        self._closed = False
+
+    @classmethod
+    def from_context(cls, context: Context) -> "DatabasePool":
+        return cls(
+            host=context.db_host,
+            port=context.db_port,
+            user=context.db_user,
+            password=context.db_password,
+            database=context.db_name,
+            min_size=context.db_pool_min_size,
+            max_size=context.db_pool_max_size,
+            query_timeout=context.db_query_timeout_seconds,
+            health_check_interval=context.db_health_check_interval_seconds,
+            stream_batch_size=context.db_stream_batch_size,
+        )
+
+    async def open(self) -> None:
+        """Open `min_size` connections ahead of the first query."""
+        missing = self.min_size - len(self._idle)
+        if missing > 0:
+            self._idle.extend(await asyncio.gather(*(self._connect() for _ in range(missing))))
+
+    async def close(self) -> None:
+        """Close every idle connection; checked-out ones are closed on release."""
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.popleft())
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[_PooledConnection]:
+        """Check a healthy connection out of the pool for the duration of the block."""
+        if self._slots.locked():
+            self.stats.waited += 1
+        async with self._slots:
+            pooled = await self._checkout()
+            healthy = False
+            try:
+                yield pooled
+                healthy = True
+            except DatabaseError as exc:
+                # Errors reported by the server (bad SQL, constraint violations)
+                # leave the connection usable; transport failures do not.
+                healthy = not isinstance(exc, OperationalError)
+                raise
+            finally:
+                if healthy and not self._closed:
+                    pooled.last_used = time.monotonic()
+                    self._idle.append(pooled)
+                else:
+                    await self._discard(pooled)
+
+    async def fetch_all(
+        self, sql: str, params: Sequence[Any] = (), *, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Run a parameterized query as a server-side prepared statement and return its rows.
+
+        Statements are prepared once per connection and reused by later calls
+        with the same SQL text.
+        """
+        with span("sql", **{"db.system": "mysql", "db.statement": sql[:1000], "db.prepared": True}) as current:
+            async with self.connection() as pooled:
+                rows = await self._with_timeout(self._fetch_prepared(pooled, sql, params), timeout)
+            current.set(**{"db.response.returned_rows": len(rows)})
+            return rows
+
+    async def fetch_raw(
+        self, sql: str, *, max_rows: Optional[int] = None, timeout: Optional[float] = None
+    ) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """Run a one-off statement without preparing it; returns column names and rows.
+
+        With `max_rows`, the session's `sql_select_limit` makes the server stop
+        after `max_rows` rows, so a SELECT without a LIMIT of its own does not
+        transfer its whole result set. A LIMIT in the statement takes precedence;
+        only its first `max_rows` rows are returned.
+        """
+
+        async def run(pooled: _PooledConnection):
+            cursor = await pooled.connection.cursor(buffered=True)
+            try:
+                if max_rows:
+                    await cursor.execute(f"SET SESSION sql_select_limit = {int(max_rows)}")
+                try:
+                    await cursor.execute(sql)
+                    if not cursor.description:
+                        return [], []
+                    columns = [column[0] for column in cursor.description]
+                    rows = await cursor.fetchmany(max_rows) if max_rows else await cursor.fetchall()
+                    return columns, rows
+                finally:
+                    # A timed-out or broken connection is discarded; a healthy one must not keep the limit.
+                    if max_rows:
+                        await cursor.execute("SET SESSION sql_select_limit = DEFAULT")
+            finally:
+                await cursor.close()
+
+        with span("sql", **{"db.system": "mysql", "db.statement": sql[:1000], "db.prepared": False}) as current:
+            async with self.connection() as pooled:
+                columns, rows = await self._with_timeout(run(pooled), timeout)
+            current.set(**{"db.response.returned_rows": len(rows)})
+            return columns, rows
+
+    async def stream(
+        self,
+        sql: str,
+        params: Sequence[Any] = (),
+        *,
+        batch_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the rows of a large scan without buffering the whole result set.
+
+        Rows are read from an unbuffered cursor `batch_size` at a time; `timeout`
+        applies to each round-trip.
+        """
+        batch_size = batch_size or self.stream_batch_size
+        # Not made the current span: the generator yields to the caller while it is open.
+        tracer = get_tracer()
+        current = tracer.start_span("sql", **{"db.system": "mysql", "db.statement": sql[:1000], "db.streamed": True})
+        returned, error = 0, None
+        try:
+            async with self.connection() as pooled:
+                cursor = await pooled.connection.cursor(dictionary=True, buffered=False)
+                try:
+                    await self._with_timeout(cursor.execute(sql, tuple(params)), timeout)
+                    while rows := await self._with_timeout(cursor.fetchmany(batch_size), timeout):
+                        returned += len(rows)
+                        for row in rows:
+                            yield row
+                finally:
+                    await cursor.close()
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            current.set(**{"db.response.returned_rows": returned})
+            tracer.end_span(current, error)
+
+    async def _fetch_prepared(self, pooled: _PooledConnection, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        statement = pooled.statements.get(sql)
+        if statement is None:
+            cursor = await pooled.connection.cursor(prepared=True, dictionary=True)
+            statement = pooled.statements[sql] = (sql, cursor)
+            self.stats.statements_prepared += 1
+        operation, cursor = statement
+        await cursor.execute(operation, tuple(params))
+        return await cursor.fetchall()
+
+    async def _with_timeout(self, awaitable, timeout: Optional[float]):
+        try:
+            return await asyncio.wait_for(awaitable, timeout or self.query_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            # The protocol state is unknown after a cancelled read: let `connection` discard it.
+            raise OperationalError(msg=f"Query timed out after {timeout or self.query_timeout:.1f}s") from None
+
+    async def _checkout(self) -> _PooledConnection:
+        self.stats.acquired += 1
+        while self._idle:
+            pooled = self._idle.pop()
+            if time.monotonic() - pooled.last_used < self.health_check_interval:
+                return pooled
+            try:
+                await pooled.connection.ping(reconnect=False)
+                return pooled
+            except Exception:
+                self.stats.health_check_failures += 1
+                logger.info("Dropping a pooled MySQL connection that failed its health check")
+                await self._discard(pooled)
+        return await self._connect()
+
+    async def _connect(self) -> _PooledConnection:
+        connection = await mysql_aio.connect(**self._connect_args)
+        cursor = await connection.cursor()
+        try:
+            await cursor.execute(f"SET SESSION max_execution_time = {int(self.query_timeout * 1000)}")
+        finally:
+            await cursor.close()
+        self.stats.opened += 1
+        logger.debug("Opened MySQL connection %d of at most %d", self.stats.opened - self.stats.closed, self.max_size)
+        return _PooledConnection(connection)
+
+    async def _discard(self, pooled: _PooledConnection) -> None:
+        self.stats.closed += 1
+        await pooled.close()
+
+
+# Connections belong to the event loop that opened them, so pools are kept per loop.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, DatabasePool]]" = weakref.WeakKeyDictionary()
+
+
+def database_pool(context: Optional[Context] = None) -> DatabasePool:
+    """Return the pool shared by every query path running on the current event loop.
+
+    Args:
+        context (Optional[Context]): Agent context with the connection and pool settings.
+    """
+    context = context or Context()
+    key = (
+        context.db_host,
+        context.db_port,
+        context.db_user,
+        context.db_name,
+        context.db_pool_min_size,
+        context.db_pool_max_size,
+        context.db_query_timeout_seconds,
+    )
+    pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(key)
+    if pool is None:
+        pool = pools[key] = DatabasePool.from_context(context)
+    return pool
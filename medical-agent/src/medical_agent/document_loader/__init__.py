@@ -0,0 +1,3 @@
+from .manifest import IngestionManifest, PageRecord
+from .pipeline import IngestionPipeline, IngestionStats, chunk_id
+from .sinks import ChunkSink, CompositeSink, LexicalIndexSink, LexiconSink, LocalIndexSink, MongoChunkSink
@@ -0,0 +1,83 @@
+"""Command line entry point for directory-level PDF ingestion.
+
+Usage:
+    medical-agent-ingest db/medic-procedures
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from dataclasses import replace
+
+from medical_agent.context import Context
+from medical_agent.document_loader.pipeline import IngestionPipeline
+from medical_agent.document_loader.sinks import (
+    ChunkSink,
+    CompositeSink,
+    LexicalIndexSink,
+    LexiconSink,
+    LocalIndexSink,
+    MongoChunkSink,
+    NeighbourSink,
+)
+from medical_agent.embeddings import build_embeddings
+from medical_agent.lexicon import TermStore, term_store_path
+from medical_agent.neighbours import NeighbourStore, neighbour_store_path
+from medical_agent.vector_stores import lexical_index, procedure_vector_store
+
+
+def build_pipeline(context: Context) -> IngestionPipeline:
+    """Build an ingestion pipeline writing to the configured procedure vector store.
+
+    The BM25 lexical index used by hybrid retrieval, the term dictionary of
+    the fast input extractor and the chunk neighbours used to expand retrieved
+    context are always built alongside it.
+    """
+    vector_store = procedure_vector_store(context)
+    vector_sink: ChunkSink = (
+        LocalIndexSink(vector_store.index)
+        if context.vector_store_backend == "local"
+        else MongoChunkSink(vector_store)
+    )
+    sink = CompositeSink(
+        vector_sink,
+        LexicalIndexSink(lexical_index(context.lexical_index_path, context.cache_dir)),
+        LexiconSink(TermStore(term_store_path(context.cache_dir))),
+        NeighbourSink(NeighbourStore(neighbour_store_path(context.cache_dir))),
+    )
+    return IngestionPipeline(context, build_embeddings(context), sink)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Incrementally ingest procedure PDFs into the vector store.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories containing PDFs.")
+    parser.add_argument("--workers", type=int, help="Number of page extraction processes.")
+    parser.add_argument(
+        "--build-ann",
+        action="store_true",
+        help="(Re)build the IVF-PQ approximate index of the local backend after ingesting.",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    context = Context()
+    if args.workers:
+        context = replace(context, ingestion_workers=args.workers)
+    pipeline = build_pipeline(context)
+
+    for path in args.paths:
+        stats = pipeline.ingest_directory(path) if not path.lower().endswith(".pdf") else pipeline.ingest([path])
+        print(f"{path}: {stats.summary()}")
+
+    if args.build_ann:
+        if context.vector_store_backend != "local":
+            parser.error("--build-ann requires VECTOR_STORE_BACKEND=local")
+        index = pipeline.sink.sinks[0].index
+        ann = index.build_ann(nlist=context.ann_nlist, m=context.ann_pq_m)
+        print(f"Built IVF-PQ index: nlist={ann.nlist} m={ann.m} over {len(ann)} vectors")
+
+
+if __name__ == "__main__":
+    main()
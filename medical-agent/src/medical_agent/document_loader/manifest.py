@@ -0,0 +1,115 @@
+"""Ingestion manifest tracking per-file and per-page content hashes."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class PageRecord:
+    """What was last ingested for a single PDF page."""
+
+    page_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+class IngestionManifest:
+    """SQLite-backed record of what has already been ingested.
+
+    A file whose hash is unchanged is skipped without being opened. For a
+    changed file, only pages whose text hash differs are re-chunked and
+    re-embedded, and the chunk IDs stored per page let stale chunks be deleted.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                file_hash TEXT NOT NULL,
+                page_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                path TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                page_hash TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                PRIMARY KEY (path, page)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """Return the hash recorded for `path`, or None if it was never ingested."""
+        with self._lock:
+            row = self._conn.execute("SELECT file_hash FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def pages(self, path: str) -> Dict[int, PageRecord]:
+        """Return the recorded pages of `path` keyed by page number."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, page_hash, chunk_ids FROM pages WHERE path = ?", (path,)
+            ).fetchall()
+        return {page: PageRecord(page_hash, json.loads(chunk_ids)) for page, page_hash, chunk_ids in rows}
+
+    def record_page(self, path: str, page: int, record: PageRecord) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (path, page, page_hash, chunk_ids) VALUES (?, ?, ?, ?)",
+                (path, page, record.page_hash, json.dumps(record.chunk_ids)),
+            )
+            self._conn.commit()
+
+    def record_file(self, path: str, file_hash: str, page_count: int) -> List[str]:
+        """Record a fully ingested file and forget pages past its new end.
+
+        Returns:
+            List[str]: Chunk IDs of the dropped pages, which should be deleted from the store.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_ids FROM pages WHERE path = ? AND page >= ?", (path, page_count)
+            ).fetchall()
+            self._conn.execute("DELETE FROM pages WHERE path = ? AND page >= ?", (path, page_count))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, file_hash, page_count) VALUES (?, ?, ?)",
+                (path, file_hash, page_count),
+            )
+            self._conn.commit()
+        return [chunk_id for (chunk_ids,) in rows for chunk_id in json.loads(chunk_ids)]
+
+    def files(self) -> List[str]:
+        """Return the paths of every recorded file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM files UNION SELECT path FROM pages").fetchall()
+        return [path for (path,) in rows]
+
+    def remove_file(self, path: str) -> List[str]:
+        """Forget `path` and all its pages.
+
+        Returns:
+            List[str]: Chunk IDs of its pages, which should be deleted from the store.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_ids FROM pages WHERE path = ?", (path,)).fetchall()
+            self._conn.execute("DELETE FROM pages WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.commit()
+        return [chunk_id for (chunk_ids,) in rows for chunk_id in json.loads(chunk_ids)]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
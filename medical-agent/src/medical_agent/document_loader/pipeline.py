@@ -0,0 +1,348 @@
+"""Streaming, parallel and incremental PDF ingestion pipeline.
+
+Pages flow through four stages connected by bounded queues, so a slow stage
+applies backpressure to the ones before it instead of buffering whole PDFs:
+
+1. extract: page text is extracted in a process pool, a few pages ahead;
+2. chunk: pages whose text hash is unchanged are skipped, the rest are split;
+3. embed: chunks are embedded in batches;
+4. write: batches are bulk-upserted and the manifest is updated.
+
+A page that cannot be extracted is logged and skipped; its file is not
+recorded as ingested, so the next run retries it. `ingest_directory` also
+drops the chunks of PDFs that were removed from the directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from medical_agent.cache import content_hash, ingestion_generation
+from medical_agent.context import Context
+from medical_agent.document_loader.manifest import IngestionManifest, PageRecord
+from medical_agent.document_loader.sinks import ChunkSink
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def chunk_id(doc: Document) -> str:
+    """Derive a stable ID for a chunk so re-ingesting it upserts instead of duplicating."""
+    meta = doc.metadata or {}
+    key = f"{meta.get('source')}|{meta.get('page')}|{meta.get('start_index')}|{doc.page_content}"
+    return content_hash(key)
+
+
+def file_hash(path: Path) -> str:
+    """Hash a file in fixed-size blocks without reading it whole into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Worker processes keep their readers open so consecutive pages of a file are cheap.
+_readers: Dict[str, PdfReader] = {}
+
+
+def _extract_page(path: str, page: int) -> str:
+    reader = _readers.get(path)
+    if reader is None:
+        _readers.clear()
+        reader = _readers[path] = PdfReader(path)
+    return reader.pages[page].extract_text() or ""
+
+
+@dataclass
+class _Page:
+    path: str
+    page: int
+    text: str
+
+
+@dataclass
+class _PageDone:
+    path: str
+    page: int
+    record: PageRecord
+    stale_ids: List[str]
+
+
+@dataclass
+class _FileDone:
+    path: str
+    file_hash: str
+    page_count: int
+
+
+@dataclass
+class _WriteBatch:
+    chunks: List[tuple[str, Document]]
+    vectors: List[List[float]]
+    markers: List[Any]
+
+
+@dataclass
+class IngestionStats:
+    """Counters and throughput of an ingestion run."""
+
+    files_seen: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    files_removed: int = 0
+    pages: int = 0
+    pages_failed: int = 0
+    pages_changed: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    chunks_deleted: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    def rate(self, count: int) -> float:
+        return count / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.files_seen} file(s), {self.files_skipped} unchanged, {self.files_failed} failed, "
+            f"{self.files_removed} removed; "
+            f"{self.pages} page(s) ({self.pages_changed} changed, {self.pages_failed} failed) "
+            f"at {self.rate(self.pages):.1f} pages/s; "
+            f"{self.chunks} chunk(s) at {self.rate(self.chunks):.1f} chunks/s; "
+            f"{self.embeddings} embedding(s) at {self.rate(self.embeddings):.1f} embeddings/s; "
+            f"{self.chunks_deleted} stale chunk(s) deleted in {self.elapsed:.2f}s"
+        )
+
+
+class IngestionPipeline:
+    """Incrementally ingest PDFs into a chunk sink.
+
+    Args:
+        context (Context): Agent context with chunking, batching and cache settings.
+        embeddings (Embeddings): Embedder used for chunk texts.
+        sink (ChunkSink): Destination for embedded chunks.
+    """
+
+    def __init__(self, context: Context, embeddings: Embeddings, sink: ChunkSink):
+        self.context = context
+        self.embeddings = embeddings
+        self.sink = sink
+        self.manifest = IngestionManifest(Path(context.cache_dir) / "ingestion_manifest.sqlite3")
+        self.generation = ingestion_generation(context.cache_dir)
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=context.ingestion_chunk_size,
+            chunk_overlap=context.ingestion_chunk_overlap,
+            add_start_index=True,
+        )
+        self.stats = IngestionStats()
+
+    def ingest_directory(self, directory: str | os.PathLike[str]) -> IngestionStats:
+        """Ingest every PDF below `directory` and drop those no longer in it."""
+        root = Path(directory).resolve()
+        paths = sorted(path.resolve() for path in root.rglob("*.pdf"))
+        present = {str(path) for path in paths}
+        removed = [path for path in self.manifest.files() if Path(path).is_relative_to(root) and path not in present]
+        return self.ingest(paths, removed=removed)
+
+    def ingest(self, paths: Iterable[str | os.PathLike[str]], removed: Iterable[str] = ()) -> IngestionStats:
+        """Ingest `paths`, skipping unchanged files and pages.
+
+        Args:
+            paths (Iterable[str | os.PathLike[str]]): PDFs to ingest.
+            removed (Iterable[str]): Previously ingested PDFs whose chunks and manifest records are dropped.
+        """
+        self.stats = IngestionStats()
+        size = self.context.ingestion_queue_size
+        pages: queue.Queue = queue.Queue(maxsize=size)
+        chunks: queue.Queue = queue.Queue(maxsize=size * 4)
+        batches: queue.Queue = queue.Queue(maxsize=4)
+        errors: List[BaseException] = []
+
+        stages = [
+            threading.Thread(target=self._run_stage, args=(self._chunk_stage, pages, chunks, errors), name="ingest-chunk"),
+            threading.Thread(target=self._run_stage, args=(self._embed_stage, chunks, batches, errors), name="ingest-embed"),
+            threading.Thread(target=self._run_stage, args=(self._write_stage, batches, None, errors), name="ingest-write"),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.context.ingestion_workers) as pool:
+                for item in self._extract_stage(paths, pool):
+                    if errors:
+                        break
+                    pages.put(item)
+        finally:
+            pages.put(_DONE)
+            for stage in stages:
+                stage.join()
+
+        if errors:
+            raise errors[0]
+
+        for path in removed:
+            stale = self.manifest.remove_file(path)
+            if stale:
+                self.sink.delete(stale)
+                self.stats.chunks_deleted += len(stale)
+            self.stats.files_removed += 1
+            logger.info("Dropped %d chunk(s) of removed file %s", len(stale), path)
+
+        self.sink.flush()
+        self.stats.elapsed = time.perf_counter() - self.stats.started_at
+        if self.stats.pages_changed or self.stats.chunks_deleted:
+            self.generation.bump()
+        logger.info("Ingestion finished: %s", self.stats.summary())
+        return self.stats
+
+    def _run_stage(
+        self,
+        stage: Callable[[Iterator[Any], Callable[[Any], None]], None],
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        errors: List[BaseException],
+    ) -> None:
+        def items() -> Iterator[Any]:
+            while (item := inbox.get()) is not _DONE:
+                yield item
+
+        emit = outbox.put if outbox is not None else (lambda item: None)
+        try:
+            stage(items(), emit)
+        except BaseException as exc:
+            logger.exception("Ingestion stage %s failed", threading.current_thread().name)
+            errors.append(exc)
+            # Keep draining so upstream stages never block on a full queue.
+            for _ in items():
+                pass
+        finally:
+            if outbox is not None:
+                outbox.put(_DONE)
+
+    def _extract_stage(self, paths: Iterable[str | os.PathLike[str]], pool: ProcessPoolExecutor) -> Iterator[Any]:
+        window = self.context.ingestion_workers * 2
+        for raw_path in paths:
+            path = Path(raw_path).resolve()
+            self.stats.files_seen += 1
+            digest = file_hash(path)
+            if self.manifest.file_hash(str(path)) == digest:
+                self.stats.files_skipped += 1
+                logger.debug("Skipping unchanged file %s", path)
+                continue
+
+            try:
+                page_count = len(PdfReader(path).pages)
+            except Exception:
+                self.stats.files_failed += 1
+                logger.warning("Could not open %s; skipping it", path, exc_info=True)
+                continue
+            failed_before = self.stats.pages_failed
+            in_flight: deque = deque()
+            for page in range(page_count):
+                in_flight.append((page, pool.submit(_extract_page, str(path), page)))
+                if len(in_flight) >= window:
+                    yield from self._extracted(str(path), *in_flight.popleft())
+            while in_flight:
+                yield from self._extracted(str(path), *in_flight.popleft())
+            if self.stats.pages_failed > failed_before:
+                # Not recorded as ingested, so the next run retries the failed pages.
+                self.stats.files_failed += 1
+                continue
+            yield _FileDone(str(path), digest, page_count)
+
+    def _extracted(self, path: str, page: int, future: Future) -> Iterator[_Page]:
+        try:
+            text = future.result()
+        except Exception:
+            self.stats.pages_failed += 1
+            logger.warning("Could not extract page %d of %s; skipping it", page, path, exc_info=True)
+            return
+        yield _Page(path, page, text)
+
+    def _chunk_stage(self, items: Iterator[Any], emit: Callable[[Any], None]) -> None:
+        known: Dict[str, Dict[int, PageRecord]] = {}
+        for item in items:
+            if isinstance(item, _FileDone):
+                known.pop(item.path, None)
+                emit(item)
+                continue
+
+            self.stats.pages += 1
+            if item.path not in known:
+                known[item.path] = self.manifest.pages(item.path)
+            previous = known[item.path].get(item.page)
+            page_hash = content_hash(item.text)
+            if previous is not None and previous.page_hash == page_hash:
+                continue
+
+            self.stats.pages_changed += 1
+            page_doc = Document(page_content=item.text, metadata={"source": item.path, "page": item.page})
+            splits = {chunk_id(doc): doc for doc in self.text_splitter.split_documents([page_doc])}
+            for cid, doc in splits.items():
+                emit((cid, doc))
+
+            stale = [cid for cid in (previous.chunk_ids if previous else []) if cid not in splits]
+            emit(_PageDone(item.path, item.page, PageRecord(page_hash, list(splits)), stale))
+
+    def _embed_stage(self, items: Iterator[Any], emit: Callable[[Any], None]) -> None:
+        batch_size = self.context.embedding_batch_size
+        pending_chunks: List[tuple[str, Document]] = []
+        pending_markers: List[Any] = []
+
+        def flush() -> None:
+            vectors = self.embeddings.embed_documents([doc.page_content for _, doc in pending_chunks]) if pending_chunks else []
+            self.stats.embeddings += len(vectors)
+            emit(_WriteBatch(list(pending_chunks), vectors, list(pending_markers)))
+            pending_chunks.clear()
+            pending_markers.clear()
+
+        for item in items:
+            if isinstance(item, tuple):
+                pending_chunks.append(item)
+                if len(pending_chunks) >= batch_size:
+                    flush()
+            else:
+                # Markers travel with the batch holding their page's last chunks.
+                pending_markers.append(item)
+        if pending_chunks or pending_markers:
+            flush()
+
+    def _write_stage(self, items: Iterator[Any], emit: Callable[[Any], None]) -> None:
+        for batch in items:
+            if batch.chunks:
+                self.sink.ensure_index(len(batch.vectors[0]))
+                self.sink.upsert(
+                    [cid for cid, _ in batch.chunks],
+                    [doc.page_content for _, doc in batch.chunks],
+                    batch.vectors,
+                    [doc.metadata for _, doc in batch.chunks],
+                )
+                self.stats.chunks += len(batch.chunks)
+
+            for marker in batch.markers:
+                stale: Sequence[str]
+                if isinstance(marker, _PageDone):
+                    stale = marker.stale_ids
+                    self.manifest.record_page(marker.path, marker.page, marker.record)
+                else:
+                    stale = self.manifest.record_file(marker.path, marker.file_hash, marker.page_count)
+                if stale:
+                    self.sink.delete(stale)
+                    self.stats.chunks_deleted += len(stale)
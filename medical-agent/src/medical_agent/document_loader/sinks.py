@@ -0,0 +1,177 @@
+"""Destinations the ingestion pipeline writes embedded chunks to."""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Protocol, Sequence
+
+from pymongo import DeleteMany, ReplaceOne
+
+from medical_agent.lexical_index import BM25Index
+from medical_agent.lexicon import TermStore
+from medical_agent.neighbours import NeighbourStore
+from medical_agent.vector_index import LocalVectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkSink(Protocol):
+    """A store that accepts embedded chunks in bulk."""
+
+    def ensure_index(self, dimensions: int) -> None:
+        """Create the search index if it does not exist yet."""
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Insert or replace the given chunks."""
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove the given chunks."""
+
+    def flush(self) -> None:
+        """Persist anything buffered once a run finishes."""
+
+
+class MongoChunkSink:
+    """Bulk-upsert chunks into the collection behind a `MongoDBAtlasVectorSearch`."""
+
+    def __init__(self, vector_store, text_key: str = "text", embedding_key: str = "embedding"):
+        self.vector_store = vector_store
+        self.collection = vector_store.collection
+        self.text_key = text_key
+        self.embedding_key = embedding_key
+        self._index_checked = False
+
+    def ensure_index(self, dimensions: int) -> None:
+        if self._index_checked:
+            return
+        index_name = self.vector_store._index_name
+        if not list(self.collection.list_search_indexes(index_name)):
+            self.vector_store.create_vector_search_index(dimensions=dimensions)
+            logger.info("MongoDB Vector Search index %s created.", index_name)
+        self._index_checked = True
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        operations: List[ReplaceOne] = [
+            ReplaceOne(
+                {"_id": chunk_id},
+                {"_id": chunk_id, self.text_key: text, self.embedding_key: list(vector), **metadata},
+                upsert=True,
+            )
+            for chunk_id, text, vector, metadata in zip(ids, texts, embeddings, metadatas)
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def delete(self, ids) -> None:
+        if ids:
+            self.collection.bulk_write([DeleteMany({"_id": {"$in": list(ids)}})])
+
+    def flush(self) -> None:
+        pass
+
+
+class LocalIndexSink:
+    """Append chunks to a `LocalVectorIndex`; deletes become tombstones."""
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    def ensure_index(self, dimensions: int) -> None:
+        if self.index.dimensions is None:
+            self.index.dimensions = dimensions
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        self.index.add(ids, embeddings, texts, metadatas)
+
+    def delete(self, ids) -> None:
+        self.index.delete(ids)
+
+    def flush(self) -> None:
+        # New rows are inserted into the ANN index incrementally; save it once per run.
+        self.index.save_ann()
+
+
+class LexicalIndexSink:
+    """Feed chunk texts into the BM25 index; embeddings are ignored."""
+
+    def __init__(self, index: BM25Index):
+        self.index = index
+
+    def ensure_index(self, dimensions: int) -> None:
+        pass
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        self.index.add(ids, texts, metadatas)
+
+    def delete(self, ids) -> None:
+        self.index.delete(ids)
+
+    def flush(self) -> None:
+        self.index.save()
+
+
+class LexiconSink:
+    """Mine symptom and disease terms from chunk texts into a `TermStore`; embeddings are ignored."""
+
+    def __init__(self, store: TermStore):
+        self.store = store
+
+    def ensure_index(self, dimensions: int) -> None:
+        pass
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        self.store.add(ids, texts)
+
+    def delete(self, ids) -> None:
+        self.store.delete(ids)
+
+    def flush(self) -> None:
+        pass
+
+
+class NeighbourSink:
+    """Record where each chunk sits in its source and renumber reading order once a run finishes."""
+
+    def __init__(self, store: NeighbourStore):
+        self.store = store
+
+    def ensure_index(self, dimensions: int) -> None:
+        pass
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        self.store.add(ids, metadatas)
+
+    def delete(self, ids) -> None:
+        self.store.delete(ids)
+
+    def flush(self) -> None:
+        self.store.rebuild()
+
+
+class CompositeSink:
+    """Write every batch to several sinks, e.g. a vector store and the lexical index."""
+
+    def __init__(self, *sinks: ChunkSink):
+        self.sinks = sinks
+
+    def ensure_index(self, dimensions: int) -> None:
+        for sink in self.sinks:
+            sink.ensure_index(dimensions)
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        for sink in self.sinks:
+            sink.upsert(ids, texts, embeddings, metadatas)
+
+    def delete(self, ids) -> None:
+        for sink in self.sinks:
+            sink.delete(ids)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
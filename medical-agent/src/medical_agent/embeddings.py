@@ -0,0 +1,183 @@
+"""Embedding wrappers that cache and batch calls to the embedding model."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from medical_agent.cache import EmbeddingCache, content_hash
+from medical_agent.context import Context
+from medical_agent.tracing import span
+from medical_agent.utils import load_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbeddings(Embeddings):
+    """Coalesce concurrent embedding calls into batched requests.
+
+    Query embeddings issued from different threads are queued and flushed
+    together once `batch_size` requests are waiting or `max_wait_ms` has
+    elapsed since the first one arrived. Document embeddings are split into
+    `batch_size` slices so a large ingestion never sends one huge request.
+    """
+
+    def __init__(self, inner: Embeddings, batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.inner = inner
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.calls = 0
+        # Guards the counter, which caller threads and the batching worker both update.
+        self._lock = threading.Lock()
+
+        self._queue: queue.Queue[Tuple[str, Future]] = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            with self._lock:
+                self.calls += 1
+            batch = texts[start:start + self.batch_size]
+            with span("embedding embed_documents", **{"embedding.texts": len(batch)}):
+                batch_vectors = self.inner.embed_documents(batch)
+            _check_count(batch, batch_vectors)
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # The span covers the wait for the coalesced batch as well as the model call.
+        with span("embedding embed_query", **{"embedding.texts": 1}):
+            future: Future = Future()
+            self._queue.put((text, future))
+            return future.result()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                with self._lock:
+                    self.calls += 1
+                vectors = self.inner.embed_documents(texts)
+                # A short response cannot be matched to its texts, so no query gets a vector.
+                _check_count(texts, vectors)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            logger.debug("Embedded %d coalesced queries in one call", len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+def _check_count(texts: List[str], vectors: List[List[float]]) -> None:
+    if len(vectors) != len(texts):
+        raise ValueError(f"Embedding model returned {len(vectors)} vector(s) for {len(texts)} text(s)")
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve embeddings from an `EmbeddingCache` and only embed unseen texts.
+
+    Texts are keyed by `(model_name, sha256(text))`, so re-ingesting an
+    unchanged document or repeating a query costs no embedding call.
+    """
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.inner = inner
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        found = self.cache.get_many(self.model_name, hashes)
+
+        # Embed each distinct missing text once, even if it repeats in the batch.
+        pending: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                pending.setdefault(h, text)
+
+        with self._lock:
+            self.hits += len(texts) - sum(1 for h in hashes if h not in found)
+            self.misses += len(pending)
+
+        if pending:
+            vectors = self.inner.embed_documents(list(pending.values()))
+            fresh = {h: np.asarray(v, dtype=np.float32) for h, v in zip(pending.keys(), vectors)}
+            self.cache.put_many(self.model_name, fresh)
+            found.update(fresh)
+
+        return [found[h].tolist() for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        h = content_hash(text)
+        found = self.cache.get_many(self.model_name, [h])
+        if h in found:
+            with self._lock:
+                self.hits += 1
+            return found[h].tolist()
+
+        with self._lock:
+            self.misses += 1
+        vector = np.asarray(self.inner.embed_query(text), dtype=np.float32)
+        self.cache.put_many(self.model_name, {h: vector})
+        return vector.tolist()
+
+
+@lru_cache(maxsize=None)
+def _shared_embeddings(
+    model_name: str,
+    cache_path: str | None,
+    lru_size: int,
+    batch_size: int,
+    max_wait_ms: float,
+) -> Embeddings:
+    embeddings: Embeddings = BatchingEmbeddings(
+        load_embeddings(model_name), batch_size=batch_size, max_wait_ms=max_wait_ms
+    )
+    if cache_path is not None:
+        embeddings = CachedEmbeddings(embeddings, EmbeddingCache(cache_path, lru_size), model_name)
+    return embeddings
+
+
+def build_embeddings(context: Context) -> Embeddings:
+    """Return the process-wide cached, batching embedder configured by `context`.
+
+    Args:
+        context (Context): The agent context holding the embedding settings.
+    """
+    cache_path = (
+        str(Path(context.cache_dir) / "embeddings.sqlite3") if context.embedding_cache_enabled else None
+    )
+    return _shared_embeddings(
+        context.embedding_model,
+        cache_path,
+        context.embedding_cache_lru_size,
+        context.embedding_batch_size,
+        context.embedding_batch_max_wait_ms,
+    )
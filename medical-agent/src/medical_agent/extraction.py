@@ -0,0 +1,228 @@
+"""Deterministic extraction of `UserInputInfo` ahead of the LLM.
+
+Most questions are short and plainly structured ("patient João Silva, fever
+and cough"), so `FastExtractor` fills `UserInputInfo` from dictionaries and
+only leaves the input to the normalization LLM call when it cannot explain it:
+
+- symptoms and diseases come from the seed vocabulary and the terms mined from
+  the procedure PDFs (`medical_agent.lexicon`), exam names from the
+  `exams_available` catalog, all matched in one pass by an Aho-Corasick
+  automaton (accent and case insensitive, on word boundaries);
+- patients are matched against an in-memory index of `patients.full_name`:
+  full names anywhere in the text, or a unique name starting with the words
+  after a cue such as "patient" or "paciente" ("patient João" finds "João
+  Silva" if no other patient is called João).
+
+The result is used when no more than a small share of the words is left
+unexplained (`fast_extraction_min_coverage`) and the patient is unambiguous.
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from medical_agent.agents.custom_guardrail.rules import GuardrailEngine, GuardrailRule, RuleMatch, fold
+from medical_agent.context import Context
+from medical_agent.lexicon import SEED_DISEASES, SEED_SYMPTOMS, TermStore, term_store_path
+from medical_agent.patient_queries import exam_names, patient_names
+from medical_agent.schemas import UserInputInfo
+from medical_agent.tracing import label_value, register_metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[^\W_]+(?:[-'][^\W_]+)*")
+_CUE_RE = re.compile(r"\b(?:patient|paciente|pt|sr|sra|mr|mrs|ms|dona|seu)\b[.:]?\s+")
+_MAX_NAME_WORDS = 5
+
+# Connecting words that carry no information of their own (folded).
+FILLER_WORDS = frozenset(
+    """
+    patient paciente pt sr sra mr mrs ms dona seu with and or has have having is are was the a an of
+    for on in to his her their reports reporting complains complaining presents presenting showing
+    symptoms symptom since days day weeks week exam exams test tests about
+    com e ou tem teve esta estava apresenta apresentando relata relatando sente sentindo queixa
+    queixando de do da dos das o a os as um uma no na nos nas para sobre sintomas sintoma desde
+    dias dia semanas semana exame exames
+    """.split()
+)
+
+
+class FastExtractor:
+    """Fill `UserInputInfo` from dictionaries when the input is simple enough.
+
+    Args:
+        context (Context): Agent context with the database and extraction settings.
+    """
+
+    def __init__(self, context: Context):
+        self.context = context
+        self.engine = GuardrailEngine(
+            (
+                GuardrailRule("symptom", SEED_SYMPTOMS),
+                GuardrailRule("disease", SEED_DISEASES),
+                GuardrailRule("exam", ()),
+                GuardrailRule("patient", ()),
+            )
+        )
+        # Folded full name -> full name, and the folded names sorted for prefix lookups.
+        self._names: Dict[str, str] = {}
+        self._sorted_names: List[str] = []
+        self._store: Optional[TermStore] = None
+        self._loaded_at = float("-inf")
+        self.hits = 0
+        self.fallbacks = 0
+        self.name = f"{context.db_user}@{context.db_host}:{context.db_port}/{context.db_name}"
+        register_metrics(f"fast_extraction:{self.name}", self.prometheus)
+
+    async def refresh(self) -> None:
+        """Reload patient names, exam names and mined terms if the refresh interval has passed."""
+        now = time.monotonic()
+        if now - self._loaded_at < self.context.phi_names_refresh_seconds:
+            return
+        # Set before awaiting so concurrent calls do not all reload.
+        self._loaded_at = now
+        names, exams, mined = await asyncio.gather(
+            patient_names(self.context),
+            exam_names(self.context),
+            asyncio.to_thread(self._mined_terms),
+            return_exceptions=True,
+        )
+        if isinstance(mined, BaseException):
+            logger.warning("Could not load the mined procedure terms: %s", mined)
+        else:
+            symptoms = {fold(term) for term in SEED_SYMPTOMS}
+            self.engine.set_patterns("disease", [*SEED_DISEASES, *(term for term in mined if fold(term) not in symptoms)])
+        if isinstance(exams, BaseException):
+            logger.warning("Could not load the exam catalog: %s", exams)
+        else:
+            self.engine.set_patterns("exam", exams)
+        if isinstance(names, BaseException):
+            logger.warning("Could not load patient names: %s", names)
+        else:
+            self._names = {fold(name.strip()): name.strip() for name in names if name.strip()}
+            self._sorted_names = sorted(self._names)
+            self.engine.set_patterns("patient", names)
+
+    def _mined_terms(self) -> List[str]:
+        if self._store is None:
+            self._store = TermStore(term_store_path(self.context.cache_dir))
+        return self._store.terms()
+
+    def extract(self, text: str, previous_patient: str = "") -> Optional[UserInputInfo]:
+        """Return the information in `text`, or None if the LLM should extract it.
+
+        Args:
+            text (str): The user's latest message.
+            previous_patient (str): Patient named earlier in the conversation, kept when `text` names none.
+        """
+        matches = _leftmost_longest(self.engine.scan(text))
+        spans = [(match.start, match.end) for match in matches]
+        patients = {self._names.get(fold(match.text), match.text) for match in matches if match.rule == "patient"}
+        if not patients:
+            cue = _CUE_RE.search(fold(text))
+            following = _WORD_RE.search(fold(text), cue.end()) if cue else None
+            # "patient with fever" names nobody.
+            if following is not None and following.group() not in FILLER_WORDS:
+                resolved = self._name_after(text, cue.end())
+                if resolved is None:
+                    # Someone is named but is unknown or ambiguous: let the LLM read it.
+                    self.fallbacks += 1
+                    return None
+                name, span = resolved
+                patients.add(name)
+                spans.append(span)
+        if len(patients) > 1 or not spans or self._coverage(text, spans) < self.context.fast_extraction_min_coverage:
+            self.fallbacks += 1
+            return None
+
+        self.hits += 1
+        symptoms = _unique(match.text.lower() for match in matches if match.rule == "symptom")
+        diseases = _unique(match.text.lower() for match in matches if match.rule == "disease")
+        return UserInputInfo(
+            patient_name=next(iter(patients), previous_patient),
+            symptoms=symptoms,
+            disease_name=diseases[0] if diseases else "",
+            condition=", ".join(diseases[1:]),
+            original_input=text,
+            summary=text.strip(),
+        )
+
+    def _name_after(self, text: str, position: int) -> Optional[Tuple[str, Tuple[int, int]]]:
+        """Resolve the words at `position` to the one patient whose name starts with the most of them.
+
+        Returns:
+            The full name and the span of the words, or None if no patient or several patients match.
+        """
+        folded = fold(text)
+        words = list(_WORD_RE.finditer(folded, position))[:_MAX_NAME_WORDS]
+        for count in range(len(words), 0, -1):
+            span = (words[0].start(), words[count - 1].end())
+            found = self._names_starting_with(folded[span[0] : span[1]])
+            if len(found) == 1:
+                return self._names[found[0]], span
+            if len(found) > 1:
+                return None
+        return None
+
+    def _names_starting_with(self, prefix: str, limit: int = 2) -> List[str]:
+        found = []
+        index = bisect.bisect_left(self._sorted_names, prefix)
+        while index < len(self._sorted_names) and self._sorted_names[index].startswith(prefix):
+            name = self._sorted_names[index]
+            if len(name) == len(prefix) or name[len(prefix)] == " ":
+                found.append(name)
+                if len(found) >= limit:
+                    break
+            index += 1
+        return found
+
+    @staticmethod
+    def _coverage(text: str, spans: List[Tuple[int, int]]) -> float:
+        """Share of the informative words of `text` that fall inside a matched span."""
+        covered = unknown = 0
+        for word in _WORD_RE.finditer(text):
+            if any(start <= word.start() and word.end() <= end for start, end in spans):
+                covered += 1
+            elif fold(word.group()) not in FILLER_WORDS:
+                unknown += 1
+        return covered / (covered + unknown) if covered + unknown else 0.0
+
+    def prometheus(self) -> str:
+        label = f'extractor="{label_value(self.name)}"'
+        return (
+            f"medical_agent_fast_extraction_hits_total{{{label}}} {self.hits}\n"
+            f"medical_agent_fast_extraction_fallbacks_total{{{label}}} {self.fallbacks}\n"
+        )
+
+
+def _leftmost_longest(matches: List[RuleMatch]) -> List[RuleMatch]:
+    selected, position = [], 0
+    for match in sorted(matches, key=lambda match: (match.start, -match.end)):
+        if match.start >= position:
+            selected.append(match)
+            position = match.end
+    return selected
+
+
+def _unique(values) -> List[str]:
+    seen: Set[str] = set()
+    return [value for value in values if not (value in seen or seen.add(value))]
+
+
+_extractors: Dict[Tuple[str, float, float], FastExtractor] = {}
+
+
+def fast_extractor(context: Context) -> FastExtractor:
+    """Return the extractor shared by every run with the same database and extraction settings."""
+    key = (
+        f"{context.db_user}@{context.db_host}:{context.db_port}/{context.db_name}|{context.cache_dir}",
+        context.phi_names_refresh_seconds,
+        context.fast_extraction_min_coverage,
+    )
+    extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = _extractors[key] = FastExtractor(context)
+    return extractor
@@ -1,20 +1,36 @@
-from os import name
-
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 
+from medical_agent.checkpointer import build_checkpointer
 from medical_agent.context import Context
 from medical_agent.state import InputState, MedicalState
+from medical_agent.tracing import install_tracing
+
+from medical_agent.nodes import (
+    gather_patient_info,
+    gather_procedure_guidelines,
+    normalize_user_input,
+    planning,
+    router,
+)
 
-from medical_agent.nodes import normalize_user_input, planning, planning
+install_tracing()
 
 builder = StateGraph(MedicalState, input_schema=InputState, context_schema=Context)
 
 builder.add_node(normalize_user_input)
 builder.add_node(planning)
+builder.add_node(gather_patient_info)
+builder.add_node(gather_procedure_guidelines)
 
 builder.add_edge(START, "normalize_user_input")
 builder.add_edge("normalize_user_input", "planning")
-builder.add_edge("planning", END)
+# Patient and procedure branches fan out in parallel when both are required.
+builder.add_conditional_edges(
+    "planning", router, ["gather_patient_info", "gather_procedure_guidelines", END]
+)
+builder.add_edge("gather_patient_info", END)
+builder.add_edge("gather_procedure_guidelines", END)
 
-graph = builder.compile(name)
\ No newline at end of file
+# None unless `CHECKPOINT_PATH` is set; the LangGraph server uses its own persistence.
+graph = builder.compile(name="medical_agent", checkpointer=build_checkpointer(Context()))
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""Lexical BM25 inverted index over procedure chunks."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from medical_agent.cache.generation import IngestionGeneration
+
+logger = logging.getLogger(__name__)
+
+# Keeps codes such as "a41.9", "i21" or "covid-19" as single tokens.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOP_WORDS = frozenset(
+    """
+    a o as os e de da do das dos em no na nos nas um uma uns umas para por com sem que se ao aos
+    the of and or in on to for with without is are be by an at as it this that from
+    """.split()
+)
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents so 'Pressão' and 'pressao' match."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into folded terms, dropping stop words."""
+    return [token for token in _TOKEN_RE.findall(fold(text)) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """BM25 index with postings stored as compact CSR arrays.
+
+    Each term maps to a slice of two parallel arrays: `uint32` document
+    numbers and `uint16` term frequencies. The per-document length
+    normalisation `k1 * (1 - b + b * len / avgdl)` is precomputed, so scoring
+    a query term is one vectorised expression over its posting slice.
+
+    New documents are buffered in memory and merged into the arrays on
+    `save`; deleted documents are tombstoned. Chunk text and metadata are
+    kept in a JSONL sidecar so lexical hits can be returned as Documents.
+
+    Given the ingestion `generation`, the saved index is re-read when the
+    generation changes, so a server sees what a later ingestion run wrote.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        k1: float = 1.2,
+        b: float = 0.75,
+        generation: Optional[IngestionGeneration] = None,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._generation = generation
+        self._seen_generation = generation.current() if generation else 0
+        self._open()
+
+    def _open(self) -> None:
+        self._terms: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._doc_nos = np.empty(0, dtype=np.uint32)
+        self._tfs = np.empty(0, dtype=np.uint16)
+        self._lengths = np.empty(0, dtype=np.uint32)
+        self._alive = np.empty(0, dtype=bool)
+        self._offsets = np.empty(0, dtype=np.uint64)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+        self._pending: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._pending_lengths: List[int] = []
+        self._pending_offsets: List[int] = []
+        self._norms: Optional[np.ndarray] = None
+        self._dirty = False
+
+        if (self.path / "postings.npz").exists():
+            self._load()
+
+    def reload(self) -> None:
+        """Re-read the saved index, picking up documents added and deleted by another process.
+
+        Documents buffered in this process and not saved yet are dropped.
+        """
+        with self._lock:
+            self._open()
+            logger.info("Reloaded BM25 index at %s with %d documents", self.path, len(self))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Index chunks, replacing earlier versions with the same ID."""
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock, open(self.path / "docs.jsonl", "ab") as docs:
+            offset = docs.tell()
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._tombstone(doc_id)
+                doc_no = len(self._ids)
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    self._pending[term].append((doc_no, min(tf, 65535)))
+                self._pending_lengths.append(sum(terms.values()))
+
+                line = json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+                docs.write(line)
+                self._pending_offsets.append(offset)
+                offset += len(line)
+
+                self._ids.append(doc_id)
+                self._rows[doc_id] = doc_no
+            self._norms = None
+            self._dirty = True
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Tombstone the given chunk IDs."""
+        with self._lock:
+            for doc_id in ids:
+                self._tombstone(doc_id)
+            self._dirty = True
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Return `(doc_no, score)` for the `k` best matching live documents."""
+        terms = set(tokenize(query))
+        self._check_generation()
+        with self._lock:
+            self._merge_pending()
+            if not terms or not len(self._alive):
+                return []
+            norms = self._length_norms()
+            n_docs = int(self._alive.sum())
+            scores = np.zeros(len(self._alive), dtype=np.float32)
+
+            for term in terms:
+                slot = self._terms.get(term)
+                if slot is None:
+                    continue
+                start, end = self._indptr[slot], self._indptr[slot + 1]
+                doc_nos = self._doc_nos[start:end]
+                tfs = self._tfs[start:end].astype(np.float32)
+                df = end - start
+                idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+                scores[doc_nos] += idf * tfs * (self.k1 + 1.0) / (tfs + norms[doc_nos])
+
+            scores[~self._alive] = 0.0
+            candidates = np.flatnonzero(scores > 0)
+            if not len(candidates):
+                return []
+            k = min(k, len(candidates))
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [(int(doc_no), float(scores[doc_no])) for doc_no in top]
+
+    def documents(self, doc_nos: Iterable[int]) -> List[Document]:
+        """Load the chunks for `doc_nos` from the sidecar."""
+        results = []
+        with self._lock, open(self.path / "docs.jsonl", "rb") as docs:
+            self._merge_pending()
+            for doc_no in doc_nos:
+                docs.seek(int(self._offsets[doc_no]))
+                record = json.loads(docs.readline())
+                results.append(Document(id=record["id"], page_content=record["text"], metadata=record["metadata"]))
+        return results
+
+    def save(self) -> None:
+        """Merge buffered documents into the posting arrays and persist them."""
+        with self._lock:
+            self._merge_pending()
+            if not self._dirty:
+                return
+            terms = sorted(self._terms, key=self._terms.get)
+            tmp_path = self.path / "postings.tmp.npz"
+            np.savez(
+                tmp_path,
+                indptr=self._indptr,
+                doc_nos=self._doc_nos,
+                tfs=self._tfs,
+                lengths=self._lengths,
+                alive=self._alive,
+                offsets=self._offsets,
+            )
+            os.replace(tmp_path, self.path / "postings.npz")
+            (self.path / "vocab.json").write_text(json.dumps(terms, ensure_ascii=False))
+            (self.path / "ids.txt").write_text("".join(doc_id + "\n" for doc_id in self._ids))
+            self._dirty = False
+            logger.info("Saved BM25 index with %d documents and %d terms", len(self), len(terms))
+
+    def _check_generation(self) -> None:
+        if self._generation is None:
+            return
+        current = self._generation.current()
+        if current != self._seen_generation:
+            with self._lock:
+                if current != self._seen_generation:
+                    self._seen_generation = current
+                    self.reload()
+
+    def _tombstone(self, doc_id: str) -> None:
+        doc_no = self._rows.pop(doc_id, None)
+        if doc_no is None:
+            return
+        if doc_no < len(self._alive):
+            self._alive[doc_no] = False
+            # avgdl is taken over live documents only.
+            self._norms = None
+        else:
+            # Still pending: zero its length so the merge marks it dead.
+            self._pending_lengths[doc_no - len(self._alive)] = -1
+
+    def _merge_pending(self) -> None:
+        if not self._pending_lengths:
+            return
+        base = len(self._alive)
+        lengths = np.asarray(self._pending_lengths, dtype=np.int64)
+        alive = lengths >= 0
+        self._lengths = np.concatenate([self._lengths, np.maximum(lengths, 0).astype(np.uint32)])
+        self._alive = np.concatenate([self._alive, alive])
+        self._offsets = np.concatenate([self._offsets, np.asarray(self._pending_offsets, dtype=np.uint64)])
+
+        for term in self._pending:
+            if term not in self._terms:
+                self._terms[term] = len(self._terms)
+
+        # Rebuild the CSR arrays with old postings first, then the new ones, per term.
+        old_counts = np.diff(self._indptr)
+        counts = np.zeros(len(self._terms), dtype=np.int64)
+        counts[: len(old_counts)] = old_counts
+        for term, postings in self._pending.items():
+            counts[self._terms[term]] += len(postings)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        doc_nos = np.empty(indptr[-1], dtype=np.uint32)
+        tfs = np.empty(indptr[-1], dtype=np.uint16)
+
+        for slot in range(len(old_counts)):
+            start, end = self._indptr[slot], self._indptr[slot + 1]
+            doc_nos[indptr[slot]:indptr[slot] + end - start] = self._doc_nos[start:end]
+            tfs[indptr[slot]:indptr[slot] + end - start] = self._tfs[start:end]
+        for term, postings in self._pending.items():
+            slot = self._terms[term]
+            end = indptr[slot + 1]
+            start = end - len(postings)
+            doc_nos[start:end] = [doc_no for doc_no, _ in postings]
+            tfs[start:end] = [tf for _, tf in postings]
+
+        self._indptr, self._doc_nos, self._tfs = indptr, doc_nos, tfs
+        self._pending.clear()
+        self._pending_lengths.clear()
+        self._pending_offsets.clear()
+        self._norms = None
+        logger.debug("Merged %d pending documents into the BM25 index", len(self._alive) - base)
+
+    def _length_norms(self) -> np.ndarray:
+        if self._norms is None:
+            live_lengths = self._lengths[self._alive]
+            avgdl = float(live_lengths.mean()) if len(live_lengths) else 1.0
+            self._norms = (self.k1 * (1.0 - self.b + self.b * self._lengths / max(avgdl, 1.0))).astype(np.float32)
+        return self._norms
+
+    def _load(self) -> None:
+        with np.load(self.path / "postings.npz") as data:
+            self._indptr = data["indptr"]
+            self._doc_nos = data["doc_nos"]
+            self._tfs = data["tfs"]
+            self._lengths = data["lengths"]
+            self._alive = data["alive"].copy()
+            self._offsets = data["offsets"]
+        terms = json.loads((self.path / "vocab.json").read_text())
+        self._terms = {term: slot for slot, term in enumerate(terms)}
+        self._ids = (self.path / "ids.txt").read_text().splitlines()
+        self._rows = {doc_id: doc_no for doc_no, doc_id in enumerate(self._ids) if self._alive[doc_no]}
@@ -0,0 +1,175 @@
+"""Dictionary of symptoms and diseases used by the fast input extractor.
+
+The dictionary combines a seed vocabulary of common symptoms and diseases
+(Portuguese and English) with terms mined from the procedure PDFs: the
+bullet items under their "Indication", "Contraindication" and "Complication"
+headings ("Urinary retention", "Prostate cancer", "Cellulitis", ...).
+
+Mined terms are stored per chunk by `TermStore`, which the ingestion
+pipeline feeds through `LexiconSink`, so re-ingesting a changed page replaces
+its terms and a deleted chunk takes its terms with it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+SEED_SYMPTOMS = (
+    "febre", "fever", "tosse", "cough", "dor de cabeça", "cefaleia", "headache", "dor no peito",
+    "dor torácica", "chest pain", "dor abdominal", "abdominal pain", "dor nas costas", "back pain",
+    "dor de garganta", "sore throat", "falta de ar", "dispneia", "shortness of breath", "dyspnoea",
+    "dyspnea", "náusea", "nausea", "vômito", "vomito", "vomiting", "diarreia", "diarrhoea", "diarrhea",
+    "tontura", "dizziness", "fadiga", "cansaço", "fatigue", "calafrios", "chills", "coriza",
+    "runny nose", "congestão nasal", "nasal congestion", "palpitações", "palpitations", "desmaio",
+    "síncope", "syncope", "fainting", "sangramento", "bleeding", "hematoma", "haematoma", "inchaço",
+    "edema", "swelling", "oedema", "chiado", "sibilância", "wheezing", "wheeze", "dor muscular",
+    "mialgia", "muscle pain", "myalgia", "dor nas articulações", "artralgia", "joint pain",
+    "arthralgia", "perda de apetite", "loss of appetite", "perda de peso", "weight loss", "sudorese",
+    "sweating", "coceira", "prurido", "itching", "erupção cutânea", "rash", "confusão mental",
+    "confusion", "convulsão", "convulsões", "seizure", "seizures", "visão turva", "blurred vision",
+    "retenção urinária", "urinary retention", "dor ao urinar", "disúria", "dysuria", "hematúria",
+    "haematuria", "hematuria", "constipação", "constipation", "insônia", "insomnia", "ansiedade",
+    "anxiety",
+)
+
+SEED_DISEASES = (
+    "diabetes", "diabetes mellitus", "hipertensão", "hipertensão arterial", "hypertension", "asma",
+    "asthma", "dpoc", "copd", "pneumonia", "bronquite", "bronchitis", "gripe", "influenza", "flu",
+    "covid", "covid-19", "dengue", "tuberculose", "tuberculosis", "infecção urinária",
+    "urinary tract infection", "uti", "insuficiência cardíaca", "heart failure", "infarto",
+    "myocardial infarction", "avc", "acidente vascular cerebral", "stroke", "anemia", "anaemia",
+    "câncer", "cancer", "cancer de próstata", "câncer de próstata", "prostate cancer", "sepse",
+    "sepsis", "septicaemia", "septicemia", "celulite", "cellulitis", "obesidade", "obesity",
+    "hipotireoidismo", "hypothyroidism", "hipertireoidismo", "hyperthyroidism", "artrite",
+    "arthritis", "osteoporose", "osteoporosis", "enxaqueca", "migraine", "epilepsia", "epilepsy",
+    "depressão", "depression", "insuficiência renal", "renal failure", "kidney failure",
+    "hepatite", "hepatitis", "cirrose", "cirrhosis", "sinusite", "sinusitis", "otite", "otitis",
+    "gastrite", "gastritis", "apendicite", "appendicitis", "meningite", "meningitis",
+)
+
+_SECTION_RE = re.compile(r"^\s*(indications?|contraindications?|complications?)\b", re.IGNORECASE)
+_BULLET_RE = re.compile(r"^\s*[•\-\*]\s*")
+_SPLIT_RE = re.compile(r"\s*(?:,|;|/|\(|\)|\band\b|\bor\b|\be\b|\bou\b|\s-\s)\s*", re.IGNORECASE)
+_WORD_RE = re.compile(r"^[^\W\d_]+(?:[-'][^\W\d_]+)*$")
+
+# Leading words that make a bullet a sentence rather than a term.
+_SENTENCE_STARTS = {
+    "to", "patients", "patient", "history", "any", "in", "with", "of", "the", "a", "an", "for",
+    "if", "when", "it", "test", "diagnostic", "monitoring", "relieving", "protecting",
+    "facilitating", "feeding", "decompression", "limbs", "damage", "sites", "evidence", "risk",
+    "prior", "start", "failure", "administration", "uncooperative", "cannot", "conduit",
+    "therapeutic", "development", "receiving", "receving",
+}
+# Words that make a phrase a clause rather than a term wherever they appear.
+_CLAUSE_WORDS = {
+    "to", "at", "in", "with", "from", "for", "as", "the", "but", "can", "until", "before", "after",
+    "including", "usually", "particularly", "leading", "causing", "used", "secondary", "other", "any",
+}
+# Leading qualifiers stripped from a term ("Severe facial trauma" -> "facial trauma").
+_QUALIFIERS = {"severe", "acute", "chronic", "known", "suspected", "established", "local", "mild", "recent"}
+_MAX_TERM_WORDS = 4
+
+
+def _bullet_items(text: str) -> Iterable[str]:
+    """Yield the bullet items (continuation lines joined) under the term-bearing headings of `text`."""
+    in_section = False
+    item: List[str] = []
+    for line in text.splitlines():
+        if _SECTION_RE.match(line) and not _BULLET_RE.match(line):
+            if item:
+                yield " ".join(item)
+            in_section, item = True, []
+            continue
+        if _BULLET_RE.match(line):
+            if item:
+                yield " ".join(item)
+            item = [_BULLET_RE.sub("", line)] if in_section else []
+        elif item and line[:1].islower():
+            item.append(line.strip())
+        else:
+            if item:
+                yield " ".join(item)
+            # Any other unbulleted line is a new heading or paragraph.
+            in_section, item = False, []
+    if item:
+        yield " ".join(item)
+
+
+def mine_terms(text: str) -> List[str]:
+    """Extract short disease and condition terms from a procedure text.
+
+    Returns:
+        List[str]: Lowercase terms of at most four words, in order of appearance, without duplicates.
+    """
+    terms: List[str] = []
+    for item in _bullet_items(text):
+        for phrase in _SPLIT_RE.split(item):
+            words = phrase.strip(" .:").lower().split()
+            while words and words[0] in _QUALIFIERS:
+                words = words[1:]
+            if not words or len(words) > _MAX_TERM_WORDS or words[0] in _SENTENCE_STARTS:
+                continue
+            if not all(_WORD_RE.match(word) for word in words) or len(" ".join(words)) < 4:
+                continue
+            if _CLAUSE_WORDS.intersection(words) or words[-1] == "of":
+                continue
+            # A lone adjective ("abdominal", "coronary") is the tail of a split phrase, not a term.
+            if len(words) == 1 and words[0].endswith(("al", "ic", "ary")):
+                continue
+            term = " ".join(words)
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+class TermStore:
+    """SQLite-backed terms mined from each ingested chunk."""
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS chunk_terms (
+                chunk_id TEXT NOT NULL,
+                term TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, term)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Replace the terms of the given chunks with those mined from their texts."""
+        rows: List[Tuple[str, str]] = [(cid, term) for cid, text in zip(ids, texts) for term in mine_terms(text)]
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunk_terms WHERE chunk_id = ?", [(cid,) for cid in ids])
+            self._conn.executemany("INSERT OR IGNORE INTO chunk_terms (chunk_id, term) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunk_terms WHERE chunk_id = ?", [(cid,) for cid in ids])
+            self._conn.commit()
+
+    def terms(self) -> List[str]:
+        """Every distinct mined term."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT term FROM chunk_terms ORDER BY term").fetchall()
+        return [term for (term,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def term_store_path(cache_dir: str) -> Path:
+    return Path(cache_dir) / "lexicon.sqlite3"
@@ -0,0 +1,172 @@
+"""Bounded conversation memory for long consultations.
+
+`messages` used to grow without limit and be sent in full on every turn, so
+each turn of a long consultation was slower than the one before. The
+conversation is now kept in two parts:
+
+- a rolling window of the most recent messages, cut on turn boundaries (a
+  human message and everything after it) to a token budget;
+- a `ConversationMemory` record folded from the `UserInputInfo` extracted on
+  every turn: the current patient, every symptom and disease mentioned about
+  them, and one-line notes of the last turns.
+
+The graph folds each turn into the record and removes the messages that fall
+out of `conversation_window_tokens` from its state. Each consumer gets its own
+slice: the normalization call sees the record and `normalization_token_budget`
+tokens of recent messages, and the supervisor sees
+`supervisor_token_budget` tokens per model call
+(`ConversationWindowMiddleware`). Sub-agents only ever see the query their
+tool is called with.
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.messages import RemoveMessage
+
+from medical_agent.agents.custom_guardrail.rules import message_role, message_text
+from medical_agent.context_assembly import estimate_tokens
+from medical_agent.prompts import append_sections
+from medical_agent.schemas import ConversationMemory, UserInputInfo
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTE_CHARS = 200
+MAX_TERMS = 32
+# Role, separators and template tokens around each message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: Any) -> int:
+    return estimate_tokens(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def recent_window(messages: Sequence[Any], budget: int) -> List[Any]:
+    """The most recent whole turns of `messages` that fit in `budget` tokens.
+
+    A turn starts at a human message, so a tool call is never separated from
+    its result. The last turn is always kept, whatever its size; a budget of
+    0 or less keeps everything.
+    """
+    if budget <= 0:
+        return list(messages)
+    start, used = len(messages), 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[index])
+        if message_role(messages[index]) in ("human", "user"):
+            if used > budget and start < len(messages):
+                break
+            start = index
+    if start == len(messages):
+        # No human message: keep what fits from the end.
+        start, used = len(messages), 0
+        while start > 0 and used + message_tokens(messages[start - 1]) <= budget:
+            start -= 1
+            used += message_tokens(messages[start])
+    return list(messages[start:])
+
+
+def _merge(terms: List[str], new: Sequence[str]) -> List[str]:
+    merged = list(terms)
+    for term in new:
+        term = term.strip()
+        if term and term.lower() not in (existing.lower() for existing in merged):
+            merged.append(term)
+    return merged[-MAX_TERMS:]
+
+
+def _note(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= MAX_NOTE_CHARS else text[: MAX_NOTE_CHARS - 3].rsplit(" ", 1)[0] + "..."
+
+
+def fold_turn(memory: Optional[ConversationMemory], info: UserInputInfo, max_notes: int) -> ConversationMemory:
+    """Return `memory` updated with the information extracted from one turn.
+
+    Args:
+        memory (Optional[ConversationMemory]): The record so far.
+        info (UserInputInfo): What the turn's normalization extracted.
+        max_notes (int): Number of turn notes kept.
+    """
+    memory = memory or ConversationMemory()
+    patient = info.get("patient_name") or ""
+    if patient and memory.get("patient_name") and patient.lower() != memory["patient_name"].lower():
+        # Another patient: what was said about the previous one no longer applies.
+        memory = ConversationMemory(turns=memory.get("turns", 0))
+    diseases = [info.get("disease_name") or "", *(info.get("condition") or "").split(",")]
+    note = _note(info.get("summary") or info.get("original_input") or "")
+    notes = [*memory.get("notes", []), note] if note else list(memory.get("notes", []))
+    return ConversationMemory(
+        patient_name=patient or memory.get("patient_name", ""),
+        symptoms=_merge(memory.get("symptoms", []), info.get("symptoms") or []),
+        diseases=_merge(memory.get("diseases", []), diseases),
+        notes=notes[-max_notes:] if max_notes > 0 else [],
+        turns=memory.get("turns", 0) + 1,
+    )
+
+
+def render_memory(memory: Optional[ConversationMemory]) -> str:
+    """Render the record as a prompt section; empty when there is nothing to say."""
+    if not memory or not memory.get("turns"):
+        return ""
+    lines = []
+    if memory.get("patient_name"):
+        lines.append(f"Patient: {memory['patient_name']}")
+    if memory.get("symptoms"):
+        lines.append(f"Symptoms reported: {', '.join(memory['symptoms'])}")
+    if memory.get("diseases"):
+        lines.append(f"Diseases and conditions mentioned: {', '.join(memory['diseases'])}")
+    if memory.get("notes"):
+        lines.append("Recent turns:")
+        lines += [f"- {note}" for note in memory["notes"]]
+    return "\n".join(lines)
+
+
+def compact_messages(messages: Sequence[Any], budget: int) -> List[RemoveMessage]:
+    """Removals for the messages older than the `budget`-token window of `messages`."""
+    kept = recent_window(messages, budget)
+    dropped = messages[: len(messages) - len(kept)]
+    removals = [RemoveMessage(id=message.id) for message in dropped if getattr(message, "id", None)]
+    if removals:
+        logger.info("Compacted conversation: %d message(s) removed, %d kept", len(removals), len(kept))
+    return removals
+
+
+class ConversationWindowMiddleware(AgentMiddleware):
+    """Send the model only the recent turns of an agent's conversation.
+
+    Before each model call, the messages are cut to the most recent whole
+    turns within `budget` tokens, and the human messages that were cut are
+    appended to the system prompt as one-line notes (the last `max_notes`),
+    after the static instructions.
+    """
+
+    def __init__(self, budget: int, max_notes: int = 8):
+        super().__init__()
+        self.budget = budget
+        self.max_notes = max_notes
+
+    def window_request(self, request: ModelRequest) -> ModelRequest:
+        messages = recent_window(request.messages, self.budget)
+        if len(messages) == len(request.messages):
+            return request
+        dropped = request.messages[: len(request.messages) - len(messages)]
+        notes = [_note(message_text(m)) for m in dropped if message_role(m) in ("human", "user") and message_text(m).strip()]
+        overrides: dict[str, Any] = {"messages": messages}
+        if notes and self.max_notes > 0:
+            overrides["system_prompt"] = append_sections(
+                request.system_prompt or "",
+                ("Earlier in this conversation", "\n".join(f"- {note}" for note in notes[-self.max_notes :])),
+            )
+        return request.override(**overrides)
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        return handler(self.window_request(request))
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        return await handler(self.window_request(request))
@@ -0,0 +1,311 @@
+"""Shared chat model clients.
+
+Chat models used to be built per call (`load_chat_model` on every graph run,
+wrapped again in `with_structured_output`) and per agent, each with its own
+HTTP client. `ModelRegistry` caches clients by `(provider/model, params)` and
+their structured-output wrappers by `(provider/model, params, schema)`.
+
+Every Ollama client is created with the same `keep_alive` and `num_ctx`, so
+the model stays loaded with its prompt cache between requests and no client
+makes the server reload it with another context size.
+
+All Ollama clients of a registry share one keep-alive HTTP connection pool,
+so requests reuse open connections instead of setting up TCP per client. The
+pool also caps in-flight generation requests (`/api/chat`, `/api/generate`)
+per model: requests over the limit wait for a slot, so the GPU box is never
+asked for more concurrent generations than it can serve.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from medical_agent.context import Context
+
+if TYPE_CHECKING:
+    from medical_agent.batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+_MODEL_RE = re.compile(rb'"model"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_GENERATION_PATHS = ("/api/chat", "/api/generate")
+
+
+def parse_concurrency_overrides(spec: str) -> Dict[str, int]:
+    """Parse `"gpt-oss:20b=2, llama3=8"` into `{"gpt-oss:20b": 2, "llama3": 8}`."""
+    limits = {}
+    for item in spec.split(","):
+        model, _, limit = item.strip().rpartition("=")
+        if model and limit.strip():
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+def _generation_model(request: httpx.Request) -> Optional[str]:
+    """The model a generation request is for, or None for other requests."""
+    if request.method != "POST" or request.url.path not in _GENERATION_PATHS:
+        return None
+    # The Ollama client serializes `model` first; no need to parse the whole prompt.
+    match = _MODEL_RE.search(request.content[:1024])
+    return match.group(1).decode() if match else None
+
+
+class ConcurrencyLimits:
+    """Per-model caps on in-flight generation requests.
+
+    Args:
+        default (int): Limit for models without an override; 0 means unlimited.
+        overrides (Dict[str, int]): Limits by Ollama model name.
+    """
+
+    def __init__(self, default: int = 0, overrides: Optional[Dict[str, int]] = None):
+        self.default = default
+        self.overrides = overrides or {}
+        self._lock = threading.Lock()
+        self._thread_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        # asyncio semaphores belong to one event loop.
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def limit(self, model: str) -> int:
+        return self.overrides.get(model, self.default)
+
+    def thread_semaphore(self, model: str) -> Optional[threading.BoundedSemaphore]:
+        limit = self.limit(model)
+        if limit <= 0:
+            return None
+        with self._lock:
+            return self._thread_semaphores.setdefault(model, threading.BoundedSemaphore(limit))
+
+    def async_semaphore(self, model: str) -> Optional[asyncio.Semaphore]:
+        limit = self.limit(model)
+        if limit <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._async_semaphores.setdefault(loop, {})
+            return semaphores.setdefault(model, asyncio.Semaphore(limit))
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+            self._release = lambda: None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+            self._release = lambda: None
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """Synchronous keep-alive transport holding a model's slot until its response is closed."""
+
+    def __init__(self, limits: ConcurrencyLimits, pool_limits: httpx.Limits):
+        self.limits = limits
+        self.inner = httpx.HTTPTransport(limits=pool_limits)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model = _generation_model(request)
+        semaphore = self.limits.thread_semaphore(model) if model else None
+        if semaphore is None:
+            return self.inner.handle_request(request)
+        semaphore.acquire()
+        try:
+            response = self.inner.handle_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, semaphore.release)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class LimitedAsyncTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `LimitedTransport`.
+
+    Connections are pooled per event loop, since they cannot move between loops.
+    """
+
+    def __init__(self, limits: ConcurrencyLimits, pool_limits: httpx.Limits):
+        self.limits = limits
+        self.pool_limits = pool_limits
+        self._inner: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._inner.get(loop)
+        if transport is None:
+            transport = self._inner[loop] = httpx.AsyncHTTPTransport(limits=self.pool_limits)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport()
+        model = _generation_model(request)
+        semaphore = self.limits.async_semaphore(model) if model else None
+        if semaphore is None:
+            return await transport.handle_async_request(request)
+        await semaphore.acquire()
+        try:
+            response = await transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, semaphore.release)
+        return response
+
+    async def aclose(self) -> None:
+        transport = self._inner.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def _freeze(params: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple(sorted((name, value if isinstance(value, Hashable) else repr(value)) for name, value in params.items()))
+
+
+class ModelRegistry:
+    """Cache chat model clients and their structured-output wrappers.
+
+    Args:
+        context (Context): Agent context with the connection pool, concurrency and Ollama model settings.
+    """
+
+    def __init__(self, context: Context):
+        self.limits = ConcurrencyLimits(
+            context.llm_max_concurrency, parse_concurrency_overrides(context.llm_concurrency_overrides)
+        )
+        pool_limits = httpx.Limits(
+            max_connections=context.ollama_max_connections,
+            max_keepalive_connections=context.ollama_max_connections,
+            keepalive_expiry=context.ollama_keepalive_expiry_seconds,
+        )
+        keep_alive = context.ollama_keep_alive
+        # Ollama reads bare numbers as seconds but duration strings need a unit.
+        self.ollama_options: Dict[str, Any] = {
+            "keep_alive": int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+        }
+        if context.ollama_num_ctx:
+            self.ollama_options["num_ctx"] = context.ollama_num_ctx
+        self.transport = LimitedTransport(self.limits, pool_limits)
+        self.async_transport = LimitedAsyncTransport(self.limits, pool_limits)
+        self._models: Dict[Tuple[Any, ...], BaseChatModel] = {}
+        self._structured: Dict[Tuple[Any, ...], Runnable] = {}
+        self._batchers: Dict[Tuple[Any, ...], "MicroBatcher"] = {}
+        self._lock = threading.RLock()
+
+    def chat_model(self, fully_specified_name: str, **params: Any) -> BaseChatModel:
+        """Return the shared client for a model.
+
+        Args:
+            fully_specified_name (str): String in the format 'provider/model'.
+            **params: Model parameters (temperature, num_ctx, ...); each combination gets its own client.
+        """
+        key = (fully_specified_name, _freeze(params))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self._models[key] = self._build(fully_specified_name, params)
+        return model
+
+    def structured_model(self, fully_specified_name: str, schema: Any, method: Optional[str] = None, **params: Any) -> Runnable:
+        """Return the shared `with_structured_output(schema)` wrapper of a model."""
+        key = (fully_specified_name, _freeze(params), schema, method)
+        structured = self._structured.get(key)
+        if structured is None:
+            with self._lock:
+                structured = self._structured.get(key)
+                if structured is None:
+                    model = self.chat_model(fully_specified_name, **params)
+                    options = {"method": method} if method else {}
+                    structured = self._structured[key] = model.with_structured_output(schema, **options)
+        return structured
+
+    def structured_batcher(
+        self, fully_specified_name: str, schema: Any, max_batch_size: int, max_wait_ms: float, **params: Any
+    ) -> "MicroBatcher":
+        """Return the shared micro-batcher of a structured-output wrapper."""
+        from medical_agent.batching import MicroBatcher
+
+        key = (fully_specified_name, _freeze(params), schema, max_batch_size, max_wait_ms)
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                structured = self.structured_model(fully_specified_name, schema, **params)
+                # One batcher, and one metrics label, per schema and model.
+                name = f'{getattr(schema, "__name__", schema)}@{fully_specified_name}'
+                batcher = self._batchers[key] = MicroBatcher(structured, name, max_batch_size, max_wait_ms)
+        return batcher
+
+    def _build(self, fully_specified_name: str, params: Dict[str, Any]) -> BaseChatModel:
+        provider, model = fully_specified_name.split("/", maxsplit=1)
+        kwargs = dict(params)
+        if provider == "ollama":
+            kwargs = {**self.ollama_options, **kwargs}
+            kwargs.setdefault("sync_client_kwargs", {"transport": self.transport})
+            kwargs.setdefault("async_client_kwargs", {"transport": self.async_transport})
+        logger.info("Creating chat model client for %s", fully_specified_name)
+        return init_chat_model(model, model_provider=provider, **kwargs)
+
+
+_registries: Dict[Tuple[Any, ...], ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def model_registry(context: Optional[Context] = None) -> ModelRegistry:
+    """Return the model registry shared by every run with the same connection settings.
+
+    Args:
+        context (Optional[Context]): Agent context with the connection pool and concurrency settings.
+    """
+    context = context or Context()
+    key = (
+        context.ollama_max_connections,
+        context.ollama_keepalive_expiry_seconds,
+        context.llm_max_concurrency,
+        context.llm_concurrency_overrides,
+        context.ollama_keep_alive,
+        context.ollama_num_ctx,
+    )
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ModelRegistry(context)
+    return registry
@@ -0,0 +1,108 @@
+"""Precomputed document-order neighbours of every ingested chunk.
+
+Procedure chunks are short, so a retrieved step usually needs the steps
+around it to make sense. Ingestion records where each chunk sits (source,
+page and `start_index`) and, once a run finishes, numbers the chunks of each
+source in reading order. Expanding a hit to its surrounding chunks is then one
+indexed lookup of the positions on either side instead of another vector
+query.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class NeighbourStore:
+    """SQLite-backed reading order of the chunks of each ingested source."""
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                start_index INTEGER NOT NULL,
+                position INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_position ON chunks (source, position);
+            """
+        )
+        self._conn.commit()
+        self._dirty = False
+
+    def add(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Record the location of the given chunks; positions are assigned by `rebuild`."""
+        rows = [
+            (cid, str(meta.get("source")), int(meta.get("page") or 0), int(meta.get("start_index") or 0))
+            for cid, meta in zip(ids, metadatas)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, source, page, start_index) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self._dirty = self._dirty or bool(rows)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(cid,) for cid in ids])
+            self._conn.commit()
+            self._dirty = self._dirty or bool(ids)
+
+    def rebuild(self) -> None:
+        """Number the chunks of each source in reading order, if any changed since the last rebuild."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._conn.execute(
+                "UPDATE chunks SET position = ordered.position FROM ("
+                " SELECT chunk_id, ROW_NUMBER() OVER (PARTITION BY source ORDER BY page, start_index) AS position"
+                " FROM chunks"
+                ") AS ordered WHERE chunks.chunk_id = ordered.chunk_id"
+            )
+            self._conn.commit()
+            self._dirty = False
+            count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        logger.info("Chunk neighbours rebuilt for %d chunk(s)", count)
+
+    def surrounding(self, ids: Sequence[str], span: int) -> List[str]:
+        """IDs of the chunks up to `span` positions before and after each of `ids`, in reading order.
+
+        The given IDs themselves are not returned, and each neighbour is
+        returned once even when it surrounds several of them.
+        """
+        if span <= 0 or not ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT neighbour.chunk_id FROM chunks AS hit"
+                " JOIN chunks AS neighbour ON neighbour.source = hit.source"
+                " AND neighbour.position BETWEEN hit.position - ? AND hit.position + ?"
+                f" WHERE hit.chunk_id IN ({', '.join('?' * len(ids))})"
+                " ORDER BY neighbour.source, neighbour.position",
+                (span, span, *ids),
+            ).fetchall()
+        given = set(ids)
+        return [cid for (cid,) in rows if cid not in given]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def neighbour_store_path(cache_dir: str) -> Path:
+    return Path(cache_dir) / "neighbours.sqlite3"
@@ -1,15 +1,25 @@
-from re import A
-from typing import Dict
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from langgraph.graph import END
 from langgraph.runtime import Runtime
 
-from medical_agent.prompts import NORMALIZATION_PROMPT, PLANNING_PROMPT
+from medical_agent.context import Context
+from medical_agent.extraction import fast_extractor
+from medical_agent.models import model_registry
+from medical_agent.memory import compact_messages, fold_turn, recent_window, render_memory
+from medical_agent.patient_queries import afetch_patient_snapshots, is_records_lookup
+from medical_agent.prompts import NORMALIZATION_PROMPT, append_sections
 from medical_agent.schemas import RequiredInfo, UserInputInfo
 from medical_agent.state import MedicalState
-from medical_agent.utils import load_chat_model
-from numpy import require
+from medical_agent.streaming import PATIENT_QUERY, emit
+from medical_agent.utils import get_message_text
 
+logger = logging.getLogger(__name__)
 
-async def normalize_user_input(state: MedicalState, runtime: Runtime) -> Dict[str, UserInputInfo]:
+
+async def normalize_user_input(state: MedicalState, runtime: Runtime) -> Dict[str, Any]:
     """
     Normalize and preprocess user input in the medical state.
 
@@ -21,16 +31,58 @@ async def normalize_user_input(state: MedicalState, runtime: Runtime) -> Dict[st
         runtime (Runtime): The runtime context.
 
     Returns:
-        MedicalState: The updated state with normalized user input.
+        Dict[str, Any]: The normalized user input, the updated conversation memory and the
+        removal of the messages that left the conversation window.
     """
 
-    model = load_chat_model(runtime.context.model)
-    structured_model = model.with_structured_output(UserInputInfo)
+    context = runtime.context
+    if context.fast_extraction_enabled:
+        user_info_input = await fast_normalize(state, context)
+        if user_info_input is not None:
+            return remember_turn(state, context, user_info_input)
+
+    if context.normalization_batching_enabled:
+        structured_model = model_registry(context).structured_batcher(
+            context.model,
+            UserInputInfo,
+            context.normalization_batch_max_size,
+            context.normalization_batch_max_wait_ms,
+        )
+    else:
+        structured_model = model_registry(context).structured_model(context.model, UserInputInfo)
+    # The record of earlier turns and a bounded slice of recent messages, so the prompt stays flat.
+    system_prompt = NORMALIZATION_PROMPT
+    memory = render_memory(state.get('memory'))
+    if memory:
+        system_prompt = append_sections(NORMALIZATION_PROMPT, ("Earlier in this consultation", memory))
     user_info_input = await structured_model.ainvoke(
-        [{"role": "system", "content": NORMALIZATION_PROMPT}, *state['messages']]
+        [{"role": "system", "content": system_prompt}, *recent_window(state['messages'], context.normalization_token_budget)]
     )
 
-    return {"user_input_info": user_info_input}
+    return remember_turn(state, context, user_info_input)
+
+
+def remember_turn(state: MedicalState, context: Context, user_input_info: UserInputInfo) -> Dict[str, Any]:
+    """Fold the turn into the conversation memory and drop the messages that left the window."""
+    return {
+        "user_input_info": user_input_info,
+        "memory": fold_turn(state.get('memory'), user_input_info, context.conversation_memory_notes),
+        "messages": compact_messages(state['messages'], context.conversation_window_tokens),
+    }
+
+
+async def fast_normalize(state: MedicalState, context: Context) -> Optional[UserInputInfo]:
+    """Extract the latest user message with the dictionaries, or return None to use the LLM."""
+    messages = state['messages']
+    if not messages or getattr(messages[-1], "type", None) != "human":
+        return None
+    extractor = fast_extractor(context)
+    try:
+        await extractor.refresh()
+    except Exception:
+        logger.exception("Could not refresh the fast extractor dictionaries")
+    previous = state.get('user_input_info') or {}
+    return extractor.extract(get_message_text(messages[-1]), previous.get('patient_name', ""))
 
 
 async def planning(state: MedicalState, runtime: Runtime) -> Dict[str, RequiredInfo]:
@@ -48,31 +100,127 @@ async def planning(state: MedicalState, runtime: Runtime) -> Dict[str, RequiredI
         Dict[str, RequiredInfo]: A dictionary containing flags indicating required information.
     """
 
+    user_input_info = state['user_input_info']
     required_info: RequiredInfo = RequiredInfo(
-        patient=state['user_input_info']['patient_name'] != "",
-        procedure_guidelines=state['user_input_info']['symptoms'] != [] or state['user_input_info']['disease_name'] != "",
-        disease_infos=state['user_input_info']['symptoms'] != [] or state['user_input_info']['disease_name'] != ""
+        patient=user_input_info['patient_name'] != "",
+        procedure_guidelines=user_input_info['symptoms'] != [] or user_input_info['disease_name'] != "",
+        disease_infos=user_input_info['symptoms'] != [] or user_input_info['disease_name'] != "",
+        ad_hoc_patient_query=user_input_info['patient_name'] != ""
+        and not is_records_lookup(user_input_info['original_input'] or user_input_info['summary']),
     )
 
     return {"required_info": required_info}
 
-def router(state: MedicalState, runtime: Runtime) -> str:
-    """Route to the next node based on the current state.
+async def gather_patient_info(state: MedicalState, runtime: Runtime) -> Dict[str, Any]:
+    """
+    Fetch the patient's records.
+
+    Plain record lookups resolve the patient by name and read their recent
+    history, exams and results with precompiled queries; a patient whose records
+    have not changed since the last lookup is served from the snapshot cache.
+    Questions that filter, aggregate or name a period (`ad_hoc_patient_query`)
+    go to the SQL agent, since the snapshot only holds the most recent rows.
 
-    This function determines the next step in the workflow based on the state.
+    Runs in parallel with `gather_procedure_guidelines` when both are required.
 
     Args:
         state (MedicalState): The current state of the conversation.
         runtime (Runtime): The runtime context.
 
     Returns:
-        str: The name of the next node to transition to.
+        Dict[str, Any]: The patient information documents, their health history and this branch's timing.
     """
-    if state.require_patient_info and not state.patient_info:
-        return "gather_patient_info"
-    elif state.require_procedure_guidelines and not state.procedure_guidelines:
-        return "gather_procedure_guidelines"
-    elif state.require_disease_info:
-        return "gather_disease_info"
+    started = time.perf_counter()
+    user_input_info = state['user_input_info']
+    patient_name = user_input_info['patient_name']
+
+    if state['required_info']['ad_hoc_patient_query']:
+        # Imported here so compiling the graph does not connect to the database.
+        from medical_agent.agents.supervisor_agent import query_patient
+
+        answer = await query_patient(
+            f"Patient: {patient_name}\n{user_input_info['summary'] or user_input_info['original_input']}", runtime.context
+        )
+        patient_info = [Document(page_content=answer, metadata={"source": "sql_agent", "patient_name": patient_name})]
+        health_history = []
+    elif snapshots := await afetch_patient_snapshots(patient_name, runtime.context):
+        patient_info = [
+            Document(
+                page_content=snapshot.to_text(),
+                metadata={"source": "patient_queries", "patient_name": snapshot.patient['full_name'], "patient_id": snapshot.patient['id']},
+            )
+            for snapshot in snapshots
+        ]
+        for document in patient_info:
+            emit("records", PATIENT_QUERY, patient_name=document.metadata['patient_name'], text=document.page_content)
+        health_history = [item for snapshot in snapshots for item in snapshot.history_items()]
     else:
-        return "final_diagnosis_and_treatment"
\ No newline at end of file
+        # The lookup already searched by exact name and prefix; the SQL agent would find nothing more.
+        patient_info = [
+            Document(
+                page_content=f"No patient named {patient_name!r} was found in the hospital records.",
+                metadata={"source": "patient_queries", "patient_name": patient_name, "not_found": True},
+            )
+        ]
+        health_history = []
+
+    elapsed = time.perf_counter() - started
+    logger.info("Branch gather_patient_info finished in %.2fs", elapsed)
+
+    return {
+        "patient_info": patient_info,
+        "patient_health_history": health_history,
+        "branch_timings": {"gather_patient_info": elapsed},
+    }
+
+
+async def gather_procedure_guidelines(state: MedicalState, runtime: Runtime) -> Dict[str, Any]:
+    """
+    Retrieve the hospital procedures relevant to the reported symptoms or disease.
+
+    Runs in parallel with `gather_patient_info` when both are required.
+
+    Args:
+        state (MedicalState): The current state of the conversation.
+        runtime (Runtime): The runtime context.
+
+    Returns:
+        Dict[str, Any]: The procedure guideline documents and this branch's timing.
+    """
+    from medical_agent.agents.supervisor_agent import search_procedures
+
+    started = time.perf_counter()
+    user_input_info = state['user_input_info']
+    query = user_input_info['disease_name'] or ", ".join(user_input_info['symptoms'])
+    if user_input_info['condition']:
+        query = f"{query} ({user_input_info['condition']})"
+    cached = await search_procedures(query, runtime.context)
+    elapsed = time.perf_counter() - started
+    logger.info("Branch gather_procedure_guidelines finished in %.2fs", elapsed)
+
+    return {
+        "procedure_guidelines": [Document(page_content=cached.answer, metadata={"sources": cached.sources, "query": query})],
+        "branch_timings": {"gather_procedure_guidelines": elapsed},
+    }
+
+
+def router(state: MedicalState, runtime: Runtime) -> List[str]:
+    """Route to the next node(s) based on the current state.
+
+    Every required information-gathering branch is returned at once so
+    LangGraph runs them in the same step, concurrently.
+
+    Args:
+        state (MedicalState): The current state of the conversation.
+        runtime (Runtime): The runtime context.
+
+    Returns:
+        List[str]: The names of the next nodes to transition to.
+    """
+    required_info = state['required_info']
+    branches = []
+    if required_info['patient']:
+        branches.append("gather_patient_info")
+    if required_info['procedure_guidelines']:
+        branches.append("gather_procedure_guidelines")
+    return branches or [END]
\ No newline at end of file
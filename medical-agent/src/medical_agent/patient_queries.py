@@ -0,0 +1,258 @@
+"""Precompiled, parameterized queries for looking up a patient's records.
+
+Resolving a patient by name and pulling their recent history, exams and
+results is a fixed access pattern, so it runs as a handful of indexed
+queries instead of going through the SQL agent's LLM round-trips:
+
+- patients by `full_name` (exact match, then prefix match; both use `idx_full_name`);
+- health_history, exam_scheduling and old_health_reports by `idx_patient_id`;
+- exam_results by `idx_exam_schedule_id`.
+
+The name lookup also returns a watermark per patient, computed from the
+same indexes: the patient's `updated_at` and, for each of their tables, the
+row count and latest `created_at` (plus a checksum of exam statuses, which
+change in place). Snapshots are cached per patient under that watermark
+(`medical_agent.cache.PatientSnapshotCache`), so a repeated lookup of an
+unchanged patient costs the one name query.
+
+Only plain record lookups take this path (`is_records_lookup`); questions
+that filter, aggregate or name a period go to the SQL agent, since the
+snapshot only holds the most recent rows.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from medical_agent.cache import PatientSnapshotCache
+from medical_agent.context import Context
+from medical_agent.database import DatabasePool, database_pool
+from medical_agent.tracing import register_metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_PATIENT_MATCHES = 5
+
+# Changes whenever a row of the patient is inserted, deleted, or updated where the table tracks it.
+PATIENT_WATERMARK = (
+    "CONCAT_WS('|', p.updated_at, "
+    "(SELECT CONCAT(COUNT(*), '@', COALESCE(MAX(h.created_at), '')) "
+    "FROM health_history h WHERE h.patient_id = p.id), "
+    "(SELECT CONCAT(COUNT(*), '@', COALESCE(MAX(s.created_at), ''), '@', COALESCE(SUM(CRC32(CONCAT(s.status, s.scheduled_at))), 0)) "
+    "FROM exam_scheduling s WHERE s.patient_id = p.id), "
+    "(SELECT CONCAT(COUNT(*), '@', COALESCE(MAX(r.created_at), '')) "
+    "FROM exam_scheduling s JOIN exam_results r ON r.exam_schedule_id = s.id WHERE s.patient_id = p.id), "
+    "(SELECT CONCAT(COUNT(*), '@', COALESCE(MAX(o.created_at), '')) "
+    "FROM old_health_reports o WHERE o.patient_id = p.id)"
+    ") AS watermark"
+)
+
+FIND_PATIENT_EXACT = (
+    f"SELECT p.id, p.full_name, p.birth_date, p.gender, {PATIENT_WATERMARK} FROM patients p "
+    "WHERE p.full_name = %s ORDER BY p.full_name LIMIT %s"
+)
+
+# A prefix LIKE without a leading wildcard is still a range scan on idx_full_name.
+FIND_PATIENT_PREFIX = (
+    f"SELECT p.id, p.full_name, p.birth_date, p.gender, {PATIENT_WATERMARK} FROM patients p "
+    "WHERE p.full_name LIKE %s ORDER BY p.full_name LIMIT %s"
+)
+
+PATIENT_HISTORY = (
+    "SELECT title, description, occurred_at FROM health_history "
+    "WHERE patient_id = %s ORDER BY occurred_at DESC LIMIT %s"
+)
+
+PATIENT_EXAMS = (
+    "SELECT e.name, s.scheduled_at, s.status, r.result_text, r.result_file_url, r.result_date "
+    "FROM exam_scheduling s "
+    "JOIN exams_available e ON e.id = s.exam_id "
+    "LEFT JOIN exam_results r ON r.exam_schedule_id = s.id "
+    "WHERE s.patient_id = %s ORDER BY s.scheduled_at DESC LIMIT %s"
+)
+
+PATIENT_OLD_REPORTS = (
+    "SELECT report_type, report_date, file_url FROM old_health_reports "
+    "WHERE patient_id = %s ORDER BY report_date DESC LIMIT %s"
+)
+
+ALL_PATIENT_NAMES = "SELECT DISTINCT full_name FROM patients"
+
+ALL_EXAM_NAMES = "SELECT DISTINCT name FROM exams_available"
+
+PATIENT_FULL_HISTORY = (
+    "SELECT title, description, occurred_at FROM health_history "
+    "WHERE patient_id = %s ORDER BY occurred_at"
+)
+
+# Filters, aggregates, comparisons and reaches past the snapshot limits.
+_AD_HOC_RE = re.compile(
+    r"\b(?:anorma(?:l|is)|abnormal|alterad[oa]s?|elevad[oa]s?|acima|abaixo|above|below|maior(?:es)?|menor(?:es)?"
+    r"|greater|higher|lower|quant[oa]s|how many|count|m[eé]dias?|average|mean|total"
+    r"|primeir[oa]s?|first|oldest|mais antig[oa]s?|compar\w*|trends?|tend[eê]ncias?|evolu[cç](?:[aã]o|[oõ]es)"
+    r"|tod[oa]s?|all|every|cada|each|nunca|never|exceto|except)\b",
+    re.IGNORECASE,
+)
+
+
+def is_records_lookup(question: str) -> bool:
+    """Whether `question` only asks for a patient's recent records, which the snapshot answers.
+
+    Questions naming a period ("em 2019", "desde 2020"), filtering or
+    aggregating ("exames alterados", "quantas consultas") or reaching past
+    the most recent rows ("todo o histórico", "primeira consulta") need the
+    SQL agent.
+    """
+    # Imported here: the guardrail package imports this module.
+    from medical_agent.agents.custom_guardrail.partition_pruning import date_window_from_text
+
+    window = date_window_from_text(question, date.today(), 0)
+    return not (window is not None and window.explicit) and not _AD_HOC_RE.search(question)
+
+
+@dataclass
+class PatientSnapshot:
+    """A patient's registration data with their most recent records."""
+
+    patient: Dict[str, Any]
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    exams: List[Dict[str, Any]] = field(default_factory=list)
+    old_reports: List[Dict[str, Any]] = field(default_factory=list)
+
+    def history_items(self) -> List[str]:
+        """One line per health history event, most recent first."""
+        return [f"{row['occurred_at'] or 'undated'}: {row['title']}. {row['description']}" for row in self.history]
+
+    def to_text(self) -> str:
+        """Render the snapshot as plain text for the model."""
+        patient = self.patient
+        lines = [
+            f"Patient: {patient['full_name']} (id {patient['id']})",
+            f"Birth date: {patient['birth_date'] or 'unknown'}; gender: {patient['gender'] or 'unknown'}",
+            "",
+            "Health history:",
+        ]
+        lines += [f"- {item}" for item in self.history_items()] or ["- none"]
+        lines += ["", "Exams:"]
+        for row in self.exams:
+            line = f"- {row['scheduled_at']}: {row['name']} ({row['status']})"
+            if row['result_date'] is not None:
+                line += f"; result on {row['result_date']}: {row['result_text'] or 'no text'}"
+                if row['result_file_url']:
+                    line += f" [{row['result_file_url']}]"
+            lines.append(line)
+        if not self.exams:
+            lines.append("- none")
+        if self.old_reports:
+            lines += ["", "Old reports:"]
+            lines += [f"- {row['report_date'] or 'undated'}: {row['report_type'] or 'report'} [{row['file_url']}]" for row in self.old_reports]
+        return "\n".join(lines)
+
+
+async def find_patients(pool: DatabasePool, name: str, limit: int = MAX_PATIENT_MATCHES) -> List[Dict[str, Any]]:
+    """Resolve a patient name, trying an exact match before a prefix match."""
+    name = " ".join(name.split())
+    patients = await pool.fetch_all(FIND_PATIENT_EXACT, (name, limit))
+    if patients:
+        return patients
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return await pool.fetch_all(FIND_PATIENT_PREFIX, (f"{escaped}%", limit))
+
+
+async def fetch_patient_snapshot(pool: DatabasePool, patient: Dict[str, Any], context: Context) -> PatientSnapshot:
+    """Read a resolved patient's recent records; the three queries run concurrently."""
+    patient_id = patient["id"]
+    history, exams, old_reports = await asyncio.gather(
+        pool.fetch_all(PATIENT_HISTORY, (patient_id, context.patient_history_limit)),
+        pool.fetch_all(PATIENT_EXAMS, (patient_id, context.patient_exam_limit)),
+        pool.fetch_all(PATIENT_OLD_REPORTS, (patient_id, context.patient_exam_limit)),
+    )
+    return PatientSnapshot(patient=patient, history=history, exams=exams, old_reports=old_reports)
+
+
+async def afetch_patient_snapshots(name: str, context: Optional[Context] = None) -> List[PatientSnapshot]:
+    """Look up every patient matching `name` together with their recent records.
+
+    Args:
+        name (str): The patient name extracted from the user input.
+        context (Optional[Context]): Agent context with the pool settings and the history and exam limits.
+
+    Returns:
+        List[PatientSnapshot]: One snapshot per matching patient; empty when no patient matches.
+    """
+    context = context or Context()
+    pool = database_pool(context)
+    cache = snapshot_cache(context) if context.patient_snapshot_cache_enabled else None
+    started = time.perf_counter()
+    patients = await find_patients(pool, name)
+    hits_before = cache.hits if cache else 0
+    snapshots = list(await asyncio.gather(*(_cached_snapshot(pool, patient, context, cache) for patient in patients)))
+    logger.info(
+        "Patient lookup for %r matched %d patient(s), %d from cache, in %.3fs",
+        name,
+        len(snapshots),
+        (cache.hits - hits_before) if cache else 0,
+        time.perf_counter() - started,
+    )
+    return snapshots
+
+
+async def _cached_snapshot(
+    pool: DatabasePool, patient: Dict[str, Any], context: Context, cache: Optional[PatientSnapshotCache]
+) -> PatientSnapshot:
+    watermark = patient.pop("watermark", None)
+    if cache is None or watermark is None:
+        return await fetch_patient_snapshot(pool, patient, context)
+    cached = cache.get(patient["id"], watermark)
+    if cached is not None:
+        return PatientSnapshot(**cached)
+    # Read after the watermark: a change in between only makes the next lookup miss.
+    snapshot = await fetch_patient_snapshot(pool, patient, context)
+    cache.put(patient["id"], watermark, asdict(snapshot))
+    return snapshot
+
+
+_snapshot_caches: Dict[Tuple[Any, ...], PatientSnapshotCache] = {}
+
+
+def snapshot_cache(context: Context) -> PatientSnapshotCache:
+    """Return the snapshot cache shared by every run with the same database and snapshot settings."""
+    database = f"{context.db_user}@{context.db_host}:{context.db_port}/{context.db_name}"
+    key = (
+        database,
+        context.patient_history_limit,
+        context.patient_exam_limit,
+        context.patient_snapshot_cache_max_entries,
+        context.cache_dir if context.patient_snapshot_cache_spill else None,
+    )
+    cache = _snapshot_caches.get(key)
+    if cache is None:
+        spill_path = Path(context.cache_dir) / "patient_snapshots.sqlite3" if context.patient_snapshot_cache_spill else None
+        cache = _snapshot_caches[key] = PatientSnapshotCache(
+            context.patient_snapshot_cache_max_entries, spill_path, name=database
+        )
+        register_metrics(f"patient_snapshot_cache:{database}", cache.prometheus)
+    return cache
+
+
+async def patient_names(context: Optional[Context] = None) -> List[str]:
+    """Return the full name of every registered patient."""
+    rows = await database_pool(context).fetch_all(ALL_PATIENT_NAMES)
+    return [row["full_name"] for row in rows if row["full_name"]]
+
+
+async def exam_names(context: Optional[Context] = None) -> List[str]:
+    """Return the name of every exam in the `exams_available` catalog."""
+    rows = await database_pool(context).fetch_all(ALL_EXAM_NAMES)
+    return [row["name"] for row in rows if row["name"]]
+
+
+async def iter_health_history(patient_id: str, context: Optional[Context] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a patient's complete health history, oldest first, without buffering it."""
+    async for row in database_pool(context).stream(PATIENT_FULL_HISTORY, (patient_id,)):
+        yield row
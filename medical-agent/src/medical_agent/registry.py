@@ -0,0 +1,169 @@
+"""Lazy registry of the agent's heavyweight components.
+
+Models, sub-agents, tools, vector stores and retrievers are built on first
+use instead of at import time, cached per `Context` and shared by every run
+that uses the same settings. Importing `medical_agent` therefore no longer
+touches Ollama, MySQL or MongoDB. A backend that is down only fails the
+requests that need it, and a failed build is retried on the next request.
+
+Components are registered by the dotted path of their factory, so the
+registry itself imports nothing heavy:
+
+    from medical_agent.registry import registry
+
+    agent = registry.get("sql_agent")          # built on first call
+    await registry.warm_up()                   # build everything up front
+
+`warm_up` also opens the connection pool and loads the schema catalog and the
+local vector index, so the first request does not pay for them.
+"""
+
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from medical_agent.context import Context
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _resolve(path: str) -> Callable[..., Any]:
+    module, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+@dataclass
+class ComponentSpec:
+    factory: str
+    """`module:function` taking a `Context` and returning the component."""
+    warm: Optional[str] = None
+    """`module:coroutine function` taking the component and the `Context`, run by `warm_up`."""
+
+
+class ComponentRegistry:
+    """Build components on first use and cache them per `Context` settings."""
+
+    def __init__(self):
+        self._specs: Dict[str, ComponentSpec] = {}
+        self._instances: Dict[Tuple[str, Context], Any] = {}
+        # One lock per component being built, so a slow build only holds up callers
+        # of the same component. Re-entrant: factories get the components they depend
+        # on from the registry.
+        self._building: Dict[Tuple[str, Context], threading.RLock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: str, warm: Optional[str] = None) -> None:
+        self._specs[name] = ComponentSpec(factory, warm)
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(self._specs)
+
+    def get(self, name: str, context: Optional[Context] = None) -> Any:
+        """Return component `name` for `context`, building it if needed.
+
+        Args:
+            name (str): A registered component name.
+            context (Optional[Context]): Settings to build with; the environment defaults if omitted.
+        """
+        context = context or Context()
+        # `Context` is frozen and hashable, so it keys the cache as is.
+        key = (name, context)
+        instance = self._instances.get(key, _MISSING)
+        if instance is not _MISSING:
+            return instance
+        with self._lock:
+            building = self._building.setdefault(key, threading.RLock())
+        with building:
+            instance = self._instances.get(key, _MISSING)
+            if instance is _MISSING:
+                started = time.perf_counter()
+                instance = _resolve(self._specs[name].factory)(context)
+                with self._lock:
+                    self._instances[key] = instance
+                    self._building.pop(key, None)
+                logger.info("Built component %s in %.3fs", name, time.perf_counter() - started)
+        return instance
+
+    def clear(self, name: Optional[str] = None) -> None:
+        """Forget the built instances of `name`, or of every component."""
+        with self._lock:
+            for key in [key for key in self._instances if name is None or key[0] == name]:
+                del self._instances[key]
+
+    async def warm_up(
+        self, names: Optional[Iterable[str]] = None, context: Optional[Context] = None
+    ) -> Dict[str, Optional[str]]:
+        """Build components (all of them by default) and run their warm-up hooks.
+
+        Failures are logged and reported instead of raised, so a missing backend
+        does not prevent the rest from warming up.
+
+        Returns:
+            Dict[str, Optional[str]]: The error of each component that failed, None for the others.
+        """
+        context = context or Context()
+        results: Dict[str, Optional[str]] = {}
+        for name in names or self.names:
+            started = time.perf_counter()
+            try:
+                # Factories may block on I/O (loading an index, connecting to MongoDB).
+                instance = await asyncio.to_thread(self.get, name, context)
+                warm = self._specs[name].warm
+                if warm:
+                    await _resolve(warm)(instance, context)
+            except Exception as exc:
+                logger.warning("Could not warm up %s: %s", name, exc)
+                results[name] = f"{type(exc).__name__}: {exc}"
+            else:
+                logger.info("Warmed up %s in %.3fs", name, time.perf_counter() - started)
+                results[name] = None
+        return results
+
+
+registry = ComponentRegistry()
+
+registry.register("chat_model", "medical_agent.registry:build_chat_model")
+registry.register("sql_model", "medical_agent.registry:build_sql_model")
+registry.register("procedure_vector_store", "medical_agent.vector_stores:procedure_vector_store")
+registry.register("procedure_retriever", "medical_agent.registry:build_procedure_retriever")
+registry.register("sql_tools", "medical_agent.tools:build_sql_tools", warm="medical_agent.registry:warm_schema_catalog")
+registry.register("sql_agent", "medical_agent.agents.sql_agent:build_sql_agent")
+registry.register("pdf_agent", "medical_agent.agents.pdf_agent:build_pdf_agent")
+registry.register("answer_cache", "medical_agent.agents.supervisor_agent:build_answer_cache")
+registry.register("supervisor_agent", "medical_agent.agents.supervisor_agent:build_supervisor_agent")
+
+
+def build_chat_model(context: Context):
+    from medical_agent.models import model_registry
+
+    return model_registry(context).chat_model(context.model)
+
+
+def build_sql_model(context: Context):
+    from medical_agent.models import model_registry
+
+    return model_registry(context).chat_model(context.sql_model)
+
+
+def build_procedure_retriever(context: Context):
+    from medical_agent.retrievers import procedure_retriever
+
+    return procedure_retriever(registry.get("procedure_vector_store", context), context)
+
+
+async def warm_schema_catalog(tools: Any, context: Context) -> None:
+    from medical_agent.schema_catalog import schema_catalog
+
+    await schema_catalog(context).ensure_fresh()
+
+
+async def warm_up(context: Optional[Context] = None) -> Dict[str, Optional[str]]:
+    """Build every registered component and open its backends ahead of the first request."""
+    return await registry.warm_up(context=context)
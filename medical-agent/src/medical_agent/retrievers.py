@@ -1,10 +1,174 @@
-from typing import Any, Callable, List
-from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 from langgraph.runtime import get_runtime
+from pydantic import ConfigDict
+from medical_agent.cache import RetrievalCache, ingestion_generation
 from medical_agent.context import Context
+from medical_agent.lexical_index import BM25Index
+from medical_agent.neighbours import NeighbourStore
+from medical_agent.tracing import register_metrics, span
+from medical_agent.vector_stores import lexical_index
 
-def procedure_retriever(vector_store: VectorStore) -> VectorStoreRetriever:
-    runtime = get_runtime(Context)
-    return vector_store.as_retriever(search_kwargs={"k": runtime.context.retriever_k})
+# The vector search runs here while the lexical search runs on the calling thread.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-retrieval")
 
-RETRIEVERS: List[Callable[..., Any]] = [procedure_retriever]
\ No newline at end of file
+
+def _doc_key(doc: Document) -> str:
+    meta = doc.metadata or {}
+    return doc.id or f"{meta.get('source')}|{meta.get('page')}|{meta.get('start_index')}|{doc.page_content}"
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]], weights: List[float], k: int, rrf_k: int = 60
+) -> List[Document]:
+    """Fuse ranked lists with weighted reciprocal-rank fusion.
+
+    Each document scores `sum(weight / (rrf_k + rank))` over the lists it appears in.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Query the BM25 index and the vector store in parallel and fuse the rankings.
+
+    Exact terms such as drug names, ICD codes and procedure names are found by
+    the lexical side even when the embedding search misses them.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    lexical_index: BM25Index
+    k: int = 5
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_future = _executor.submit(
+            self.vector_retriever.invoke, query, {"callbacks": run_manager.get_child()}
+        )
+        with span("lexical_search bm25", **{"lexical_search.k": self.k}) as current:
+            lexical_hits = self.lexical_index.search(query, self.k)
+            lexical_docs = self.lexical_index.documents(doc_no for doc_no, _ in lexical_hits)
+            current.set(**{"retrieval.documents": len(lexical_docs)})
+        vector_docs = vector_future.result()
+
+        return reciprocal_rank_fusion(
+            [vector_docs, lexical_docs],
+            [self.vector_weight, self.lexical_weight],
+            self.k,
+            self.rrf_k,
+        )
+
+
+class CachedRetriever(BaseRetriever):
+    """Serve a retriever's results from a `RetrievalCache` keyed on the query embedding.
+
+    Only the IDs and metadata of the hits are cached; on a hit their texts are
+    loaded by ID from the vector store. A hit whose chunks no longer all exist
+    is dropped and the query is retrieved again.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    vector_store: VectorStore
+    cache: RetrievalCache
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # The shared embedder caches query embeddings, so the inner retriever does not embed the query again.
+        vector = self.cache.normalize(self.vector_store.embeddings.embed_query(query))
+        with span("retrieval_cache lookup") as current:
+            generation = self.cache.generation()
+            cached = self.cache.lookup(vector)
+            docs = self._load(cached) if cached is not None else None
+            if cached is not None and docs is None:
+                self.cache.discard(vector)
+            current.set(**{"retrieval_cache.hit": docs is not None})
+        if docs is not None:
+            return docs
+
+        docs = self.retriever.invoke(query, {"callbacks": run_manager.get_child()})
+        if all(doc.id for doc in docs):
+            self.cache.store(vector, [(doc.id, dict(doc.metadata or {})) for doc in docs], generation)
+        return docs
+
+    def _load(self, cached: List[Tuple[str, Dict[str, Any]]]) -> Optional[List[Document]]:
+        by_id = {doc.id: doc for doc in self.vector_store.get_by_ids([doc_id for doc_id, _ in cached])}
+        if len(by_id) < len(cached):
+            return None
+        return [Document(id=doc_id, page_content=by_id[doc_id].page_content, metadata=metadata) for doc_id, metadata in cached]
+
+
+def with_surrounding_chunks(
+    docs: List[Document], vector_store: VectorStore, neighbours: NeighbourStore, neighbour_span: int
+) -> List[Document]:
+    """Append the chunks within `neighbour_span` positions of each of `docs` in reading order.
+
+    Neighbours come from the positions precomputed at ingestion and are loaded
+    by ID, so no search runs. They are appended after every retrieved chunk so
+    the retrieval ranks are unchanged; context assembly merges each with the
+    chunk it touches.
+    """
+    ids = [doc.id for doc in docs if doc.id]
+    surrounding = neighbours.surrounding(ids, neighbour_span)
+    if not surrounding:
+        return docs
+    try:
+        loaded = vector_store.get_by_ids(surrounding)
+    except NotImplementedError:
+        return docs
+    return [*docs, *loaded]
+
+
+def procedure_retriever(vector_store: VectorStore, context: Optional[Context] = None) -> BaseRetriever:
+    context = context or get_runtime(Context).context
+    search_kwargs: dict[str, Any] = {"k": context.retriever_k}
+    if context.vector_store_backend == "local" and context.ann_enabled:
+        search_kwargs["nprobe"] = context.ann_nprobe
+        search_kwargs["rerank_factor"] = context.ann_rerank_factor
+    vector_retriever = vector_store.as_retriever(search_kwargs=search_kwargs)
+
+    retriever: BaseRetriever = vector_retriever
+    if context.retriever_mode == "hybrid":
+        retriever = HybridRetriever(
+            vector_retriever=vector_retriever,
+            lexical_index=lexical_index(context.lexical_index_path, context.cache_dir),
+            k=context.retriever_k,
+            vector_weight=context.hybrid_vector_weight,
+            lexical_weight=context.hybrid_lexical_weight,
+            rrf_k=context.rrf_k,
+        )
+
+    if not context.retrieval_cache_enabled:
+        return retriever
+
+    cache = RetrievalCache(
+        bits=context.retrieval_cache_lsh_bits,
+        tables=context.retrieval_cache_lsh_tables,
+        similarity_threshold=context.retrieval_cache_similarity_threshold,
+        max_entries=context.retrieval_cache_max_entries,
+        generation=ingestion_generation(context.cache_dir),
+        name=str(context.cache_dir),
+    )
+    register_metrics(f"retrieval_cache:{cache.name}", cache.prometheus)
+    return CachedRetriever(retriever=retriever, vector_store=vector_store, cache=cache)
+
+RETRIEVERS: List[Callable[..., Any]] = [procedure_retriever]
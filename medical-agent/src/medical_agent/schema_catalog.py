@@ -0,0 +1,258 @@
+"""In-memory catalog of the hospital database schema.
+
+The SQL agent used to spend tool round-trips listing tables and reflecting
+the partitioned tables on every question. The catalog reads tables, columns,
+column comments, indexes, partition ranges and a few sample rows once, serves
+them from memory to the SQL tools, and renders a compact schema block for the
+SQL agent's system prompt.
+
+A cheap fingerprint query (per table: name, creation time, comment and
+checksums of its columns, indexes and partitions) runs at most every
+`refresh_interval` seconds; the full catalog is only rebuilt when the
+fingerprint changes, i.e. after DDL, including in-place `ALTER TABLE ...
+MODIFY`, index changes and `REORGANIZE PARTITION`.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+
+from medical_agent.context import Context
+from medical_agent.database import database_pool
+from medical_agent.prompts import append_sections
+
+logger = logging.getLogger(__name__)
+
+# CRC32 sums of everything the catalog renders, so any change to a column's
+# type or comment, an index or a partition range changes the fingerprint.
+FINGERPRINT = (
+    "SELECT t.table_name AS name, t.create_time AS created, t.table_comment AS comment, "
+    "(SELECT SUM(CRC32(CONCAT_WS('|', c.ordinal_position, c.column_name, c.column_type, c.is_nullable, "
+    "c.column_key, c.column_comment))) FROM information_schema.columns c "
+    "WHERE c.table_schema = t.table_schema AND c.table_name = t.table_name) AS columns, "
+    "(SELECT SUM(CRC32(CONCAT_WS('|', s.index_name, s.seq_in_index, s.column_name, s.non_unique))) "
+    "FROM information_schema.statistics s "
+    "WHERE s.table_schema = t.table_schema AND s.table_name = t.table_name) AS indexes, "
+    "(SELECT SUM(CRC32(CONCAT_WS('|', p.partition_ordinal_position, p.partition_name, p.partition_method, "
+    "p.partition_expression, p.partition_description))) FROM information_schema.partitions p "
+    "WHERE p.table_schema = t.table_schema AND p.table_name = t.table_name AND p.partition_name IS NOT NULL) AS partitions "
+    "FROM information_schema.tables t "
+    "WHERE t.table_schema = DATABASE() AND t.table_type = 'BASE TABLE' ORDER BY t.table_name"
+)
+
+COLUMNS = (
+    "SELECT table_name AS table_name, column_name AS name, column_type AS type, is_nullable AS nullable, "
+    "column_key AS `key`, column_comment AS comment "
+    "FROM information_schema.columns WHERE table_schema = DATABASE() ORDER BY table_name, ordinal_position"
+)
+
+INDEXES = (
+    "SELECT table_name AS table_name, index_name AS name, column_name AS column_name "
+    "FROM information_schema.statistics WHERE table_schema = DATABASE() "
+    "ORDER BY table_name, index_name, seq_in_index"
+)
+
+PARTITIONS = (
+    "SELECT table_name AS table_name, partition_name AS name, partition_method AS method, "
+    "partition_expression AS expression, partition_description AS description "
+    "FROM information_schema.partitions WHERE table_schema = DATABASE() AND partition_name IS NOT NULL "
+    "ORDER BY table_name, partition_ordinal_position"
+)
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    nullable: bool
+    key: str
+    comment: str
+
+
+@dataclass
+class PartitionInfo:
+    name: str
+    description: str
+
+
+@dataclass
+class TableInfo:
+    """Everything the SQL agent needs to know about one table."""
+
+    name: str
+    comment: str = ""
+    columns: List[ColumnInfo] = field(default_factory=list)
+    indexes: Dict[str, List[str]] = field(default_factory=dict)
+    partition_method: str = ""
+    partition_expression: str = ""
+    partitions: List[PartitionInfo] = field(default_factory=list)
+    create_statement: str = ""
+    sample_columns: List[str] = field(default_factory=list)
+    sample_rows: List[Tuple[Any, ...]] = field(default_factory=list)
+
+    def render_compact(self) -> str:
+        """One block per table for the system prompt: columns, comments, indexes and partitions."""
+        columns = []
+        for column in self.columns:
+            text = f"{column.name} {column.type}"
+            if column.key == "PRI":
+                text += " PK"
+            if not column.nullable and column.key != "PRI":
+                text += " NOT NULL"
+            if column.comment:
+                text += f" -- {column.comment}"
+            columns.append(f"  {text}")
+
+        lines = [f"{self.name}" + (f": {self.comment}" if self.comment else "")]
+        lines += columns
+        secondary = {name: cols for name, cols in self.indexes.items() if name != "PRIMARY"}
+        if secondary:
+            lines.append("  indexes: " + ", ".join(f"{name}({', '.join(cols)})" for name, cols in secondary.items()))
+        if self.partitions:
+            ranges = ", ".join(f"{p.name} < {p.description}" for p in self.partitions)
+            lines.append(f"  partitioned by {self.partition_method} ({self.partition_expression}): {ranges}")
+        return "\n".join(lines)
+
+    def render_schema(self) -> str:
+        """`sql_db_schema` output: the CREATE TABLE statement followed by sample rows."""
+        sample = "\n".join("\t".join(str(value)[:100] for value in row) for row in self.sample_rows)
+        return (
+            f"{self.create_statement}\n\n/*\n{len(self.sample_rows)} rows from {self.name} table:\n"
+            + "\t".join(self.sample_columns)
+            + f"\n{sample}\n*/"
+        )
+
+
+class SchemaCatalog:
+    """Schema of the hospital database, held in memory and refreshed on DDL change.
+
+    Args:
+        context (Context): Agent context with the database settings.
+        refresh_interval (float): Minimum time between two fingerprint checks, in seconds.
+        sample_rows (int): Number of sample rows kept per table.
+    """
+
+    def __init__(self, context: Context, refresh_interval: float = 300.0, sample_rows: int = 3):
+        self.context = context
+        self.refresh_interval = refresh_interval
+        self.sample_rows = sample_rows
+        self.tables: Dict[str, TableInfo] = {}
+        self._fingerprint: Optional[List[Tuple[Any, ...]]] = None
+        self._checked_at = float("-inf")
+        self._rendered = ""
+
+    @property
+    def table_names(self) -> List[str]:
+        return list(self.tables)
+
+    async def ensure_fresh(self) -> "SchemaCatalog":
+        """Rebuild the catalog if it is empty or the schema fingerprint changed since the last check."""
+        now = time.monotonic()
+        if self.tables and now - self._checked_at < self.refresh_interval:
+            return self
+        # Set before awaiting so concurrent callers do not all run the check.
+        self._checked_at = now
+        pool = database_pool(self.context)
+        rows = await pool.fetch_all(FINGERPRINT)
+        fingerprint = [tuple(row.values()) for row in rows]
+        if fingerprint != self._fingerprint:
+            await self._rebuild({row["name"]: row["comment"] for row in rows})
+            self._fingerprint = fingerprint
+        return self
+
+    def render(self) -> str:
+        """The compact schema block injected into the SQL agent's system prompt."""
+        return self._rendered
+
+    async def _rebuild(self, comments: Dict[str, str]) -> None:
+        started = time.perf_counter()
+        pool = database_pool(self.context)
+        columns, indexes, partitions = await asyncio.gather(
+            pool.fetch_all(COLUMNS), pool.fetch_all(INDEXES), pool.fetch_all(PARTITIONS)
+        )
+
+        tables: Dict[str, TableInfo] = {name: TableInfo(name=name, comment=comment or "") for name, comment in comments.items()}
+        for row in columns:
+            table = tables.get(row["table_name"])
+            if table is not None:
+                table.columns.append(
+                    ColumnInfo(row["name"], row["type"], row["nullable"] == "YES", row["key"] or "", row["comment"] or "")
+                )
+        for row in indexes:
+            table = tables.get(row["table_name"])
+            if table is not None:
+                table.indexes.setdefault(row["name"], []).append(row["column_name"])
+        for row in partitions:
+            table = tables.get(row["table_name"])
+            if table is not None:
+                table.partition_method = row["method"] or ""
+                table.partition_expression = (row["expression"] or "").replace("`", "")
+                table.partitions.append(PartitionInfo(row["name"], row["description"] or ""))
+
+        await asyncio.gather(*(self._load_table_details(table) for table in tables.values()))
+
+        self.tables = tables
+        self._rendered = "\n\n".join(table.render_compact() for table in tables.values())
+        logger.info("Built schema catalog of %d tables in %.3fs", len(tables), time.perf_counter() - started)
+
+    async def _load_table_details(self, table: TableInfo) -> None:
+        pool = database_pool(self.context)
+        # Names come from information_schema, so quoting them is safe.
+        _, create = await pool.fetch_raw(f"SHOW CREATE TABLE `{table.name}`")
+        table.create_statement = create[0][1] if create else ""
+        if self.sample_rows:
+            table.sample_columns, table.sample_rows = await pool.fetch_raw(
+                f"SELECT * FROM `{table.name}` LIMIT {self.sample_rows}"
+            )
+
+
+_catalogs: Dict[Tuple[str, int, str], SchemaCatalog] = {}
+
+
+def schema_catalog(context: Optional[Context] = None) -> SchemaCatalog:
+    """Return the catalog shared by the SQL tools and the SQL agent prompt.
+
+    Args:
+        context (Optional[Context]): Agent context with the database and refresh settings.
+    """
+    context = context or Context()
+    key = (context.db_host, context.db_port, context.db_name)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = SchemaCatalog(
+            context,
+            refresh_interval=context.schema_catalog_refresh_seconds,
+            sample_rows=context.schema_catalog_sample_rows,
+        )
+    return catalog
+
+
+class SchemaPromptMiddleware(AgentMiddleware):
+    """Append the pre-rendered schema block to the agent's system prompt.
+
+    The catalog is refreshed (cheaply, see `SchemaCatalog.ensure_fresh`) before
+    each model call, so the model can write queries without listing tables or
+    fetching schemas first.
+    """
+
+    def __init__(self, catalog: SchemaCatalog):
+        super().__init__()
+        self.catalog = catalog
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        try:
+            await self.catalog.ensure_fresh()
+        except Exception:
+            # The tools still work without the block; the model just has to look the schema up.
+            logger.exception("Could not refresh the schema catalog")
+        schema = self.catalog.render()
+        if not schema:
+            return await handler(request)
+        system_prompt = append_sections(request.system_prompt or "", ("Database schema", schema))
+        return await handler(request.override(system_prompt=system_prompt))
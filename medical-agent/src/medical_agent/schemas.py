@@ -62,4 +62,40 @@ class RequiredInfo(TypedDict):
     """
     A flag indicating whether additional disease information is required.
     This can be used to determine if the agent needs to gather more details about specific diseases mentioned by the user.
-    """
\ No newline at end of file
+    """
+
+    ad_hoc_patient_query: bool = field(default=False)
+    """
+    A flag indicating whether the patient question filters, aggregates or names a period.
+    Such questions go to the SQL agent instead of the precompiled record lookup.
+    """
+
+@dataclass
+class ConversationMemory(TypedDict):
+    """Compact record of a consultation, folded from the `UserInputInfo` of every turn."""
+
+    patient_name: str = field(default="")
+    """
+    The patient the consultation is currently about.
+    Naming another patient starts a new record.
+    """
+
+    symptoms: List[str] = field(default_factory=list)
+    """
+    Every symptom reported about the patient, in order of first mention.
+    """
+
+    diseases: List[str] = field(default_factory=list)
+    """
+    Every disease or condition mentioned about the patient, in order of first mention.
+    """
+
+    notes: List[str] = field(default_factory=list)
+    """
+    One-line summaries of the most recent turns, oldest first.
+    """
+
+    turns: int = field(default=0)
+    """
+    Number of turns folded into the record.
+    """
@@ -0,0 +1,325 @@
+"""Lightweight MySQL tokenizer and SELECT analysis for rewriting generated SQL.
+
+This is not a full SQL parser. It understands enough of a single top-level
+SELECT (table references, join kinds, aliases and the WHERE clause) to add
+predicates safely; anything it does not understand (CTEs, UNIONs, multiple
+statements) is reported as unsupported and left untouched by callers.
+
+It also classifies statements as read-only or not, for the guardrails.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    |(?P<ident>`(?:[^`]|``)*`)
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<space>\s+)
+    |(?P<op><=|>=|<>|!=|:=|\|\||&&)
+    |(?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Keywords that end a table reference or a WHERE clause at the top level.
+_CLAUSE_KEYWORDS = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "FOR", "WINDOW", "INTO", "LOCK", "PROCEDURE"}
+_JOIN_KEYWORDS = {"JOIN", "STRAIGHT_JOIN"}
+_JOIN_MODIFIERS = {"LEFT", "RIGHT", "INNER", "CROSS", "OUTER", "NATURAL"}
+_RESERVED_AFTER_TABLE = _CLAUSE_KEYWORDS | _JOIN_KEYWORDS | _JOIN_MODIFIERS | {"ON", "USING", "AS", "USE", "FORCE", "IGNORE", "PARTITION", "UNION"}
+
+READ_ONLY_STATEMENTS = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN", "TABLE", "VALUES"}
+# Keywords that make a statement write wherever they appear (e.g. `WITH ... DELETE`, `SELECT ... INTO OUTFILE`).
+WRITE_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "REPLACE", "DROP", "CREATE", "ALTER", "RENAME", "TRUNCATE",
+    "GRANT", "REVOKE", "OUTFILE", "DUMPFILE",
+}
+# Aggregate functions whose result depends on every row the query reads.
+_AGGREGATE_FUNCTIONS = {"COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STDDEV", "VARIANCE", "BIT_AND", "BIT_OR"}
+# MySQL (`/*!`, `/*!50000`) and MariaDB (`/*M!`) run the body of these comments as SQL.
+_EXECUTABLE_COMMENT_RE = re.compile(r"^/\*M?!\d*")
+_SCHEMA_OBJECTS = {
+    "TABLE", "TABLES", "DATABASE", "SCHEMA", "INDEX", "VIEW", "USER", "ROLE", "TRIGGER", "PROCEDURE",
+    "FUNCTION", "EVENT", "TEMPORARY", "UNIQUE", "OR",
+}
+
+
+@dataclass
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper() if self.kind == "word" else self.text
+
+    @property
+    def name(self) -> str:
+        """Identifier value with backticks removed."""
+        return self.text[1:-1].replace("``", "`") if self.kind == "ident" else self.text
+
+
+def tokenize_sql(sql: str) -> List[Token]:
+    """Split SQL into tokens, tagging each with its parenthesis depth."""
+    tokens = []
+    depth = 0
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup or "punct"
+        text = match.group()
+        if text == ")":
+            depth = max(depth - 1, 0)
+        tokens.append(Token(kind, text, match.start(), match.end(), depth))
+        if text == "(":
+            depth += 1
+    return tokens
+
+
+def significant(tokens: List[Token]) -> List[Token]:
+    """Drop whitespace and comments."""
+    return [token for token in tokens if token.kind not in ("space", "comment")]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split on top-level semicolons, ignoring those inside strings and comments."""
+    statements, start = [], 0
+    for token in tokenize_sql(sql):
+        if token.text == ";" and token.depth == 0:
+            statements.append(sql[start:token.start])
+            start = token.end
+    statements.append(sql[start:])
+    return [statement for statement in statements if statement.strip()]
+
+
+def write_operations(sql: str) -> List[str]:
+    """Return the keywords that make `sql` modify data, schema or privileges; empty when it is read-only.
+
+    Keywords inside strings, comments and backticked identifiers are ignored, as
+    are `INSERT(...)` and `REPLACE(...)` used as string functions. The body of
+    executable comments (`/*! ... */`) is checked, since MySQL runs it.
+    """
+    operations = []
+    for statement in split_statements(sql):
+        all_tokens = tokenize_sql(statement)
+        for comment in all_tokens:
+            if comment.kind == "comment" and (match := _EXECUTABLE_COMMENT_RE.match(comment.text)):
+                operations += _write_keywords(significant(tokenize_sql(comment.text[match.end() : -2])))
+        tokens = significant(all_tokens)
+        if not tokens:
+            continue
+        if tokens[0].upper not in READ_ONLY_STATEMENTS:
+            operations.append(tokens[0].upper)
+        operations += _write_keywords(tokens[1:])
+    return list(dict.fromkeys(operations))
+
+
+def _write_keywords(tokens: List[Token]) -> List[str]:
+    return [
+        token.upper
+        for token, following in zip(tokens, tokens[1:] + [None])
+        if token.kind == "word" and token.upper in WRITE_KEYWORDS and not (following and following.text == "(")
+    ]
+
+
+def write_statement_prefix(text: str) -> Optional[str]:
+    """Return the operation if `text` starts like a statement that writes, else None.
+
+    Meant for prose: "update me on Alice" or "create a summary" do not match,
+    "UPDATE patients SET ...", "delete the exams from ..." and "drop table x" do.
+    """
+    tokens = significant(tokenize_sql(text[:200]))[:8]
+    if not tokens or tokens[0].kind != "word":
+        return None
+    words = [token.upper for token in tokens]
+    operation, rest = words[0], words[1:]
+    if operation in ("INSERT", "REPLACE"):
+        matched = bool(rest) and rest[0] in ("INTO", "IGNORE", "LOW_PRIORITY", "DELAYED", "HIGH_PRIORITY")
+    elif operation == "UPDATE":
+        matched = len(tokens) > 2 and tokens[1].kind in ("word", "ident") and "SET" in words[2:4]
+    elif operation == "DELETE":
+        matched = "FROM" in rest[:3]
+    elif operation in ("DROP", "CREATE", "ALTER", "RENAME"):
+        matched = bool(rest) and rest[0] in _SCHEMA_OBJECTS
+    elif operation == "TRUNCATE":
+        matched = bool(rest) and rest[0] == "TABLE"
+    elif operation in ("GRANT", "REVOKE"):
+        matched = "ON" in rest[:5]
+    else:
+        matched = False
+    return operation if matched else None
+
+
+@dataclass
+class TableRef:
+    name: str
+    alias: str
+    join: str
+    """`from` for tables in the FROM list, otherwise the join kind (`inner`, `left`, `right`, `cross`)."""
+
+
+@dataclass
+class SelectQuery:
+    """A single top-level SELECT with the positions needed to add WHERE predicates."""
+
+    sql: str
+    tables: List[TableRef] = field(default_factory=list)
+    where: Optional[Tuple[int, int]] = None
+    """Character span of the WHERE condition, if there is one."""
+    insert_at: int = 0
+    """Where a new WHERE clause goes when there is none."""
+    where_columns: Set[Tuple[str, str]] = field(default_factory=set)
+    """`(qualifier, column)` pairs referenced in the WHERE clause; qualifier is empty when unqualified."""
+    aggregate: bool = False
+    """True when the select list calls an aggregate function or the query has GROUP BY or HAVING."""
+
+    def with_conditions(self, conditions: List[str]) -> str:
+        """Return the SQL with `conditions` AND-ed into the WHERE clause."""
+        if not conditions:
+            return self.sql
+        extra = " AND ".join(conditions)
+        if self.where is not None:
+            start, end = self.where
+            return f"{self.sql[:start]}({self.sql[start:end]}) AND {extra}{self.sql[end:]}"
+        before, after = self.sql[: self.insert_at].rstrip(), self.sql[self.insert_at :].lstrip()
+        return f"{before} WHERE {extra}" + (f" {after}" if after else "")
+
+
+def parse_select(sql: str) -> Optional[SelectQuery]:
+    """Analyse a single SELECT statement, or return None if it is not one this module can rewrite."""
+    statements = split_statements(sql)
+    if len(statements) != 1:
+        return None
+    sql = statements[0].rstrip()
+    tokens = significant(tokenize_sql(sql))
+    if not tokens or tokens[0].upper != "SELECT":
+        return None
+    top = [token for token in tokens if token.depth == 0]
+    if any(token.upper in ("UNION", "INTERSECT", "EXCEPT") for token in top):
+        return None
+
+    query = SelectQuery(sql=sql, insert_at=len(sql))
+    index = _find(top, 0, {"FROM"})
+    query.aggregate = _is_aggregate(top, len(top) if index is None else index)
+    if index is None:
+        return query
+
+    where_start = None
+    i = index + 1
+    join = "from"
+    while i < len(top):
+        token = top[i]
+        keyword = token.upper
+        if keyword in _CLAUSE_KEYWORDS:
+            if keyword == "WHERE":
+                where_start = i
+            else:
+                query.insert_at = token.start
+            break
+        if keyword in _JOIN_MODIFIERS or keyword in _JOIN_KEYWORDS:
+            join = _join_kind(top, i)
+            while i < len(top) and top[i].upper not in _JOIN_KEYWORDS:
+                i += 1
+            i += 1
+            continue
+        if keyword == ",":
+            join = "from"
+            i += 1
+            continue
+        if keyword == "(":
+            # Derived table: skip it and its alias, it is not a base table reference.
+            i = _find(top, i + 1, {")"}) or len(top)
+            i += 1
+            if i < len(top) and top[i].upper == "AS":
+                i += 1
+            if i < len(top) and top[i].kind in ("word", "ident") and top[i].upper not in _RESERVED_AFTER_TABLE:
+                i += 1
+            continue
+        if keyword in ("ON", "USING"):
+            i = _skip_condition(top, i + 1)
+            continue
+        if token.kind in ("word", "ident") and keyword not in _RESERVED_AFTER_TABLE:
+            i = _read_table(top, i, join, query.tables)
+            continue
+        i += 1
+
+    if where_start is not None:
+        end_index = _find(top, where_start + 1, _CLAUSE_KEYWORDS - {"WHERE"})
+        start_char = top[where_start].end
+        end_char = top[end_index].start if end_index is not None else len(sql)
+        body = sql[start_char:end_char]
+        query.where = (start_char + len(body) - len(body.lstrip()), start_char + len(body.rstrip()))
+        query.where_columns = _columns(tokens, top[where_start].end, end_char)
+    return query
+
+
+def _find(tokens: List[Token], start: int, keywords: Set[str]) -> Optional[int]:
+    for index in range(start, len(tokens)):
+        if tokens[index].upper in keywords:
+            return index
+    return None
+
+
+def _is_aggregate(top: List[Token], select_end: int) -> bool:
+    if any(token.upper in ("GROUP", "HAVING") for token in top[select_end:]):
+        return True
+    select_list = top[1:select_end]
+    return any(
+        token.kind == "word" and token.upper in _AGGREGATE_FUNCTIONS and following.text == "("
+        for token, following in zip(select_list, select_list[1:])
+    )
+
+
+def _join_kind(tokens: List[Token], index: int) -> str:
+    words = []
+    while index < len(tokens) and tokens[index].upper not in _JOIN_KEYWORDS:
+        words.append(tokens[index].upper)
+        index += 1
+    for kind in ("LEFT", "RIGHT", "CROSS"):
+        if kind in words:
+            return kind.lower()
+    return "inner"
+
+
+def _skip_condition(tokens: List[Token], index: int) -> int:
+    while index < len(tokens):
+        keyword = tokens[index].upper
+        if keyword in _CLAUSE_KEYWORDS or keyword in _JOIN_KEYWORDS or keyword in _JOIN_MODIFIERS or keyword == ",":
+            return index
+        index += 1
+    return index
+
+
+def _read_table(tokens: List[Token], index: int, join: str, tables: List[TableRef]) -> int:
+    name = tokens[index].name
+    index += 1
+    # Qualified names: db.table
+    while index + 1 < len(tokens) and tokens[index].text == "." and tokens[index + 1].kind in ("word", "ident"):
+        name = tokens[index + 1].name
+        index += 2
+    alias = name
+    if index < len(tokens) and tokens[index].upper == "AS":
+        index += 1
+    if index < len(tokens) and tokens[index].kind in ("word", "ident") and tokens[index].upper not in _RESERVED_AFTER_TABLE:
+        alias = tokens[index].name
+        index += 1
+    tables.append(TableRef(name=name, alias=alias, join=join))
+    return index
+
+
+def _columns(tokens: List[Token], start: int, end: int) -> Set[Tuple[str, str]]:
+    inside = [token for token in tokens if start <= token.start < end]
+    columns = set()
+    for i, token in enumerate(inside):
+        if token.kind not in ("word", "ident"):
+            continue
+        if i + 2 < len(inside) and inside[i + 1].text == "." and inside[i + 2].kind in ("word", "ident"):
+            columns.add((token.name.lower(), inside[i + 2].name.lower()))
+        elif not (i >= 1 and inside[i - 1].text == "."):
+            columns.add(("", token.name.lower()))
+    return columns
@@ -1,12 +1,17 @@
 from dataclasses import dataclass, field
-from typing import List, List, Literal, Sequence, TypedDict
+from typing import Dict, List, Sequence, TypedDict
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
 from typing_extensions import Annotated
 from langchain_core.documents import Document
 
-from medical_agent.schemas import RequiredInfo, UserInputInfo
+from medical_agent.schemas import ConversationMemory, RequiredInfo, UserInputInfo
+
+
+def merge_timings(left: Dict[str, float] | None, right: Dict[str, float] | None) -> Dict[str, float]:
+    """Merge branch timings written by nodes that run in the same step."""
+    return {**(left or {}), **(right or {})}
 
 
 @dataclass
@@ -95,4 +100,16 @@ class MedicalState(InputState):
     """
     Flags indicating what additional information is required.
     This can be used to determine if the agent needs to gather more details about the patient, procedure guidelines, or disease information.
+    """
+
+    memory: ConversationMemory = field(default_factory=ConversationMemory)
+    """
+    Compact record of the whole consultation.
+    Messages that leave the window kept in `messages` are only remembered through it.
+    """
+
+    branch_timings: Annotated[Dict[str, float], merge_timings] = field(default_factory=dict)
+    """
+    Wall-clock seconds spent in each information-gathering branch of the current run.
+    Branches run in parallel, so the run's gathering latency is the maximum, not the sum.
     """
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Custom stream events forwarded from the sub-agents to the client.
+
+The SQL and PDF agents run inside graph nodes and supervisor tools, so their
+output used to reach the client only once they had finished. They are now
+streamed, and what they produce is written to the caller's LangGraph stream
+writer as soon as it is available:
+
+- `{"event": "citations", "source": ..., "sources": ["file.pdf:3", ...]}` when
+  procedure retrieval finishes, before the model starts answering;
+- `{"event": "token", "source": ..., "text": ...}` for every chunk of a
+  sub-agent's answer.
+- `{"event": "records", "source": "patient_query", "patient_name": ..., "text": ...}`
+  with a patient's records when they come from the precompiled lookup rather
+  than from the SQL agent's answer.
+
+`source` is the tool that produced the event (`patient_query` or
+`procedure_search`). Clients read these with `stream_mode="custom"`, and the
+supervisor's own final answer with `stream_mode="messages"`:
+
+    async for mode, chunk in graph.astream(inputs, stream_mode=["custom", "messages"]):
+        ...
+
+Outside a streamed run the events are dropped.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import AIMessageChunk
+from langgraph.config import get_stream_writer
+from langgraph.types import StreamWriter
+
+logger = logging.getLogger(__name__)
+
+PATIENT_QUERY = "patient_query"
+PROCEDURE_SEARCH = "procedure_search"
+
+
+def _discard(chunk: Any) -> None:
+    pass
+
+
+def stream_writer() -> StreamWriter:
+    """The stream writer of the current LangGraph run, or one that drops events outside a run."""
+    try:
+        return get_stream_writer()
+    except (RuntimeError, KeyError):
+        return _discard
+
+
+def emit(event: str, source: str, **payload: Any) -> None:
+    """Write one custom event to the current run's stream."""
+    stream_writer()({"event": event, "source": source, **payload})
+
+
+async def astream_agent(agent, inputs: Dict[str, Any], source: str, context: Any = None) -> Optional[Dict[str, Any]]:
+    """Run `agent` to completion, forwarding its answer tokens and custom events to the caller's stream.
+
+    Args:
+        agent: A compiled agent graph.
+        inputs (Dict[str, Any]): The agent's input state.
+        source (str): Name the forwarded token events are tagged with.
+        context (Any): Runtime context passed to the agent's run.
+
+    Returns:
+        Optional[Dict[str, Any]]: The agent's final state, as `ainvoke` would return it.
+    """
+    # Taken here: inside the agent, `get_stream_writer` is the agent's own.
+    write = stream_writer()
+    final = None
+    async for mode, chunk in agent.astream(inputs, stream_mode=["messages", "custom", "values"], context=context):
+        if mode == "values":
+            final = chunk
+        elif mode == "custom":
+            write(chunk)
+        else:
+            message, _ = chunk
+            # Chunks of a tool-calling turn are not part of the answer.
+            if isinstance(message, AIMessageChunk) and message.text and not message.tool_call_chunks:
+                write({"event": "token", "source": source, "text": message.text})
+    return final
@@ -1,18 +1,90 @@
-from typing import Any, Callable, List
+from typing import Any, Callable, List, Optional
+
+from langchain_community.tools.sql_database.prompt import QUERY_CHECKER
+from langchain_core.language_models import BaseChatModel
+from langchain_core.tools import BaseTool, tool
+from mysql.connector.errors import Error as MySQLError
 
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langgraph.runtime import get_runtime
 from medical_agent.context import Context
-from utils import load_chat_model
+from medical_agent.database import database_pool
+from medical_agent.registry import registry
+from medical_agent.schema_catalog import schema_catalog
+from medical_agent.utils import get_message_text
 
 """This module provides medical-related tools for the medical agent.
 These tools are intended to be used by the medical agent to assist with various tasks.
 """
 
-runtime = get_runtime(Context)
+MAX_RESULT_ROWS = 100
+
+
+def sql_database_tools(llm: BaseChatModel, context: Optional[Context] = None) -> List[BaseTool]:
+    """Build the SQL agent's tools on top of the shared async connection pool.
+
+    They mirror `SQLDatabaseToolkit` (same names and descriptions, so the SQL
+    agent prompt still applies), but run on pooled async connections instead
+    of a synchronous engine, and table lists and schemas are served from the
+    in-memory schema catalog.
+
+    Args:
+        llm (BaseChatModel): Model used by the query checker.
+        context (Optional[Context]): Agent context with the database settings.
+    """
+    context = context or Context()
+
+    @tool("sql_db_list_tables")
+    async def list_tables(tool_input: str = "") -> str:
+        """Input is an empty string, output is a comma-separated list of tables in the database."""
+        catalog = await schema_catalog(context).ensure_fresh()
+        return ", ".join(catalog.table_names)
+
+    @tool("sql_db_schema")
+    async def table_schema(table_names: str) -> str:
+        """Get the schema and sample rows for the specified SQL tables.
+
+        Input to this tool is a comma-separated list of tables, output is the schema and sample rows for those tables.
+        The available tables are listed in the database schema of the system prompt.
+        Example Input: table1, table2, table3
+        """
+        catalog = await schema_catalog(context).ensure_fresh()
+        requested = [name.strip().strip("`") for name in table_names.split(",") if name.strip()]
+        missing = [name for name in requested if name not in catalog.tables]
+        if missing:
+            return f"Error: table_names {set(missing)} not found in database"
+        return "\n\n".join(catalog.tables[name].render_schema() for name in requested)
+
+    @tool("sql_db_query")
+    async def run_query(query: str) -> str:
+        """Input to this tool is a detailed and correct SQL query, output is a result from the database.
+
+        If the query is not correct, an error message will be returned.
+        If an error is returned, rewrite the query, check the query, and try again.
+        """
+        try:
+            _, rows = await database_pool(context).fetch_raw(query, max_rows=MAX_RESULT_ROWS)
+        except MySQLError as exc:
+            return f"Error: {exc}"
+        return str([tuple(str(value)[:100] if isinstance(value, str) else value for value in row) for row in rows]) if rows else ""
+
+    @tool("sql_db_query_checker")
+    async def check_query(query: str) -> str:
+        """Use this tool to double check if your query is correct before executing it.
+
+        Always use this tool before executing a query with sql_db_query!
+        """
+        response = await llm.ainvoke(QUERY_CHECKER.format(query=query, dialect="MySQL"))
+        return get_message_text(response)
+
+    return [table_schema, run_query, list_tables, check_query]
+
 
+def build_sql_tools(context: Context) -> List[BaseTool]:
+    """Build the SQL tools with the configured SQL model; called by the component registry."""
+    return sql_database_tools(registry.get("sql_model", context), context)
 
 
-TOOLS: List[Callable[..., Any]] = SQLDatabaseToolkit(db=runtime.context.sql_db_connection, llm=load_chat_model(runtime.context.sql_model)).get_tools() + [
-    
-]
\ No newline at end of file
+def __getattr__(name: str) -> List[Callable[..., Any]]:
+    # TOOLS is built on first access so importing this module does not load a model.
+    if name == "TOOLS":
+        return list(registry.get("sql_tools"))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,481 @@
+"""Nested latency, token and row-count spans for the graph and its sub-agents.
+
+Spans are recorded for graph nodes, tool calls, LLM calls and retrievers
+(through a LangChain callback handler registered globally), and for embedding
+calls, vector and lexical searches and SQL statements (through `span` blocks
+in those code paths). Nothing needs an external collector:
+
+- finished spans are appended to a JSONL file, one OTLP/JSON
+  `ExportTraceServiceRequest` per line, the format of the OpenTelemetry
+  collector's file exporter, so the file can be replayed into any OTLP backend;
+- span durations feed per-name histograms whose p50/p95/p99 are served in
+  Prometheus text format by `metrics_text` and, optionally, over HTTP.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tracers.context import register_configure_hook
+
+from medical_agent.context import Context
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "medical-agent"
+
+
+@dataclass
+class Span:
+    """One timed operation; `attributes` follow OpenTelemetry naming where one exists."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds (up to now if the span is still open)."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set(self, **attributes: Any) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonlSpanExporter:
+    """Append finished spans to a file as OTLP/JSON lines."""
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span: Span) -> None:
+        record = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp()]}],
+                }
+            ]
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+# Log-spaced bucket bounds from 10µs to ~10min, 10% apart: quantiles are within 10%.
+# Cache hits and lock waits take microseconds, so the range starts well below 1ms.
+_BUCKETS = [0.00001 * 1.1**i for i in range(190)]
+# Prometheus quantile labels of the summary keys.
+_QUANTILES = (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))
+
+
+class LatencyHistograms:
+    """Per-span-name duration histograms with quantile estimates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        bucket = bisect.bisect_left(_BUCKETS, seconds)
+        with self._lock:
+            counts = self._counts.setdefault(name, [0] * (len(_BUCKETS) + 1))
+            counts[bucket] += 1
+            self._sums[name] = self._sums.get(name, 0.0) + seconds
+            low, high = self._bounds.get(name, (seconds, seconds))
+            self._bounds[name] = (min(low, seconds), max(high, seconds))
+
+    def quantile(self, name: str, q: float) -> float:
+        """Upper bound of the bucket holding quantile `q`, clamped to the observed min and max."""
+        with self._lock:
+            counts = list(self._counts.get(name, ()))
+            low, high = self._bounds.get(name, (0.0, 0.0))
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        estimate = _BUCKETS[-1]
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                estimate = _BUCKETS[min(bucket, len(_BUCKETS) - 1)]
+                break
+        return min(max(estimate, low), high)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """`{span name: {count, sum, min, max, p50, p95, p99}}`, durations in seconds."""
+        with self._lock:
+            names = {name: (sum(counts), self._sums[name], self._bounds[name]) for name, counts in self._counts.items()}
+        return {
+            name: {
+                "count": count,
+                "sum": total,
+                "min": low,
+                "max": high,
+                "p50": self.quantile(name, 0.50),
+                "p95": self.quantile(name, 0.95),
+                "p99": self.quantile(name, 0.99),
+            }
+            for name, (count, total, (low, high)) in sorted(names.items())
+        }
+
+    def prometheus(self) -> str:
+        """Render the histograms as a Prometheus summary."""
+        lines = [
+            "# HELP medical_agent_span_duration_seconds Duration of traced operations.",
+            "# TYPE medical_agent_span_duration_seconds summary",
+        ]
+        for name, stats in self.summary().items():
+            label = label_value(name)
+            for quantile, key in _QUANTILES:
+                lines.append(
+                    f'medical_agent_span_duration_seconds{{span="{label}",quantile="{quantile}"}} {stats[key]:.6f}'
+                )
+            lines.append(f'medical_agent_span_duration_seconds_sum{{span="{label}"}} {stats["sum"]:.6f}')
+            lines.append(f'medical_agent_span_duration_seconds_count{{span="{label}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Create spans, track the current one per task and hand finished spans to the exporter."""
+
+    def __init__(self, exporter: Optional[JsonlSpanExporter] = None):
+        self.exporter = exporter
+        self.histograms = LatencyHistograms()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        parent = parent or current_span()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.histograms.observe(span.name, span.duration)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception:
+                logger.debug("Could not export span %s", span.name, exc_info=True)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        span = self.start_span(name, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            self.end_span(span, exc)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current.reset(token)
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("medical_agent_current_span", default=None)
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    """The innermost open span: an explicit `span` block, else the running LangChain run."""
+    span = _current.get()
+    if span is not None:
+        return span
+    config = var_child_runnable_config.get() or {}
+    manager = config.get("callbacks")
+    run_id = getattr(manager, "parent_run_id", None)
+    return _callback_handler.span_for(run_id) if run_id else None
+
+
+def span(name: str, **attributes: Any):
+    """Shorthand for `get_tracer().span(...)`."""
+    return _tracer.span(name, **attributes)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorate a sync or async function so each call is recorded as a span."""
+
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _tracer.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turn LangChain runs (graph nodes, tools, LLM calls, retrievers) into spans.
+
+    Chains other than the graph itself and its nodes are not recorded; their
+    children are attached to the nearest recorded ancestor instead.
+    """
+
+    run_inline = True
+
+    def __init__(self, cost_per_1k_input_tokens: float = 0.0, cost_per_1k_output_tokens: float = 0.0):
+        self.cost_per_1k_input_tokens = cost_per_1k_input_tokens
+        self.cost_per_1k_output_tokens = cost_per_1k_output_tokens
+        self._lock = threading.Lock()
+        self._spans: Dict[UUID, Span] = {}
+        # Runs that are not recorded resolve to their closest recorded ancestor.
+        self._aliases: Dict[UUID, Optional[Span]] = {}
+
+    def span_for(self, run_id: Optional[UUID]) -> Optional[Span]:
+        if run_id is None:
+            return None
+        with self._lock:
+            return self._spans.get(run_id) or self._aliases.get(run_id)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, **attributes: Any) -> None:
+        parent = self.span_for(parent_run_id) if parent_run_id else _current.get()
+        span = _tracer.start_span(name, parent=parent, **attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _alias(self, run_id: UUID, parent_run_id: Optional[UUID]) -> None:
+        parent = self.span_for(parent_run_id) if parent_run_id else _current.get()
+        with self._lock:
+            self._aliases[run_id] = parent
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> Optional[Span]:
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+            self._aliases.pop(run_id, None)
+        if span is not None:
+            span.set(**attributes)
+            _tracer.end_span(span, error)
+        return span
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if parent_run_id is None:
+            self._start(run_id, None, f"graph {name or 'run'}")
+        elif node and node == name:
+            self._start(run_id, parent_run_id, f"node {node}", **{"langgraph.step": metadata.get("langgraph_step", 0)})
+        else:
+            self._alias(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, name=None, **kwargs):
+        tool_name = name or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, f"tool {tool_name}", **{"tool.name": tool_name})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(run_id, parent_run_id, serialized, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(run_id, parent_run_id, serialized, metadata)
+
+    def _start_llm(self, run_id, parent_run_id, serialized, metadata) -> None:
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or ((serialized or {}).get("kwargs") or {}).get("model") or "llm"
+        self._start(run_id, parent_run_id, f"llm {model}", **{"gen_ai.request.model": model})
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        span = self.span_for(run_id)
+        duration = span.duration if span else 0.0
+        self._end(
+            run_id,
+            **{
+                "gen_ai.usage.input_tokens": input_tokens,
+                "gen_ai.usage.output_tokens": output_tokens,
+                "gen_ai.tokens_per_second": output_tokens / duration if duration else 0.0,
+                "gen_ai.cost": input_tokens / 1000 * self.cost_per_1k_input_tokens
+                + output_tokens / 1000 * self.cost_per_1k_output_tokens,
+            },
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, name=None, **kwargs):
+        self._start(run_id, parent_run_id, f"retriever {name or 'retriever'}")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, **{"retrieval.documents": len(documents)})
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+_callback_handler = TracingCallbackHandler()
+_installed = False
+
+
+def install_tracing(context: Optional[Context] = None) -> Tracer:
+    """Attach the callback handler to every LangChain run and set up the exporter.
+
+    Safe to call more than once; only the first call has an effect.
+
+    Args:
+        context (Optional[Context]): Agent context with the tracing settings.
+    """
+    global _installed
+    context = context or Context()
+    if _installed or not context.tracing_enabled:
+        return _tracer
+    _installed = True
+
+    _tracer.exporter = JsonlSpanExporter(context.trace_export_path)
+    _callback_handler.cost_per_1k_input_tokens = context.llm_cost_per_1k_input_tokens
+    _callback_handler.cost_per_1k_output_tokens = context.llm_cost_per_1k_output_tokens
+    # The variable's default is what every configured callback manager sees, so
+    # the handler reaches runs started by the LangGraph server as well.
+    register_configure_hook(ContextVar("medical_agent_tracing", default=_callback_handler), inheritable=True)
+    if context.metrics_port:
+        start_metrics_server(context.metrics_port)
+    logger.info("Tracing spans to %s", context.trace_export_path)
+    return _tracer
+
+
+_metric_sources: Dict[str, Callable[[], str]] = {}
+
+
+def label_value(value: Any) -> str:
+    """Escape `value` for use inside a quoted Prometheus label."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def register_metrics(name: str, source: Callable[[], str]) -> None:
+    """Serve the Prometheus text lines returned by `source` from `metrics_text`.
+
+    Sources are kept by `name`, so registering a name again replaces the
+    earlier source instead of serving its series twice or keeping it alive.
+    Components with several live instances register one name per instance
+    and label their series with it.
+    """
+    _metric_sources[name] = source
+
+
+def metrics_text() -> str:
+    """Span latency quantiles and registered metrics in Prometheus text format."""
+    # Every series of a metric must be adjacent, whichever instance reported it.
+    metrics: Dict[str, List[str]] = {}
+    for source in list(_metric_sources.values()):
+        for line in source().splitlines():
+            if line:
+                metrics.setdefault(line.split("{", 1)[0].split(" ", 1)[0], []).append(line)
+    return _tracer.histograms.prometheus() + "".join(f"{line}\n" for lines in metrics.values() for line in lines)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve `metrics_text` at `http://host:port/metrics` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving span metrics on http://%s:%d/metrics", host, port)
+    return server
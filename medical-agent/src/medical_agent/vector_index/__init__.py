@@ -0,0 +1,3 @@
+from .ivf_pq import IVFPQIndex
+from .local_index import IndexHit, LocalVectorIndex
+from .store import LocalVectorStore
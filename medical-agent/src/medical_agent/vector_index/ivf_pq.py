@@ -0,0 +1,214 @@
+"""Inverted-file index with product quantization (IVF-PQ) in pure NumPy.
+
+Vectors are assigned to the closest of `nlist` coarse centroids and the
+residual to that centroid is compressed to `m` one-byte codes, one per
+sub-space. A query only scans the `nprobe` lists whose centroids are most
+similar to it and scores their codes with a precomputed lookup table, so
+search cost grows with `nprobe / nlist` of the corpus instead of all of it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_KSUB = 256
+
+
+def kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 20,
+    seed: int = 0,
+    spherical: bool = False,
+    block_rows: int = 16384,
+) -> np.ndarray:
+    """Lloyd's k-means with blocked distance computations.
+
+    Args:
+        vectors (np.ndarray): `n x d` float32 training vectors.
+        k (int): Number of centroids.
+        iterations (int): Number of assignment/update rounds.
+        seed (int): Seed for the initial centroid sample.
+        spherical (bool): Keep centroids L2-normalised and assign by inner product.
+
+    Returns:
+        np.ndarray: `k x d` float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    k = min(k, n)
+    centroids = vectors[rng.choice(n, size=k, replace=False)].astype(np.float32, copy=True)
+    assignment = np.empty(n, dtype=np.int64)
+
+    for _ in range(iterations):
+        for start in range(0, n, block_rows):
+            assignment[start:start + block_rows] = assign(vectors[start:start + block_rows], centroids, spherical)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=k)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random training points.
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.where(norms == 0, 1, norms)
+    return centroids.astype(np.float32)
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, spherical: bool = False) -> np.ndarray:
+    """Index of the closest centroid for each vector."""
+    if spherical:
+        return np.argmax(vectors @ centroids.T, axis=1)
+    # argmin ||x - c||^2 == argmin ||c||^2 - 2 x.c
+    return np.argmin((centroids * centroids).sum(axis=1) - 2.0 * (vectors @ centroids.T), axis=1)
+
+
+class IVFPQIndex:
+    """Approximate inner-product index over L2-normalised vectors.
+
+    Args:
+        dimensions (int): Vector dimensionality; must be divisible by `m`.
+        nlist (int): Number of inverted lists (coarse centroids).
+        m (int): Number of PQ sub-spaces, i.e. bytes per encoded vector.
+    """
+
+    def __init__(self, dimensions: int, nlist: int = 1024, m: int = 64):
+        if dimensions % m:
+            raise ValueError(f"dimensions ({dimensions}) must be divisible by m ({m})")
+        self.dimensions = dimensions
+        self.nlist = nlist
+        self.m = m
+        self.dsub = dimensions // m
+
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self._list_rows: List[List[np.ndarray]] = []
+        self._list_codes: List[List[np.ndarray]] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return sum(len(rows) for chunks in self._list_rows for rows in chunks)
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0) -> None:
+        """Learn coarse centroids and residual PQ codebooks from `vectors`."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        # Keep at least ~39 points per list, as smaller lists give noisy centroids.
+        self.nlist = max(1, min(self.nlist, len(vectors) // 39 or 1))
+        self.centroids = kmeans(vectors, self.nlist, iterations, seed, spherical=True)
+        self.nlist = len(self.centroids)
+
+        residuals = vectors - self.centroids[assign(vectors, self.centroids, spherical=True)]
+        self.codebooks = np.stack(
+            [
+                kmeans(residuals[:, j * self.dsub:(j + 1) * self.dsub], _KSUB, iterations, seed + j + 1)
+                for j in range(self.m)
+            ]
+        )
+        self._list_rows = [[] for _ in range(self.nlist)]
+        self._list_codes = [[] for _ in range(self.nlist)]
+        logger.info("Trained IVF-PQ index: nlist=%d m=%d on %d vectors", self.nlist, self.m, len(vectors))
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Encode `vectors` and append them to their inverted lists under `rows`."""
+        if not self.is_trained:
+            raise RuntimeError("IVF-PQ index must be trained before adding vectors")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = np.asarray(rows, dtype=np.int64)
+        lists = assign(vectors, self.centroids, spherical=True)
+        codes = self._encode(vectors - self.centroids[lists])
+        for list_no in np.unique(lists):
+            mask = lists == list_no
+            self._list_rows[list_no].append(rows[mask])
+            self._list_codes[list_no].append(codes[mask])
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-`k` rows for `query` by scanning `nprobe` lists.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row numbers and approximate scores, best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+
+        # q.(c + r) = q.c + sum_j q_j.codebook_j[code_j]; the table is shared by all lists.
+        table = np.einsum("md,mkd->mk", query.reshape(self.m, self.dsub), self.codebooks)
+        sub_spaces = np.arange(self.m)
+
+        all_rows, all_scores = [], []
+        for list_no in probes:
+            rows, codes = self._list(list_no)
+            if not len(rows):
+                continue
+            all_rows.append(rows)
+            all_scores.append(coarse[list_no] + table[sub_spaces, codes].sum(axis=1))
+
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(all_rows)
+        scores = np.concatenate(all_scores)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def save(self, path: str | os.PathLike[str]) -> None:
+        """Write the trained index and its lists to an `.npz` file."""
+        lists = [self._list(i) for i in range(self.nlist)]
+        sizes = np.array([len(rows) for rows, _ in lists], dtype=np.int64)
+        tmp_path = Path(path).with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            sizes=sizes,
+            rows=np.concatenate([rows for rows, _ in lists]) if sizes.sum() else np.empty(0, dtype=np.int64),
+            codes=np.concatenate([codes for _, codes in lists]) if sizes.sum() else np.empty((0, self.m), dtype=np.uint8),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike[str]) -> "IVFPQIndex":
+        """Load an index written by `save`."""
+        with np.load(path) as data:
+            centroids, codebooks = data["centroids"], data["codebooks"]
+            index = cls(centroids.shape[1], nlist=len(centroids), m=len(codebooks))
+            index.centroids, index.codebooks = centroids, codebooks
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            rows, codes = data["rows"], data["codes"]
+            index._list_rows = [[rows[offsets[i]:offsets[i + 1]]] for i in range(index.nlist)]
+            index._list_codes = [[codes[offsets[i]:offsets[i + 1]]] for i in range(index.nlist)]
+        return index
+
+    def _list(self, list_no: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Consolidate appended chunks lazily so inserts stay O(batch).
+        row_chunks, code_chunks = self._list_rows[list_no], self._list_codes[list_no]
+        if len(row_chunks) > 1:
+            self._list_rows[list_no] = row_chunks = [np.concatenate(row_chunks)]
+            self._list_codes[list_no] = code_chunks = [np.concatenate(code_chunks)]
+        if not row_chunks:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.m), dtype=np.uint8)
+        return row_chunks[0], code_chunks[0]
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = residuals[:, j * self.dsub:(j + 1) * self.dsub]
+            codes[:, j] = assign(sub, self.codebooks[j])
+        return codes
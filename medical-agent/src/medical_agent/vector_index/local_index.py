@@ -0,0 +1,403 @@
+"""In-process vector index stored as a memory-mapped matrix with a metadata sidecar."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from medical_agent.cache.generation import IngestionGeneration
+from medical_agent.vector_index.ivf_pq import IVFPQIndex
+
+logger = logging.getLogger(__name__)
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Rows scored per block, so float16/int8 matrices never get a full float32 copy.
+_SEARCH_BLOCK_ROWS = 65536
+
+
+@dataclass
+class IndexHit:
+    """A single search result."""
+
+    row: int
+    id: str
+    score: float
+    text: str
+    metadata: Dict[str, Any]
+
+
+class LocalVectorIndex:
+    """Cosine-similarity index kept in memory-mapped files under `path`.
+
+    Layout:
+    - `header.json`: dimensions, dtype, row count and capacity;
+    - `vectors.bin`: `capacity x dimensions` matrix of L2-normalised vectors,
+      stored as float32, float16 or int8 (int8 rows carry a scale in `scales.bin`);
+    - `alive.bin`: one byte per row, cleared to tombstone a deleted row;
+    - `offsets.bin` / `docs.jsonl`: byte offsets into the JSONL sidecar holding
+      each row's ID, text and metadata, read only for the rows returned.
+
+    Opening an index maps the files and reads the ID column, so startup cost
+    does not depend on the size of the texts. Upserts append a new row and
+    tombstone the previous one; `compact` rewrites the files without them.
+
+    An optional IVF-PQ index (`ivfpq.npz`) can be built with `build_ann`; once
+    present, searches given an `nprobe` scan only the probed lists and re-rank
+    the candidates exactly, and new rows are inserted into it as they arrive.
+
+    Ingestion usually writes from another process. Given the ingestion
+    `generation`, the index re-opens its files when the generation changes, so
+    rows added or replaced by a later run become searchable without a restart.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        dimensions: Optional[int] = None,
+        dtype: str = "float32",
+        generation: Optional[IngestionGeneration] = None,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported index dtype {dtype!r}; expected one of {sorted(DTYPES)}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.dimensions: Optional[int] = dimensions
+        self.dtype: str = dtype
+        self._generation = generation
+        self._seen_generation = generation.current() if generation else 0
+        self._open()
+
+    def _open(self) -> None:
+        header = self._read_header()
+        self.dimensions = header.get("dimensions", self.dimensions)
+        self.dtype = header.get("dtype", self.dtype)
+        self.count: int = header.get("count", 0)
+        self.capacity: int = header.get("capacity", 0)
+
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._alive: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+        self.ann: Optional[IVFPQIndex] = None
+        self._ann_dirty = False
+
+        if (self.path / "ivfpq.npz").exists():
+            self.ann = IVFPQIndex.load(self.path / "ivfpq.npz")
+
+        if self.capacity:
+            self._map_files()
+            ids_path = self.path / "ids.txt"
+            self._ids = ids_path.read_text().splitlines()[: self.count] if ids_path.exists() else []
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids) if self._alive[row]}
+
+    def reload(self) -> None:
+        """Re-open the files, picking up rows written and tombstoned by another process."""
+        with self._lock:
+            self._open()
+            logger.info("Reloaded local vector index at %s with %d live rows", self.path, len(self._rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def ids(self) -> List[str]:
+        """IDs of the live rows."""
+        return list(self._rows)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        """Append rows, replacing any live row that has the same ID.
+
+        Returns:
+            List[int]: The row numbers assigned to the new vectors.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("Expected one vector per id")
+        if not len(ids):
+            return []
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = int(matrix.shape[1])
+            if matrix.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {matrix.shape[1]}")
+
+            self._reserve(self.count + len(ids))
+            start = self.count
+            rows = list(range(start, start + len(ids)))
+
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+            self._write_vectors(start, matrix)
+
+            with open(self.path / "docs.jsonl", "ab") as docs, open(self.path / "ids.txt", "a") as id_file:
+                offset = docs.tell()
+                for row, doc_id, text, metadata in zip(rows, ids, texts, metadatas):
+                    line = json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+                    docs.write(line)
+                    id_file.write(doc_id + "\n")
+                    self._offsets[row] = offset
+                    offset += len(line)
+
+                    previous = self._rows.get(doc_id)
+                    if previous is not None:
+                        self._alive[previous] = 0
+                    self._alive[row] = 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+
+            self.count += len(ids)
+            if self.ann is not None:
+                self.ann.add(np.asarray(rows), matrix)
+                self._ann_dirty = True
+            self.flush()
+            return rows
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Tombstone the rows with the given IDs and return how many were removed."""
+        removed = 0
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = 0
+                    removed += 1
+            if removed:
+                self.flush()
+        return removed
+
+    def search(
+        self,
+        query: Sequence[float] | np.ndarray,
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        rerank_factor: int = 4,
+    ) -> List[IndexHit]:
+        """Return the `k` live rows most similar to `query`, best first.
+
+        Args:
+            query: Query embedding.
+            k (int): Number of results.
+            nprobe (Optional[int]): When set and an ANN index exists, scan this many
+                inverted lists instead of the whole matrix.
+            rerank_factor (int): ANN candidates fetched per result and re-ranked exactly.
+        """
+        self._check_generation()
+        if nprobe and self.ann is not None:
+            return self._ann_search(query, k, nprobe, rerank_factor)
+
+        scores = self.scores(query)
+        if scores is None:
+            return []
+        return self.hits(self.top_k(scores, k), scores)
+
+    def scores(self, query: Sequence[float] | np.ndarray) -> Optional[np.ndarray]:
+        """Cosine similarity of `query` against every row, with dead rows at -inf."""
+        with self._lock:
+            count = self.count
+            if not count or not self._rows:
+                return None
+            q = np.asarray(query, dtype=np.float32)
+            norm = float(np.linalg.norm(q))
+            q = q / norm if norm else q
+
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, _SEARCH_BLOCK_ROWS):
+                end = min(start + _SEARCH_BLOCK_ROWS, count)
+                block = self._vectors[start:end]
+                if self.dtype == "int8":
+                    scores[start:end] = (block @ q) * self._scales[start:end]
+                else:
+                    scores[start:end] = block.astype(np.float32, copy=False) @ q
+            scores[np.asarray(self._alive[:count]) == 0] = -np.inf
+            return scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Row numbers of the `k` highest finite scores, best first."""
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates])]
+
+    def hits(self, rows: Iterable[int], scores: Optional[np.ndarray] = None, by_position: bool = False) -> List[IndexHit]:
+        """Materialise rows into hits, reading their text and metadata from the sidecar.
+
+        `scores` is indexed by row number, or by position in `rows` when `by_position` is set.
+        """
+        results = []
+        with self._lock, open(self.path / "docs.jsonl", "rb") as docs:
+            for position, row in enumerate(rows):
+                row = int(row)
+                docs.seek(int(self._offsets[row]))
+                record = json.loads(docs.readline())
+                score = float(scores[position if by_position else row]) if scores is not None else 0.0
+                results.append(IndexHit(row, record["id"], score, record["text"], record["metadata"]))
+        return results
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Return the live row holding `doc_id`, if any."""
+        self._check_generation()
+        return self._rows.get(doc_id)
+
+    def vectors(self, rows: Sequence[int] | np.ndarray) -> np.ndarray:
+        """Return the float32 vectors stored at `rows`."""
+        with self._lock:
+            block = np.asarray(self._vectors[np.asarray(rows)], dtype=np.float32)
+            if self.dtype == "int8":
+                block = block * np.asarray(self._scales[np.asarray(rows)])[:, None]
+            return block
+
+    def live_rows(self) -> np.ndarray:
+        """Row numbers of every live vector."""
+        with self._lock:
+            return np.flatnonzero(np.asarray(self._alive[: self.count]))
+
+    def build_ann(self, nlist: int = 1024, m: int = 64, sample_size: int = 50000, iterations: int = 20) -> IVFPQIndex:
+        """Train an IVF-PQ index on (a sample of) the live vectors and insert all of them."""
+        with self._lock:
+            rows = self.live_rows()
+            if not len(rows):
+                raise ValueError("Cannot build an ANN index over an empty index")
+            rng = np.random.default_rng(0)
+            sample = rows if len(rows) <= sample_size else np.sort(rng.choice(rows, sample_size, replace=False))
+
+            ann = IVFPQIndex(self.dimensions, nlist=nlist, m=m)
+            ann.train(self.vectors(sample), iterations=iterations)
+            for start in range(0, len(rows), _SEARCH_BLOCK_ROWS):
+                block = rows[start:start + _SEARCH_BLOCK_ROWS]
+                ann.add(block, self.vectors(block))
+            self.ann = ann
+            self._ann_dirty = True
+            self.save_ann()
+            return ann
+
+    def save_ann(self) -> None:
+        """Persist the ANN index if it changed since it was last saved."""
+        with self._lock:
+            if self.ann is not None and self._ann_dirty:
+                self.ann.save(self.path / "ivfpq.npz")
+                self._ann_dirty = False
+
+    def compact(self) -> None:
+        """Rewrite the index without tombstoned rows."""
+        with self._lock:
+            ann = self.ann
+            self.ann = None
+            (self.path / "ivfpq.npz").unlink(missing_ok=True)
+            rows = self.live_rows()
+            hits = self.hits(rows)
+            vectors = self.vectors(rows) if len(rows) else np.empty((0, self.dimensions or 0), dtype=np.float32)
+            for name in ("vectors.bin", "scales.bin", "alive.bin", "offsets.bin", "docs.jsonl", "ids.txt", "header.json"):
+                (self.path / name).unlink(missing_ok=True)
+            self._vectors = self._scales = self._alive = self._offsets = None
+            self.count = self.capacity = 0
+            self._ids, self._rows = [], {}
+            self.add(
+                [hit.id for hit in hits], vectors, [hit.text for hit in hits], [hit.metadata for hit in hits]
+            )
+            logger.info("Compacted local vector index at %s to %d rows", self.path, len(rows))
+            if ann is not None and len(rows):
+                # Row numbers changed, so the inverted lists have to be rebuilt.
+                self.build_ann(nlist=ann.nlist, m=ann.m)
+
+    def flush(self) -> None:
+        """Flush mapped files and persist the header."""
+        with self._lock:
+            for array in (self._vectors, self._scales, self._alive, self._offsets):
+                if array is not None:
+                    array.flush()
+            header = {
+                "dimensions": self.dimensions,
+                "dtype": self.dtype,
+                "count": self.count,
+                "capacity": self.capacity,
+            }
+            tmp_path = self.path / "header.json.tmp"
+            tmp_path.write_text(json.dumps(header))
+            os.replace(tmp_path, self.path / "header.json")
+
+    def _check_generation(self) -> None:
+        if self._generation is None:
+            return
+        current = self._generation.current()
+        if current != self._seen_generation:
+            with self._lock:
+                if current != self._seen_generation:
+                    self._seen_generation = current
+                    self.reload()
+
+    def _ann_search(self, query, k: int, nprobe: int, rerank_factor: int) -> List[IndexHit]:
+        q = np.asarray(query, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        q = q / norm if norm else q
+        with self._lock:
+            candidates, _ = self.ann.search(q, k * max(1, rerank_factor), nprobe)
+            candidates = candidates[np.asarray(self._alive[candidates]) == 1]
+            if not len(candidates):
+                return []
+            exact = self.vectors(candidates) @ q
+            order = np.argsort(-exact)[:k]
+            return self.hits(candidates[order], exact[order], by_position=True)
+
+    def _read_header(self) -> Dict[str, Any]:
+        header_path = self.path / "header.json"
+        return json.loads(header_path.read_text()) if header_path.exists() else {}
+
+    def _write_vectors(self, start: int, matrix: np.ndarray) -> None:
+        end = start + len(matrix)
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[start:end] = np.round(matrix / scales[:, None]).astype(np.int8)
+            self._scales[start:end] = scales
+        else:
+            self._vectors[start:end] = matrix.astype(DTYPES[self.dtype])
+
+    def _reserve(self, rows: int) -> None:
+        if rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        self.flush()
+        self._vectors = self._scales = self._alive = self._offsets = None
+        self._grow_file("vectors.bin", capacity * self.dimensions * np.dtype(DTYPES[self.dtype]).itemsize)
+        self._grow_file("alive.bin", capacity)
+        self._grow_file("offsets.bin", capacity * 8)
+        if self.dtype == "int8":
+            self._grow_file("scales.bin", capacity * 4)
+        self.capacity = capacity
+        self._map_files()
+
+    def _grow_file(self, name: str, size: int) -> None:
+        with open(self.path / name, "ab") as fh:
+            fh.truncate(size)
+
+    def _map_files(self) -> None:
+        self._vectors = np.memmap(
+            self.path / "vectors.bin", dtype=DTYPES[self.dtype], mode="r+", shape=(self.capacity, self.dimensions)
+        )
+        self._alive = np.memmap(self.path / "alive.bin", dtype=np.uint8, mode="r+", shape=(self.capacity,))
+        self._offsets = np.memmap(self.path / "offsets.bin", dtype=np.uint64, mode="r+", shape=(self.capacity,))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self.path / "scales.bin", dtype=np.float32, mode="r+", shape=(self.capacity,))
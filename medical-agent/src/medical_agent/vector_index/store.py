@@ -0,0 +1,98 @@
+"""LangChain `VectorStore` adapter over `LocalVectorIndex`."""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from medical_agent.tracing import span
+from medical_agent.vector_index.local_index import IndexHit, LocalVectorIndex
+
+
+def _to_document(hit: IndexHit) -> Document:
+    return Document(id=hit.id, page_content=hit.text, metadata=hit.metadata)
+
+
+class LocalVectorStore(VectorStore):
+    """Vector store that searches a memory-mapped `LocalVectorIndex` in-process.
+
+    It is a drop-in replacement for `MongoDBAtlasVectorSearch` in the
+    retrieval path: no network round-trip and no external service.
+    """
+
+    def __init__(self, index: LocalVectorIndex, embedding: Embeddings):
+        self.index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.index.add(ids, vectors, texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        return self.index.delete(ids) > 0
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        rows = [row for row in (self.index.row_of(doc_id) for doc_id in ids) if row is not None]
+        return [_to_document(hit) for hit in self.index.hits(rows)]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        rerank_factor: int = 4,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        with span("vector_search local", **{"vector_search.k": k, "vector_search.ann": nprobe is not None}) as current:
+            hits = self.index.search(embedding, k, nprobe=nprobe, rerank_factor=rerank_factor)
+            current.set(**{"retrieval.documents": len(hits)})
+        return [(_to_document(hit), hit.score) for hit in hits]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: str = ".cache/medical_agent/procedure_index",
+        dtype: str = "float32",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(LocalVectorIndex(path, dtype=dtype), embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
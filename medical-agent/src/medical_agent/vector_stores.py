@@ -1,15 +1,65 @@
-from typing import Any, Callable, List
-from langchain_mongodb import MongoDBAtlasVectorSearch
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain_core.vectorstores import VectorStore
 from langgraph.runtime import get_runtime
 
-from context import Context
+from medical_agent.cache import IngestionGeneration, ingestion_generation
+from medical_agent.context import Context
+from medical_agent.embeddings import build_embeddings
+from medical_agent.lexical_index import BM25Index
+from medical_agent.neighbours import NeighbourStore, neighbour_store_path
+from medical_agent.vector_index import LocalVectorIndex, LocalVectorStore
+
+
+@lru_cache(maxsize=None)
+def shared_generation(cache_dir: str) -> IngestionGeneration:
+    """The ingestion generation under `cache_dir`, shared so its file is re-read only when it changes."""
+    return ingestion_generation(cache_dir)
+
+
+@lru_cache(maxsize=None)
+def local_vector_index(path: str, dtype: str, cache_dir: str) -> LocalVectorIndex:
+    """Open the local index at `path` once per process; it reloads itself after each ingestion run."""
+    return LocalVectorIndex(path, dtype=dtype, generation=shared_generation(cache_dir))
+
+
+@lru_cache(maxsize=None)
+def lexical_index(path: str, cache_dir: str) -> BM25Index:
+    """Open the BM25 index at `path` once per process; it reloads itself after each ingestion run."""
+    return BM25Index(path, generation=shared_generation(cache_dir))
+
+
+_neighbour_stores: Dict[str, Tuple[int, NeighbourStore]] = {}
+_neighbour_stores_lock = threading.Lock()
+
+
+def neighbour_store(cache_dir: str) -> NeighbourStore:
+    """Return the chunk neighbours under `cache_dir`, opened again after each ingestion run."""
+    generation = shared_generation(cache_dir).current()
+    with _neighbour_stores_lock:
+        opened = _neighbour_stores.get(cache_dir)
+        if opened is None or opened[0] != generation:
+            # The previous handle closes once the calls still using it let go of it.
+            opened = _neighbour_stores[cache_dir] = (generation, NeighbourStore(neighbour_store_path(cache_dir)))
+        return opened[1]
+
+
+def procedure_vector_store(context: Optional[Context] = None) -> VectorStore:
+    context = context or get_runtime(Context).context
+    if context.vector_store_backend == "local":
+        return LocalVectorStore(
+            local_vector_index(context.local_index_path, context.local_index_dtype, context.cache_dir),
+            build_embeddings(context),
+        )
+
+    # Imported here so the local backend works without the MongoDB driver.
+    from langchain_mongodb import MongoDBAtlasVectorSearch
 
-def procedure_vector_store() -> MongoDBAtlasVectorSearch:
-    runtime = get_runtime(Context)
     vector_store = MongoDBAtlasVectorSearch.from_connection_string(
-        connection_string=runtime.context.mongodb_connection_string,
-        namespace=runtime.context.mongodb_namespace,
-        embedding=runtime.context.embedding_model,
+        connection_string=context.mongodb_connection_string,
+        namespace=context.mongodb_namespace,
+        embedding=build_embeddings(context),
         index_name="vector_index"
     )
     return vector_store
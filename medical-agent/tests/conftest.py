@@ -0,0 +1,86 @@
+"""Shared fixtures: a deterministic embedder, tiny PDFs and a Context rooted in a temporary directory."""
+
+from __future__ import annotations
+
+import zlib
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from medical_agent.context import Context
+
+DIMENSIONS = 64
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words vectors hashed into `DIMENSIONS` buckets; texts sharing words are close."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def vector(self, text: str) -> List[float]:
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % DIMENSIONS] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self.vector(text)
+
+
+def write_pdf(path: Path, pages: Sequence[str]) -> Path:
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", ""]
+    kids = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode('latin-1')}\nendstream")
+        content = len(objects)
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Contents {content} 0 R /Resources << /Font << /F1 {{font}} 0 R >> >> >>"
+        )
+        kids.append(len(objects))
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    font = len(objects)
+    objects = [obj.replace("{font}", str(font)) for obj in objects]
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(body)
+    return path
+
+
+@pytest.fixture
+def embeddings() -> HashEmbeddings:
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def context(tmp_path: Path) -> Context:
+    return Context(
+        cache_dir=str(tmp_path / "cache"),
+        local_index_path=str(tmp_path / "procedure_index"),
+        lexical_index_path=str(tmp_path / "lexical_index"),
+        vector_store_backend="local",
+        ingestion_workers=1,
+        ingestion_chunk_size=200,
+        ingestion_chunk_overlap=20,
+    )
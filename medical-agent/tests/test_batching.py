@@ -0,0 +1,100 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable
+
+from medical_agent.batching import MicroBatcher, input_key
+
+
+class Upper(Runnable):
+    """Upper-cases its inputs, recording each batch; `fail` inputs raise."""
+
+    def __init__(self, fail=(), broken=False):
+        self.fail = set(fail)
+        self.broken = broken
+        self.batches = []
+
+    def invoke(self, input, config=None, **kwargs):
+        raise AssertionError("calls must be batched")
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        self.batches.append(list(inputs))
+        await asyncio.sleep(0.01)
+        if self.broken:
+            raise ConnectionError("ollama is down")
+        return [ValueError(text) if text in self.fail else text.upper() for text in inputs]
+
+
+def run_concurrently(batcher, inputs):
+    async def main():
+        return await asyncio.gather(*(batcher.ainvoke(text) for text in inputs), return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_calls_go_out_in_one_batch():
+    runnable = Upper()
+    batcher = MicroBatcher(runnable, "test", max_batch_size=8, max_wait_ms=50)
+    assert run_concurrently(batcher, ["a", "b", "c"]) == ["A", "B", "C"]
+    assert runnable.batches == [["a", "b", "c"]]
+    assert batcher.queue_depth == 0
+
+
+def test_full_batches_are_dispatched_without_waiting():
+    runnable = Upper()
+    batcher = MicroBatcher(runnable, "test", max_batch_size=2, max_wait_ms=10_000)
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.ainvoke(text) for text in "abcd")), timeout=1)
+
+    assert asyncio.run(main()) == ["A", "B", "C", "D"]
+    assert runnable.batches == [["a", "b"], ["c", "d"]]
+
+
+def test_identical_calls_share_one_generation():
+    runnable = Upper()
+    batcher = MicroBatcher(runnable, "test", max_wait_ms=20)
+    assert run_concurrently(batcher, ["a", "a", "b", "a"]) == ["A", "A", "B", "A"]
+    assert runnable.batches == [["a", "b"]]
+    assert (batcher.stats.requests, batcher.stats.coalesced) == (4, 2)
+
+
+def test_a_failing_input_only_fails_its_callers():
+    batcher = MicroBatcher(Upper(fail={"b"}), "test", max_wait_ms=20)
+    results = run_concurrently(batcher, ["a", "b"])
+    assert results[0] == "A" and isinstance(results[1], ValueError)
+
+    results = run_concurrently(MicroBatcher(Upper(broken=True), "test", max_wait_ms=20), ["a", "b"])
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_a_shared_result():
+    batcher = MicroBatcher(Upper(), "test", max_wait_ms=20)
+
+    async def main():
+        first = asyncio.ensure_future(batcher.ainvoke("a"))
+        second = asyncio.ensure_future(batcher.ainvoke("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "A"
+
+
+def test_batch_size_histogram_is_cumulative():
+    batcher = MicroBatcher(Upper(), "normalize", max_batch_size=4, max_wait_ms=20)
+    run_concurrently(batcher, ["a"])
+    run_concurrently(batcher, ["a", "b", "c"])
+    text = batcher.prometheus()
+    assert 'medical_agent_batch_size_bucket{batcher="normalize",le="1"} 1' in text
+    assert 'medical_agent_batch_size_bucket{batcher="normalize",le="2"} 1' in text
+    assert 'medical_agent_batch_size_bucket{batcher="normalize",le="4"} 2' in text
+    assert 'medical_agent_batch_size_bucket{batcher="normalize",le="+Inf"} 2' in text
+    assert 'medical_agent_batch_max_queue_depth{batcher="normalize"} 3' in text
+
+
+def test_input_key_depends_on_roles_and_texts():
+    prompt = [SystemMessage("extract"), HumanMessage("dor de cabeça")]
+    assert input_key(prompt) == input_key([{"role": "system", "content": "extract"}, ("user", "dor de cabeça")])
+    assert input_key(prompt) != input_key([HumanMessage("extract"), HumanMessage("dor de cabeça")])
+    assert input_key("a") == input_key([HumanMessage("a")])
@@ -0,0 +1,133 @@
+import asyncio
+import sqlite3
+import threading
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AnyMessage
+from langgraph.graph import START, StateGraph, add_messages
+from typing_extensions import Annotated, TypedDict
+
+from medical_agent.checkpointer import SQLiteCheckpointer
+
+LONG_PROTOCOL = "Administer oxygen to keep saturation above 94%. " * 40
+
+
+class State(TypedDict):
+    messages: Annotated[List[AnyMessage], add_messages]
+    documents: List[Document]
+    turns: int
+
+
+def answer(state: State) -> dict:
+    turns = state.get("turns", 0) + 1
+    return {
+        "messages": [AIMessage(f"answer {turns}")],
+        "documents": [Document(page_content=LONG_PROTOCOL, metadata={"source": "asthma.pdf", "page": 1})],
+        "turns": turns,
+    }
+
+
+def build(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "answer")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def config(thread="consultation-1"):
+    return {"configurable": {"thread_id": thread}}
+
+
+def count(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_state_round_trips_through_a_reopened_file(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    graph = build(SQLiteCheckpointer(path))
+    for turn in range(3):
+        graph.invoke({"messages": [("user", f"question {turn}")]}, config())
+
+    reopened = build(SQLiteCheckpointer(path))
+    state = reopened.get_state(config()).values
+    assert state["turns"] == 3
+    assert [message.text for message in state["messages"]] == [
+        "question 0", "answer 1", "question 1", "answer 2", "question 2", "answer 3",
+    ]
+    assert state["documents"][0].metadata == {"source": "asthma.pdf", "page": 1}
+    assert reopened.get_state(config("other")).values == {}
+
+    history = list(reopened.get_state_history(config()))
+    assert len(history) == 9
+    # Earlier checkpoints hold the state as it was then.
+    assert min(snapshot.values.get("turns", 0) for snapshot in history) == 0
+
+
+def compressed(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM payloads WHERE type LIKE 'zlib+%'").fetchone()[0]
+
+
+def test_values_are_stored_once(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    graph = build(SQLiteCheckpointer(path))
+    graph.invoke({"messages": [("user", "q")]}, config())
+    payloads, large = count(path, "payloads"), compressed(path)
+    assert large > 0
+    graph.invoke({"messages": [("user", "q")]}, config())
+    # The repeated document is not stored again; only new messages and counters are.
+    assert compressed(path) == large
+    assert count(path, "payloads") - payloads <= 5
+
+
+def test_prune_keeps_the_latest_checkpoints(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    checkpointer = SQLiteCheckpointer(path, keep_per_thread=2)
+    graph = build(checkpointer)
+    for turn in range(5):
+        graph.invoke({"messages": [("user", f"question {turn}")]}, config())
+    graph.invoke({"messages": [("user", "other")]}, config("consultation-2"))
+
+    deleted = checkpointer.prune()
+    assert deleted["checkpoints"] == 15 - 2 + 3 - 2
+    assert deleted["payloads"] > 0
+    assert len(list(checkpointer.list(config()))) == 2
+    state = graph.get_state(config()).values
+    assert state["turns"] == 5 and len(state["messages"]) == 10
+    assert graph.get_state(config("consultation-2")).values["turns"] == 1
+    assert checkpointer.prune() == {"checkpoints": 0, "channel_values": 0, "payloads": 0}
+
+
+def test_the_saver_can_be_used_while_listing(tmp_path):
+    checkpointer = SQLiteCheckpointer(tmp_path / "checkpoints.sqlite3")
+    graph = build(checkpointer)
+    graph.invoke({"messages": [("user", "q")]}, config())
+    listed = []
+
+    def read_each():
+        for checkpoint_tuple in checkpointer.list(config()):
+            listed.append(checkpointer.get_tuple(checkpoint_tuple.config).checkpoint["id"])
+
+    # A saver that holds its lock while yielding deadlocks here, so bound the wait.
+    reader = threading.Thread(target=read_each, daemon=True)
+    reader.start()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert listed == [checkpoint_tuple.checkpoint["id"] for checkpoint_tuple in checkpointer.list(config())]
+    assert len(listed) == 3
+
+
+def test_async_graph_and_delete_thread(tmp_path):
+    checkpointer = SQLiteCheckpointer(tmp_path / "checkpoints.sqlite3")
+    graph = build(checkpointer)
+
+    async def main():
+        await graph.ainvoke({"messages": [("user", "q")]}, config())
+        await graph.ainvoke({"messages": [("user", "q")]}, config())
+        return (await graph.aget_state(config())).values
+
+    assert asyncio.run(main())["turns"] == 2
+    checkpointer.delete_thread("consultation-1")
+    assert graph.get_state(config()).values == {}
@@ -0,0 +1,73 @@
+from dataclasses import replace
+
+from langchain_core.documents import Document
+
+from medical_agent.context_assembly import (
+    MIN_PARTIAL_TOKENS,
+    Passage,
+    assemble_context,
+    drop_near_duplicates,
+    merge_adjacent,
+    pack,
+    rerank,
+    source_label,
+)
+
+PAGE = (
+    "Asthma exacerbation. Give oxygen to keep saturation between 94 and 98 percent. "
+    "Give salbutamol 5 mg nebulised and repeat every 15 minutes. "
+    "Give prednisolone 40 mg orally. Reassess after each dose and escalate if there is no response."
+)
+
+
+def chunk(start, end, page=1, source="asthma.pdf"):
+    return Document(page_content=PAGE[start:end], metadata={"source": source, "page": page, "start_index": start})
+
+
+def test_source_label_falls_back_through_metadata():
+    assert source_label(Document(page_content="", metadata={"filename": "a.pdf", "page_number": 0})) == ("a.pdf", "0")
+    assert source_label(Document(page_content="")) == ("unknown-source", "unknown-page")
+
+
+def test_overlapping_and_touching_chunks_are_stitched():
+    # The splitter drops the space at 138 between touching chunks.
+    first, overlapping, touching = chunk(0, 80), chunk(60, 138), chunk(139, len(PAGE))
+    [passage] = merge_adjacent([touching, first, overlapping])
+    assert passage.text == PAGE
+    assert (passage.start, passage.rank) == (0, 0)
+
+
+def test_distant_chunks_and_other_pages_stay_apart():
+    docs = [chunk(100, 140), chunk(0, 40), chunk(0, 40, page=2), Document(page_content="no offset")]
+    passages = merge_adjacent(docs)
+    assert [(p.page, p.start, p.rank) for p in passages] == [("1", 100, 0), ("1", 0, 1), ("2", 0, 2), ("unknown-page", None, 3)]
+
+
+def test_near_duplicates_keep_the_better_ranked_passage():
+    text = "give salbutamol 5 mg nebulised and repeat every 15 minutes"
+    passages = [Passage("a.pdf", "1", text, 0), Passage("b.pdf", "3", text + " now", 1), Passage("c.pdf", "1", "give oxygen", 2)]
+    assert [p.source for p in drop_near_duplicates(passages, 0.8)] == ["a.pdf", "c.pdf"]
+    assert len(drop_near_duplicates(passages, 0.9)) == 3
+
+
+def test_rerank_prefers_query_terms_over_rank():
+    passages = [Passage("a.pdf", "1", "fracture immobilisation", 0), Passage("b.pdf", "1", "nebulised salbutamol dose", 1)]
+    assert [p.source for p in rerank("salbutamol dose", passages)] == ["b.pdf", "a.pdf"]
+
+
+def test_pack_never_exceeds_the_budget():
+    long = Passage("a.pdf", "1", " ".join(["salbutamol"] * 100), 0)
+    for budget in (MIN_PARTIAL_TOKENS, 50, 99, 300):
+        packed = pack([Passage("b.pdf", "1", "oxygen", 1), long], budget)
+        assert sum(p.tokens for p in packed) <= budget
+    cut = pack([long], 50)[0]
+    assert cut.text.endswith(" ...") and "salbutamo ..." not in cut.text
+    # A remainder too small to be useful is skipped.
+    assert pack([Passage("b.pdf", "1", "x" * 40, 0), long], 20) == [Passage("b.pdf", "1", "x" * 40, 0)]
+
+
+def test_assemble_context_reports_sources_and_savings(context):
+    docs = [chunk(0, 80), chunk(60, 140), chunk(0, 80), chunk(0, 140, source="copy.pdf")]
+    assembled = assemble_context("salbutamol oxygen", docs, replace(context, context_token_budget=1000))
+    assert assembled.sources == ["asthma.pdf:1"]
+    assert assembled.tokens_after < assembled.tokens_before
@@ -0,0 +1,213 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+from mysql.connector.errors import OperationalError, ProgrammingError
+
+from medical_agent import database as module
+from medical_agent.database import DatabasePool, database_pool
+
+ROWS = [{"id": number} for number in range(7)]
+
+
+class FakeCursor:
+    def __init__(self, connection, **options):
+        self.connection = connection
+        self.options = options
+        self.description = None
+        self.rows = []
+
+    async def execute(self, sql, params=()):
+        self.connection.executed.append((sql, params))
+        if sql.startswith("SET SESSION sql_select_limit"):
+            limit = sql.rsplit("= ", 1)[1]
+            self.connection.select_limit = None if limit == "DEFAULT" else int(limit)
+            return
+        if self.connection.delay:
+            await asyncio.sleep(self.connection.delay)
+        if self.connection.error:
+            raise self.connection.error
+        self.description = [("id",)]
+        self.rows = list(ROWS[: self.connection.select_limit])
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchmany(self, size):
+        self.connection.round_trips += 1
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    async def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.executed = []
+        self.cursors = []
+        self.round_trips = 0
+        self.select_limit = None
+        self.closed = False
+
+    @property
+    def delay(self):
+        return self.server.delay
+
+    @property
+    def error(self):
+        return self.server.error
+
+    async def cursor(self, **options):
+        cursor = FakeCursor(self, **options)
+        self.cursors.append(cursor)
+        return cursor
+
+    async def ping(self, reconnect=False):
+        if self.server.ping_fails:
+            raise OperationalError(msg="gone away")
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    def __init__(self):
+        self.connections = []
+        self.delay = 0
+        self.error = None
+        self.ping_fails = False
+
+    async def connect(self, **settings):
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(module, "mysql_aio", server)
+    return server
+
+
+def new_pool(**options):
+    return DatabasePool(host="db", port=3306, user="u", password="p", database="hospital", **options)
+
+
+def test_statements_are_prepared_once_per_connection(server):
+    pool = new_pool(query_timeout=2.5)
+
+    async def main():
+        for patient in (1, 2, 3):
+            # A new string object each time, like SQL built at call sites.
+            sql = " ".join(["SELECT id FROM patients", "WHERE id = %s"])
+            assert await pool.fetch_all(sql, (patient,)) == ROWS
+
+    asyncio.run(main())
+    [connection] = server.connections
+    assert connection.executed[0] == ("SET SESSION max_execution_time = 2500", ())
+    operations = [sql for sql, _ in connection.executed[1:]]
+    assert len(set(map(id, operations))) == 1
+    assert [params for _, params in connection.executed[1:]] == [(1,), (2,), (3,)]
+    assert pool.stats.statements_prepared == 1 and pool.stats.opened == 1
+    assert connection.cursors[1].options == {"prepared": True, "dictionary": True}
+
+
+def test_concurrent_queries_share_at_most_max_size_connections(server):
+    server.delay = 0.01
+    pool = new_pool(max_size=2)
+
+    async def main():
+        await asyncio.gather(*(pool.fetch_all("SELECT 1") for _ in range(6)))
+
+    asyncio.run(main())
+    assert len(server.connections) == 2
+    assert pool.stats.acquired == 6 and pool.stats.waited > 0
+
+
+def test_a_timed_out_connection_is_discarded(server):
+    server.delay = 1
+    pool = new_pool()
+
+    async def main():
+        with pytest.raises(OperationalError, match="timed out"):
+            await pool.fetch_all("SELECT SLEEP(1)", timeout=0.01)
+        server.delay = 0
+        await pool.fetch_all("SELECT 1")
+
+    asyncio.run(main())
+    first, second = server.connections
+    assert first.closed and not second.closed
+    assert (pool.stats.timeouts, pool.stats.closed) == (1, 1)
+
+
+def test_server_errors_keep_the_connection(server):
+    pool = new_pool()
+
+    async def main():
+        await pool.open()
+        server.error = ProgrammingError(msg="Unknown column")
+        with pytest.raises(ProgrammingError):
+            await pool.fetch_raw("SELECT nope FROM patients")
+        server.error = None
+        return await pool.fetch_raw("SELECT id FROM patients", max_rows=2)
+
+    assert asyncio.run(main()) == (["id"], ROWS[:2])
+    assert len(server.connections) == 1 and pool.stats.closed == 0
+
+
+def test_capped_raw_queries_stop_on_the_server(server):
+    pool = new_pool()
+
+    async def main():
+        capped = await pool.fetch_raw("SELECT id FROM exam_results", max_rows=3)
+        return capped, await pool.fetch_all("SELECT id FROM exam_results")
+
+    capped, uncapped = asyncio.run(main())
+    [connection] = server.connections
+    assert capped == (["id"], ROWS[:3]) and uncapped == ROWS
+    assert [sql for sql, _ in connection.executed[1:4]] == [
+        "SET SESSION sql_select_limit = 3",
+        "SELECT id FROM exam_results",
+        "SET SESSION sql_select_limit = DEFAULT",
+    ]
+    assert connection.cursors[1].options == {"buffered": True}
+
+
+def test_idle_connections_failing_the_health_check_are_replaced(server):
+    pool = new_pool(min_size=2, health_check_interval=0)
+
+    async def main():
+        await pool.open()
+        server.ping_fails = True
+        await pool.fetch_all("SELECT 1")
+        await pool.close()
+
+    asyncio.run(main())
+    assert len(server.connections) == 3
+    assert pool.stats.health_check_failures == 2
+    assert all(connection.closed for connection in server.connections)
+
+
+def test_stream_reads_in_batches(server):
+    pool = new_pool(stream_batch_size=3)
+
+    async def main():
+        return [row async for row in pool.stream("SELECT id FROM exams")]
+
+    assert asyncio.run(main()) == ROWS
+    [connection] = server.connections
+    assert connection.round_trips == 4
+    assert connection.cursors[-1].options == {"dictionary": True, "buffered": False}
+
+
+def test_one_pool_per_event_loop_and_settings(context):
+    async def pools():
+        return database_pool(context), database_pool(context), database_pool(replace(context, db_pool_max_size=3))
+
+    first, same, other = asyncio.run(pools())
+    assert first is same and other is not first and other.max_size == 3
+    assert asyncio.run(pools())[0] is not first
@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from medical_agent.cache import EmbeddingCache
+from medical_agent.embeddings import BatchingEmbeddings, CachedEmbeddings
+from tests.conftest import HashEmbeddings
+
+
+class RecordingEmbeddings(HashEmbeddings):
+    def __init__(self, drop: int = 0):
+        super().__init__()
+        self.drop = drop
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        vectors = super().embed_documents(texts)
+        return vectors[: len(vectors) - self.drop]
+
+
+def embed_concurrently(embeddings: Embeddings, texts):
+    barrier = threading.Barrier(len(texts))
+
+    def embed(text):
+        barrier.wait()
+        return embeddings.embed_query(text)
+
+    with ThreadPoolExecutor(len(texts)) as pool:
+        futures = [pool.submit(embed, text) for text in texts]
+        return [future.exception(timeout=5) or future.result() for future in futures]
+
+
+def test_concurrent_queries_are_coalesced():
+    inner = RecordingEmbeddings()
+    batching = BatchingEmbeddings(inner, batch_size=8, max_wait_ms=200)
+    texts = [f"query {i}" for i in range(8)]
+    vectors = embed_concurrently(batching, texts)
+    assert vectors == [inner.vector(text) for text in texts]
+    assert len(inner.batches) < len(texts)
+
+
+def test_short_response_fails_every_query_instead_of_hanging():
+    batching = BatchingEmbeddings(RecordingEmbeddings(drop=1), batch_size=4, max_wait_ms=200)
+    results = embed_concurrently(batching, [f"query {i}" for i in range(4)])
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_documents_are_sliced_and_checked():
+    inner = RecordingEmbeddings()
+    batching = BatchingEmbeddings(inner, batch_size=3)
+    assert len(batching.embed_documents([f"text {i}" for i in range(7)])) == 7
+    assert [len(batch) for batch in inner.batches] == [3, 3, 1]
+    assert batching.calls == 3
+
+    with pytest.raises(ValueError):
+        BatchingEmbeddings(RecordingEmbeddings(drop=1)).embed_documents(["a", "b"])
+
+
+def test_cached_embeddings_only_embed_unseen_texts(tmp_path):
+    inner = RecordingEmbeddings()
+    cached = CachedEmbeddings(inner, EmbeddingCache(tmp_path / "embeddings.sqlite3"), "model")
+    first = cached.embed_documents(["a b", "c d", "a b"])
+    assert inner.batches == [["a b", "c d"]]
+    assert cached.embed_documents(["c d", "e f"])[0] == first[1]
+    assert inner.batches[-1] == ["e f"]
+    assert (cached.hits, cached.misses) == (1, 3)
+
+    # A new process reads the vectors back from SQLite.
+    reopened = CachedEmbeddings(inner, EmbeddingCache(tmp_path / "embeddings.sqlite3"), "model")
+    assert reopened.embed_query("a b") == pytest.approx(first[0])
+    assert reopened.hits == 1
+    # Another model never sees these vectors.
+    other = CachedEmbeddings(inner, EmbeddingCache(tmp_path / "embeddings.sqlite3"), "other-model")
+    other.embed_query("a b")
+    assert other.misses == 1
+
+
+def test_cached_counters_are_consistent_under_threads(tmp_path):
+    cached = CachedEmbeddings(HashEmbeddings(), EmbeddingCache(tmp_path / "embeddings.sqlite3"), "model")
+
+    def work():
+        for i in range(200):
+            cached.embed_query(f"query {i % 10}")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cached.hits + cached.misses == 1600
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from medical_agent import extraction as module
+from medical_agent.extraction import FastExtractor
+from medical_agent.lexicon import TermStore, mine_terms, term_store_path
+
+PATIENTS = ["João Silva", "Maria Souza", "Maria Lima", "Ana Paula Costa"]
+
+PROTOCOL = """Urinary catheterisation
+Indications
+• Urinary retention
+• Prostate cancer, cellulitis
+Contraindications
+- Known urethral trauma
+Procedure
+Explain the procedure to the patient.
+"""
+
+
+@pytest.fixture
+def extractor(context, monkeypatch):
+    loads = []
+
+    async def patient_names(context):
+        loads.append("patients")
+        return PATIENTS
+
+    async def exam_names(context):
+        return ["Hemograma", "Raio-X de tórax"]
+
+    monkeypatch.setattr(module, "patient_names", patient_names)
+    monkeypatch.setattr(module, "exam_names", exam_names)
+    TermStore(term_store_path(context.cache_dir)).add(["c1"], [PROTOCOL])
+    extractor = FastExtractor(context)
+    extractor.loads = loads
+    asyncio.run(extractor.refresh())
+    return extractor
+
+
+def test_mine_terms_reads_indication_bullets():
+    assert mine_terms(PROTOCOL) == ["urinary retention", "prostate cancer", "cellulitis", "urethral trauma"]
+
+
+def test_full_name_and_symptoms(extractor):
+    info = extractor.extract("Paciente Joao Silva com febre e dor de cabeca")
+    assert info["patient_name"] == "João Silva"
+    assert info["symptoms"] == ["febre", "dor de cabeca"]
+    assert info["disease_name"] == ""
+
+
+def test_cue_resolves_a_unique_first_name(extractor):
+    assert extractor.extract("patient João: fever and cough")["patient_name"] == "João Silva"
+    assert extractor.extract("paciente Ana com tosse")["patient_name"] == "Ana Paula Costa"
+
+
+def test_ambiguous_or_unknown_names_go_to_the_llm(extractor):
+    assert extractor.extract("paciente Maria com febre") is None
+    assert extractor.extract("paciente Pedro com febre") is None
+    assert extractor.extract("João Silva e Maria Lima com febre") is None
+
+
+def test_previous_patient_is_kept_when_nobody_is_named(extractor):
+    info = extractor.extract("patient with fever and urinary retention", previous_patient="Maria Lima")
+    assert info["patient_name"] == "Maria Lima"
+    assert (info["symptoms"], info["disease_name"]) == (["fever", "urinary retention"], "")
+
+
+def test_mined_terms_are_diseases(extractor):
+    info = extractor.extract("Maria Souza, prostate cancer and cellulitis")
+    assert (info["disease_name"], info["condition"]) == ("prostate cancer", "cellulitis")
+
+
+def test_unexplained_words_go_to_the_llm(extractor):
+    assert extractor.extract("João Silva caiu da escada ontem à noite e bateu a cabeça com febre") is None
+    assert extractor.extract("Hemograma da Maria Souza")["patient_name"] == "Maria Souza"
+    assert (extractor.hits, extractor.fallbacks) == (1, 1)
+
+
+def test_refresh_waits_for_the_interval(extractor):
+    asyncio.run(extractor.refresh())
+    assert extractor.loads == ["patients"]
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.tools import tool
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from medical_agent.schemas import UserInputInfo
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from fake_ollama import FakeOllama, hashed_embedding, render_prompt  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    with FakeOllama(
+        llm_latency_ms=0, tokens_per_second=0, embed_latency_ms=0, dimensions=16, answer_tokens=6,
+        patient_names=["João Silva"], terms=["febre", "dor de cabeça"],
+    ) as server:
+        yield server
+
+
+def chat(system, *turns):
+    messages = [{"role": "system", "content": system}]
+    messages += [{"role": "user", "content": turn} for turn in turns]
+    return {"model": "llama", "messages": messages}
+
+
+def test_prompt_is_rendered_system_then_tools_then_turns():
+    body = chat("static", "asma")
+    body["tools"] = [{"function": {"name": "search"}}]
+    assert render_prompt(body) == '<system>static<tools>[{"function": {"name": "search"}}]<user>asma'
+
+
+def test_only_the_uncached_suffix_costs_prefill():
+    with FakeOllama(prefill_tokens_per_second=100, kv_slots=1) as server:
+        system = "s" * 4000
+        cold = server.prefill_seconds(chat(system, "asma"))
+        warm = server.prefill_seconds(chat(system, "sepse"))
+        extended = server.prefill_seconds(chat(system, "sepse", "e febre"))
+        other = server.prefill_seconds({**chat(system, "x"), "model": "qwen"})
+    assert cold == pytest.approx(10.0, rel=0.01)
+    assert warm < 0.1 and extended < 0.1
+    # Each model has its own cache.
+    assert other == pytest.approx(cold, rel=0.01)
+    assert server.stats.prompt_cached_tokens > 2000
+
+
+def test_a_diverging_prompt_evicts_the_oldest_slot():
+    with FakeOllama(prefill_tokens_per_second=100, kv_slots=2) as server:
+        first, second, third = ("a" * 400, "b" * 400, "c" * 400)
+        for system in (first, second, third):
+            server.prefill_seconds(chat(system, "q"))
+        assert server.prefill_seconds(chat(third, "q")) < 0.05
+        assert server.prefill_seconds(chat(first, "q")) == pytest.approx(1.01, rel=0.05)
+
+
+def test_structured_output_streams_and_tool_calls_over_http(server):
+    model = ChatOllama(model="llama", base_url=server.url)
+    info = model.with_structured_output(UserInputInfo, method="json_schema").invoke(
+        "Paciente Joao Silva com febre e dor de cabeca"
+    )
+    assert info["patient_name"] == "João Silva"
+    assert info["symptoms"] == ["febre", "dor de cabeça"]
+
+    chunks = [chunk.text for chunk in model.stream("febre alta")]
+    assert len(chunks) > 2 and "".join(chunks) == "febre alta febre alta febre alta"
+
+    @tool
+    def sql_db_query(query: str) -> str:
+        """Run a query."""
+        return ""
+
+    [call] = model.bind_tools([sql_db_query]).invoke("patient: João Silva").tool_calls
+    assert call["name"] == "sql_db_query" and "LIKE 'João Silva%'" in call["args"]["query"]
+    assert server.stats.snapshot()["structured_requests"] == 1
+    assert server.stats.tool_call_responses == 1
+
+
+def test_embeddings_are_deterministic_and_word_based(server):
+    embeddings = OllamaEmbeddings(model="nomic", base_url=server.url)
+    vectors = embeddings.embed_documents(["febre alta", "Febre  ALTA", "fratura"])
+    assert vectors[0] == pytest.approx(hashed_embedding("febre alta", 16))
+    assert vectors[0] == pytest.approx(vectors[1]) and vectors[0] != pytest.approx(vectors[2])
+    assert (server.stats.embed_requests, server.stats.embed_inputs) == (1, 3)
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.graph import END
+
+from medical_agent import nodes
+from medical_agent.cache.semantic_cache import CachedAnswer
+from medical_agent.graph import builder
+
+
+def info(patient="", symptoms=(), disease="", question=""):
+    return {
+        "patient_name": patient,
+        "symptoms": list(symptoms),
+        "disease_name": disease,
+        "condition": "",
+        "original_input": question,
+        "summary": "",
+    }
+
+
+@pytest.mark.parametrize(
+    "extracted, branches",
+    [
+        (info("Alice", ["febre"]), ["gather_patient_info", "gather_procedure_guidelines"]),
+        (info("Alice"), ["gather_patient_info"]),
+        (info(disease="asma"), ["gather_procedure_guidelines"]),
+        (info(), [END]),
+    ],
+)
+def test_router_returns_every_required_branch(extracted, branches):
+    state = {"user_input_info": extracted}
+    state.update(asyncio.run(nodes.planning(state, None)))
+    assert nodes.router(state, None) == branches
+
+
+def test_branches_run_concurrently_and_join(context, monkeypatch):
+    started = {"patient": asyncio.Event(), "procedure": asyncio.Event()}
+
+    async def fast_normalize(state, context):
+        return info("Alice", ["febre"], question="exames alterados da Alice em 2019, com febre")
+
+    # Each branch waits for the other to start, so running them one after the other times out.
+    async def query_patient(query, context=None):
+        started["patient"].set()
+        await asyncio.wait_for(started["procedure"].wait(), 5)
+        return "Alice, 54, asthmatic."
+
+    async def search_procedures(query, context=None):
+        started["procedure"].set()
+        await asyncio.wait_for(started["patient"].wait(), 5)
+        return CachedAnswer(query=query, answer="Give oxygen.", sources=["asthma.pdf:2"])
+
+    monkeypatch.setattr(nodes, "fast_normalize", fast_normalize)
+    monkeypatch.setattr("medical_agent.agents.supervisor_agent.query_patient", query_patient)
+    monkeypatch.setattr("medical_agent.agents.supervisor_agent.search_procedures", search_procedures)
+
+    state = asyncio.run(
+        builder.compile().ainvoke({"messages": [HumanMessage("paciente Alice com febre")]}, context=context)
+    )
+    assert state["patient_info"][0].page_content == "Alice, 54, asthmatic."
+    assert state["procedure_guidelines"][0].metadata == {"sources": ["asthma.pdf:2"], "query": "febre"}
+    assert set(state["branch_timings"]) == {"gather_patient_info", "gather_procedure_guidelines"}
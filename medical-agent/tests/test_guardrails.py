@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+
+from medical_agent.agents.custom_guardrail import DatabaseWriteOperationGuardrail, GuardrailEngine, GuardrailRule
+from medical_agent.agents.custom_guardrail.rules import SeenMessages, fold
+from medical_agent.sql_parsing import write_operations, write_statement_prefix
+
+
+@pytest.mark.parametrize(
+    "sql, operations",
+    [
+        ("DELETE FROM patients", ["DELETE"]),
+        ("delete from patients where id = 1", ["DELETE"]),
+        ("SELECT 1; DROP TABLE patients", ["DROP"]),
+        ("SeLeCt 1;\n  uPdAtE patients SET name = 'x'", ["UPDATE"]),
+        ("WITH x AS (SELECT 1) DELETE FROM patients", ["DELETE"]),
+        ("WITH x AS (SELECT 1) UPDATE patients SET name = 'x'", ["UPDATE"]),
+        ("SELECT * INTO OUTFILE '/tmp/patients' FROM patients", ["OUTFILE"]),
+        ("SELECT * FROM patients FOR UPDATE", ["UPDATE"]),
+        ("SELECT 1 INTO @x; SELECT * FROM t INTO DUMPFILE '/tmp/x'", ["DUMPFILE"]),
+        ("(DELETE FROM patients)", ["(", "DELETE"]),
+        ("SELECT 1 -- comment\n; TRUNCATE TABLE exams", ["TRUNCATE"]),
+        ("SELECT 1 /* ; */ ; INSERT INTO exams VALUES (1)", ["INSERT"]),
+        ("SELECT 1 --1; DROP TABLE patients", ["DROP"]),
+        ("SELECT 1 /*!50000 ; DROP TABLE patients */", ["DROP"]),
+        ("/*!DELETE FROM patients*/", ["DELETE"]),
+        ("/*M!100000 TRUNCATE exams */ SELECT 1", ["TRUNCATE"]),
+        ("CALL purge_patients()", ["CALL"]),
+        ("LOAD DATA INFILE '/tmp/x' INTO TABLE patients", ["LOAD"]),
+        ("SET GLOBAL read_only = 0", ["SET"]),
+        ("GRANT ALL ON *.* TO 'x'", ["GRANT"]),
+    ],
+)
+def test_writes_are_detected(sql, operations):
+    assert write_operations(sql)[: len(operations)] == operations
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM patients WHERE id = 1",
+        "SELECT REPLACE(name, 'a', 'b'), INSERT(name, 1, 2, 'x') FROM patients",
+        "SELECT `delete`, `update` FROM audit",
+        "SELECT 'DROP TABLE patients; DELETE FROM exams' AS note",
+        'SELECT "update" FROM patients',
+        "SELECT 1 -- ; DROP TABLE patients",
+        "SELECT 1 # ; DELETE FROM patients",
+        "SELECT 1 /* DELETE FROM patients */",
+        "SELECT /*! STRAIGHT_JOIN */ p.id FROM patients p",
+        "WITH recent AS (SELECT * FROM exams) SELECT * FROM recent",
+        "SHOW TABLES",
+        "DESCRIBE patients",
+        "EXPLAIN SELECT * FROM exams",
+        "",
+    ],
+)
+def test_reads_are_clean(sql):
+    assert write_operations(sql) == []
+
+
+@pytest.mark.parametrize(
+    "text, operation",
+    [
+        ("UPDATE patients SET name = 'x'", "UPDATE"),
+        ("delete the exams from patient 7", "DELETE"),
+        ("drop table patients", "DROP"),
+        ("insert into exams values (1)", "INSERT"),
+        ("truncate table exams", "TRUNCATE"),
+        ("grant select on patients to bob", "GRANT"),
+        ("update me on Alice", None),
+        ("create a summary of the exams", None),
+        ("delete", None),
+        ("what was replaced in the last visit?", None),
+    ],
+)
+def test_write_statement_prefix(text, operation):
+    assert write_statement_prefix(text) == operation
+
+
+def test_engine_scans_folded_whole_words():
+    engine = GuardrailEngine([GuardrailRule("names", ("João Silva", "Ana"))])
+    assert [match.text for match in engine.scan("joao silva e ANA, não Anamaria")] == ["joao silva", "ANA"]
+    assert fold("João") == "joao" and len(fold("Ação")) == 4
+
+
+def test_engine_redacts_leftmost_longest_and_recompiles():
+    engine = GuardrailEngine(
+        [GuardrailRule("block", ("drop",)), GuardrailRule("phi", ("Ana", "Ana Souza"), action="redact", replacement="[P]")]
+    )
+    assert engine.redact("Ana Souza and Ana; drop") == "[P] and [P]; drop"
+    assert engine.redact("nothing here") == "nothing here"
+    assert engine.set_patterns("phi", ["Bruno"])
+    assert not engine.set_patterns("phi", ["Bruno"])
+    assert engine.redact("Ana and Bruno") == "Ana and [P]"
+    assert [match.rule for match in engine.scan("drop Bruno", rules=("block",))] == ["block"]
+
+
+def test_seen_messages_are_checked_once_and_bounded():
+    seen = SeenMessages(max_size=2)
+    first, second, third = (HumanMessage("q", id=str(i)) for i in range(3))
+    assert seen.unseen([first, second]) == [first, second]
+    assert seen.unseen([first, second, third]) == [third]
+    # The oldest ID was forgotten.
+    assert seen.unseen([first]) == [first]
+    anonymous = {"role": "user", "content": "q"}
+    assert seen.unseen([anonymous]) == seen.unseen([anonymous]) == [anonymous]
+
+
+def test_write_requests_are_blocked_once():
+    guardrail = DatabaseWriteOperationGuardrail(GuardrailEngine([GuardrailRule("write_intent", ("delete", "update"))]))
+    request = HumanMessage("Please DELETE FROM exams WHERE patient_id = 7", id="1")
+    blocked = guardrail.before_agent({"messages": [request]})
+    assert blocked["jump_to"] == "end"
+    # Later turns do not re-check the old message.
+    assert guardrail.before_agent({"messages": [request, AIMessage("no", id="2"), HumanMessage("update me on Alice", id="3")]}) is None
+
+
+def test_generated_writes_are_refused():
+    guardrail = DatabaseWriteOperationGuardrail()
+    calls = []
+
+    async def handler(request):
+        calls.append(request.tool_call["args"]["query"])
+        return ToolMessage(content="[(1,)]", tool_call_id="call")
+
+    def run(name, query):
+        request = ToolCallRequest(
+            tool_call={"name": name, "args": {"query": query}, "id": "call"}, tool=None, state={}, runtime=None
+        )
+        return asyncio.run(guardrail.awrap_tool_call(request, handler))
+
+    refused = run("sql_db_query", "SELECT 1 /*!50000 ; DROP TABLE patients */")
+    assert refused.status == "error" and "DROP" in refused.content
+    assert run("sql_db_query", "SELECT * FROM patients").content == "[(1,)]"
+    assert run("sql_db_schema", "DROP TABLE patients").content == "[(1,)]"
+    assert calls == ["SELECT * FROM patients", "DROP TABLE patients"]
@@ -0,0 +1,68 @@
+from dataclasses import replace
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from medical_agent.lexical_index import BM25Index
+from medical_agent.retrievers import CachedRetriever, HybridRetriever, procedure_retriever, reciprocal_rank_fusion
+from medical_agent.vector_index import LocalVectorIndex, LocalVectorStore
+
+
+def doc(doc_id: str, text: str = "") -> Document:
+    return Document(id=doc_id, page_content=text or doc_id)
+
+
+class StaticRetriever(BaseRetriever):
+    docs: List[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.docs
+
+
+def ids(docs):
+    return [d.id for d in docs]
+
+
+def test_documents_ranked_by_both_lists_come_first():
+    vector = [doc("a"), doc("b"), doc("c")]
+    lexical = [doc("d"), doc("c")]
+    assert ids(reciprocal_rank_fusion([vector, lexical], [1.0, 1.0], k=4)) == ["c", "a", "d", "b"]
+
+
+def test_weights_and_k():
+    vector, lexical = [doc("a")], [doc("b")]
+    assert ids(reciprocal_rank_fusion([vector, lexical], [1.0, 2.0], k=2)) == ["b", "a"]
+    assert ids(reciprocal_rank_fusion([vector, lexical], [1.0, 2.0], k=1)) == ["b"]
+
+
+def test_documents_without_ids_are_fused_by_location():
+    first = Document(page_content="give oxygen", metadata={"source": "asthma.pdf", "page": 1, "start_index": 0})
+    same = Document(page_content="give oxygen", metadata={"source": "asthma.pdf", "page": 1, "start_index": 0})
+    other = Document(page_content="give oxygen", metadata={"source": "asthma.pdf", "page": 2, "start_index": 0})
+    fused = reciprocal_rank_fusion([[first, other], [same]], [1.0, 1.0], k=5)
+    assert fused == [first, other]
+
+
+def test_exact_codes_missed_by_the_vector_search_are_found(tmp_path):
+    lexical = BM25Index(tmp_path / "bm25")
+    lexical.add(["sepsis", "asthma"], ["CID A41.9 sepsis give fluids", "asthma give oxygen"])
+    retriever = HybridRetriever(
+        vector_retriever=StaticRetriever(docs=[doc("asthma"), doc("fracture")]), lexical_index=lexical, k=3
+    )
+    assert ids(retriever.invoke("A41.9")) == ["asthma", "sepsis", "fracture"]
+    assert ids(retriever.invoke("asthma oxygen"))[0] == "asthma"
+
+
+def test_procedure_retriever_follows_the_context(context, embeddings):
+    store = LocalVectorStore(LocalVectorIndex(context.local_index_path), embeddings)
+
+    hybrid = procedure_retriever(store, replace(context, retrieval_cache_enabled=False))
+    assert isinstance(hybrid, HybridRetriever)
+    assert (hybrid.k, hybrid.rrf_k) == (context.retriever_k, context.rrf_k)
+
+    vector_only = procedure_retriever(store, replace(context, retriever_mode="vector", retrieval_cache_enabled=False))
+    assert not isinstance(vector_only, HybridRetriever)
+
+    cached = procedure_retriever(store, context)
+    assert isinstance(cached, CachedRetriever) and isinstance(cached.retriever, HybridRetriever)
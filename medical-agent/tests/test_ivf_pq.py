@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from medical_agent.vector_index import IVFPQIndex, LocalVectorIndex
+from medical_agent.vector_index.ivf_pq import kmeans
+
+
+def clustered(n=2000, dimensions=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimensions))
+    vectors = centres[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall(found, expected):
+    return len(set(found) & set(expected)) / len(expected)
+
+
+def test_kmeans_finds_separated_clusters():
+    rng = np.random.default_rng(0)
+    vectors = np.concatenate([rng.normal(loc, 0.1, size=(50, 2)) for loc in (-5, 5)]).astype(np.float32)
+    centroids = kmeans(vectors, 2)
+    assert sorted(np.round(centroids[:, 0]).tolist()) == [-5.0, 5.0]
+
+
+def test_dimensions_must_split_into_sub_spaces():
+    with pytest.raises(ValueError):
+        IVFPQIndex(30, m=8)
+    with pytest.raises(RuntimeError):
+        IVFPQIndex(32, m=8).add([0], np.zeros((1, 32)))
+
+
+def test_search_recalls_the_exact_neighbours():
+    vectors = clustered()
+    index = IVFPQIndex(32, nlist=16, m=8)
+    index.train(vectors)
+    index.add(np.arange(len(vectors)), vectors)
+    assert len(index) == len(vectors)
+
+    queries = vectors[:20]
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    recalls = [recall(index.search(query, 50, nprobe=4)[0], expected) for query, expected in zip(queries, exact)]
+    assert np.mean(recalls) > 0.8
+
+    rows, scores = index.search(queries[0], 10, nprobe=index.nlist)
+    assert len(rows) == 10 and (np.diff(scores) <= 0).all()
+
+
+def test_nlist_is_capped_by_the_training_size():
+    index = IVFPQIndex(32, nlist=1024, m=8)
+    index.train(clustered(n=400))
+    assert index.nlist == 400 // 39
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = clustered(n=500)
+    index = IVFPQIndex(32, nlist=8, m=8)
+    index.train(vectors)
+    index.add(np.arange(250), vectors[:250])
+    index.add(np.arange(250, 500), vectors[250:])
+    index.save(tmp_path / "ivfpq.npz")
+
+    loaded = IVFPQIndex.load(tmp_path / "ivfpq.npz")
+    assert (loaded.nlist, loaded.m, len(loaded)) == (index.nlist, index.m, 500)
+    for query in vectors[:5]:
+        np.testing.assert_array_equal(loaded.search(query, 10, nprobe=3)[0], index.search(query, 10, nprobe=3)[0])
+
+
+def test_local_index_reranks_ann_candidates_exactly(tmp_path):
+    vectors = clustered(n=1000)
+    ids = [str(i) for i in range(len(vectors))]
+    index = LocalVectorIndex(tmp_path / "index")
+    index.add(ids, vectors, [f"chunk {i}" for i in ids])
+    index.build_ann(nlist=8, m=8, iterations=10)
+
+    query = vectors[3]
+    hits = index.search(query, k=5, nprobe=8)
+    assert hits[0].id == "3" and hits[0].score == pytest.approx(1.0, abs=1e-5)
+    assert [hit.score for hit in hits] == pytest.approx([float(vectors[int(hit.id)] @ query) for hit in hits], abs=1e-5)
+    wide = index.search(query, k=5, nprobe=8, rerank_factor=50)
+    assert [hit.id for hit in wide] == [hit.id for hit in index.search(query, k=5)]
+
+    # Rows added later are inserted into the lists; deleted rows are skipped.
+    index.add(["new"], vectors[3:4], ["new chunk"])
+    index.delete(["3"])
+    assert [hit.id for hit in index.search(query, k=1, nprobe=8)] == ["new"]
+
+    index.save_ann()
+    reopened = LocalVectorIndex(tmp_path / "index")
+    assert reopened.ann is not None
+    assert [hit.id for hit in reopened.search(query, k=1, nprobe=8)] == ["new"]
@@ -0,0 +1,61 @@
+from medical_agent.cache import ingestion_generation
+from medical_agent.document_loader.pipeline import IngestionPipeline
+from medical_agent.document_loader.sinks import LexicalIndexSink
+from medical_agent.lexical_index import BM25Index, tokenize
+from tests.conftest import write_pdf
+
+
+def test_tokenize_folds_accents_and_keeps_codes():
+    assert tokenize("Pressão arterial e CID A41.9 ou COVID-19") == ["pressao", "arterial", "cid", "a41.9", "ou", "covid-19"]
+
+
+def test_search_ranks_exact_terms_and_skips_deleted(tmp_path):
+    index = BM25Index(tmp_path / "bm25")
+    index.add(["a", "b", "c"], ["dipirona 500 mg", "paracetamol 750 mg", "dipirona dipirona dose"])
+    index.save()
+
+    assert [index.documents([doc_no])[0].id for doc_no, _ in index.search("dipirona", 3)] == ["c", "a"]
+    index.delete(["c"])
+    assert [index.documents([doc_no])[0].id for doc_no, _ in index.search("dipirona", 3)] == ["a"]
+
+
+def test_saved_index_reopens(tmp_path):
+    index = BM25Index(tmp_path / "bm25")
+    index.add(["a", "b"], ["sepsis fluids", "asthma oxygen"])
+    index.delete(["b"])
+    index.save()
+
+    reopened = BM25Index(tmp_path / "bm25")
+    assert len(reopened) == 1
+    assert reopened.search("asthma", 5) == []
+
+
+def test_reingested_page_is_searchable_without_reopening(context, embeddings, tmp_path):
+    pdf = write_pdf(tmp_path / "protocol.pdf", ["asthma protocol give oxygen", "sepsis protocol give fluids"])
+    serving = BM25Index(context.lexical_index_path, generation=ingestion_generation(context.cache_dir))
+
+    def ingest():
+        sink = LexicalIndexSink(BM25Index(context.lexical_index_path))
+        IngestionPipeline(context, embeddings, sink).ingest([pdf])
+
+    ingest()
+    assert serving.search("oxygen", 5)
+
+    write_pdf(pdf, ["asthma protocol give salbutamol", "sepsis protocol give fluids"])
+    ingest()
+
+    assert serving.search("oxygen", 5) == []
+    [(doc_no, _)] = serving.search("salbutamol", 5)
+    assert "salbutamol" in serving.documents([doc_no])[0].page_content
+
+
+def test_deletes_alone_refresh_the_average_length(tmp_path):
+    texts = ["sepsis fluids", "asthma oxygen " + "word " * 40, "sepsis antibiotics early"]
+    index = BM25Index(tmp_path / "bm25")
+    index.add(["a", "b", "c"], texts)
+    index.search("sepsis", 3)
+    index.delete(["b"])
+
+    fresh = BM25Index(tmp_path / "fresh")
+    fresh.add(["a", "c"], [texts[0], texts[2]])
+    assert [score for _, score in index.search("sepsis", 3)] == [score for _, score in fresh.search("sepsis", 3)]
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import numpy as np
+
+from medical_agent.cache import ingestion_generation
+from medical_agent.document_loader.pipeline import IngestionPipeline
+from medical_agent.document_loader.sinks import LocalIndexSink
+from medical_agent.vector_index import LocalVectorIndex
+from tests.conftest import write_pdf
+
+
+def ingest(context, embeddings, pdf: Path) -> None:
+    # Each run opens its own handle, as the ingestion CLI does in its own process.
+    IngestionPipeline(context, embeddings, LocalIndexSink(LocalVectorIndex(context.local_index_path))).ingest([pdf])
+
+
+def test_add_search_and_tombstone(tmp_path, embeddings):
+    index = LocalVectorIndex(tmp_path / "index")
+    texts = ["asthma give oxygen", "sepsis give fluids", "fracture immobilize limb"]
+    index.add(["a", "s", "f"], embeddings.embed_documents(texts), texts)
+
+    assert [hit.id for hit in index.search(embeddings.embed_query("sepsis fluids"), k=1)] == ["s"]
+    assert index.delete(["s"]) == 1
+    assert "s" not in [hit.id for hit in index.search(embeddings.embed_query("sepsis fluids"), k=3)]
+
+    reopened = LocalVectorIndex(tmp_path / "index")
+    assert sorted(reopened.ids) == ["a", "f"]
+
+
+def test_upsert_replaces_the_previous_row(tmp_path, embeddings):
+    index = LocalVectorIndex(tmp_path / "index")
+    index.add(["a"], embeddings.embed_documents(["asthma give oxygen"]), ["asthma give oxygen"])
+    index.add(["a"], embeddings.embed_documents(["asthma give salbutamol"]), ["asthma give salbutamol"])
+
+    hits = index.search(embeddings.embed_query("asthma"), k=5)
+    assert [hit.text for hit in hits] == ["asthma give salbutamol"]
+    assert len(index) == 1
+
+
+def test_compact_drops_tombstoned_rows(tmp_path, embeddings):
+    index = LocalVectorIndex(tmp_path / "index", dtype="float16")
+    texts = [f"step {i} of the protocol" for i in range(5)]
+    index.add([str(i) for i in range(5)], embeddings.embed_documents(texts), texts)
+    index.delete(["1", "3"])
+    index.compact()
+
+    assert index.count == 3
+    assert sorted(index.ids) == ["0", "2", "4"]
+    assert np.isfinite(index.scores(embeddings.embed_query("step"))).all()
+
+
+def test_reingested_page_is_searchable_without_reopening(context, embeddings, tmp_path):
+    pdf = write_pdf(tmp_path / "protocol.pdf", ["asthma protocol give oxygen", "sepsis protocol give fluids"])
+    generation = ingestion_generation(context.cache_dir)
+    # The serving process opens the index before any ingestion run.
+    serving = LocalVectorIndex(context.local_index_path, generation=generation)
+
+    ingest(context, embeddings, pdf)
+    hits = serving.search(embeddings.embed_query("asthma protocol give oxygen"), k=1)
+    assert hits and "oxygen" in hits[0].text
+
+    write_pdf(pdf, ["asthma protocol give salbutamol", "sepsis protocol give fluids"])
+    ingest(context, embeddings, pdf)
+
+    texts = [hit.text for hit in serving.search(embeddings.embed_query("asthma protocol give salbutamol"), k=5)]
+    assert "salbutamol" in texts[0]
+    assert not any("oxygen" in text for text in texts)
+    assert len(serving) == 2
@@ -0,0 +1,104 @@
+from langchain.agents.middleware import ModelResponse
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+
+from medical_agent.memory import (
+    ConversationWindowMiddleware,
+    compact_messages,
+    fold_turn,
+    message_tokens,
+    recent_window,
+    render_memory,
+)
+from medical_agent.nodes import remember_turn
+from tests.test_pdf_agent import model_request
+
+
+def info(patient="", symptoms=(), disease="", condition="", summary=""):
+    return {
+        "patient_name": patient,
+        "symptoms": list(symptoms),
+        "disease_name": disease,
+        "condition": condition,
+        "original_input": summary,
+        "summary": summary,
+    }
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages += [
+            HumanMessage(f"question {turn} " + "word " * 20, id=f"h{turn}"),
+            AIMessage("", tool_calls=[{"name": "search", "args": {}, "id": f"t{turn}"}], id=f"a{turn}"),
+            ToolMessage("result " * 20, tool_call_id=f"t{turn}", id=f"r{turn}"),
+            AIMessage(f"answer {turn}", id=f"f{turn}"),
+        ]
+    return messages
+
+
+def test_window_keeps_whole_recent_turns():
+    messages = conversation(5)
+    turn = sum(message_tokens(message) for message in messages[:4])
+    window = recent_window(messages, 2 * turn)
+    assert [message.id for message in window] == ["h3", "a3", "r3", "f3", "h4", "a4", "r4", "f4"]
+    # The last turn is kept even when it alone is over the budget.
+    assert recent_window(messages, 1) == messages[-4:]
+    assert recent_window(messages, 0) == messages
+
+
+def test_compaction_removes_the_messages_outside_the_window():
+    messages = conversation(3)
+    removals = compact_messages(messages, 1)
+    assert all(isinstance(removal, RemoveMessage) for removal in removals)
+    assert [removal.id for removal in removals] == [message.id for message in messages[:8]]
+    assert compact_messages(messages, 0) == []
+
+
+def test_memory_merges_terms_and_resets_on_another_patient():
+    memory = fold_turn(None, info("Alice", ["febre"], "asma", summary="Alice com febre"), max_notes=2)
+    memory = fold_turn(memory, info("", ["Febre", "tosse"], "", "DPOC", "e tosse"), max_notes=2)
+    memory = fold_turn(memory, info("alice", [], "", summary="piorou"), max_notes=2)
+    assert memory["patient_name"] == "alice"
+    assert memory["symptoms"] == ["febre", "tosse"]
+    assert memory["diseases"] == ["asma", "DPOC"]
+    assert memory["notes"] == ["e tosse", "piorou"]
+    assert memory["turns"] == 3
+
+    switched = fold_turn(memory, info("Bruno", ["dor"]), max_notes=2)
+    assert (switched["patient_name"], switched["symptoms"], switched["diseases"]) == ("Bruno", ["dor"], [])
+    assert switched["turns"] == 4
+
+
+def test_render_memory():
+    assert render_memory(None) == ""
+    memory = fold_turn(None, info("Alice", ["febre"], summary="x " * 200), max_notes=4)
+    text = render_memory(memory)
+    assert text.startswith("Patient: Alice\nSymptoms reported: febre\nRecent turns:\n- x x")
+    assert len(text.splitlines()[-1]) <= 2 + 200 and text.endswith("...")
+
+
+def test_remember_turn_folds_and_compacts(context):
+    messages = conversation(40)
+    update = remember_turn({"messages": messages}, context, info("Alice", ["febre"]))
+    assert update["memory"]["turns"] == 1
+    assert update["messages"] and update["messages"][0].id == "h0"
+    kept = len(messages) - len(update["messages"])
+    assert kept % 4 == 0 and 0 < kept < len(messages)
+
+
+def test_middleware_sends_recent_turns_and_notes_the_rest():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return ModelResponse(result=[AIMessage("ok")])
+
+    middleware = ConversationWindowMiddleware(budget=1, max_notes=1)
+    request = model_request("unused").override(messages=conversation(3), system_prompt="static")
+    middleware.wrap_model_call(request, handler)
+    assert [message.id for message in seen[0].messages] == ["h2", "a2", "r2", "f2"]
+    assert seen[0].system_prompt.startswith("static\n\nEarlier in this conversation:\n- question 1 ")
+
+    short = model_request("only turn")
+    middleware.wrap_model_call(short, handler)
+    assert seen[1] is short
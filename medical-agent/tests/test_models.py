@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import replace
+
+import httpx
+import pytest
+
+from medical_agent import models
+from medical_agent.models import (
+    ConcurrencyLimits,
+    LimitedAsyncTransport,
+    LimitedTransport,
+    ModelRegistry,
+    model_registry,
+    parse_concurrency_overrides,
+)
+from medical_agent.schemas import UserInputInfo
+
+
+def chat_request(model="gpt-oss:20b", path="/api/chat"):
+    body = json.dumps({"model": model, "messages": [{"role": "user", "content": "hi"}]})
+    return httpx.Request("POST", f"http://ollama:11434{path}", content=body)
+
+
+class Body(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """An unread response body, as a real transport returns it."""
+
+    def __iter__(self):
+        yield b"{}"
+
+    async def __aiter__(self):
+        yield b"{}"
+
+
+class Gauge:
+    """Counts the requests in flight on a fake server and the peak."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def leave(self):
+        with self.lock:
+            self.current -= 1
+
+
+def test_parse_concurrency_overrides():
+    assert parse_concurrency_overrides(" gpt-oss:20b=2, llama3=8 ,, bad=") == {"gpt-oss:20b": 2, "llama3": 8}
+    assert parse_concurrency_overrides("") == {}
+
+
+def test_only_generation_requests_are_limited():
+    assert models._generation_model(chat_request()) == "gpt-oss:20b"
+    assert models._generation_model(chat_request(path="/api/generate")) == "gpt-oss:20b"
+    assert models._generation_model(chat_request(path="/api/embed")) is None
+    assert models._generation_model(httpx.Request("GET", "http://ollama:11434/api/tags")) is None
+
+
+def test_sync_transport_holds_a_slot_until_the_response_is_closed():
+    gauge = Gauge()
+
+    def handler(request):
+        gauge.enter()
+        time.sleep(0.05)
+        gauge.leave()
+        return httpx.Response(200, stream=Body())
+
+    transport = LimitedTransport(ConcurrencyLimits(default=1), httpx.Limits())
+    transport.inner = httpx.MockTransport(handler)
+    slots = transport.limits.thread_semaphore("gpt-oss:20b")
+
+    response = transport.handle_request(chat_request())
+    assert not slots.acquire(blocking=False)
+    response.close()
+    assert slots.acquire(blocking=False)
+    slots.release()
+
+    def call():
+        with httpx.Client(transport=transport) as client:
+            client.send(chat_request()).close()
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gauge.peak == 1
+
+
+def test_async_transport_caps_concurrent_generations(monkeypatch):
+    gauge = Gauge()
+
+    async def handler(request):
+        gauge.enter()
+        await asyncio.sleep(0.02)
+        gauge.leave()
+        return httpx.Response(200, stream=Body())
+
+    monkeypatch.setattr(models.httpx, "AsyncHTTPTransport", lambda limits: httpx.MockTransport(handler))
+    transport = LimitedAsyncTransport(ConcurrencyLimits(default=8, overrides={"gpt-oss:20b": 1}), httpx.Limits())
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.post("http://ollama:11434/api/chat", json={"model": "gpt-oss:20b"}) for _ in range(5)))
+            first_peak, gauge.peak = gauge.peak, 0
+            await asyncio.gather(*(client.post("http://ollama:11434/api/chat", json={"model": "llama3"}) for _ in range(5)))
+            return first_peak, gauge.peak
+
+    assert asyncio.run(main()) == (1, 5)
+
+
+def test_registry_shares_clients_and_pins_ollama_options(context):
+    registry = ModelRegistry(replace(context, ollama_keep_alive="300", ollama_num_ctx=8192))
+    model = registry.chat_model("ollama/gpt-oss:20b")
+    assert registry.chat_model("ollama/gpt-oss:20b") is model
+    assert registry.chat_model("ollama/gpt-oss:20b", temperature=0) is not model
+    assert (model.keep_alive, model.num_ctx) == (300, 8192)
+    assert registry.ollama_options == {"keep_alive": 300, "num_ctx": 8192}
+    assert ModelRegistry(replace(context, ollama_keep_alive="10m")).ollama_options["keep_alive"] == "10m"
+
+    structured = registry.structured_model("ollama/gpt-oss:20b", UserInputInfo)
+    assert registry.structured_model("ollama/gpt-oss:20b", UserInputInfo) is structured
+
+
+def test_registries_are_shared_per_connection_settings(context):
+    assert model_registry(context) is model_registry(replace(context, model="ollama/other"))
+    assert model_registry(context) is not model_registry(replace(context, ollama_max_connections=context.ollama_max_connections + 1))
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_non_positive_limits_are_unlimited(limit):
+    assert ConcurrencyLimits(default=limit).thread_semaphore("m") is None
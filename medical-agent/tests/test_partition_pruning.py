@@ -0,0 +1,199 @@
+import asyncio
+from dataclasses import replace
+from datetime import date
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+
+from medical_agent.agents.custom_guardrail.partition_pruning import (
+    DateWindow,
+    ExplainSummary,
+    PartitionPruningMiddleware,
+    date_window_from_text,
+)
+from medical_agent.schema_catalog import PartitionInfo, TableInfo
+from medical_agent.sql_parsing import parse_select
+
+TODAY = date(2026, 10, 18)
+
+
+class FakeCatalog:
+    def __init__(self):
+        self.tables = {
+            "exams": TableInfo(
+                name="exams",
+                partition_method="RANGE",
+                partition_expression="year(exam_date)",
+                partitions=[PartitionInfo(f"p{year}", str(year + 1)) for year in range(2018, 2027)],
+            ),
+            "health_history": TableInfo(
+                name="health_history",
+                partition_method="RANGE",
+                partition_expression="year(occurred_at)",
+                partitions=[PartitionInfo(f"p{year}", str(year + 1)) for year in range(2018, 2027)],
+            ),
+            "patients": TableInfo(name="patients"),
+        }
+
+    async def ensure_fresh(self):
+        return self
+
+
+class FakeMiddleware(PartitionPruningMiddleware):
+    """Answers EXPLAIN like MySQL and records the queries explained.
+
+    Each partitioned table is reported under its alias; a table with a bound on
+    its partition column reads `partitions_read` partitions, any other all nine.
+    """
+
+    def __init__(self, context, partitions_read=2):
+        super().__init__(FakeCatalog(), context, today=lambda: TODAY)
+        self.partitions_read = partitions_read
+        self.explained = []
+
+    async def explain(self, query):
+        self.explained.append(query)
+        partitions = {}
+        for table in parse_select(query).tables:
+            info = self.catalog.tables[table.name]
+            if info.partitions:
+                bounded = f"`{table.alias}`.`{self._partition_column(info)}` >=" in query
+                read = self.partitions_read if bounded else len(info.partitions)
+                partitions[table.alias.lower()] = {f"p{i}" for i in range(read)}
+        return ExplainSummary(partitions, rows=100 * sum(map(len, partitions.values())))
+
+
+@pytest.fixture
+def middleware(context):
+    return FakeMiddleware(context)
+
+
+def run_tool(middleware, query, question, results):
+    calls = []
+
+    async def handler(request):
+        sql = request.tool_call["args"]["query"]
+        calls.append(sql)
+        return ToolMessage(content=results(sql), tool_call_id="call")
+
+    request = ToolCallRequest(
+        tool_call={"name": "sql_db_query", "args": {"query": query}, "id": "call"},
+        tool=None,
+        state={"messages": [HumanMessage(question)]},
+        runtime=None,
+    )
+    return asyncio.run(middleware.awrap_tool_call(request, handler)), calls
+
+
+@pytest.mark.parametrize(
+    "text, window",
+    [
+        ("exames em 2023", DateWindow(date(2023, 1, 1), date(2024, 1, 1), explicit=True)),
+        ("between 2021 and 2023", DateWindow(date(2021, 1, 1), date(2024, 1, 1), explicit=True)),
+        ("consultas de 15/03/2022", DateWindow(date(2022, 1, 1), date(2023, 1, 1), explicit=True)),
+        ("desde 2020", DateWindow(date(2020, 1, 1), explicit=True)),
+        ("últimos 6 meses", DateWindow(date(2026, 4, 21), explicit=True)),
+        ("ano passado", DateWindow(date(2025, 1, 1), date(2026, 1, 1), explicit=True)),
+        ("exames recentes do paciente 42", DateWindow(date(2024, 10, 18))),
+    ],
+)
+def test_date_window_from_text(text, window):
+    assert date_window_from_text(text, TODAY, 730) == window
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "exames do paciente 2023",
+        "paciente com id 2019 no quarto 2024",
+        "dose de 2000 mg de paracetamol",
+        "primeira consulta do paciente 7",
+        "todo o histórico de exames",
+    ],
+)
+def test_no_window_without_dates_or_recency(text):
+    assert date_window_from_text(text, TODAY, 730) is None
+
+
+def test_aggregate_detection():
+    assert parse_select("SELECT COUNT(*) FROM exams").aggregate
+    assert parse_select("SELECT MIN(exam_date) FROM exams WHERE patient_id = 1").aggregate
+    assert parse_select("SELECT patient_id, type FROM exams GROUP BY patient_id, type").aggregate
+    assert not parse_select("SELECT * FROM exams WHERE id IN (SELECT MAX(id) FROM exams)").aggregate
+    assert not parse_select("SELECT count FROM exams").aggregate
+
+
+def test_explicit_window_bounds_query_and_is_stated(middleware):
+    response, calls = run_tool(
+        middleware, "SELECT * FROM exams e JOIN patients p ON p.id = e.patient_id", "exames em 2023", lambda sql: "[(1,)]"
+    )
+    assert calls == [
+        "SELECT * FROM exams e JOIN patients p ON p.id = e.patient_id"
+        " WHERE `e`.`exam_date` >= '2023-01-01' AND `e`.`exam_date` < '2024-01-01'"
+    ]
+    assert middleware.explained == ["SELECT * FROM exams e JOIN patients p ON p.id = e.patient_id", *calls]
+    assert "from 2023-01-01 to before 2024-01-01" in response.content
+    assert middleware.stats.partitions_total == 9 and middleware.stats.partitions_read == 2
+    assert (middleware.stats.rows_before, middleware.stats.rows_after) == (900, 200)
+
+
+def test_outer_joined_partitioned_table_does_not_cancel_the_rewrite(middleware):
+    query = "SELECT * FROM exams e LEFT JOIN health_history h ON h.patient_id = e.patient_id"
+    _, calls = run_tool(middleware, query, "exames em 2023", lambda sql: "[(1,)]")
+    assert calls == [query + " WHERE `e`.`exam_date` >= '2023-01-01' AND `e`.`exam_date` < '2024-01-01'"]
+    assert middleware.stats.partitions_total == 9 and middleware.stats.partitions_read == 2
+
+
+def test_question_without_period_runs_unchanged(middleware):
+    query = "SELECT * FROM exams WHERE patient_id = 7"
+    response, calls = run_tool(middleware, query, "exames do paciente 7", lambda sql: "[(1,)]")
+    assert calls == [query] and response.content == "[(1,)]"
+    assert middleware.explained == []
+
+
+def test_aggregate_query_runs_unchanged(middleware):
+    query = "SELECT COUNT(*) FROM exams WHERE patient_id = 7"
+    _, calls = run_tool(middleware, query, "quantos exames recentes o paciente 7 fez?", lambda sql: "[(3,)]")
+    assert calls == [query]
+
+
+def test_existing_partition_predicate_is_kept(middleware):
+    query = "SELECT * FROM exams WHERE exam_date > '2020-01-01'"
+    _, calls = run_tool(middleware, query, "exames em 2023", lambda sql: "[(1,)]")
+    assert calls == [query]
+
+
+def test_outer_joined_table_is_not_bounded(middleware):
+    query = "SELECT * FROM patients p LEFT JOIN exams e ON e.patient_id = p.id"
+    _, calls = run_tool(middleware, query, "exames em 2023", lambda sql: "[(1,)]")
+    assert calls == [query]
+
+
+def test_default_lookback_falls_back_when_empty(middleware):
+    query = "SELECT * FROM exams WHERE patient_id = 7"
+    response, calls = run_tool(middleware, query, "últimos exames do paciente 7", lambda sql: "" if "WHERE (" in sql else "[(1,)]")
+    assert calls[0].startswith("SELECT * FROM exams WHERE (patient_id = 7) AND `exams`.`exam_date` >= '2024-10-18'")
+    assert calls[1] == query
+    assert response.content == "[(1,)]"
+    assert middleware.stats.fallbacks == 1
+
+
+def test_default_lookback_result_states_the_window(middleware):
+    response, _ = run_tool(middleware, "SELECT * FROM exams", "exames recentes", lambda sql: "[(1,)]")
+    assert "default lookback" in response.content and "2024-10-18" in response.content
+
+
+def test_rewrite_dropped_when_explain_shows_no_pruning(context):
+    middleware = FakeMiddleware(context, partitions_read=9)
+    query = "SELECT * FROM exams"
+    response, calls = run_tool(middleware, query, "exames em 2023", lambda sql: "[(1,)]")
+    assert calls == [query] and response.content == "[(1,)]"
+    assert len(middleware.explained) == 2 and middleware.stats.queries_rewritten == 0
+
+
+def test_disabled(context):
+    middleware = FakeMiddleware(replace(context, partition_pruning_enabled=False))
+    query = "SELECT * FROM exams"
+    _, calls = run_tool(middleware, query, "exames em 2023", lambda sql: "[(1,)]")
+    assert calls == [query]
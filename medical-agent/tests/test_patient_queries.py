@@ -0,0 +1,151 @@
+import asyncio
+from dataclasses import replace
+from datetime import date
+
+import pytest
+from langgraph.runtime import Runtime
+
+from medical_agent import nodes
+from medical_agent import patient_queries as module
+from medical_agent.patient_queries import (
+    FIND_PATIENT_EXACT,
+    FIND_PATIENT_PREFIX,
+    PATIENT_EXAMS,
+    PATIENT_HISTORY,
+    PATIENT_OLD_REPORTS,
+    PatientSnapshot,
+    afetch_patient_snapshots,
+    find_patients,
+)
+
+ALICE = {"id": "p1", "full_name": "Alice Souza", "birth_date": date(1980, 5, 1), "gender": "F"}
+
+
+class FakePool:
+    """Answers the lookup queries for one patient and records every query run."""
+
+    def __init__(self, patients=(ALICE,), watermark="w1"):
+        self.patients = list(patients)
+        self.watermark = watermark
+        self.queries = []
+
+    async def fetch_all(self, sql, params=()):
+        self.queries.append((sql, params))
+        if sql == FIND_PATIENT_EXACT:
+            return [dict(p, watermark=self.watermark) for p in self.patients if p["full_name"] == params[0]]
+        if sql == FIND_PATIENT_PREFIX:
+            prefix = params[0][:-1].replace("\\", "")
+            return [dict(p, watermark=self.watermark) for p in self.patients if p["full_name"].startswith(prefix)]
+        if sql == PATIENT_HISTORY:
+            return [{"title": "Asthma", "description": "Mild, intermittent", "occurred_at": date(2024, 3, 2)}]
+        if sql == PATIENT_EXAMS:
+            return [{"name": "Spirometry", "scheduled_at": date(2024, 3, 9), "status": "done",
+                     "result_text": "Normal", "result_file_url": None, "result_date": date(2024, 3, 10)}]
+        if sql == PATIENT_OLD_REPORTS:
+            return []
+        raise AssertionError(sql)
+
+    def count(self, sql):
+        return sum(1 for query, _ in self.queries if query == sql)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(module, "database_pool", lambda context=None: pool)
+    monkeypatch.setattr(module, "_snapshot_caches", {})
+    return pool
+
+
+def test_exact_match_is_tried_before_the_escaped_prefix(pool):
+    assert asyncio.run(find_patients(pool, "  Alice   Souza "))[0]["id"] == "p1"
+    assert pool.count(FIND_PATIENT_PREFIX) == 0
+
+    assert asyncio.run(find_patients(pool, "Alice"))[0]["id"] == "p1"
+    assert pool.queries[-1] == (FIND_PATIENT_PREFIX, ("Alice%", module.MAX_PATIENT_MATCHES))
+
+    asyncio.run(find_patients(pool, "50%_off"))
+    assert pool.queries[-1][1][0] == "50\\%\\_off%"
+
+
+def test_snapshot_reads_history_exams_and_reports(pool, context):
+    [snapshot] = asyncio.run(afetch_patient_snapshots("Alice Souza", replace(context, patient_snapshot_cache_enabled=False)))
+    assert "watermark" not in snapshot.patient
+    assert snapshot.history_items() == ["2024-03-02: Asthma. Mild, intermittent"]
+    text = snapshot.to_text()
+    assert "Patient: Alice Souza (id p1)" in text
+    assert "- 2024-03-09: Spirometry (done); result on 2024-03-10: Normal" in text
+    assert "Old reports" not in text
+    assert {sql for sql, _ in pool.queries[1:]} == {PATIENT_HISTORY, PATIENT_EXAMS, PATIENT_OLD_REPORTS}
+    assert (PATIENT_HISTORY, ("p1", context.patient_history_limit)) in pool.queries
+
+
+def test_unknown_patient_matches_nothing(pool, context):
+    assert asyncio.run(afetch_patient_snapshots("Bruno", context)) == []
+
+
+def test_empty_snapshot_renders_placeholders():
+    text = PatientSnapshot(patient={"id": "p2", "full_name": "Bruno", "birth_date": None, "gender": None}).to_text()
+    assert "Birth date: unknown; gender: unknown" in text
+    assert text.count("- none") == 2
+
+
+@pytest.mark.parametrize(
+    "question, lookup",
+    [
+        ("exames da Maria Souza", True),
+        ("histórico do paciente João Silva", True),
+        ("exames recentes da Maria", True),
+        ("Maria's abnormal exams in 2019", False),
+        ("exames alterados da Maria", False),
+        ("quantas consultas a Ana teve?", False),
+        ("primeira consulta do João", False),
+        ("todo o histórico da Maria", False),
+        ("consultas da Ana desde 2020", False),
+    ],
+)
+def test_plain_lookups_are_told_from_ad_hoc_questions(question, lookup):
+    assert module.is_records_lookup(question) is lookup
+
+
+def node_state(patient_name, question):
+    user_input_info = {
+        "patient_name": patient_name, "symptoms": [], "disease_name": "", "condition": "",
+        "summary": "", "original_input": question,
+    }
+    state = {"user_input_info": user_input_info}
+    state.update(asyncio.run(nodes.planning(state, None)))
+    return state
+
+
+def test_node_uses_the_fast_path(pool, context, monkeypatch):
+    def unexpected(*args, **kwargs):
+        raise AssertionError("the SQL agent should not run for a plain lookup")
+
+    monkeypatch.setattr("medical_agent.agents.supervisor_agent.query_patient", unexpected)
+    update = asyncio.run(nodes.gather_patient_info(node_state("Alice Souza", "exames da Alice"), Runtime(context=context)))
+    assert update["patient_info"][0].metadata == {"source": "patient_queries", "patient_name": "Alice Souza", "patient_id": "p1"}
+    assert update["patient_health_history"] == ["2024-03-02: Asthma. Mild, intermittent"]
+
+
+def test_ad_hoc_questions_go_to_the_sql_agent(pool, context, monkeypatch):
+    async def query_patient(query, context=None):
+        return f"answer to {query}"
+
+    monkeypatch.setattr("medical_agent.agents.supervisor_agent.query_patient", query_patient)
+    state = node_state("Alice Souza", "exames alterados da Alice em 2019")
+    update = asyncio.run(nodes.gather_patient_info(state, Runtime(context=context)))
+    assert update["patient_info"][0].page_content == "answer to Patient: Alice Souza\nexames alterados da Alice em 2019"
+    assert update["patient_info"][0].metadata["source"] == "sql_agent"
+    assert pool.queries == []
+
+
+def test_unknown_patient_is_reported_without_the_sql_agent(pool, context, monkeypatch):
+    def unexpected(*args, **kwargs):
+        raise AssertionError("the SQL agent should not look for a patient the lookup did not find")
+
+    monkeypatch.setattr("medical_agent.agents.supervisor_agent.query_patient", unexpected)
+    update = asyncio.run(nodes.gather_patient_info(node_state("Bruno", "exames do Bruno"), Runtime(context=context)))
+    [document] = update["patient_info"]
+    assert document.page_content == "No patient named 'Bruno' was found in the hospital records."
+    assert document.metadata["not_found"] is True and update["patient_health_history"] == []
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+from langchain.agents.middleware import ModelRequest, ModelResponse
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.retrievers import BaseRetriever
+from langgraph.runtime import Runtime
+
+from medical_agent.agents import pdf_agent
+from medical_agent.context import Context
+
+DOCS = [Document(id="c1", page_content="Give oxygen to keep saturation above 94%.", metadata={"source": "asthma.pdf", "page": 2})]
+
+
+class SlowRetriever(BaseRetriever):
+    """Only a blocking search, like the hybrid and cached retrievers."""
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(0.2)
+        return list(DOCS)
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    """Contexts the middleware asked the registry for."""
+    components = {"procedure_retriever": SlowRetriever(), "procedure_vector_store": object()}
+    requested = []
+
+    def get(name, context=None):
+        requested.append(context)
+        return components[name]
+
+    monkeypatch.setattr(pdf_agent.registry, "get", get)
+    return requested
+
+
+@pytest.fixture
+def middleware(context):
+    return pdf_agent.ProcedureContextMiddleware(context)
+
+
+def model_request(query, context=None):
+    return ModelRequest(
+        model=None,
+        system_prompt=None,
+        messages=[HumanMessage(query)],
+        tool_choice=None,
+        tools=[],
+        response_format=None,
+        state={"messages": [HumanMessage(query)]},
+        runtime=Runtime(context=context),
+    )
+
+
+def test_sync_prompt_contains_retrieved_passages(requested, middleware):
+    prompts = []
+
+    def handler(request):
+        prompts.append(request.system_prompt)
+        return ModelResponse(result=[AIMessage("ok")])
+
+    middleware.wrap_model_call(model_request("asma oxigênio"), handler)
+    assert "Source: asthma.pdf | Page: 2" in prompts[0]
+    assert "asma oxigênio" in prompts[0]
+
+
+def test_async_retrieval_does_not_block_the_event_loop(requested, middleware):
+    async def handler(request):
+        return ModelResponse(result=[AIMessage(request.system_prompt)])
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        response = await middleware.awrap_model_call(model_request("asma"), handler)
+        task.cancel()
+        return response, ticks
+
+    response, ticks = asyncio.run(main())
+    assert "Source: asthma.pdf" in response.result[0].content
+    assert ticks >= 5
+
+
+def test_sources_are_collected_for_the_caller(requested, middleware):
+    sources = []
+    token = pdf_agent._retrieved_sources.set(sources)
+    try:
+        middleware.wrap_model_call(model_request("asma"), lambda request: ModelResponse(result=[]))
+    finally:
+        pdf_agent._retrieved_sources.reset(token)
+    assert sources == ["asthma.pdf:2"]
+
+
+def test_run_context_overrides_the_build_context(requested, middleware, context):
+    run_context = Context(**{**vars(context), "retriever_k": context.retriever_k + 1})
+    middleware.wrap_model_call(model_request("asma", run_context), lambda request: ModelResponse(result=[]))
+    assert requested and all(seen is run_context for seen in requested)
+
+    requested.clear()
+    middleware.wrap_model_call(model_request("asma"), lambda request: ModelResponse(result=[]))
+    assert requested and all(seen is context for seen in requested)
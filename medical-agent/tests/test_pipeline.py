@@ -0,0 +1,96 @@
+from pathlib import Path
+
+import pytest
+
+from medical_agent.document_loader import pipeline
+from medical_agent.document_loader.manifest import IngestionManifest
+from medical_agent.document_loader.pipeline import IngestionPipeline
+from medical_agent.document_loader.sinks import LocalIndexSink
+from medical_agent.vector_index import LocalVectorIndex
+from tests.conftest import write_pdf
+
+_original_extract_page = pipeline._extract_page
+
+
+def _extract_failing_second_page(path: str, page: int) -> str:
+    # Module level so the extraction worker processes can unpickle it.
+    if page == 1:
+        raise ValueError("broken content stream")
+    return _original_extract_page(path, page)
+
+
+@pytest.fixture
+def index(context):
+    return LocalVectorIndex(context.local_index_path)
+
+
+def run(context, embeddings, index, paths=None, directory=None):
+    ingestion = IngestionPipeline(context, embeddings, LocalIndexSink(index))
+    return ingestion.ingest_directory(directory) if directory is not None else ingestion.ingest(paths)
+
+
+def sources(index):
+    return {Path(hit.metadata["source"]).name for hit in index.hits(index.live_rows())}
+
+
+def test_unchanged_file_and_pages_are_skipped(context, embeddings, index, tmp_path):
+    pdf = write_pdf(tmp_path / "protocol.pdf", ["asthma give oxygen", "sepsis give fluids"])
+    first = run(context, embeddings, index, [pdf])
+    assert (first.pages, first.pages_changed) == (2, 2)
+    assert run(context, embeddings, index, [pdf]).files_skipped == 1
+
+    write_pdf(pdf, ["asthma give salbutamol", "sepsis give fluids"])
+    third = run(context, embeddings, index, [pdf])
+    assert (third.pages, third.pages_changed, third.chunks_deleted) == (2, 1, 1)
+
+
+def test_manifest_pages_read_once_per_file(context, embeddings, index, tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / "protocol.pdf", [f"page {i} of the protocol" for i in range(5)])
+    calls = []
+    original = IngestionManifest.pages
+    monkeypatch.setattr(IngestionManifest, "pages", lambda self, path: calls.append(path) or original(self, path))
+    run(context, embeddings, index, [pdf])
+    assert calls == [str(pdf.resolve())]
+
+
+def test_failed_page_is_skipped_and_retried(context, embeddings, index, tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / "protocol.pdf", ["asthma give oxygen", "sepsis give fluids", "stroke call team"])
+    monkeypatch.setattr(pipeline, "_extract_page", _extract_failing_second_page)
+    stats = run(context, embeddings, index, [pdf])
+    assert (stats.pages, stats.pages_failed, stats.files_failed) == (2, 1, 1)
+    assert len(index) == 2
+
+    monkeypatch.setattr(pipeline, "_extract_page", _original_extract_page)
+    retry = run(context, embeddings, index, [pdf])
+    assert retry.files_skipped == 0
+    assert (retry.pages, retry.pages_changed, retry.pages_failed) == (3, 1, 0)
+    assert len(index) == 3
+    assert run(context, embeddings, index, [pdf]).files_skipped == 1
+
+
+def test_unreadable_file_does_not_abort_the_run(context, embeddings, index, tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "broken.pdf").write_bytes(b"not a pdf")
+    write_pdf(tmp_path / "docs" / "protocol.pdf", ["asthma give oxygen"])
+    stats = run(context, embeddings, index, directory=tmp_path / "docs")
+    assert (stats.files_seen, stats.files_failed, stats.pages) == (2, 1, 1)
+    assert sources(index) == {"protocol.pdf"}
+
+
+def test_removed_pdf_is_purged(context, embeddings, index, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    write_pdf(docs / "asthma.pdf", ["asthma give oxygen", "asthma give salbutamol"])
+    write_pdf(docs / "sepsis.pdf", ["sepsis give fluids"])
+    other = write_pdf(tmp_path / "stroke.pdf", ["stroke call team"])
+    run(context, embeddings, index, [other])
+    run(context, embeddings, index, directory=docs)
+    assert sources(index) == {"asthma.pdf", "sepsis.pdf", "stroke.pdf"}
+
+    (docs / "asthma.pdf").unlink()
+    stats = run(context, embeddings, index, directory=docs)
+    assert (stats.files_removed, stats.chunks_deleted) == (1, 2)
+    # Files outside the directory are left alone.
+    assert sources(index) == {"sepsis.pdf", "stroke.pdf"}
+    manifest = IngestionManifest(Path(context.cache_dir) / "ingestion_manifest.sqlite3")
+    assert {Path(path).name for path in manifest.files()} == {"sepsis.pdf", "stroke.pdf"}
@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+import pytest
+from langchain.agents.middleware import ModelResponse
+from langchain_core.messages import AIMessage
+
+from medical_agent import prompts
+from medical_agent.agents import pdf_agent
+from medical_agent.context_assembly import AssembledContext, Passage
+from medical_agent.prompts import PDF_AGENT_PROMPT, append_sections
+from medical_agent.schema_catalog import SchemaPromptMiddleware
+from tests.test_pdf_agent import model_request
+
+
+def test_sections_are_appended_after_the_prompt():
+    assert append_sections("static") == "static"
+    assert append_sections("static", ("Query", "asma"), ("Docs", "a\nb")) == "static\n\nQuery:\nasma\n\nDocs:\na\nb"
+
+
+@pytest.mark.parametrize("name", ["NORMALIZATION_PROMPT", "PDF_AGENT_PROMPT", "SUPERVISOR_PROMPT"])
+def test_static_prompts_have_no_placeholders(name):
+    assert "{" not in getattr(prompts, name)
+
+
+def test_pdf_prompts_share_the_static_prefix():
+    first = pdf_agent._system_message("asma", AssembledContext([Passage("asthma.pdf", "2", "Give oxygen.", 0)]))
+    second = pdf_agent._system_message("sepse", AssembledContext([Passage("sepsis.pdf", "1", "Give fluids.", 0)]))
+    shared = os.path.commonprefix([first, second])
+    assert shared == PDF_AGENT_PROMPT + "\n\nUser query:\n"
+
+
+class FakeCatalog:
+    def __init__(self, schema):
+        self.schema = schema
+
+    async def ensure_fresh(self):
+        raise ConnectionError("database unavailable")
+
+    def render(self):
+        return self.schema
+
+
+def test_schema_block_is_appended_to_the_sql_prompt():
+    prompts_seen = []
+
+    async def handler(request):
+        prompts_seen.append(request.system_prompt)
+        return ModelResponse(result=[AIMessage("ok")])
+
+    request = model_request("exames do paciente 7").override(system_prompt="static sql instructions")
+    asyncio.run(SchemaPromptMiddleware(FakeCatalog("exams(id, exam_date)")).awrap_model_call(request, handler))
+    asyncio.run(SchemaPromptMiddleware(FakeCatalog("")).awrap_model_call(request, handler))
+    assert prompts_seen == ["static sql instructions\n\nDatabase schema:\nexams(id, exam_date)", "static sql instructions"]
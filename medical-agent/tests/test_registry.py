@@ -0,0 +1,112 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import FrozenInstanceError, replace
+from pathlib import Path
+
+import pytest
+
+from medical_agent.registry import ComponentRegistry
+
+builds = []
+
+
+def build_component(context):
+    builds.append(context.model)
+    # Slow enough that concurrent first calls overlap.
+    time.sleep(0.02)
+    if context.model == "broken":
+        raise ConnectionError("backend unavailable")
+    return {"model": context.model}
+
+
+released = threading.Event()
+
+
+def build_blocked_component(context):
+    return "released" if released.wait(2) else "timed out"
+
+
+async def warm_component(component, context):
+    component["warm"] = True
+
+
+@pytest.fixture
+def registry():
+    builds.clear()
+    registry = ComponentRegistry()
+    registry.register("component", "tests.test_registry:build_component", warm="tests.test_registry:warm_component")
+    return registry
+
+
+def test_components_are_built_once_per_settings(registry, context):
+    threads = [threading.Thread(target=registry.get, args=("component", context)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.get("component", context) is registry.get("component", replace(context))
+    assert registry.get("component", replace(context, model="other"))["model"] == "other"
+    assert builds == [context.model, "other"]
+
+    registry.clear("component")
+    registry.get("component", context)
+    assert len(builds) == 3
+
+
+def test_a_failed_build_is_retried(registry, context):
+    broken = replace(context, model="broken")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            registry.get("component", broken)
+    assert builds == ["broken", "broken"]
+
+
+def test_a_slow_build_does_not_block_other_components(registry, context):
+    released.clear()
+    registry.register("blocked", "tests.test_registry:build_blocked_component")
+    thread = threading.Thread(target=registry.get, args=("blocked", context))
+    thread.start()
+    try:
+        assert registry.get("component", context) == {"model": context.model}
+    finally:
+        released.set()
+        thread.join()
+    assert registry.get("blocked", context) == "released"
+
+
+def test_contexts_key_the_cache_without_copying(context):
+    assert hash(context) == hash(replace(context)) and context == replace(context)
+    # Settings cannot change under a cached component.
+    with pytest.raises(FrozenInstanceError):
+        context.model = "other"
+
+
+def test_warm_up_reports_failures_instead_of_raising(registry, context):
+    registry.register("broken", "tests.test_registry:build_component")
+    assert asyncio.run(registry.warm_up(context=context)) == {"component": None, "broken": None}
+    assert registry.get("component", context)["warm"] is True
+
+    results = asyncio.run(registry.warm_up(["component"], replace(context, model="broken")))
+    assert results == {"component": "ConnectionError: backend unavailable"}
+
+
+def run_python(code):
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parents[1] / "src")}
+    env.pop("CHECKPOINT_PATH", None)
+    return subprocess.run([sys.executable, "-W", "ignore", "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+
+
+def test_importing_the_package_builds_nothing():
+    code = (
+        "import sys, medical_agent\n"
+        "print(sorted(m for m in ('langgraph', 'langchain_ollama', 'pymongo') if m in sys.modules))\n"
+        "from medical_agent.agents import supervisor_agent\n"
+        "from medical_agent.registry import registry\n"
+        "graph = medical_agent.graph\n"
+        "print(type(graph).__name__, len(registry._instances), 'langchain_mongodb' in sys.modules)\n"
+    )
+    assert run_python(code).splitlines() == ["[]", "CompiledStateGraph 0 False"]
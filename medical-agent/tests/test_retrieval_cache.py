@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from medical_agent.cache import RetrievalCache, ingestion_generation
+from medical_agent.document_loader.sinks import NeighbourSink
+from medical_agent.neighbours import NeighbourStore
+from medical_agent.retrievers import CachedRetriever, with_surrounding_chunks
+from medical_agent.vector_index import LocalVectorIndex, LocalVectorStore
+from medical_agent.vector_stores import neighbour_store
+
+TEXTS = [f"step {i} of the asthma protocol give oxygen item{i}" for i in range(10)]
+IDS = [f"c{i}" for i in range(10)]
+METADATAS = [{"source": "protocol.pdf", "page": i // 5, "start_index": (i % 5) * 100} for i in range(10)]
+
+
+def unit(rng, dimensions=256):
+    vector = rng.standard_normal(dimensions)
+    return RetrievalCache.normalize(vector)
+
+
+def near(rng, vector, similarity):
+    noise = unit(rng, len(vector))
+    noise = RetrievalCache.normalize(noise - (noise @ vector) * vector)
+    return RetrievalCache.normalize(similarity * vector + np.sqrt(1 - similarity**2) * noise)
+
+
+@pytest.fixture
+def store(tmp_path, embeddings):
+    store = LocalVectorStore(LocalVectorIndex(tmp_path / "index"), embeddings)
+    store.index.add(IDS, embeddings.embed_documents(TEXTS), TEXTS, METADATAS)
+    return store
+
+
+def test_close_queries_share_a_result_and_distant_ones_do_not():
+    rng = np.random.default_rng(0)
+    cache = RetrievalCache(similarity_threshold=0.95)
+    query = unit(rng)
+    cache.store(query, [("c1", {"page": 0})])
+
+    assert cache.lookup(near(rng, query, 0.99)) == [("c1", {"page": 0})]
+    assert cache.lookup(near(rng, query, 0.5)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lookup_returns_a_copy():
+    rng = np.random.default_rng(1)
+    cache = RetrievalCache()
+    query = unit(rng)
+    cache.store(query, [("c1", {})])
+    cache.lookup(query).clear()
+    assert cache.lookup(query) == [("c1", {})]
+
+
+def test_discard_counts_only_removed_entries(tmp_path):
+    rng = np.random.default_rng(2)
+    generation = ingestion_generation(tmp_path)
+    cache = RetrievalCache(generation=generation)
+    query = unit(rng)
+
+    cache.discard(query)
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 0, "stale": 0, "invalidations": 0, "hit_rate": 0.0}
+
+    cache.store(query, [("c1", {})])
+    assert cache.lookup(query) is not None
+    cache.discard(query)
+    assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["stale"]) == (0, 1, 1)
+
+    cache.store(query, [("c1", {})])
+    assert cache.lookup(query) is not None
+    generation.bump()
+    assert cache.lookup(unit(rng)) is None
+    cache.discard(query)
+    assert cache.stats()["hits"] == 1 and cache.stats()["stale"] == 1
+
+
+def test_generation_bump_invalidates(tmp_path):
+    rng = np.random.default_rng(3)
+    generation = ingestion_generation(tmp_path)
+    cache = RetrievalCache(generation=generation)
+    query = unit(rng)
+    cache.store(query, [("c1", {})])
+
+    generation.bump()
+    assert cache.lookup(query) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_results_retrieved_across_a_bump_are_not_cached(tmp_path):
+    rng = np.random.default_rng(4)
+    generation = ingestion_generation(tmp_path)
+    cache = RetrievalCache(generation=generation)
+    query = unit(rng)
+    seen = cache.generation()
+    generation.bump()
+    cache.store(query, [("c1", {})], seen)
+    assert cache.lookup(query) is None
+    cache.store(query, [("c1", {})], cache.generation())
+    assert cache.lookup(query) == [("c1", {})]
+
+
+def test_cached_retriever_serves_rephrasings_and_refetches_deleted_chunks(store):
+    cache = RetrievalCache(similarity_threshold=0.9)
+    retriever = CachedRetriever(retriever=store.as_retriever(search_kwargs={"k": 3}), vector_store=store, cache=cache)
+
+    first = retriever.invoke("asthma protocol give oxygen item3")
+    second = retriever.invoke("asthma protocol give oxygen item3 ")
+    assert [doc.id for doc in second] == [doc.id for doc in first]
+    assert second[0].page_content == first[0].page_content
+    assert cache.stats()["hits"] == 1
+
+    store.index.delete([first[0].id])
+    third = retriever.invoke("asthma protocol give oxygen item3")
+    assert first[0].id not in [doc.id for doc in third]
+    assert cache.stats()["stale"] == 1
+
+
+def test_surrounding_chunks_follow_reading_order_across_pages(tmp_path, store):
+    sink = NeighbourSink(NeighbourStore(tmp_path / "neighbours.sqlite3"))
+    # Written out of order: positions come from page and start_index.
+    sink.upsert(IDS[::-1], None, None, METADATAS[::-1])
+    sink.flush()
+
+    assert sink.store.surrounding(["c4"], 1) == ["c3", "c5"]
+    assert sink.store.surrounding(["c4", "c5"], 2) == ["c2", "c3", "c6", "c7"]
+    assert sink.store.surrounding(["c0"], 0) == []
+
+    [hit] = store.get_by_ids(["c4"])
+    expanded = with_surrounding_chunks([hit], store, sink.store, 1)
+    assert [doc.id for doc in expanded] == ["c4", "c3", "c5"]
+
+    sink.delete(["c5"])
+    sink.flush()
+    assert sink.store.surrounding(["c4"], 1) == ["c3", "c6"]
+
+
+def test_neighbour_store_is_reopened_after_ingestion(tmp_path):
+    cache_dir = str(tmp_path)
+    opened = neighbour_store(cache_dir)
+    assert neighbour_store(cache_dir) is opened
+
+    ingestion_generation(cache_dir).bump()
+    assert neighbour_store(cache_dir) is not opened
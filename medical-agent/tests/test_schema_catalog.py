@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from medical_agent import schema_catalog as module
+from medical_agent.schema_catalog import COLUMNS, FINGERPRINT, INDEXES, PARTITIONS, SchemaCatalog
+
+
+class FakePool:
+    def __init__(self):
+        self.column_type = "date"
+        self.partition_checksum = 1
+        self.queries = []
+
+    async def fetch_all(self, sql):
+        self.queries.append(sql)
+        if sql == FINGERPRINT:
+            return [
+                {"name": "exams", "created": None, "comment": "Exams", "columns": hash(self.column_type),
+                 "indexes": 7, "partitions": self.partition_checksum},
+            ]
+        if sql == COLUMNS:
+            return [{"table_name": "exams", "name": "exam_date", "type": self.column_type, "nullable": "NO", "key": "", "comment": ""}]
+        if sql == INDEXES:
+            return [{"table_name": "exams", "name": "PRIMARY", "column_name": "id"}]
+        if sql == PARTITIONS:
+            return [{"table_name": "exams", "name": "p2025", "method": "RANGE", "expression": "year(`exam_date`)", "description": "2026"}]
+        raise AssertionError(sql)
+
+    async def fetch_raw(self, sql):
+        if sql.startswith("SHOW CREATE TABLE"):
+            return ["Table", "Create Table"], [("exams", "CREATE TABLE exams (...)")]
+        return ["id"], [(1,)]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(module, "database_pool", lambda context: pool)
+    return pool
+
+
+def rebuilds(pool):
+    return pool.queries.count(COLUMNS)
+
+
+def test_fingerprint_covers_columns_indexes_and_partitions():
+    for needle in ("column_type", "column_comment", "information_schema.statistics", "partition_description"):
+        assert needle in FINGERPRINT
+
+
+def test_rebuilds_only_when_fingerprint_changes(pool, context):
+    catalog = SchemaCatalog(context, refresh_interval=0)
+    asyncio.run(catalog.ensure_fresh())
+    assert "exam_date date" in catalog.render()
+    assert catalog.tables["exams"].partition_expression == "year(exam_date)"
+    asyncio.run(catalog.ensure_fresh())
+    assert rebuilds(pool) == 1
+
+    pool.column_type = "datetime"
+    asyncio.run(catalog.ensure_fresh())
+    assert rebuilds(pool) == 2
+    assert "exam_date datetime" in catalog.render()
+
+    pool.partition_checksum = 2
+    asyncio.run(catalog.ensure_fresh())
+    assert rebuilds(pool) == 3
+
+
+def test_refresh_interval_skips_the_fingerprint(pool, context):
+    catalog = SchemaCatalog(context, refresh_interval=300)
+    asyncio.run(catalog.ensure_fresh())
+    asyncio.run(catalog.ensure_fresh())
+    assert pool.queries.count(FINGERPRINT) == 1
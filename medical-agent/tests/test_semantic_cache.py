@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from medical_agent.cache import SemanticAnswerCache, ingestion_generation
+
+
+@pytest.fixture
+def generation(tmp_path):
+    return ingestion_generation(tmp_path)
+
+
+def make_cache(embeddings, generation=None, **kwargs):
+    return SemanticAnswerCache(embeddings.embed_query, generation=generation, **kwargs)
+
+
+def test_generation_survives_reopening_and_repeated_bumps(tmp_path, generation):
+    assert generation.current() == 0
+    assert generation.bump() == 1
+    assert generation.bump() == 2
+    assert ingestion_generation(tmp_path).current() == 2
+
+
+def test_close_query_is_served_from_the_cache(embeddings):
+    cache = make_cache(embeddings, similarity_threshold=0.9)
+    calls = []
+
+    def compute(query):
+        calls.append(query)
+        return f"answer to {query}", ["protocol.pdf:1"]
+
+    first = cache.get_or_compute("asthma protocol give oxygen", compute)
+    second = cache.get_or_compute("asthma protocol give oxygen ", compute)
+
+    assert second is first
+    assert second.sources == ["protocol.pdf:1"]
+    assert calls == ["asthma protocol give oxygen"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_distant_query_misses(embeddings):
+    cache = make_cache(embeddings, similarity_threshold=0.9)
+    cache.get_or_compute("asthma protocol give oxygen", lambda q: ("a", []))
+    assert cache.lookup(cache.embed("fracture immobilize the limb")) is None
+
+
+def test_generation_bump_invalidates(embeddings, generation):
+    cache = make_cache(embeddings, generation)
+    vector = cache.embed("asthma protocol")
+    cache.store("asthma protocol", vector, "answer", [])
+    assert cache.lookup(vector) is not None
+
+    generation.bump()
+    assert cache.lookup(vector) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_answer_computed_across_a_bump_is_not_cached(embeddings, generation):
+    cache = make_cache(embeddings, generation)
+
+    async def compute(query):
+        # An ingestion finishes while the PDF agent is still answering.
+        generation.bump()
+        return "answer from the old corpus", ["old.pdf:1"]
+
+    answer = asyncio.run(cache.aget_or_compute("asthma protocol", compute))
+    assert answer.answer == "answer from the old corpus"
+    assert cache.lookup(cache.embed("asthma protocol")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_and_evicted_entries_are_dropped(embeddings, monkeypatch):
+    cache = make_cache(embeddings, ttl_seconds=10.0, max_entries=2)
+    vectors = [cache.embed(text) for text in ("asthma oxygen", "sepsis fluids", "fracture splint")]
+    for text, vector in zip(("a", "s", "f"), vectors):
+        cache.store(text, vector, text, [])
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(vectors[0]) is None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 60.0)
+    assert cache.lookup(vectors[2]) is None
+
+
+def test_embed_normalizes(embeddings):
+    cache = make_cache(embeddings)
+    assert np.isclose(np.linalg.norm(cache.embed("asthma asthma oxygen")), 1.0)
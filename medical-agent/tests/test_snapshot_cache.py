@@ -0,0 +1,66 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from medical_agent import patient_queries as module
+from medical_agent.cache import PatientSnapshotCache
+from medical_agent.patient_queries import PATIENT_HISTORY, afetch_patient_snapshots
+from tests.test_patient_queries import FakePool
+
+
+def test_snapshot_is_served_only_under_its_watermark():
+    cache = PatientSnapshotCache()
+    cache.put("p1", "w1", {"history": ["asthma"]})
+    assert cache.get("p1", "w1") == {"history": ["asthma"]}
+    assert cache.get("p1", "w2") is None
+    # A stale entry is dropped, not kept for the old watermark.
+    assert cache.get("p1", "w1") is None
+    assert cache.get("p2", "w1") is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 2, "stale": 1, "spilled": 0}
+
+
+def test_evicted_snapshots_spill_to_disk(tmp_path):
+    cache = PatientSnapshotCache(max_entries=1, spill_path=tmp_path / "snapshots.sqlite3")
+    cache.put("p1", "w1", {"name": "Alice"})
+    cache.put("p2", "w1", {"name": "Bruno"})
+    assert cache.stats()["spilled"] == 1
+    assert cache.get("p1", "w1") == {"name": "Alice"}
+    assert cache.get("p1", "w2") is None
+    assert cache.get("p1", "w1") is None
+
+    cache.invalidate()
+    assert cache.get("p2", "w1") is None
+    cache.close()
+
+
+def test_prometheus_lists_every_counter():
+    text = PatientSnapshotCache().prometheus()
+    for name in ("entries", "hits", "misses", "stale", "spilled"):
+        assert f'medical_agent_patient_snapshot_cache_{name}{{cache="default"}} 0\n' in text
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(module, "database_pool", lambda context=None: pool)
+    monkeypatch.setattr(module, "_snapshot_caches", {})
+    return pool
+
+
+def test_unchanged_patient_costs_only_the_name_query(pool, context):
+    first = asyncio.run(afetch_patient_snapshots("Alice Souza", context))
+    second = asyncio.run(afetch_patient_snapshots("Alice Souza", context))
+    assert second == first
+    assert pool.count(PATIENT_HISTORY) == 1
+
+    pool.watermark = "w2"
+    asyncio.run(afetch_patient_snapshots("Alice Souza", context))
+    assert pool.count(PATIENT_HISTORY) == 2
+
+
+def test_cache_is_shared_per_database_and_limits(pool, context):
+    asyncio.run(afetch_patient_snapshots("Alice Souza", context))
+    asyncio.run(afetch_patient_snapshots("Alice Souza", replace(context, patient_history_limit=5)))
+    assert pool.count(PATIENT_HISTORY) == 2
+    assert module.snapshot_cache(context) is module.snapshot_cache(replace(context))
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import re
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.tools import tool
+from langgraph.graph import START, MessagesState, StateGraph
+
+from medical_agent.streaming import PROCEDURE_SEARCH, astream_agent, emit
+
+
+class StreamingFakeModel(GenericFakeChatModel):
+    """Streams each scripted reply word by word, and tool calls as tool-call chunks."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = next(self.messages)
+        if message.tool_calls:
+            calls = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                for call in message.tool_calls
+            ]
+            chunks = [AIMessageChunk(content=message.content, tool_call_chunks=calls)]
+        else:
+            chunks = [AIMessageChunk(content=word) for word in re.findall(r"\S+\s*", message.content)]
+        for chunk in chunks:
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+
+
+@tool
+def search(query: str) -> str:
+    """Search the procedures."""
+    emit("citations", PROCEDURE_SEARCH, sources=["asthma.pdf:2"])
+    return "Give oxygen."
+
+
+def sub_agent():
+    model = StreamingFakeModel(
+        messages=iter(
+            [
+                AIMessage("Let me search.", tool_calls=[{"name": "search", "args": {"query": "asma"}, "id": "call"}]),
+                AIMessage("Give oxygen to keep saturation above 94%."),
+            ]
+        )
+    )
+    return create_agent(model, tools=[search])
+
+
+def graph(agent):
+    async def answer(state):
+        final = await astream_agent(agent, {"messages": [("user", "asma")]}, PROCEDURE_SEARCH)
+        return {"messages": [final["messages"][-1]]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "answer")
+    return builder.compile()
+
+
+def test_sub_agent_tokens_and_citations_reach_the_client():
+    async def main():
+        events = []
+        async for mode, chunk in graph(sub_agent()).astream({"messages": [("user", "asma")]}, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                events.append(chunk)
+            else:
+                final = chunk
+        return events, final
+
+    events, final = asyncio.run(main())
+    assert events[0] == {"event": "citations", "source": PROCEDURE_SEARCH, "sources": ["asthma.pdf:2"]}
+    tokens = [event["text"] for event in events[1:]]
+    # The tool-calling turn is not part of the answer.
+    assert all(event["event"] == "token" for event in events[1:]) and "Let me search." not in tokens
+    assert len(tokens) > 1 and "".join(tokens) == "Give oxygen to keep saturation above 94%."
+    assert final["messages"][-1].content == "Give oxygen to keep saturation above 94%."
+
+
+def test_without_a_stream_events_are_dropped():
+    emit("token", PROCEDURE_SEARCH, text="dropped")
+    final = asyncio.run(graph(sub_agent()).ainvoke({"messages": [("user", "asma")]}))
+    assert final["messages"][-1].content == "Give oxygen to keep saturation above 94%."
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from medical_agent import tracing
+from medical_agent.cache import RetrievalCache
+from medical_agent.tracing import JsonlSpanExporter, LatencyHistograms, Tracer, metrics_text, register_metrics
+
+
+def test_microsecond_durations_are_resolved():
+    histograms = LatencyHistograms()
+    for _ in range(100):
+        histograms.observe("cache hit", 0.00005)
+    stats = histograms.summary()["cache hit"]
+    assert stats["p50"] == pytest.approx(0.00005, rel=0.1)
+    assert stats["min"] == stats["max"] == 0.00005
+
+
+def test_quantiles_are_within_ten_percent_and_clamped():
+    histograms = LatencyHistograms()
+    for i in range(1, 101):
+        histograms.observe("query", i / 100)
+    assert histograms.quantile("query", 0.5) == pytest.approx(0.5, rel=0.1)
+    assert histograms.quantile("query", 0.99) == pytest.approx(0.99, rel=0.1)
+    assert histograms.quantile("query", 1.0) == 1.0
+    assert histograms.quantile("missing", 0.5) == 0.0
+
+
+def test_prometheus_quantile_labels():
+    histograms = LatencyHistograms()
+    histograms.observe('node "a"', 0.2)
+    text = histograms.prometheus()
+    for quantile in ("0.5", "0.95", "0.99"):
+        assert f'medical_agent_span_duration_seconds{{span="node \\"a\\"",quantile="{quantile}"}}' in text
+    assert 'quantile="0.50"' not in text
+    assert 'medical_agent_span_duration_seconds_count{span="node \\"a\\""} 1' in text
+
+
+def test_metric_sources_are_kept_by_name_and_grouped(monkeypatch):
+    monkeypatch.setattr(tracing, "_metric_sources", {})
+    first, second = RetrievalCache(name="/data/a"), RetrievalCache(name='/data/"b"')
+    register_metrics("retrieval_cache:a", RetrievalCache(name="/data/a").prometheus)
+    # Rebuilding a component replaces its source instead of serving its series twice.
+    register_metrics("retrieval_cache:a", first.prometheus)
+    register_metrics("retrieval_cache:b", second.prometheus)
+    lines = [line for line in metrics_text().splitlines() if line.startswith("medical_agent_retrieval_cache_")]
+    assert lines[:2] == [
+        'medical_agent_retrieval_cache_entries{cache="/data/a"} 0',
+        'medical_agent_retrieval_cache_entries{cache="/data/\\"b\\""} 0',
+    ]
+    assert len(lines) == len(set(lines)) == 2 * len(first.stats())
+
+
+def test_nested_spans_are_exported_as_otlp(tmp_path):
+    tracer = Tracer(JsonlSpanExporter(tmp_path / "traces.jsonl"))
+    with tracer.span("graph", **{"request.id": 7}) as outer:
+        with tracer.span("retriever") as inner:
+            pass
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("boom")
+
+    records = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    spans = [record["resourceSpans"][0]["scopeSpans"][0]["spans"][0] for record in records]
+    assert [span["name"] for span in spans] == ["retriever", "graph", "failing"]
+    assert spans[0]["parentSpanId"] == outer.span_id and spans[0]["traceId"] == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert spans[1]["attributes"] == [{"key": "request.id", "value": {"intValue": "7"}}]
+    assert spans[2]["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert tracer.histograms.summary()["graph"]["count"] == 1